@@ -283,6 +283,17 @@ def invalid_flex_config(message: str) -> ResponseTuple:
     )
 
 
+def unprocessable_entity(messages: dict) -> ResponseTuple:
+    return (
+        dict(
+            result="Rejected",
+            status="UNPROCESSABLE_ENTITY",
+            message=dict(json=messages),
+        ),
+        422,
+    )
+
+
 @BaseMessage("The requested backup is not known.")
 def unrecognized_backup(message: str) -> ResponseTuple:
     return dict(result="Rejected", status="UNRECOGNIZED_BACKUP", message=message), 400
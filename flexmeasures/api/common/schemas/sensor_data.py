@@ -1,17 +1,21 @@
 from __future__ import annotations
 
-from datetime import timedelta
+import base64
+import binascii
+from datetime import datetime, timedelta
+import json
+from typing import Iterator
 
 from flask_login import current_user
 from isodate import datetime_isoformat
 from marshmallow import fields, post_load, validates_schema, ValidationError
-from marshmallow.validate import OneOf
+from marshmallow.validate import Length, OneOf, Range
 from marshmallow_polyfield import PolyField
 from timely_beliefs import BeliefsDataFrame
 import pandas as pd
 
 from flexmeasures.data import ma
-from flexmeasures.data.models.time_series import Sensor
+from flexmeasures.data.models.time_series import Sensor, TimedBelief
 from flexmeasures.api.common.schemas.sensors import SensorField
 from flexmeasures.api.common.utils.api_utils import upsample_values
 from flexmeasures.data.models.planning.utils import initialize_index
@@ -30,6 +34,10 @@ from flexmeasures.utils.unit_utils import (
 )
 
 
+# Number of events to load at a time when streaming sensor data
+STREAM_CHUNK_SIZE = 10_000
+
+
 class SingleValueField(fields.Float):
     """Field that both de-serializes and serializes a single value to a list of floats (length 1)."""
 
@@ -100,10 +108,33 @@ class SensorDataDescriptionSchema(ma.Schema):
             )
 
 
+def encode_cursor(page_start: datetime) -> str:
+    """Make an opaque pagination cursor, pointing to the start of a page."""
+    return base64.urlsafe_b64encode(page_start.isoformat().encode()).decode()
+
+
+class CursorField(fields.Str):
+    """Field for an opaque pagination cursor, which de-serializes to the start of the requested page."""
+
+    def _deserialize(self, value, attr, data, **kwargs) -> pd.Timestamp:
+        value = super()._deserialize(value, attr, data, **kwargs)
+        try:
+            page_start = pd.Timestamp(base64.urlsafe_b64decode(value.encode()).decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError("Invalid cursor.")
+        if page_start.tzinfo is None:
+            raise ValidationError("Invalid cursor.")
+        return page_start
+
+
 class GetSensorDataSchema(SensorDataDescriptionSchema):
     resolution = DurationField(required=False)
     source = SourceIdField(required=False)
 
+    # Optional fields for paginating through long time windows
+    limit = fields.Int(required=False, validate=Range(min=1))
+    cursor = CursorField(required=False)
+
     # Optional field that can be used for extra validation
     type = fields.Str(
         required=False,
@@ -135,24 +166,31 @@ class GetSensorDataSchema(SensorDataDescriptionSchema):
                 f"The unit requested for this message type should be convertible from an energy price unit, got incompatible unit: {requested_unit}"
             )
 
+    @validates_schema
+    def check_cursor_against_time_window(self, data, **kwargs):
+        cursor = data.get("cursor")
+        if cursor is not None and not (
+            data["start"] <= cursor < data["start"] + data["duration"]
+        ):
+            raise ValidationError(
+                "The cursor does not lie within the requested time window.", "cursor"
+            )
+
     @staticmethod
-    def load_data_and_make_response(sensor_data_description: dict) -> dict:
-        """Turn the de-serialized and validated data description into a response.
+    def get_page(
+        sensor_data_description: dict,
+    ) -> tuple[datetime, datetime, timedelta, str | None]:
+        """Decide on the time window and resolution of the requested page of data.
 
-        Specifically, this function:
-        - queries data according to the given description
-        - converts to a single deterministic belief per event
-        - ensures the response respects the requested time frame
-        - converts values to the requested unit
-        - converts values to the requested resolution
+        Without a limit, the page spans the whole requested time window.
+        Note that the resolution is decided on the whole window, so it is the same for each page.
+
+        :returns: start and end of the page, the resolution of the data, and the cursor of the next page (or None for the last page)
         """
         sensor: Sensor = sensor_data_description["sensor"]
         start = sensor_data_description["start"]
-        duration = sensor_data_description["duration"]
-        end = sensor_data_description["start"] + duration
-        unit = sensor_data_description["unit"]
+        end = start + sensor_data_description["duration"]
         resolution = sensor_data_description.get("resolution")
-        source = sensor_data_description.get("source")
 
         # Post-load configuration of event frequency
         if resolution is None:
@@ -162,6 +200,23 @@ class GetSensorDataSchema(SensorDataDescriptionSchema):
                 # For instantaneous sensors, choose a default resolution given the requested time window
                 resolution = decide_resolution(start, end)
 
+        page_start = sensor_data_description.get("cursor", start)
+        page_end = end
+        limit = sensor_data_description.get("limit")
+        if limit is not None and resolution > timedelta(0):
+            page_end = min(page_start + limit * resolution, end)
+        next_cursor = encode_cursor(page_end) if page_end < end else None
+        return page_start, page_end, resolution, next_cursor
+
+    @staticmethod
+    def get_search_kwargs(
+        sensor_data_description: dict,
+        start: datetime,
+        end: datetime,
+        resolution: timedelta,
+    ) -> dict:
+        """Search a single deterministic belief per event within the given time window, at the given resolution."""
+
         # Post-load configuration of belief timing against message type
         horizons_at_least = sensor_data_description.get("horizon", None)
         horizons_at_most = None
@@ -175,45 +230,197 @@ class GetSensorDataSchema(SensorDataDescriptionSchema):
                 # If the horizon field is used, ensure we still respect the minimum horizon for prognoses
                 horizons_at_least = max(horizons_at_least, timedelta(0))
 
-        df = simplify_index(
-            sensor.search_beliefs(
-                event_starts_after=start,
-                event_ends_before=end,
-                horizons_at_least=horizons_at_least,
-                horizons_at_most=horizons_at_most,
-                source=source,
-                beliefs_before=sensor_data_description.get("prior", None),
-                one_deterministic_belief_per_event=True,
-                resolution=resolution,
-                as_json=False,
-            )
+        return dict(
+            event_starts_after=start,
+            event_ends_before=end,
+            horizons_at_least=horizons_at_least,
+            horizons_at_most=horizons_at_most,
+            source=sensor_data_description.get("source"),
+            beliefs_before=sensor_data_description.get("prior", None),
+            one_deterministic_belief_per_event=True,
+            resolution=resolution,
         )
 
+    @staticmethod
+    def make_values(
+        bdf: BeliefsDataFrame,
+        sensor_data_description: dict,
+        start: datetime,
+        end: datetime,
+        resolution: timedelta,
+    ) -> pd.Series:
+        """Turn the beliefs found by a search into the requested values.
+
+        :returns: the values, converted to the requested unit, with NaN values for events without data
+        """
+        df = simplify_index(bdf)
+
         # Convert to desired time range
         index = initialize_index(start=start, end=end, resolution=resolution)
         df = df.reindex(index)
 
         # Convert to desired unit
-        values: pd.Series = convert_units(  # type: ignore
+        return convert_units(  # type: ignore
             df["event_value"],
-            from_unit=sensor.unit,
-            to_unit=unit,
+            from_unit=sensor_data_description["sensor"].unit,
+            to_unit=sensor_data_description["unit"],
         )
 
-        # Convert NaN to None, which JSON dumps as null values
-        values = values.astype(object).where(pd.notnull(values), None)
+    @staticmethod
+    def load_values(
+        sensor_data_description: dict,
+        start: datetime,
+        end: datetime,
+        resolution: timedelta,
+    ) -> pd.Series:
+        """Load a single deterministic belief per event within the given time window, at the given resolution.
+
+        :returns: the values, converted to the requested unit, with NaN values for events without data
+        """
+        sensor: Sensor = sensor_data_description["sensor"]
+        bdf = sensor.search_beliefs(
+            **GetSensorDataSchema.get_search_kwargs(
+                sensor_data_description, start, end, resolution
+            ),
+            as_json=False,
+        )
+        return GetSensorDataSchema.make_values(
+            bdf, sensor_data_description, start, end, resolution
+        )
+
+    @staticmethod
+    def load_data_and_make_response(
+        sensor_data_description: dict, values_as_series: bool = False
+    ) -> dict:
+        """Turn the de-serialized and validated data description into a response.
+
+        Specifically, this function:
+        - queries data according to the given description
+        - converts to a single deterministic belief per event
+        - ensures the response respects the requested time frame (or page thereof)
+        - converts values to the requested unit
+        - converts values to the requested resolution
+
+        :param values_as_series: if True, values are given as a Series indexed by event start (with NaN values for missing data),
+                                 rather than as a list (with None values for missing data)
+        """
+        start, end, resolution, next_cursor = GetSensorDataSchema.get_page(
+            sensor_data_description
+        )
+        values = GetSensorDataSchema.load_values(
+            sensor_data_description, start, end, resolution
+        )
+        if not values_as_series:
+            # Convert NaN to None, which JSON dumps as null values
+            values = values.astype(object).where(pd.notnull(values), None).tolist()
 
         # Form the response
         response = dict(
-            values=values.tolist(),
+            values=values,
             start=datetime_isoformat(start),
-            duration=duration_isoformat(duration),
-            unit=unit,
-            resolution=duration_isoformat(df.event_resolution),
+            duration=duration_isoformat(end - start),
+            unit=sensor_data_description["unit"],
+            resolution=duration_isoformat(resolution),
         )
+        if next_cursor is not None:
+            response["next_cursor"] = next_cursor
 
         return response
 
+    @staticmethod
+    def stream_data(
+        sensor_data_description: dict, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """Stream the requested page of data as newline-delimited JSON, with one line per event.
+
+        Data is loaded for one chunk of events at a time, so memory use is bounded,
+        and the first events are sent before the rest of the time window is loaded.
+        """
+        start, end, resolution, _ = GetSensorDataSchema.get_page(
+            sensor_data_description
+        )
+        step = chunk_size * resolution if resolution > timedelta(0) else end - start
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + step, end)
+            values = GetSensorDataSchema.load_values(
+                sensor_data_description, chunk_start, chunk_end, resolution
+            )
+            values = values.astype(object).where(pd.notnull(values), None)
+            yield "".join(
+                json.dumps(dict(start=event_start.isoformat(), value=value)) + "\n"
+                for event_start, value in values.items()
+            ).encode()
+            chunk_start = chunk_end
+
+
+class GetSensorDataBatchSchema(ma.Schema):
+    """
+    Schema describing the data of multiple sensors, over the same time window.
+    Values are given in the unit of each sensor.
+    """
+
+    sensors = fields.List(
+        SensorField(entity_type="sensor", fm_scheme="fm1"),
+        required=True,
+        validate=Length(min=1),
+    )
+    start = AwareDateTimeField(required=True, format="iso")
+    duration = DurationField(required=True)
+    horizon = DurationField(required=False)
+    prior = AwareDateTimeField(required=False, format="iso")
+    resolution = DurationField(required=False)
+    source = SourceIdField(required=False)
+
+    @staticmethod
+    def load_data_and_make_response(batch_description: dict) -> dict:
+        """Turn the de-serialized and validated batch description into a response, with data for each sensor.
+
+        Sensors sharing the same resolution have their beliefs searched in one query.
+        """
+        sensors: list[Sensor] = list(dict.fromkeys(batch_description["sensors"]))
+        sensor_data_descriptions = [
+            dict(
+                {k: v for k, v in batch_description.items() if k != "sensors"},
+                sensor=sensor,
+                unit=sensor.unit,
+            )
+            for sensor in sensors
+        ]
+
+        # Group sensors by page (which differ by resolution only)
+        groups: dict[tuple, list[dict]] = {}
+        for sensor_data_description in sensor_data_descriptions:
+            page = GetSensorDataSchema.get_page(sensor_data_description)[:3]
+            groups.setdefault(page, []).append(sensor_data_description)
+
+        data = {}
+        for (start, end, resolution), group in groups.items():
+            bdf_dict = TimedBelief.search(
+                [d["sensor"] for d in group],
+                **GetSensorDataSchema.get_search_kwargs(
+                    group[0], start, end, resolution
+                ),
+                sum_multiple=False,
+            )
+            for sensor_data_description in group:
+                sensor = sensor_data_description["sensor"]
+                values = GetSensorDataSchema.make_values(
+                    bdf_dict[sensor], sensor_data_description, start, end, resolution
+                )
+
+                # Convert NaN to None, which JSON dumps as null values
+                values = values.astype(object).where(pd.notnull(values), None)
+                data[sensor.id] = dict(
+                    sensor=sensor.entity_address,
+                    values=values.tolist(),
+                    start=datetime_isoformat(start),
+                    duration=duration_isoformat(end - start),
+                    unit=sensor.unit,
+                    resolution=duration_isoformat(resolution),
+                )
+        return dict(data=[data[sensor.id] for sensor in sensors])
+
 
 class PostSensorDataSchema(SensorDataDescriptionSchema):
     """
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
 from timely_beliefs.beliefs.classes import BeliefsDataFrame
-from typing import Sequence
-from datetime import timedelta
+from typing import Iterator, Sequence
+from datetime import datetime, timedelta
+import hashlib
+import zlib
 
-from flask import current_app
+from flask import current_app, request, Response
 from numpy import array
 from psycopg2.errors import UniqueViolation
 from rq.job import Job
 from sqlalchemy.exc import IntegrityError
+from werkzeug.http import http_date, is_resource_modified, quote_etag, unquote_etag
 
 from flexmeasures.data import db
+from flexmeasures.data.services.time_series import get_belief_version
 from flexmeasures.data.utils import save_to_db
 from flexmeasures.api.common.responses import (
     invalid_replacement,
@@ -39,6 +43,89 @@ def upsample_values(
     return value_groups
 
 
+def negotiate_content_encoding() -> str | None:
+    """Choose how to compress a streamed response, given the Accept-Encoding header of the request.
+
+    Brotli ("br") is only offered if the brotli package is installed.
+    """
+    encodings = ["gzip"]
+    try:
+        import brotli  # noqa F401
+
+        encodings.insert(0, "br")
+    except ImportError:
+        pass
+    return request.accept_encodings.best_match(encodings)
+
+
+def compress_stream(
+    chunks: Iterator[bytes], encoding: str | None = None
+) -> Iterator[bytes]:
+    """Compress a stream of chunks with the given content encoding ("br", "gzip" or None).
+
+    Each chunk is flushed, so the client receives data as soon as it is loaded.
+    """
+    if encoding is None:
+        yield from chunks
+    elif encoding == "br":
+        import brotli
+
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    else:
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def get_conditional_headers(
+    sensors: list,
+    event_starts_after: datetime | None = None,
+    event_ends_before: datetime | None = None,
+    variant: str = "",
+) -> dict:
+    """ETag and Last-Modified headers for a response about the beliefs of the given sensors, within the given window.
+
+    The ETag also depends on the requested URL (including its query string), as it identifies a specific representation.
+    Pass a variant to tell apart other representations of the same URL (e.g. in another content type or encoding).
+    """
+    fingerprint, last_modified = get_belief_version(
+        sensors, event_starts_after, event_ends_before
+    )
+    etag = hashlib.sha1(
+        f"{request.full_path} {variant} {fingerprint}".encode()
+    ).hexdigest()
+    headers = {"ETag": quote_etag(etag)}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(headers: dict) -> Response | None:
+    """Respond with 304 Not Modified, if the If-None-Match or If-Modified-Since request headers match the given headers.
+
+    Meant to be called before loading any data, for example:
+
+        headers = get_conditional_headers([sensor], start, end)
+        response = not_modified(headers)
+        if response is not None:
+            return response
+        ...
+        return data, 200, headers
+    """
+    etag, _ = unquote_etag(headers["ETag"])
+    if is_resource_modified(
+        request.environ, etag=etag, last_modified=headers.get("Last-Modified")
+    ):
+        return None
+    return Response(status=304, headers=headers)
+
+
 def unique_ever_seen(iterable: Sequence, selector: Sequence):
     """
     Return unique iterable elements with corresponding lists of selector elements, preserving order.
@@ -88,7 +175,49 @@ def save_and_enqueue(
     if status[:7] == "success" and status != "success_but_nothing_new":
         enqueue_forecasting_jobs(forecasting_jobs)
 
-    # Pick a response
+    return pick_save_response(status)
+
+
+def save_batch_and_enqueue(
+    data: list[BeliefsDataFrame],
+    forecasting_jobs: list[Job] | None = None,
+    save_changed_beliefs_only: bool = True,
+) -> list[ResponseTuple]:
+    """Save a batch of BeliefsDataFrames in one transaction, with bulk inserts, and pick a response for each.
+
+    Each BeliefsDataFrame is saved within its own savepoint,
+    so that (forbidden) replacements only lead to rejecting the BeliefsDataFrame they are part of.
+    Forecasting jobs are enqueued once for the whole batch, if any new data was saved.
+    """
+    statuses = []
+    for bdf in data:
+        try:
+            with db.session.begin_nested():
+                statuses.append(
+                    save_to_db(
+                        bdf,
+                        bulk_save_objects=True,
+                        save_changed_beliefs_only=save_changed_beliefs_only,
+                    )
+                )
+        except IntegrityError as e:
+            if not is_timed_belief_replacement(e):
+                raise
+            statuses.append("invalid_replacement")
+    db.session.commit()
+
+    # Only enqueue forecasting jobs upon successfully saving new data
+    if any(
+        status[:7] == "success" and status != "success_but_nothing_new"
+        for status in statuses
+    ):
+        enqueue_forecasting_jobs(forecasting_jobs)
+
+    return [pick_save_response(status) for status in statuses]
+
+
+def pick_save_response(status: str) -> ResponseTuple:
+    """Pick a response given the status returned by save_to_db."""
     if status == "success":
         return request_processed()
     elif status in (
@@ -104,11 +233,16 @@ def catch_timed_belief_replacements(error: IntegrityError):
 
     Return a more informative message.
     """
-    if isinstance(error.orig, UniqueViolation) and "timed_belief_pkey" in str(
-        error.orig
-    ):
+    if is_timed_belief_replacement(error):
         # Some beliefs represented replacements, which was forbidden
         return invalid_replacement()
 
     # Forward to our generic error handler
     return error_handling_router(error)
+
+
+def is_timed_belief_replacement(error: IntegrityError) -> bool:
+    """Check whether an IntegrityError is due to a UniqueViolation on the TimedBelief primary key."""
+    return isinstance(error.orig, UniqueViolation) and "timed_belief_pkey" in str(
+        error.orig
+    )
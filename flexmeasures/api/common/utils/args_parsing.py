@@ -4,6 +4,12 @@ from webargs.multidictproxy import MultiDictProxy
 from webargs import ValidationError
 from webargs.flaskparser import parser
 
+from flexmeasures.api.common.utils.binary_formats import (
+    ARROW_STREAM,
+    MSGPACK,
+    load_binary_message,
+)
+
 """
 Utils for argument parsing (we use webargs),
 including error handling.
@@ -45,3 +51,14 @@ def load_data(request, schema):
     if request.mimetype == "application/json" and request.method == "POST":
         newdata.update(request.get_json())
     return MultiDictProxy(newdata, schema)
+
+
+@parser.location_loader("json_or_binary")
+def load_json_or_binary_data(request, schema):
+    """
+    We allow messages to come in JSON or in one of our binary formats (see binary_formats.py),
+    depending on the Content-Type header.
+    """
+    if request.mimetype in (ARROW_STREAM, MSGPACK):
+        return load_binary_message(request.get_data(), request.mimetype)
+    return parser.load_json(request, schema)
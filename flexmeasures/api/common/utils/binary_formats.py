@@ -0,0 +1,148 @@
+"""
+Utils for exchanging sensor data in binary formats, as an alternative to JSON.
+
+Clients can send (with Content-Type) or accept (with Accept) the following formats:
+- application/vnd.apache.arrow.stream: an Arrow IPC stream with the columns event_start and event_value,
+  and the other message fields (e.g. sensor, unit and start) as JSON in the schema metadata (under the key "flexmeasures").
+  Values go over the wire as a contiguous float64 buffer, with missing values as nulls.
+- application/msgpack: the same message as in JSON, packed with MessagePack.
+
+Both require optional dependencies (pyarrow and msgpack, respectively).
+Responses fall back to JSON if the requested format is not available on the server.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+import json
+
+from flask import request, Response
+import pandas as pd
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+from flexmeasures.data.services.belief_files import METADATA_KEY, import_pyarrow
+
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+
+
+def import_msgpack():
+    """Import msgpack, which is only needed for exchanging MessagePack messages.
+
+    :raises ImportError: if msgpack is not installed
+    """
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError(
+            "Exchanging MessagePack messages requires msgpack (pip install msgpack)."
+        ) from e
+    return msgpack
+
+
+@lru_cache()
+def get_available_mimetypes() -> tuple[str, ...]:
+    """List the mimetypes we can respond with, in order of preference."""
+    mimetypes = [JSON]
+    for mimetype, import_package in (
+        (ARROW_STREAM, import_pyarrow),
+        (MSGPACK, import_msgpack),
+    ):
+        try:
+            import_package()
+        except ImportError:
+            continue
+        mimetypes.append(mimetype)
+    return tuple(mimetypes)
+
+
+def negotiate_mimetype(mimetypes: tuple[str, ...] | None = None) -> str:
+    """Choose the mimetype of the response, given the Accept header of the request, defaulting to JSON.
+
+    :param mimetypes: mimetypes to choose from, by default JSON and the available binary formats
+    """
+    if mimetypes is None:
+        mimetypes = get_available_mimetypes()
+    return request.accept_mimetypes.best_match(mimetypes, default=JSON)
+
+
+def load_binary_message(data: bytes, mimetype: str) -> dict:
+    """Load a message in one of the binary formats, to the same dictionary as a JSON message would load to.
+
+    :raises UnsupportedMediaType: if the format is not available on the server
+    :raises BadRequest: if the message cannot be read
+    """
+    try:
+        if mimetype == ARROW_STREAM:
+            pa = import_pyarrow()
+        elif mimetype == MSGPACK:
+            msgpack = import_msgpack()
+        else:
+            raise UnsupportedMediaType(f"Unsupported content type: {mimetype}")
+    except ImportError as e:
+        raise UnsupportedMediaType(str(e))
+
+    try:
+        if mimetype == MSGPACK:
+            message = msgpack.unpackb(data)
+        else:
+            table = pa.ipc.open_stream(data).read_all()
+            metadata = table.schema.metadata or {}
+            message = json.loads(metadata.get(METADATA_KEY, b"{}"))
+            message["values"] = table.column("event_value").to_pylist()
+    except Exception as e:
+        raise BadRequest(f"Cannot read {mimetype} message: {e}")
+    if not isinstance(message, dict):
+        raise BadRequest(f"Cannot read {mimetype} message: expected a map.")
+    return message
+
+
+def make_binary_response(
+    message: dict,
+    mimetype: str,
+    values: pd.Series | None = None,
+    status: int = 200,
+    headers: dict | None = None,
+) -> Response:
+    """Respond with a message in one of the binary formats.
+
+    :param message: the message as it would be sent in JSON
+    :param values:  for Arrow streams, the values as a series indexed by event start (by default, the message's values are used)
+    """
+    if mimetype == ARROW_STREAM:
+        pa = import_pyarrow()
+        metadata = {k: v for k, v in message.items() if k != "values"}
+        if values is None:
+            values = message.get("values", [])
+            values = pd.Series(
+                values,
+                index=pd.date_range(
+                    pd.Timestamp(message["start"]),
+                    periods=len(values),
+                    freq=pd.Timedelta(message["duration"]) / max(len(values), 1),
+                ),
+                dtype=float,
+            )
+        batch = pa.RecordBatch.from_arrays(
+            [
+                pa.array(values.index),
+                pa.array(values.to_numpy(dtype=float), from_pandas=True),
+            ],
+            names=["event_start", "event_value"],
+        )
+        batch = batch.replace_schema_metadata(
+            {METADATA_KEY: json.dumps(metadata, default=str).encode()}
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        data = sink.getvalue().to_pybytes()
+    elif mimetype == MSGPACK:
+        data = import_msgpack().packb(message, default=str)
+    else:
+        raise ValueError(f"Unsupported mimetype: {mimetype}")
+    response = Response(data, status=status, mimetype=mimetype, headers=headers)
+    response.vary.add("Accept")
+    return response
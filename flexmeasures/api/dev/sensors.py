@@ -3,10 +3,14 @@ import warnings
 
 from flask_classful import FlaskView, route
 from flask_security import current_user
-from marshmallow import fields
+from marshmallow import fields, validate
 from webargs.flaskparser import use_kwargs
 from werkzeug.exceptions import abort
 
+from flexmeasures.api.common.utils.api_utils import (
+    get_conditional_headers,
+    not_modified,
+)
 from flexmeasures.data import db
 from flexmeasures.auth.policy import ADMIN_ROLE, ADMIN_READER_ROLE
 from flexmeasures.auth.decorators import permission_required_for_context
@@ -20,6 +24,7 @@ from flexmeasures.data.models.generic_assets import GenericAsset
 from flexmeasures.data.models.time_series import Sensor
 from flexmeasures.data.services.annotations import prepare_annotations_for_chart
 from flexmeasures.ui.utils.view_utils import set_session_variables
+from flexmeasures.utils.downsampling import DOWNSAMPLING_METHODS
 
 
 class SensorAPI(FlaskView):
@@ -88,6 +93,11 @@ class SensorAPI(FlaskView):
             "beliefs_before": AwareDateTimeField(format="iso", required=False),
             "resolution": DurationField(required=False),
             "most_recent_beliefs_only": fields.Boolean(required=False, default=True),
+            "compact": fields.Boolean(required=False),
+            "downsampling": fields.Str(
+                required=False, validate=validate.OneOf(DOWNSAMPLING_METHODS)
+            ),
+            "width": fields.Int(required=False, validate=validate.Range(min=1)),
         },
         location="query",
     )
@@ -107,8 +117,19 @@ class SensorAPI(FlaskView):
         - "beliefs_before" (see the `timely-beliefs documentation <https://github.com/SeitaBV/timely-beliefs/blob/main/timely_beliefs/docs/timing.md/#events-and-sensors>`_)
         - "resolution" (see :ref:`resolutions`)
         - "most_recent_beliefs_only" (if true, returns the most recent belief for each event; if false, returns each belief for each event; defaults to true)
+        - "compact" (if true, lists the sensor and sources only once, and the beliefs by column rather than as records; defaults to false)
+        - "downsampling" ("lttb" or "minmax", to downsample each source's series while preserving its shape, to one point or to the minimum and maximum per pixel, respectively; only applies to series with more points than the chart width)
+        - "width" (the chart width in pixels, for downsampling; defaults to 1000)
+
+        Responses come with ETag and Last-Modified headers, so clients can poll with conditional requests (and get a 304 response if nothing changed).
         """
-        return sensor.search_beliefs(as_json=True, **kwargs)
+        headers = get_conditional_headers(
+            [sensor], kwargs.get("event_starts_after"), kwargs.get("event_ends_before")
+        )
+        response = not_modified(headers)
+        if response is not None:
+            return response
+        return sensor.search_beliefs(as_json=True, **kwargs), 200, headers
 
     @route("/<id>/chart_annotations", strict_slashes=False)
     @use_kwargs(
@@ -4,7 +4,7 @@ from flask import current_app
 from flask_classful import FlaskView, route
 from flask_security import auth_required
 from flask_json import as_json
-from marshmallow import fields
+from marshmallow import fields, validate
 from webargs.flaskparser import use_kwargs, use_args
 from sqlalchemy import select, delete
 
@@ -16,7 +16,12 @@ from flexmeasures.data.schemas import AwareDateTimeField
 from flexmeasures.data.schemas.generic_assets import GenericAssetSchema as AssetSchema
 from flexmeasures.api.common.schemas.generic_assets import AssetIdField
 from flexmeasures.api.common.schemas.users import AccountIdField
+from flexmeasures.api.common.utils.api_utils import (
+    get_conditional_headers,
+    not_modified,
+)
 from flexmeasures.utils.coding_utils import flatten_unique
+from flexmeasures.utils.downsampling import DOWNSAMPLING_METHODS
 from flexmeasures.ui.utils.view_utils import set_session_variables
 
 
@@ -306,6 +311,11 @@ class AssetAPI(FlaskView):
             "beliefs_after": AwareDateTimeField(format="iso", required=False),
             "beliefs_before": AwareDateTimeField(format="iso", required=False),
             "most_recent_beliefs_only": fields.Boolean(required=False),
+            "compact": fields.Boolean(required=False),
+            "downsampling": fields.Str(
+                required=False, validate=validate.OneOf(DOWNSAMPLING_METHODS)
+            ),
+            "width": fields.Int(required=False, validate=validate.Range(min=1)),
         },
         location="query",
     )
@@ -316,6 +326,20 @@ class AssetAPI(FlaskView):
         .. :quickref: Chart; Download time series for use in charts
 
         Data for use in charts (in case you have the chart specs already).
+        With compact=true, sensors and sources are listed only once, and the beliefs by column rather than as records.
+        With downsampling=lttb or downsampling=minmax, each series with more points than the chart width (in pixels, set with width)
+        is downsampled such that its shape is preserved (one point per pixel, or the minimum and maximum per pixel, respectively).
+        Responses come with ETag and Last-Modified headers, so clients can poll with conditional requests (and get a 304 response if nothing changed).
         """
         sensors = flatten_unique(asset.sensors_to_show)
-        return asset.search_beliefs(sensors=sensors, as_json=True, **kwargs)
+        headers = get_conditional_headers(
+            sensors, kwargs.get("event_starts_after"), kwargs.get("event_ends_before")
+        )
+        response = not_modified(headers)
+        if response is not None:
+            return response
+        return (
+            asset.search_beliefs(sensors=sensors, as_json=True, **kwargs),
+            200,
+            headers,
+        )
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from flask import current_app, request, Response
+from flask_classful import FlaskView, route
+from flask_json import as_json
+from flask_security import auth_required, current_user
+from marshmallow import fields
+from rq.job import Job, NoSuchJobError
+from webargs.flaskparser import use_kwargs
+from werkzeug.exceptions import Forbidden
+
+from flexmeasures.api.common.responses import unrecognized_event
+from flexmeasures.auth.policy import check_access, user_has_admin_access
+from flexmeasures.data import db
+from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.job_progress import (
+    get_latest_progress,
+    iter_progress_events,
+)
+
+
+EVENT_STREAM = "text/event-stream"
+
+
+class JobAPI(FlaskView):
+    """
+    This API view lets clients follow the progress of long-running jobs.
+    """
+
+    route_base = "/jobs"
+    trailing_slash = False
+    decorators = [auth_required()]
+
+    @route("/<id>/progress", methods=["GET"])
+    @use_kwargs(
+        {"job_id": fields.Str(data_key="id")},
+        location="path",
+    )
+    def get_progress(self, job_id: str, **kwargs):
+        """Follow the progress of a job, live.
+
+        .. :quickref: Job; Follow the progress of a job
+
+        Long-running network jobs (load scheduling, OPF/PF and flexibility) report their progress
+        per time step or per iteration, often together with partial results.
+        With an `Accept: text/event-stream` header (as sent by `EventSource` in browsers),
+        this endpoint streams these updates as Server-Sent Events until the job ends,
+        so clients can show partial results while the job continues, rather than poll for its status.
+        Each update is sent as a "progress" event, starting with the latest update so far,
+        and the stream closes with an "end" event stating the job status.
+        Otherwise, the latest update is returned as JSON, together with the job status.
+
+        **Example events**
+
+        .. sourcecode::
+
+            event: progress
+            data: {"job_id": "b3a4...", "step": 12, "total": 96, "message": "Step 12 of 96", "partial_result": {...}, "reported_at": "2024-05-28T10:00:00+00:00"}
+
+            event: end
+            data: {"job_id": "b3a4...", "status": "finished"}
+
+        **Example response (JSON)**
+
+        .. sourcecode:: json
+
+            {
+                "job_id": "b3a4...",
+                "status": "started",
+                "progress": {
+                    "step": 12,
+                    "total": 96,
+                    "message": "Step 12 of 96",
+                    ...
+                }
+            }
+
+        :reqheader Authorization: The authentication token
+        :reqheader Accept: text/event-stream or application/json
+        :resheader Content-Type: text/event-stream or application/json
+        :status 200: PROCESSED
+        :status 400: UNRECOGNIZED_UDI_EVENT
+        :status 401: UNAUTHORIZED
+        :status 403: INVALID_SENDER
+        """
+        try:
+            job = Job.fetch(job_id, connection=current_app.redis_connection)
+        except NoSuchJobError:
+            return unrecognized_event(job_id, "job")
+
+        # Only users who can read the job's network can follow the job
+        network_id = job.meta.get("network_id")
+        network = db.session.get(Network, network_id) if network_id else None
+        if network is not None:
+            check_access(network, "read")
+        elif not user_has_admin_access(current_user, "read"):
+            raise Forbidden(f"You cannot follow the progress of job {job_id}.")
+
+        if (
+            request.accept_mimetypes.best_match(
+                ["application/json", EVENT_STREAM], default="application/json"
+            )
+            != EVENT_STREAM
+        ):
+            return get_progress_as_json(job)
+
+        # The stream only needs Redis, so release the database connection rather than keep it for as long as the job runs
+        db.session.close()
+        response = Response(iter_progress_events(job), mimetype=EVENT_STREAM)
+        response.headers["Cache-Control"] = "no-cache"
+        # Tell nginx not to buffer the stream
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+
+@as_json
+def get_progress_as_json(job: Job):
+    status = job.get_status(refresh=True)
+    return (
+        dict(
+            job_id=job.id,
+            status=status.value if status is not None else "unknown",
+            progress=get_latest_progress(job.id, job.connection),
+        ),
+        200,
+    )
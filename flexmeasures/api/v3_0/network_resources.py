@@ -150,6 +150,7 @@ class NetworkResourceAPI(FlaskView):
         :status 422: UNPROCESSABLE_ENTITY
         """
         network_resource = NetworkResource(**network_resource_data)
+        network_resource.update_parameters()
         db.session.add(network_resource)
         db.session.commit()
         return network_resource_schema.dump(network_resource), 201
@@ -242,6 +243,7 @@ class NetworkResourceAPI(FlaskView):
         """
         for k, v in network_resource_data.items():
             setattr(db_network_resource, k, v)
+        db_network_resource.update_parameters()
         db.session.add(db_network_resource)
         db.session.commit()
         return network_resource_schema.dump(db_network_resource), 200
@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta
 import json
 
 from flask import current_app
@@ -7,15 +8,20 @@ from flask_json import as_json
 from marshmallow import fields
 from webargs.flaskparser import use_kwargs, use_args
 from sqlalchemy import select, delete
+import isodate
 
 from flexmeasures.auth.decorators import permission_required_for_context
 from flexmeasures.data import db
 from flexmeasures.data.models.user import Account
 from flexmeasures.data.models.generic_assets import GenericAsset
 from flexmeasures.data.models.networks import Network
-from flexmeasures.data.schemas import AwareDateTimeField
+from flexmeasures.data.schemas import AwareDateTimeField, DurationField
 from flexmeasures.data.schemas.generic_assets import GenericAssetSchema as AssetSchema
 from flexmeasures.data.schemas.networks import NetworkSchema
+from flexmeasures.data.services.flexibility_envelopes import (
+    ENVELOPE_UNIT,
+    get_stored_flexibility_envelopes,
+)
 from flexmeasures.api.common.schemas.generic_assets import AssetIdField
 from flexmeasures.api.common.schemas.networks import NetworkIdField
 from flexmeasures.api.common.schemas.users import AccountIdField
@@ -266,6 +272,91 @@ class NetworkAPI(FlaskView):
         current_app.logger.info("Deleted network '%s'." % network_name)
         return {}, 204
 
+    @route("/<id>/flexibility-envelopes", methods=["GET"])
+    @use_kwargs({"network": NetworkIdField(data_key="id")}, location="path")
+    @use_kwargs(
+        {
+            "start": AwareDateTimeField(format="iso", required=True),
+            "duration": DurationField(required=True),
+        },
+        location="query",
+    )
+    @permission_required_for_context("read", ctx_arg_name="network")
+    @as_json
+    def get_flexibility_envelopes(
+        self, id: int, network: Network, start: datetime, duration: timedelta
+    ):
+        """Get the stored flexibility envelopes of a network.
+
+        .. :quickref: Network; Get flexibility envelopes
+
+        This endpoint returns the upward and downward flexibility (in MW) of each bus and of the network as a whole,
+        as last computed by ``flexmeasures add flexibility-envelopes``. No optimisation is run.
+        Upward flexibility is the room to increase net injection, downward flexibility the room to decrease it.
+
+        **Example request**
+
+        .. code-block:: json
+
+            /api/v3_0/networks/1/flexibility-envelopes?start=2024-05-01T00:00+02:00&duration=PT2H
+
+        **Example response**
+
+        .. sourcecode:: json
+
+            {
+                "start": "2024-05-01T00:00:00+02:00",
+                "duration": "PT2H",
+                "unit": "MW",
+                "network": {
+                    "upward": [1.2, 0.8],
+                    "downward": [0.4, 0.9]
+                },
+                "buses": {
+                    "3": {
+                        "upward": [1.2, 0.8],
+                        "downward": [0.4, 0.9]
+                    }
+                }
+            }
+
+        :reqheader Authorization: The authentication token
+        :reqheader Content-Type: application/json
+        :resheader Content-Type: application/json
+        :status 200: PROCESSED
+        :status 400: INVALID_REQUEST
+        :status 401: UNAUTHORIZED
+        :status 403: INVALID_SENDER
+        :status 404: UNKNOWN_ENVELOPES
+        :status 422: UNPROCESSABLE_ENTITY
+        """
+        envelopes = get_stored_flexibility_envelopes(
+            network, start=start, end=start + duration
+        )
+        if envelopes is None:
+            return (
+                dict(
+                    status="UNKNOWN_ENVELOPES",
+                    message=f"No flexibility envelopes have been computed for network {id}.",
+                ),
+                404,
+            )
+        response = dict(
+            start=isodate.datetime_isoformat(start),
+            duration=isodate.duration_isoformat(duration),
+            unit=ENVELOPE_UNIT,
+            network={},
+            buses={},
+        )
+        for direction, envelope in envelopes.items():
+            for bus_id, values in envelope.items():
+                values = values.where(values.notna(), None).tolist()
+                if bus_id is None:
+                    response["network"][direction] = values
+                else:
+                    response["buses"].setdefault(str(bus_id), {})[direction] = values
+        return response, 200
+
     # @route("/<id>/chart", strict_slashes=False)  # strict on next version? see #1014
     # @use_kwargs(
     #     {"asset": AssetIdField(data_key="id")},
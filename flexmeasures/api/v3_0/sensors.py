@@ -2,34 +2,55 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta
 
-from flask import current_app, url_for
+from flask import current_app, Response, stream_with_context, url_for
 from flask_classful import FlaskView, route
 from flask_json import as_json
 from flask_security import auth_required
 import isodate
 from marshmallow import fields, ValidationError
+from marshmallow.validate import Length
 from rq.job import Job, NoSuchJobError
 from timely_beliefs import BeliefsDataFrame
 from webargs.flaskparser import use_args, use_kwargs
+from werkzeug.exceptions import Forbidden
 from sqlalchemy import delete
 
 from flexmeasures.api.common.responses import (
+    invalid_sender,
     request_processed,
+    unprocessable_entity,
     unrecognized_event,
     unknown_schedule,
     invalid_flex_config,
     fallback_schedule_redirect,
 )
+from flexmeasures.api.common.utils.binary_formats import (
+    ARROW_STREAM,
+    JSON,
+    MSGPACK,
+    get_available_mimetypes,
+    make_binary_response,
+    negotiate_mimetype,
+)
 from flexmeasures.api.common.utils.validators import (
     optional_duration_accepted,
 )
 from flexmeasures.api.common.schemas.sensor_data import (
+    GetSensorDataBatchSchema,
     GetSensorDataSchema,
     PostSensorDataSchema,
 )
 from flexmeasures.api.common.schemas.users import AccountIdField
-from flexmeasures.api.common.utils.api_utils import save_and_enqueue
+from flexmeasures.api.common.utils.api_utils import (
+    compress_stream,
+    get_conditional_headers,
+    negotiate_content_encoding,
+    not_modified,
+    save_and_enqueue,
+    save_batch_and_enqueue,
+)
 from flexmeasures.auth.decorators import permission_required_for_context
+from flexmeasures.auth.policy import check_access
 from flexmeasures.data import db
 from flexmeasures.data.models.user import Account
 from flexmeasures.data.models.generic_assets import GenericAsset
@@ -47,6 +68,7 @@ from flexmeasures.utils.time_utils import duration_isoformat
 
 # Instantiate schemas outside of endpoint logic to minimize response time
 get_sensor_schema = GetSensorDataSchema()
+get_sensor_batch_schema = GetSensorDataBatchSchema()
 post_sensor_schema = PostSensorDataSchema()
 sensors_schema = SensorSchema(many=True)
 sensor_schema = SensorSchema()
@@ -111,7 +133,7 @@ class SensorAPI(FlaskView):
     @route("/data", methods=["POST"])
     @use_args(
         post_sensor_schema,
-        location="json",
+        location="json_or_binary",
     )
     @permission_required_for_context(
         "create-children",
@@ -146,8 +168,15 @@ class SensorAPI(FlaskView):
         FlexMeasures will attempt to upsample lower resolutions.
         The list of values may include null values.
 
+        **Binary formats**
+
+        Instead of JSON, the message can be sent as MessagePack (``application/msgpack``),
+        or as an Arrow IPC stream (``application/vnd.apache.arrow.stream``) with an ``event_value`` column,
+        and the other fields as JSON in the schema metadata (under the key "flexmeasures").
+        These formats are only supported if the server has msgpack or pyarrow installed, respectively.
+
         :reqheader Authorization: The authentication token
-        :reqheader Content-Type: application/json
+        :reqheader Content-Type: application/json, application/msgpack or application/vnd.apache.arrow.stream
         :resheader Content-Type: application/json
         :status 200: PROCESSED
         :status 400: INVALID_REQUEST
@@ -189,21 +218,287 @@ class SensorAPI(FlaskView):
         - "horizon" (see :ref:`beliefs`)
         - "prior" (see :ref:`beliefs`)
         - "source" (see :ref:`sources`)
+        - "limit" (maximum number of values in the response)
+        - "cursor" (from the "next_cursor" of the previous response)
+
+        **Pagination**
+
+        Long time windows can be fetched in pages, by setting a limit.
+        As long as more data follows, the response contains a "next_cursor",
+        which can be passed as the cursor of the next request (with otherwise the same fields).
+        The "start" and "duration" in the response then describe the page.
+
+        **Streaming**
+
+        Clients that accept ``application/x-ndjson`` receive a stream of newline-delimited JSON instead,
+        with one line per event, such as ``{"start": "2021-06-07T00:00:00+02:00", "value": 3.5}``.
+        The stream starts as soon as the first events are loaded, which suits bulk downloads of long time windows.
+        It can also be paginated, in which case the cursor of the next page is given in the X-Next-Cursor header.
+        The stream is compressed if the client accepts gzip (or brotli, if installed on the server).
+
+        **Binary formats**
+
+        Clients that accept ``application/msgpack`` receive the response packed with MessagePack.
+        Clients that accept ``application/vnd.apache.arrow.stream`` receive an Arrow IPC stream
+        with the columns ``event_start`` and ``event_value``, and the other fields as JSON in the schema metadata (under the key "flexmeasures").
+        These formats are only supported if the server has msgpack or pyarrow installed, respectively (otherwise, the response is in JSON).
 
         :reqheader Authorization: The authentication token
         :reqheader Content-Type: application/json
-        :resheader Content-Type: application/json
+        :reqheader Accept: application/json, application/x-ndjson, application/msgpack or application/vnd.apache.arrow.stream
+        :reqheader Accept-Encoding: gzip or br (for streamed responses)
+        :resheader Content-Type: application/json, application/x-ndjson, application/msgpack or application/vnd.apache.arrow.stream
+        :resheader X-Next-Cursor: cursor of the next page (for streamed responses)
         :status 200: PROCESSED
         :status 400: INVALID_REQUEST
         :status 401: UNAUTHORIZED
         :status 403: INVALID_SENDER
         :status 422: UNPROCESSABLE_ENTITY
         """
-        response = GetSensorDataSchema.load_data_and_make_response(
+        sensor = sensor_data_description["sensor"]
+        start, end, _, next_cursor = GetSensorDataSchema.get_page(
             sensor_data_description
         )
+        mimetype = negotiate_mimetype(
+            get_available_mimetypes() + ("application/x-ndjson",)
+        )
+        if mimetype == "application/x-ndjson":
+            encoding = negotiate_content_encoding()
+            headers = get_conditional_headers(
+                [sensor], start, end, variant=f"application/x-ndjson {encoding}"
+            )
+            response = not_modified(headers)
+            if response is not None:
+                return response
+            streamed_response = Response(
+                stream_with_context(
+                    compress_stream(
+                        GetSensorDataSchema.stream_data(sensor_data_description),
+                        encoding,
+                    )
+                ),
+                mimetype="application/x-ndjson",
+                headers=headers,
+            )
+            streamed_response.vary.update(["Accept", "Accept-Encoding"])
+            if encoding is not None:
+                streamed_response.headers["Content-Encoding"] = encoding
+            if next_cursor is not None:
+                streamed_response.headers["X-Next-Cursor"] = next_cursor
+            return streamed_response
+
+        headers = get_conditional_headers([sensor], start, end, variant=mimetype)
+        response = not_modified(headers)
+        if response is not None:
+            return response
+        response = GetSensorDataSchema.load_data_and_make_response(
+            sensor_data_description, values_as_series=mimetype == ARROW_STREAM
+        )
         d, s = request_processed()
-        return dict(**response, **d), s
+        if mimetype == ARROW_STREAM:
+            values = response.pop("values")
+            return make_binary_response(
+                dict(**response, **d), mimetype, values=values, headers=headers
+            )
+        if mimetype == MSGPACK:
+            return make_binary_response(
+                dict(**response, **d), mimetype, headers=headers
+            )
+        return dict(**response, **d), s, headers
+
+    @route("/data/batch", methods=["POST"])
+    @use_kwargs(
+        {"data": fields.List(fields.Dict(), required=True, validate=Length(min=1))},
+        location="json",
+    )
+    def post_data_batch(self, data: list[dict]):
+        """
+        Post data for multiple sensors to FlexMeasures.
+
+        .. :quickref: Data; Upload data for multiple sensors
+
+        **Example request**
+
+        .. code-block:: json
+
+            {
+                "data": [
+                    {
+                        "sensor": "ea1.2021-01.io.flexmeasures:fm1.1",
+                        "values": [-11.28, -11.28, -11.28, -11.28],
+                        "start": "2021-06-07T00:00:00+02:00",
+                        "duration": "PT1H",
+                        "unit": "m³/h"
+                    },
+                    {
+                        "sensor": "ea1.2021-01.io.flexmeasures:fm1.2",
+                        "values": [3.5],
+                        "start": "2021-06-07T00:00:00+02:00",
+                        "duration": "PT1H",
+                        "unit": "kW"
+                    }
+                ]
+            }
+
+        Each item is a message as described for `/sensors/data` (POST).
+        All data is saved in one transaction, and forecasting jobs are enqueued once for the whole batch.
+
+        **Example response**
+
+        Each item gets its own result, in the order of the request.
+        Items that are invalid, not permitted or that represent replacements are rejected, without affecting the other items.
+        If any items were rejected, the response status is 207.
+
+        .. sourcecode:: json
+
+            {
+                "results": [
+                    {
+                        "sensor": "ea1.2021-01.io.flexmeasures:fm1.1",
+                        "status_code": 200,
+                        "status": "PROCESSED",
+                        "message": "Request has been processed."
+                    },
+                    {
+                        "sensor": "ea1.2021-01.io.flexmeasures:fm1.2",
+                        "status_code": 403,
+                        "result": "Rejected",
+                        "status": "INVALID_SENDER",
+                        "message": "You cannot be authorized for this content or functionality. It requires create-children permission(s)."
+                    }
+                ],
+                "status": "PROCESSED",
+                "message": "Request has been processed."
+            }
+
+        :reqheader Authorization: The authentication token
+        :reqheader Content-Type: application/json
+        :resheader Content-Type: application/json
+        :status 200: PROCESSED
+        :status 207: PROCESSED (with some items rejected)
+        :status 400: INVALID_REQUEST
+        :status 401: UNAUTHORIZED
+        :status 422: UNPROCESSABLE_ENTITY
+        """
+        results: list[tuple | None] = []
+        bdfs = []
+        for message in data:
+            try:
+                bdf = post_sensor_schema.load(message)
+                check_access(bdf.sensor, "create-children")
+            except ValidationError as e:
+                results.append(unprocessable_entity(e.messages))
+                continue
+            except Forbidden:
+                results.append(invalid_sender(["create-children"]))
+                continue
+            results.append(None)
+            bdfs.append(bdf)
+
+        # Fill in the results of the saved items
+        saved_results = iter(save_batch_and_enqueue(bdfs))
+        results = [
+            result if result is not None else next(saved_results) for result in results
+        ]
+
+        d, s = request_processed()
+        if any(code >= 400 for _, code in results):
+            s = 207
+        return (
+            dict(
+                results=[
+                    dict(sensor=message.get("sensor"), status_code=code, **response)
+                    for message, (response, code) in zip(data, results)
+                ],
+                **d,
+            ),
+            s,
+        )
+
+    @route("/data/batch", methods=["GET"])
+    @use_args(
+        get_sensor_batch_schema,
+        location="query",
+    )
+    def get_data_batch(self, batch_description: dict):
+        """Get data for multiple sensors from FlexMeasures.
+
+        .. :quickref: Data; Download data for multiple sensors
+
+        **Example request**
+
+        Sensors are listed by repeating the sensors parameter in the query string.
+
+        .. code-block:: json
+
+            {
+                "sensors": ["ea1.2021-01.io.flexmeasures:fm1.1", "ea1.2021-01.io.flexmeasures:fm1.2"],
+                "start": "2021-06-07T00:00:00+02:00",
+                "duration": "PT1H",
+                "resolution": "PT15M"
+            }
+
+        **Optional fields**
+
+        - "resolution" (see :ref:`frequency_and_resolution`)
+        - "horizon" (see :ref:`beliefs`)
+        - "prior" (see :ref:`beliefs`)
+        - "source" (see :ref:`sources`)
+
+        **Example response**
+
+        The data of each sensor is given in the unit of that sensor.
+        Sensors with the same resolution have their data loaded in one query.
+
+        .. sourcecode:: json
+
+            {
+                "data": [
+                    {
+                        "sensor": "ea1.2021-01.io.flexmeasures:fm1.1",
+                        "values": [-11.28, -11.28, -11.28, -11.28],
+                        "start": "2021-06-07T00:00:00+02:00",
+                        "duration": "PT1H",
+                        "unit": "m³/h",
+                        "resolution": "PT15M"
+                    },
+                    {
+                        "sensor": "ea1.2021-01.io.flexmeasures:fm1.2",
+                        "values": [3.5, 3.5, 3.5, null],
+                        "start": "2021-06-07T00:00:00+02:00",
+                        "duration": "PT1H",
+                        "unit": "kW",
+                        "resolution": "PT15M"
+                    }
+                ],
+                "status": "PROCESSED",
+                "message": "Request has been processed."
+            }
+
+        :reqheader Authorization: The authentication token
+        :reqheader Content-Type: application/json
+        :resheader Content-Type: application/json
+        :status 200: PROCESSED
+        :status 400: INVALID_REQUEST
+        :status 401: UNAUTHORIZED
+        :status 403: INVALID_SENDER
+        :status 422: UNPROCESSABLE_ENTITY
+        """
+        for sensor in batch_description["sensors"]:
+            check_access(sensor, "read")
+        headers = get_conditional_headers(
+            batch_description["sensors"],
+            batch_description["start"],
+            batch_description["start"] + batch_description["duration"],
+        )
+        response = not_modified(headers)
+        if response is not None:
+            return response
+        response = GetSensorDataBatchSchema.load_data_and_make_response(
+            batch_description
+        )
+        d, s = request_processed()
+        return dict(**response, **d), s, headers
 
     @route("/<id>/schedules/trigger", methods=["POST"])
     @use_kwargs(
@@ -429,9 +724,12 @@ class SensorAPI(FlaskView):
                 "unit": "MW"
             }
 
+        Like `/sensors/data` (GET), the schedule can also be requested as MessagePack or as an Arrow IPC stream.
+
         :reqheader Authorization: The authentication token
         :reqheader Content-Type: application/json
-        :resheader Content-Type: application/json
+        :reqheader Accept: application/json, application/msgpack or application/vnd.apache.arrow.stream
+        :resheader Content-Type: application/json, application/msgpack or application/vnd.apache.arrow.stream
         :status 200: PROCESSED
         :status 400: INVALID_TIMEZONE, INVALID_DOMAIN, INVALID_UNIT, UNKNOWN_SCHEDULE, UNRECOGNIZED_CONNECTION_GROUP
         :status 401: UNAUTHORIZED
@@ -529,6 +827,14 @@ class SensorAPI(FlaskView):
                 + f"no data source could be found for {data_source}. {scheduler_info_msg}"
             )
 
+        mimetype = negotiate_mimetype()
+        headers = get_conditional_headers(
+            [sensor], schedule_start, schedule_start + planning_horizon, mimetype
+        )
+        response = not_modified(headers)
+        if response is not None:
+            return response
+
         power_values = sensor.search_beliefs(
             event_starts_after=schedule_start,
             event_ends_before=schedule_start + planning_horizon,
@@ -563,7 +869,15 @@ class SensorAPI(FlaskView):
         )
 
         d, s = request_processed(scheduler_info_msg)
-        return dict(scheduler_info=scheduler_info, **response, **d), s
+        if mimetype != JSON:
+            return make_binary_response(
+                dict(scheduler_info=scheduler_info, **response, **d),
+                mimetype,
+                values=consumption_schedule,
+                status=s,
+                headers=headers,
+            )
+        return dict(scheduler_info=scheduler_info, **response, **d), s, headers
 
     @route("/<id>", methods=["GET"])
     @use_kwargs({"sensor": SensorIdField(data_key="id")}, location="path")
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+
+from flask import url_for
+import pytest
+
+from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.job_progress import enqueue_network_job
+from flexmeasures.data.tests.test_job_progress import count_to
+from flexmeasures.data.tests.utils import work_on_rq, exception_reporter
+
+
+@pytest.fixture(scope="function")
+def finished_network_job(app, fresh_db, setup_accounts_fresh_db):
+    """A finished job on a network of the Prosumer account, which reported its progress."""
+    network = Network(
+        name="test network", account_id=setup_accounts_fresh_db["Prosumer"].id
+    )
+    fresh_db.session.add(network)
+    fresh_db.session.flush()
+    job = enqueue_network_job(count_to, network.id, dict(n=3))
+    work_on_rq(app.queues["scheduling"], exc_handler=exception_reporter)
+    return job
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_prosumer_user@seita.nl"], indirect=True
+)
+def test_get_progress_as_json(
+    client, setup_roles_users_fresh_db, finished_network_job, requesting_user
+):
+    response = client.get(
+        url_for("JobAPI:get_progress", id=finished_network_job.id),
+        headers={"Accept": "application/json"},
+    )
+    assert response.status_code == 200
+    assert response.json["status"] == "finished"
+    assert response.json["progress"]["step"] == 3
+    assert response.json["progress"]["partial_result"] == [2]
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_prosumer_user@seita.nl"], indirect=True
+)
+def test_get_progress_as_event_stream(
+    client, setup_roles_users_fresh_db, finished_network_job, requesting_user
+):
+    response = client.get(
+        url_for("JobAPI:get_progress", id=finished_network_job.id),
+        headers={"Accept": "text/event-stream"},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.headers["X-Accel-Buffering"] == "no"
+
+    # The latest update, followed by the end of the job
+    events = response.get_data(as_text=True).strip().split("\n\n")
+    assert [event.split("\n")[0] for event in events] == [
+        "event: progress",
+        "event: end",
+    ]
+    assert json.loads(events[1].split("data: ")[1])["status"] == "finished"
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_supplier_user_4@seita.nl"], indirect=True
+)
+def test_get_progress_without_access_to_network(
+    client, setup_roles_users_fresh_db, finished_network_job, requesting_user
+):
+    response = client.get(
+        url_for("JobAPI:get_progress", id=finished_network_job.id),
+        headers={"Accept": "text/event-stream"},
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_prosumer_user@seita.nl"], indirect=True
+)
+def test_get_progress_of_unknown_job(
+    client, setup_roles_users_fresh_db, requesting_user
+):
+    response = client.get(url_for("JobAPI:get_progress", id="unknown-job-id"))
+    assert response.status_code == 400
+    assert response.json["status"] == "UNRECOGNIZED_UDI_EVENT"
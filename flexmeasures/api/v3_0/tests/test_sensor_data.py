@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 from datetime import timedelta
+import gzip
+import json
+
 from flask import url_for
 import pytest
 
@@ -112,6 +115,194 @@ def test_get_instantaneous_sensor_data(
     assert all(a == b for a, b in zip(values, [815, 818, None, None]))
 
 
+@pytest.mark.parametrize(
+    "requesting_user", ["test_supplier_user_4@seita.nl"], indirect=True
+)
+def test_get_sensor_data_in_pages_and_as_stream(
+    client,
+    setup_api_test_data: dict[str, Sensor],
+    setup_roles_users: dict[str, User],
+    requesting_user,
+    db,
+):
+    """Check the /sensors/data endpoint for fetching data in pages, and as a (compressed) stream."""
+    sensor = setup_api_test_data["some gas sensor"]
+    source: Source = db.session.get(
+        User, setup_roles_users["Test Supplier User"]
+    ).data_source[0]
+    message = {
+        "sensor": f"ea1.2021-01.io.flexmeasures:fm1.{sensor.id}",
+        "start": "2021-05-02T00:00:00+02:00",
+        "duration": "PT1H20M",
+        "horizon": "PT0H",
+        "unit": "m³/h",
+        "source": source.id,
+        "resolution": "PT20M",
+        "limit": 3,
+    }
+    response = client.get(url_for("SensorAPI:get_data"), query_string=message)
+    assert response.status_code == 200
+    assert response.json["values"] == [91.5, 92.1, None]
+    assert response.json["duration"] == "PT1H"
+
+    # The next (and last) page holds the remaining value
+    message["cursor"] = response.json["next_cursor"]
+    response = client.get(url_for("SensorAPI:get_data"), query_string=message)
+    assert response.status_code == 200
+    assert response.json["values"] == [None]
+    assert response.json["start"] == "2021-05-02T01:00:00+02:00"
+    assert "next_cursor" not in response.json
+
+    # Stream the whole time window
+    del message["cursor"], message["limit"]
+    response = client.get(
+        url_for("SensorAPI:get_data"),
+        query_string=message,
+        headers={"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["Content-Encoding"] == "gzip"
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line)["value"] for line in lines] == [91.5, 92.1, None, None]
+    assert json.loads(lines[0])["start"] == "2021-05-02T00:00:00+02:00"
+
+
+@pytest.mark.parametrize(
+    "mimetype, package",
+    [
+        ("application/msgpack", "msgpack"),
+        ("application/vnd.apache.arrow.stream", "pyarrow"),
+    ],
+)
+@pytest.mark.parametrize(
+    "requesting_user", ["test_supplier_user_4@seita.nl"], indirect=True
+)
+def test_get_sensor_data_in_binary_format(
+    client,
+    setup_api_test_data: dict[str, Sensor],
+    setup_roles_users: dict[str, User],
+    requesting_user,
+    db,
+    mimetype,
+    package,
+):
+    """Check the /sensors/data endpoint for fetching data as MessagePack or as an Arrow stream."""
+    pytest.importorskip(package)
+    sensor = setup_api_test_data["some gas sensor"]
+    source: Source = db.session.get(
+        User, setup_roles_users["Test Supplier User"]
+    ).data_source[0]
+    message = {
+        "sensor": f"ea1.2021-01.io.flexmeasures:fm1.{sensor.id}",
+        "start": "2021-05-02T00:00:00+02:00",
+        "duration": "PT1H20M",
+        "horizon": "PT0H",
+        "unit": "m³/h",
+        "source": source.id,
+        "resolution": "PT20M",
+    }
+    response = client.get(
+        url_for("SensorAPI:get_data"),
+        query_string=message,
+        headers={"Accept": mimetype},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    if package == "msgpack":
+        import msgpack
+
+        data = msgpack.unpackb(response.data)
+        values = data["values"]
+    else:
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(response.data).read_all()
+        data = json.loads(table.schema.metadata[b"flexmeasures"])
+        values = table.column("event_value").to_pylist()
+    assert values == [91.5, 92.1, None, None]
+    assert data["unit"] == "m³/h"
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_supplier_user_4@seita.nl"], indirect=True
+)
+def test_get_sensor_data_conditionally(
+    client,
+    setup_api_test_data: dict[str, Sensor],
+    requesting_user,
+):
+    """Check that polling the /sensors/data endpoint with the ETag of the previous response yields a 304 response."""
+    sensor = setup_api_test_data["some gas sensor"]
+    message = {
+        "sensor": f"ea1.2021-01.io.flexmeasures:fm1.{sensor.id}",
+        "start": "2021-05-02T00:00:00+02:00",
+        "duration": "PT1H20M",
+        "unit": "m³/h",
+    }
+    response = client.get(url_for("SensorAPI:get_data"), query_string=message)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "Last-Modified" in response.headers
+
+    response = client.get(
+        url_for("SensorAPI:get_data"),
+        query_string=message,
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 304
+    assert response.data == b""
+
+    # Asking for data in another unit means asking for another representation
+    response = client.get(
+        url_for("SensorAPI:get_data"),
+        query_string={**message, "unit": "l/h"},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_supplier_user_4@seita.nl"], indirect=True
+)
+def test_get_sensor_data_batch(
+    client,
+    setup_api_test_data: dict[str, Sensor],
+    setup_roles_users: dict[str, User],
+    requesting_user,
+    db,
+):
+    """Check the /sensors/data/batch endpoint for fetching data of multiple sensors at once."""
+    gas_sensor = setup_api_test_data["some gas sensor"]
+    temperature_sensor = setup_api_test_data["some temperature sensor"]
+    source: Source = db.session.get(
+        User, setup_roles_users["Test Supplier User"]
+    ).data_source[0]
+    message = {
+        "sensors": [
+            f"ea1.2021-01.io.flexmeasures:fm1.{gas_sensor.id}",
+            f"ea1.2021-01.io.flexmeasures:fm1.{temperature_sensor.id}",
+        ],
+        "start": "2021-05-02T00:00:00+02:00",
+        "duration": "PT1H20M",
+        "horizon": "PT0H",
+        "source": source.id,
+        "resolution": "PT20M",
+    }
+    response = client.get(
+        url_for("SensorAPI:get_data_batch"),
+        query_string=message,
+    )
+    print("Server responded with:\n%s" % response.json)
+    assert response.status_code == 200
+    gas_data, temperature_data = response.json["data"]
+    assert gas_data["sensor"] == message["sensors"][0]
+    assert gas_data["unit"] == gas_sensor.unit
+    assert gas_data["values"] == [91.5, 92.1, None, None]
+    assert temperature_data["values"] == [815, 818, None, None]
+
+
 @pytest.mark.parametrize(
     "requesting_user, status_code",
     [
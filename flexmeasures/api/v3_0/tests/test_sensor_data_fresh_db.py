@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import pandas as pd
 import pytest
 from flask import url_for
+import timely_beliefs as tb
 from timely_beliefs.tests.utils import equal_lists
 from sqlalchemy import select
 
 from flexmeasures import Sensor, Source
 from flexmeasures.api.v3_0.tests.utils import make_sensor_data_request_for_gas_sensor
 from flexmeasures.data.models.time_series import TimedBelief
+from flexmeasures.data.utils import save_to_db
 
 
 @pytest.mark.parametrize(
@@ -120,3 +123,88 @@ def test_auto_fix_missing_registration_of_user_as_data_source(
         select(Source).filter_by(user=setup_user_without_data_source)
     ).scalar_one_or_none()
     assert data_source is not None
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_supplier_user_4@seita.nl"], indirect=True
+)
+def test_post_sensor_data_batch(
+    client,
+    setup_api_fresh_test_data,
+    requesting_user,
+    db,
+):
+    """Check that valid items of a batch are saved, while invalid items are rejected individually."""
+    valid_data = make_sensor_data_request_for_gas_sensor(num_values=6, unit="m³/h")
+    invalid_data = make_sensor_data_request_for_gas_sensor(num_values=4, unit="m³/h")
+    response = client.post(
+        url_for("SensorAPI:post_data_batch"),
+        json={"data": [valid_data, invalid_data]},
+    )
+    print(response.json)
+    assert response.status_code == 207
+    results = response.json["results"]
+    assert [result["status_code"] for result in results] == [200, 422]
+    assert results[0]["sensor"] == valid_data["sensor"]
+
+    sensor: Sensor = db.session.execute(
+        select(Sensor).filter_by(name="some gas sensor")
+    ).scalar_one_or_none()
+    beliefs = db.session.scalars(
+        select(TimedBelief).filter(
+            TimedBelief.sensor_id == sensor.id,
+            TimedBelief.event_start >= valid_data["start"],
+        )
+    ).all()
+    assert len(beliefs) == 6
+
+
+@pytest.mark.parametrize(
+    "requesting_user", ["test_supplier_user_4@seita.nl"], indirect=True
+)
+def test_get_sensor_data_conditionally_after_overwrite(
+    client,
+    setup_api_fresh_test_data,
+    requesting_user,
+    db,
+):
+    """Check that overwriting a belief (with the same belief time and source) changes the ETag."""
+    sensor = setup_api_fresh_test_data["some gas sensor"]
+    message = {
+        "sensor": f"ea1.2021-01.io.flexmeasures:fm1.{sensor.id}",
+        "start": "2021-05-02T00:00:00+02:00",
+        "duration": "PT30M",
+        "unit": "m³/h",
+    }
+    response = client.get(url_for("SensorAPI:get_data"), query_string=message)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.json["values"][0] == 91.3
+
+    belief = db.session.scalars(
+        select(TimedBelief)
+        .filter_by(sensor_id=sensor.id)
+        .order_by(TimedBelief.event_start)
+    ).first()
+    bdf = tb.BeliefsDataFrame(
+        pd.DataFrame(
+            {
+                "event_start": [belief.event_start],
+                "belief_horizon": [belief.belief_horizon],
+                "event_value": [95.0],
+            }
+        ),
+        sensor=sensor,
+        source=belief.source,
+    )
+    save_to_db(bdf, save_changed_beliefs_only=False, allow_overwrite=True)
+    db.session.commit()
+
+    response = client.get(
+        url_for("SensorAPI:get_data"),
+        query_string=message,
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json["values"][0] == 95.0
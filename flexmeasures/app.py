@@ -104,6 +104,10 @@ def create(  # noqa C901
     )
     app.job_cache = JobCache(app.redis_connection)
 
+    from flexmeasures.data.services.belief_cache import BeliefCache
+
+    app.belief_cache = BeliefCache(app.redis_connection)
+
     # Some basic security measures
 
     set_secret_key(app)
@@ -4,8 +4,14 @@ CLI commands for populating the database
 
 from __future__ import annotations
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Type
+from itertools import islice
+import os
+import tempfile
+import time
+from typing import Iterator, Type
 
 from traitlets import Integer
 import isodate
@@ -42,11 +48,20 @@ from flexmeasures.data.scripts.data_gen import (
     add_default_asset_types,
 )
 from flexmeasures.data.services.data_sources import get_or_create_source
+from flexmeasures.data.services.belief_files import BELIEF_FILE_FORMATS, import_beliefs
 from flexmeasures.data.services.forecasting import create_forecasting_jobs
 from flexmeasures.data.services.scheduling import make_schedule, create_scheduling_job
 from flexmeasures.data.services.opf import eflex_opf, eflex_pf
 from flexmeasures.data.services.load_scheduling import eflex_load_scheduling
 from flexmeasures.data.services.flexibility import eflex_flexibility
+from flexmeasures.data.services.flexibility_envelopes import eflex_flexibility_envelopes
+from flexmeasures.data.services.networks import (
+    get_network_resource_ids,
+    get_network_tables,
+)
+from flexmeasures.data.services.network_files import import_network, read_network_file
+from flexmeasures.data.services.network_snapshots import take_network_snapshot
+from flexmeasures.data.services.rollups import get_rollup_resolutions, update_rollups
 from flexmeasures.data.services.users import create_user
 from flexmeasures.data.models.user import Account, AccountRole, RolesAccounts
 from flexmeasures.data.models.time_series import (
@@ -464,6 +479,16 @@ def add_asset(**args):
     required=True,
     type=str,
     help="Name of the network resource",)
+@click.option(
+    "--latitude",
+    type=LatitudeField(),
+    help="Latitude of the network resource's location",
+)
+@click.option(
+    "--longitude",
+    type=LongitudeField(),
+    help="Longitude of the network resource's location",
+)
 @click.option(
     "--account",
     "--account-id",
@@ -521,6 +546,7 @@ def add_network_resource(**args):
             **MsgStyle.WARN,
         )
     network_resource.attributes = attributes
+    network_resource.update_parameters()
     db.session.add(network_resource)
     db.session.commit()
     click.secho(
@@ -538,13 +564,68 @@ def add_network_resource(**args):
 @click.option(
     "--network-resources",
     "network_resources",
-    required=True,
+    required=False,
     multiple=True,
     type=int,
     help="Network Resources assigned to this network",
 )
+@click.option(
+    "--from-file",
+    "from_file",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Alternatively, create the network with all its network resources, assets and sensors from a pandapower JSON (.json) or MATPOWER (.m) file.",
+)
+@click.option(
+    "--account",
+    "account_id",
+    type=int,
+    required=False,
+    help="Add the network (and, with --from-file, all that it creates) to this account. Follow up with the account's ID. If not set, the network will become public.",
+)
+@click.option(
+    "--resolution",
+    "sensor_resolution",
+    type=DurationField(),
+    required=False,
+    default="PT1H",
+    help="With --from-file, the event resolution of the power sensors created for the assets, as an ISO8601 duration string. Defaults to PT1H.",
+)
 def add_network(**args):
-    """Add a network (a set of network resources)."""
+    """Add a network (a set of network resources), or import one from a file."""
+    from_file = args.pop("from_file")
+    sensor_resolution = args.pop("sensor_resolution")
+    if from_file is not None:
+        if args["network_resources"]:
+            click.secho(
+                "Pass either --network-resources or --from-file, not both.",
+                **MsgStyle.ERROR,
+            )
+            raise click.Abort()
+        try:
+            net = read_network_file(from_file)
+        except ValueError as ve:
+            click.secho(str(ve), **MsgStyle.ERROR)
+            raise click.Abort()
+        network = import_network(
+            net,
+            name=args["name"],
+            account_id=args["account_id"],
+            sensor_resolution=sensor_resolution,
+        )
+        db.session.commit()
+        click.secho(
+            f"Successfully created network with ID {network.id}, with {len(net.bus)} buses,"
+            f" {len(net.line)} lines, {len(net.trafo)} transformers, {len(net.shunt)} shunts"
+            f" and {len(net.load) + len(net.sgen) + len(net.gen) + len(net.ext_grid)} assets.",
+            **MsgStyle.SUCCESS,
+        )
+        return
+    if not args["network_resources"]:
+        click.secho(
+            "Pass either --network-resources or --from-file.", **MsgStyle.ERROR
+        )
+        raise click.Abort()
     check_errors(NetworkSchema().validate(args))
 
     network = Network(**args)
@@ -608,18 +689,28 @@ def add_source(name: str, model: str, version: str, source_type: str):
     "--sensor",
     "--sensor-id",
     "sensor",
-    required=True,
+    required=False,
     type=SensorIdField(),
     cls=DeprecatedOption,
     deprecated=["--sensor-id"],
     preferred="--sensor",
-    help="Record the beliefs under this sensor. Follow up with the sensor's ID. ",
+    help="Record the beliefs under this sensor. Follow up with the sensor's ID. "
+    "Required for CSV and Excel files.",
 )
 @click.option(
     "--source",
-    required=True,
+    required=False,
     type=str,
-    help="Source of the beliefs (an existing source id or name, or a new name).",
+    help="Source of the beliefs (an existing source id or name, or a new name). "
+    "Required for CSV and Excel files.",
+)
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["csv", *BELIEF_FILE_FORMATS]),
+    default="csv",
+    help="Format of the file. CSV also covers Excel files. "
+    "Parquet and Arrow files (as exported with `flexmeasures show beliefs`) are imported in chunks, and record beliefs under the sensors and sources described in the file, unless --sensor or --source is set. Requires pyarrow.",
 )
 @click.option(
     "--unit",
@@ -745,6 +836,29 @@ def add_source(name: str, model: str, version: str, source_type: str):
     type=int,
     help="[For xls or xlsx files] Sheet number with the data (0 is 1st sheet)",
 )
+@click.option(
+    "--chunk-size",
+    "chunk_size",
+    required=False,
+    type=click.IntRange(min=1),
+    help="[For CSV files] Read and save the file in chunks of this many rows, each saved in its own transaction, so that large files load with bounded memory. "
+    "Note that resampling (see --resample) happens per chunk, so pick a chunk size that is a multiple of the number of rows per resampled event. "
+    "Also note that the file is split into chunks by lines, so quoted fields spanning multiple lines are not supported.",
+)
+@click.option(
+    "--start-row",
+    "start_row",
+    default=0,
+    type=click.IntRange(min=0),
+    help="[For CSV files, with --chunk-size] Skip this many rows (after the skipped header rows), to resume loading a file where a previous run failed. "
+    "Any --nrows still counts from the first row after the skipped header rows.",
+)
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="[For CSV files, with --chunk-size] Number of threads parsing upcoming chunks, while earlier chunks are being saved.",
+)
 def add_beliefs(
     file: str,
     sensor: Sensor,
@@ -768,6 +882,10 @@ def add_beliefs(
     decimal: str = ".",
     thousands: str | None = None,
     sheet_number: int | None = None,
+    file_format: str = "csv",
+    chunk_size: int | None = None,
+    start_row: int = 0,
+    workers: int = 1,
     **kwargs,  # in-code calls to this CLI command can set additional kwargs for use in pandas.read_csv or pandas.read_excel
 ):
     """Add sensor data from a CSV or Excel file.
@@ -787,7 +905,24 @@ def add_beliefs(
 
     In case no --horizon is specified and no beliefcol is specified,
     the moment of executing this CLI command is taken as the time at which the beliefs were recorded.
+
+    Beliefs exported to Parquet or Arrow files can be imported with --format parquet or --format arrow.
     """
+    if file_format != "csv":
+        add_beliefs_from_columnar_file(
+            file,
+            file_format,
+            sensor=sensor,
+            source=parse_source(source) if source is not None else None,
+            allow_overwrite=allow_overwrite,
+        )
+        return
+    if sensor is None or source is None:
+        click.secho(
+            "Set --sensor and --source to add beliefs from CSV or Excel files.",
+            **MsgStyle.ERROR,
+        )
+        raise click.Abort()
     _source = parse_source(source)
 
     # Set up optional parameters for read_csv
@@ -811,15 +946,10 @@ def add_beliefs(
     filter_by_column = (
         dict(zip(filter_columns, filter_values)) if filter_columns else None
     )
-    bdf = tb.read_csv(
-        file,
-        sensor,
-        source=_source,
+    read_kwargs = dict(
         cumulative_probability=cp,
         resample=resample,
         header=None,
-        skiprows=skiprows,
-        nrows=nrows,
         usecols=[datecol, valuecol]
         if beliefcol is None
         else [datecol, beliefcol, valuecol],
@@ -830,14 +960,72 @@ def add_beliefs(
         filter_by_column=filter_by_column,
         **kwargs,
     )
+    if chunk_size is not None:
+        if file.split(".")[-1].lower() != "csv":
+            click.secho("Only CSV files can be read in chunks.", **MsgStyle.ERROR)
+            raise click.Abort()
+        add_beliefs_in_chunks(
+            file,
+            sensor,
+            source=_source,
+            unit=unit,
+            allow_overwrite=allow_overwrite,
+            chunk_size=chunk_size,
+            start_row=start_row,
+            workers=workers,
+            skiprows=skiprows,
+            nrows=nrows,
+            read_kwargs=read_kwargs,
+        )
+        return
+    bdf = tb.read_csv(
+        file,
+        sensor,
+        source=_source,
+        skiprows=skiprows,
+        nrows=nrows,
+        **read_kwargs,
+    )
+    bdf = clean_beliefs(bdf, sensor, unit)
+    try:
+        save_to_db(
+            bdf,
+            save_changed_beliefs_only=False,
+            use_copy=True,
+            allow_overwrite=allow_overwrite,
+        )
+        db.session.commit()
+        click.secho(f"Successfully created beliefs\n{bdf}", **MsgStyle.SUCCESS)
+    except IntegrityError as e:
+        db.session.rollback()
+        click.secho(
+            f"Failed to create beliefs due to the following error: {e.orig}",
+            **MsgStyle.ERROR,
+        )
+        if not allow_overwrite:
+            click.secho(
+                "As a possible workaround, use the --allow-overwrite flag.",
+                **MsgStyle.ERROR,
+            )
 
+
+def clean_beliefs(
+    bdf: BeliefsDataFrame, sensor: Sensor, unit: str | None = None, verbose: bool = True
+) -> BeliefsDataFrame:
+    """Drop duplicate beliefs that were read in, and convert their values to the sensor unit."""
     duplicate_rows = bdf.index.duplicated(keep="first")
     if any(duplicate_rows) > 0:
-        click.secho(
-            "Duplicates found. Dropping duplicates for the following records:",
-            **MsgStyle.WARN,
-        )
-        click.secho(bdf[duplicate_rows], **MsgStyle.WARN)
+        if verbose:
+            click.secho(
+                "Duplicates found. Dropping duplicates for the following records:",
+                **MsgStyle.WARN,
+            )
+            click.secho(bdf[duplicate_rows], **MsgStyle.WARN)
+        else:
+            click.secho(
+                f"Dropping {sum(duplicate_rows)} duplicates.",
+                **MsgStyle.WARN,
+            )
         bdf = bdf[~duplicate_rows]
     if unit is not None:
         bdf["event_value"] = convert_units(
@@ -846,26 +1034,174 @@ def add_beliefs(
             to_unit=sensor.unit,
             event_resolution=sensor.event_resolution,
         )
+    return bdf
+
+
+def iter_lines_in_chunks(
+    file: str, chunk_size: int, skip_lines: int = 0, max_lines: int | None = None
+) -> Iterator[list[str]]:
+    """Read a text file in chunks of lines, after skipping some lines, and up to a maximum number of lines.
+
+    Note that the file is split by physical lines, so (quoted) CSV fields spanning multiple lines are not supported.
+    """
+    with open(file) as f:
+        lines = islice(
+            f, skip_lines, None if max_lines is None else skip_lines + max_lines
+        )
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def add_beliefs_in_chunks(
+    file: str,
+    sensor: Sensor,
+    source: DataSource,
+    unit: str | None,
+    allow_overwrite: bool,
+    chunk_size: int,
+    start_row: int,
+    workers: int,
+    skiprows: int,
+    nrows: int | None,
+    read_kwargs: dict,
+):
+    """Add beliefs from a CSV file in chunks of rows, each saved in its own transaction.
+
+    Upcoming chunks are parsed in worker threads, while earlier chunks are being saved,
+    with at most one chunk per worker waiting to be saved, to keep memory use bounded.
+    Parsing does not touch the database (or the session's objects):
+    chunks are parsed with a plain copy of the sensor and a placeholder source, which are swapped in upon saving.
+    In case of a failure, the rows from which to resume are reported.
+    Rows are counted from the skipped header rows, both for start_row and for nrows,
+    so a resumed run stops where the original run would have stopped.
+    The file is split into chunks by physical lines, so (quoted) CSV fields spanning multiple lines are not supported.
+    """
+    plain_sensor = tb.Sensor(
+        name=sensor.name,
+        unit=sensor.unit,
+        timezone=sensor.timezone,
+        event_resolution=sensor.event_resolution,
+    )
+    placeholder_source = tb.BeliefSource(name="placeholder")
+
+    def parse_chunk(chunk_path: str) -> BeliefsDataFrame:
+        try:
+            return tb.read_csv(
+                chunk_path, plain_sensor, source=placeholder_source, **read_kwargs
+            )
+        finally:
+            os.remove(chunk_path)
+
+    start_time = time.perf_counter()
+    n_beliefs = 0
+    first_row = start_row
+    with tempfile.TemporaryDirectory() as tmp_dir, ThreadPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        chunks = enumerate(
+            iter_lines_in_chunks(
+                file,
+                chunk_size,
+                skip_lines=skiprows + start_row,
+                max_lines=max(nrows - start_row, 0) if nrows is not None else None,
+            )
+        )
+        pending: deque[tuple[int, Future]] = deque()
+
+        def submit_next_chunk():
+            i, lines = next(chunks, (None, None))
+            if lines is None:
+                return
+            chunk_path = os.path.join(tmp_dir, f"chunk_{i}.csv")
+            with open(chunk_path, "w") as f:
+                f.writelines(lines)
+            pending.append((len(lines), executor.submit(parse_chunk, chunk_path)))
+
+        for _ in range(workers):
+            submit_next_chunk()
+        while pending:
+            n_rows, future = pending.popleft()
+            submit_next_chunk()
+            last_row = first_row + n_rows - 1
+            try:
+                bdf = future.result()
+                if not bdf.empty:
+                    bdf = tb.BeliefsDataFrame(
+                        bdf.reset_index().assign(source=source), sensor=sensor
+                    )
+                    bdf = clean_beliefs(bdf, sensor, unit, verbose=False)
+                    save_to_db(
+                        bdf,
+                        save_changed_beliefs_only=False,
+                        use_copy=True,
+                        allow_overwrite=allow_overwrite,
+                    )
+                    db.session.commit()
+                    n_beliefs += len(bdf)
+            except Exception as e:
+                db.session.rollback()
+                click.secho(
+                    f"Failed to add rows {first_row} to {last_row}. Rows before have been saved. To resume, use --start-row {first_row}.",
+                    **MsgStyle.ERROR,
+                )
+                if isinstance(e, IntegrityError) and not allow_overwrite:
+                    click.secho(
+                        "As a possible workaround, use the --allow-overwrite flag.",
+                        **MsgStyle.ERROR,
+                    )
+                raise
+            rows_per_second = (last_row + 1 - start_row) / (
+                time.perf_counter() - start_time
+            )
+            click.echo(
+                f"Added rows {first_row} to {last_row} ({n_beliefs} beliefs so far, {rows_per_second:.0f} rows per second)."
+            )
+            first_row = last_row + 1
+    click.secho(
+        f"Successfully added {n_beliefs} beliefs from rows {start_row} to {first_row - 1}.",
+        **MsgStyle.SUCCESS,
+    )
+
+
+def add_beliefs_from_columnar_file(
+    file: str,
+    file_format: str,
+    sensor: Sensor | None = None,
+    source: DataSource | None = None,
+    allow_overwrite: bool = False,
+):
+    """Add beliefs from a Parquet or Arrow file, committing each chunk."""
+    n_beliefs = 0
     try:
-        TimedBelief.add(
-            bdf,
-            expunge_session=True,
+        for n_beliefs_in_chunk in import_beliefs(
+            file,
+            file_format=file_format,
+            sensor=sensor,
+            source=source,
             allow_overwrite=allow_overwrite,
-            bulk_save_objects=True,
-            commit_transaction=True,
-        )
-        click.secho(f"Successfully created beliefs\n{bdf}", **MsgStyle.SUCCESS)
-    except IntegrityError as e:
+        ):
+            db.session.commit()
+            n_beliefs += n_beliefs_in_chunk
+            click.echo(f"Added {n_beliefs} beliefs so far...")
+    except ImportError as e:
+        click.secho(str(e), **MsgStyle.ERROR)
+        raise click.Abort()
+    except (ValueError, IntegrityError) as e:
         db.session.rollback()
         click.secho(
-            f"Failed to create beliefs due to the following error: {e.orig}",
+            f"Failed to add beliefs after {n_beliefs} beliefs, due to the following error: {getattr(e, 'orig', e)}",
             **MsgStyle.ERROR,
         )
-        if not allow_overwrite:
+        if isinstance(e, IntegrityError) and not allow_overwrite:
             click.secho(
                 "As a possible workaround, use the --allow-overwrite flag.",
                 **MsgStyle.ERROR,
             )
+        raise click.Abort()
+    click.secho(f"Successfully added {n_beliefs} beliefs.", **MsgStyle.SUCCESS)
 
 
 @fm_add_data.command("annotation", cls=DeprecatedOptionsCommand)
@@ -1745,23 +2081,68 @@ def add_schedule_process(
     required=True,
     help="Can be multiple battery packs. Should be a power sensor. Follow up with the sensor's ID.",
 )
+@click.option(
+    "--use-stored-prices",
+    "use_stored_prices",
+    is_flag=True,
+    default=False,
+    help="Use the stored nodal prices (LMPs) of the network, rather than running an OPF for every step."
+    " Nodal prices are stored whenever the OPF does run.",
+)
+@click.option(
+    "--method",
+    "method",
+    type=click.Choice(["central", "admm"]),
+    default="central",
+    help="Reschedule loads one by one ('central', the default),"
+    " or let all loads solve their own subproblem in parallel, coordinated through an OPF per step ('admm').",
+)
+@click.option(
+    "--rho",
+    "rho",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    help="ADMM penalty parameter. Higher values pull the loads and their network-side copies together more strongly. Defaults to 1.",
+)
+@click.option(
+    "--max-iterations",
+    "max_iterations",
+    type=click.IntRange(min=1),
+    default=20,
+    help="Maximum number of iterations. Defaults to 20.",
+)
+@click.option(
+    "--tolerance",
+    "tolerance",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1e-3,
+    help="ADMM stops once both its primal and dual residuals are below this value. Defaults to 0.001.",
+)
+@click.option(
+    "--workers",
+    "n_workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of ADMM worker processes. Defaults to the number of cores.",
+)
 def add_schedule_load(
     network: int,
     battery: int, 
     start: datetime,
-    duration: datetime
+    duration: datetime,
+    use_stored_prices: bool = False,
+    method: str = "central",
+    rho: float = 1.0,
+    max_iterations: int = 20,
+    tolerance: float = 1e-3,
+    n_workers: int | None = None,
 ):
     """Create a new load scheduling for a network."""
-    lines_on_network, buses_on_network, shunts_on_network, transformers_on_network = [], [], [], []    
-    for resource in Network.query.get(network).network_resources:
-        if(NetworkResource.query.get(resource).network_resource_type_id == 1):
-            buses_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 0):
-            lines_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 4):
-            shunts_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 2):
-            transformers_on_network.append(NetworkResource.query.get(resource).id)
+    resource_ids = get_network_resource_ids(Network.query.get(network[0]))
+    lines_on_network = resource_ids["line"]
+    buses_on_network = resource_ids["bus"]
+    shunts_on_network = resource_ids["shunt"]
+    transformers_on_network = resource_ids["transformer"]
     
     ext_grid = []
     for battery_id in battery:
@@ -1781,6 +2162,13 @@ def add_schedule_load(
         external_grid = ext_grid,
         resolution    = GenericAsset.query.get(ext_grid[0]).sensors[0].event_resolution,
         belief_time   = server_now(),
+        network_id    = network[0],
+        use_stored_prices = use_stored_prices,
+        method        = method,
+        rho           = rho,
+        max_iterations = max_iterations,
+        tolerance     = tolerance,
+        n_workers     = n_workers,
     )
 
     success = eflex_load_scheduling(**load_scheduling_kwargs)
@@ -1832,24 +2220,51 @@ def add_schedule_load(
     required=True,
     help="Can be multiple pv. Should be a power sensor. Follow up with the sensor's ID.",
 )
+@click.option(
+    "--horizon",
+    "horizon",
+    type=click.IntRange(min=1),
+    required=False,
+    default=None,
+    help="Optimise receding windows of this many steps (MPC), with coupled battery states of charge."
+    " If not set, each step is optimised on its own.",
+)
+@click.option(
+    "--horizon-step",
+    "horizon_step",
+    type=click.IntRange(min=1),
+    required=False,
+    default=1,
+    help="Number of steps to commit from each window before it recedes (only used with --horizon). Defaults to 1.",
+)
+@click.option(
+    "--use-stored-prices",
+    "use_stored_prices",
+    is_flag=True,
+    default=False,
+    help="Use the stored nodal prices (LMPs) of the network, rather than running an OPF for every step."
+    " Nodal prices are stored whenever the OPF does run.",
+)
 def add_schedule_flexibility(
     network: int,
     battery: int, 
     pv: int,
     start: datetime,
-    duration: datetime
+    duration: datetime,
+    horizon: int | None = None,
+    horizon_step: int = 1,
+    use_stored_prices: bool = False,
 ):
     """Create a new flexibility scheduling for a network."""
-    lines_on_network, buses_on_network, shunts_on_network, transformers_on_network = [], [], [], []    
-    for resource in Network.query.get(network).network_resources:
-        if(NetworkResource.query.get(resource).network_resource_type_id == 1):
-            buses_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 0):
-            lines_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 4):
-            shunts_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 2):
-            transformers_on_network.append(NetworkResource.query.get(resource).id)
+    if horizon is not None and horizon_step > horizon:
+        click.secho("--horizon-step cannot be larger than --horizon.", **MsgStyle.ERROR)
+        raise click.Abort()
+
+    resource_ids = get_network_resource_ids(Network.query.get(network[0]))
+    lines_on_network = resource_ids["line"]
+    buses_on_network = resource_ids["bus"]
+    shunts_on_network = resource_ids["shunt"]
+    transformers_on_network = resource_ids["transformer"]
     
     ext_grid = []
     for battery_id in battery:
@@ -1877,6 +2292,10 @@ def add_schedule_flexibility(
         external_grid = ext_grid,
         resolution    = res,
         belief_time   = server_now(),
+        horizon       = horizon,
+        horizon_step  = horizon_step,
+        network_id    = network[0],
+        use_stored_prices = use_stored_prices,
     )
 
     print(load_flexibility_kwargs)
@@ -1960,24 +2379,24 @@ def add_opf(
     #             Adj_matrix[line][column] = 1
     #             Adj_matrix[column][line] = 1
     
-    lines_on_network = []
-    buses_on_network = []
-    for resource in network:
-        print(network, resource)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 1):
-            buses_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 0):
-            lines_on_network.append(NetworkResource.query.get(resource).id)
+    tables = get_network_tables(resource_ids=list(network))
+    external_grids = [
+        b for b in battery
+        if GenericAsset.query.get(b).get_attribute("slack") == "True"
+    ]
 
     scheduling_kwargs = dict(
-        start       = start,
-        end         = start + duration,
-        load        = load,
-        battery     = battery,
-        lines       = lines_on_network,
-        buses       = buses_on_network,
-        resolution  = GenericAsset.query.get(battery[0]).sensors[0].event_resolution,
-        belief_time = server_now(),
+        start        = start,
+        end          = start + duration,
+        load         = list(load),
+        battery      = [b for b in battery if b not in external_grids],
+        lines        = list(tables["line"].index),
+        buses        = list(tables["bus"].index),
+        shunts       = list(tables["shunt"].index),
+        transformers = list(tables["transformer"].index),
+        external_grd = external_grids,
+        resolution   = GenericAsset.query.get(battery[0]).sensors[0].event_resolution,
+        belief_time  = server_now(),
     )
 
     success = eflex_opf(**scheduling_kwargs)
@@ -2053,13 +2472,9 @@ def add_opf(
     #     "Load and Battery sensors do not have the same event resolution"
 
     # Acknowledging the buses in the network/lines
-    lines_on_network = []
-    buses_on_network = []
-    for resource in network:
-        if(NetworkResource.query.get(resource).network_resource_type_id == 1):
-            buses_on_network.append(NetworkResource.query.get(resource).id)
-        if(NetworkResource.query.get(resource).network_resource_type_id == 0):
-            lines_on_network.append(NetworkResource.query.get(resource).id)
+    tables = get_network_tables(resource_ids=list(network))
+    lines_on_network = list(tables["line"].index)
+    buses_on_network = list(tables["bus"].index)
     # print(buses_on_network, lines_on_network)        
 
     # # Creating the adjacency matrix (FIX THIS WITH LINES/BUSES INFORMATION)
@@ -2088,6 +2503,144 @@ def add_opf(
         pass
 
 
+@fm_add_data.command("flexibility-envelopes")
+@with_appcontext
+@click.option(
+    "--network",
+    "network_id",
+    type=int,
+    required=True,
+    help="Compute the envelopes of the buses in this network. Follow up with the network's ID.",
+)
+@click.option(
+    "--start",
+    "start",
+    type=AwareDateTimeField(format="iso"),
+    required=True,
+    help="Envelopes start at this datetime. Follow up with a timezone-aware datetime in ISO 6801 format.",
+)
+@click.option(
+    "--duration",
+    "duration",
+    type=DurationField(),
+    required=True,
+    help="Duration of the envelopes, after --start. Follow up with a duration in ISO 6801 format, e.g. PT24H (1 day).",
+)
+@click.option(
+    "--resolution",
+    "resolution",
+    type=DurationField(),
+    required=False,
+    default="PT1H",
+    help="Resolution of the envelopes. Follow up with a duration in ISO 6801 format. Defaults to PT1H.",
+)
+def add_flexibility_envelopes(
+    network_id: int,
+    start: datetime,
+    duration: timedelta,
+    resolution: timedelta,
+):
+    """
+    Compute and store the upward and downward flexibility envelopes of each bus in a network, and of the network as a whole.
+
+    The envelopes follow from the stored schedules (e.g. from `flexmeasures add schedule for-flex`), so no optimisation is run.
+    """
+    network = db.session.get(Network, network_id)
+    if network is None:
+        click.secho(f"No network found with ID {network_id}.", **MsgStyle.ERROR)
+        raise click.Abort()
+    envelopes = eflex_flexibility_envelopes(
+        network,
+        start=start,
+        end=start + duration,
+        resolution=resolution,
+        belief_time=server_now(),
+    )
+    click.secho(
+        f"Stored flexibility envelopes for {len(envelopes['upward'].columns)} buses in network {network.name}.",
+        **MsgStyle.SUCCESS,
+    )
+
+
+@fm_add_data.command("network-snapshot")
+@with_appcontext
+@click.option(
+    "--network",
+    "network_id",
+    type=int,
+    required=True,
+    help="Snapshot this network. Follow up with the network's ID.",
+)
+def add_network_snapshot(network_id: int):
+    """
+    Freeze a network, with the parameters of all its resources and assets, into a snapshot identified by its content hash.
+
+    Taking a snapshot of an unchanged network yields the same hash, and stores nothing new.
+    """
+    network = db.session.get(Network, network_id)
+    if network is None:
+        click.secho(f"No network found with ID {network_id}.", **MsgStyle.ERROR)
+        raise click.Abort()
+    frozen = take_network_snapshot(network)
+    db.session.commit()
+    click.secho(
+        f"Network {network.name} is frozen in snapshot {frozen.hash}.",
+        **MsgStyle.SUCCESS,
+    )
+
+
+@fm_add_data.command("rollups")
+@with_appcontext
+@click.option(
+    "--sensor",
+    "sensors",
+    required=True,
+    multiple=True,
+    type=SensorIdField(),
+    help="Compute the rollups of this sensor. Follow up with the sensor's ID. This argument can be given multiple times.",
+)
+@click.option(
+    "--start",
+    "start",
+    type=AwareDateTimeField(format="iso"),
+    required=False,
+    help="Compute rollups about events starting at this datetime. Follow up with a timezone-aware datetime in ISO 6801 format.",
+)
+@click.option(
+    "--end",
+    "end",
+    type=AwareDateTimeField(format="iso"),
+    required=False,
+    help="Compute rollups about events ending at this datetime. Follow up with a timezone-aware datetime in ISO 6801 format.",
+)
+def add_rollups(
+    sensors: list[Sensor],
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """
+    (Re)compute the rollups of sensors, for fast searches at coarse resolutions.
+
+    Rollups are updated whenever beliefs are saved, so this is meant for data that was saved in some other way,
+    such as before rollups were introduced.
+    Searches only read rollups for periods that were rolled up completely, i.e. by this command or by saving beliefs,
+    so leave out --start and --end to let searches about any period use the rollups.
+    """
+    for sensor in sensors:
+        resolutions = get_rollup_resolutions(sensor)
+        if not resolutions:
+            click.secho(
+                f"No rollups are maintained for {sensor.__repr__()}.", **MsgStyle.WARN
+            )
+            continue
+        update_rollups(sensor, start=start, end=end)
+        db.session.commit()
+        click.secho(
+            f"Rolled up the beliefs of {sensor.__repr__()} at resolutions {', '.join(isodate.duration_isoformat(r) for r in resolutions)}.",
+            **MsgStyle.SUCCESS,
+        )
+
+
 @fm_add_data.command("report")
 @with_appcontext
 @click.option(
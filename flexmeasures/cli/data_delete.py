@@ -11,7 +11,7 @@ import click
 from flask import current_app as app
 from flask.cli import with_appcontext
 from timely_beliefs.beliefs.queries import query_unchanged_beliefs
-from sqlalchemy import delete, func, select
+from sqlalchemy import and_, delete, func, select, true
 
 
 from flexmeasures.data import db
@@ -19,10 +19,18 @@ from flexmeasures.data.models.user import Account, AccountRole, RolesAccounts, U
 from flexmeasures.data.models.generic_assets import GenericAsset
 from flexmeasures.data.models.network_resources import NetworkResource
 from flexmeasures.data.models.networks import Network
-from flexmeasures.data.models.time_series import Sensor, TimedBelief
+from flexmeasures.data.models.time_series import Sensor, TimedBelief, TimedBeliefRollup
 from flexmeasures.data.schemas import AwareDateTimeField, SensorIdField, AssetIdField
+from flexmeasures.data.schemas.times import DurationField
 from flexmeasures.data.schemas.network_resource import NetworkResourceIdField
 from flexmeasures.data.schemas.networks import NetworkIdField
+from flexmeasures.data.services.belief_cache import invalidate_cached_beliefs
+from flexmeasures.data.services.partitions import drop_partitions
+from flexmeasures.data.services.rollups import (
+    get_belief_windows,
+    update_rollups,
+    update_rollups_for_windows,
+)
 from flexmeasures.data.services.users import find_user_by_email, delete_user
 from flexmeasures.cli.utils import (
     abort,
@@ -31,6 +39,7 @@ from flexmeasures.cli.utils import (
     DeprecatedOptionsCommand,
 )
 from flexmeasures.utils.flexmeasures_inflection import join_words_into_a_list
+from flexmeasures.utils.time_utils import server_now
 
 
 @click.group("delete")
@@ -322,7 +331,11 @@ def delete_beliefs(  # noqa: C901
     if start is not None:
         event_filters += [TimedBelief.event_start >= start]
     if end is not None:
-        event_filters += [TimedBelief.event_start + Sensor.event_resolution <= end]
+        event_filters += [
+            TimedBelief.event_start + Sensor.event_resolution <= end,
+            # Implied by the above, but lets Postgres skip partitions of later months
+            TimedBelief.event_start < end,
+        ]
 
     # Entity filter
     entity_filters = []
@@ -355,6 +368,20 @@ def delete_beliefs(  # noqa: C901
     click.confirm(prompt, abort=True)
     db.session.execute(delete(TimedBelief).where(*entity_filters, *event_filters))
     click.secho(f"Removing {num_beliefs_up_for_deletion} beliefs ...")
+    sensors_with_deleted_beliefs = (
+        db.session.scalars(
+            select(Sensor).filter(
+                Sensor.generic_asset_id.in_([asset.id for asset in generic_assets])
+            )
+        ).all()
+        if generic_assets
+        else sensors
+    )
+    for sensor in sensors_with_deleted_beliefs:
+        update_rollups(sensor, start=start, end=end)
+    invalidate_cached_beliefs(
+        [sensor.id for sensor in sensors_with_deleted_beliefs], start=start, end=end
+    )
     db.session.commit()
     num_beliefs_after = db.session.scalar(select(func.count()).select_from(q))
     # only show the entity names for the final confirmation
@@ -371,6 +398,72 @@ def delete_beliefs(  # noqa: C901
     done(message)
 
 
+@fm_delete_data.command("old-beliefs")
+@with_appcontext
+@click.option(
+    "--before",
+    "before",
+    type=AwareDateTimeField(),
+    required=False,
+    help="Remove beliefs about events starting before this datetime. Follow up with a timezone-aware datetime in ISO 6801 format.",
+)
+@click.option(
+    "--older-than",
+    "older_than",
+    type=DurationField(),
+    required=False,
+    help="Remove beliefs about events starting longer ago than this duration (e.g. P365D). Follow up with a duration in ISO 6801 format.",
+)
+def delete_old_beliefs(
+    before: datetime | None = None, older_than: timedelta | None = None
+):
+    """Delete beliefs about old events, for data retention.
+
+    If the beliefs table is partitioned by month, partitions covering only old events are dropped as a whole,
+    and any other old beliefs (e.g. about the month in which the cutoff lies) are deleted row by row.
+    Rollups of old beliefs are removed, too.
+    """
+    if (before is None) == (older_than is None):
+        abort("Pass either --before or --older-than.")
+    if older_than is not None:
+        before = server_now() - older_than
+    old_partitions = drop_partitions(before, dry_run=True)
+    # Old beliefs outside the partitions to be dropped
+    event_filters = [TimedBelief.event_start < before] + [
+        ~and_(
+            TimedBelief.event_start >= p.start if p.start is not None else true(),
+            TimedBelief.event_start < p.end,
+        )
+        for p in old_partitions
+    ]
+    num_beliefs_up_for_deletion = db.session.scalar(
+        select(func.count()).select_from(select(TimedBelief).filter(*event_filters))
+    )
+    if not old_partitions and num_beliefs_up_for_deletion == 0:
+        done(f"No beliefs about events starting before {before}.")
+        return
+    prompt = f"Delete {num_beliefs_up_for_deletion} beliefs about events starting before {before}"
+    if old_partitions:
+        prompt = f"Drop partitions {join_words_into_a_list([p.name for p in old_partitions])}, with all their beliefs, and d{prompt[1:]}"
+    click.confirm(f"{prompt}?", abort=True)
+    drop_partitions(before)
+    db.session.execute(delete(TimedBelief).filter(*event_filters))
+    sensors_with_old_rollups = db.session.scalars(
+        select(Sensor).filter(
+            Sensor.id.in_(
+                select(TimedBeliefRollup.sensor_id)
+                .filter(TimedBeliefRollup.event_start < before)
+                .distinct()
+            )
+        )
+    ).all()
+    for sensor in sensors_with_old_rollups:
+        update_rollups(sensor, end=before)
+    invalidate_cached_beliefs(end=before)
+    db.session.commit()
+    done(f"Removed beliefs about events starting before {before}.")
+
+
 @fm_delete_data.command("unchanged-beliefs", cls=DeprecatedOptionsCommand)
 @with_appcontext
 @click.option(
@@ -447,12 +540,24 @@ def delete_unchanged_beliefs(
     beliefs_up_for_deletion = list(
         chain(*[db.session.scalars(q).all() for q in unchanged_queries])
     )
+    windows = {}
+    for b in beliefs_up_for_deletion:
+        first, last = windows.get(b.sensor_id, (b.event_start, b.event_start))
+        windows[b.sensor_id] = (min(first, b.event_start), max(last, b.event_start))
+    windows = {
+        sensor_id: (first, last + db.session.get(Sensor, sensor_id).event_resolution)
+        for sensor_id, (first, last) in windows.items()
+    }
     batch_size = 10000
     for i, b in enumerate(beliefs_up_for_deletion, start=1):
         if i % batch_size == 0 or i == num_beliefs_up_for_deletion:
             click.echo(f"{i} beliefs processed ...")
         db.session.delete(b)
     click.secho(f"Removing {num_beliefs_up_for_deletion} beliefs ...")
+    db.session.flush()
+    # Unchanged beliefs may still be the most recent beliefs (of their source) about their event
+    update_rollups_for_windows(windows)
+    invalidate_cached_beliefs([sensor_id] if sensor_id else None)
     db.session.commit()
     num_beliefs_after = db.session.scalar(select(func.count()).select_from(q))
     done(f"{num_beliefs_after} beliefs left.")
@@ -478,7 +583,10 @@ def delete_nan_beliefs(sensor_id: int | None = None):
     query = q.filter(TimedBelief.event_value == float("NaN"))
     prompt = f"Delete {query.count()} NaN beliefs out of {q.count()} beliefs?"
     click.confirm(prompt, abort=True)
+    windows = get_belief_windows(query)
     query.delete()
+    update_rollups_for_windows(windows)
+    invalidate_cached_beliefs([sensor_id] if sensor_id is not None else None)
     db.session.commit()
     done(f"Done! {q.count()} beliefs left")
 
@@ -510,6 +618,7 @@ def delete_sensor(
     )
     for statement in statements:
         db.session.execute(statement)
+    invalidate_cached_beliefs([sensor.id for sensor in sensors])
     db.session.commit()
 
 
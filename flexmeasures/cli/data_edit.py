@@ -22,6 +22,7 @@ from flexmeasures.data.schemas.generic_assets import GenericAssetIdField
 from flexmeasures.data.schemas.sensors import SensorIdField
 from flexmeasures.data.models.generic_assets import GenericAsset
 from flexmeasures.data.models.time_series import TimedBelief
+from flexmeasures.data.services.belief_cache import invalidate_cached_beliefs
 from flexmeasures.data.utils import save_to_db
 from flexmeasures.cli.utils import MsgStyle, DeprecatedOption, DeprecatedOptionsCommand
 
@@ -241,6 +242,11 @@ def resample_sensor_data(
                 TimedBelief.event_start + sensor.event_resolution <= event_ends_before
             )
         db.session.execute(query)
+        invalidate_cached_beliefs(
+            [sensor.id],
+            start=None if pd.isnull(event_starts_after) else event_starts_after,
+            end=None if pd.isnull(event_ends_before) else event_ends_before,
+        )
         save_to_db(df_resampled, bulk_save_objects=True)
     db.session.commit()
     click.secho("Successfully resampled sensor data.", **MsgStyle.SUCCESS)
@@ -10,7 +10,7 @@ import click
 from flask import current_app as app
 from flask.cli import with_appcontext
 from tabulate import tabulate
-from humanize import naturaldelta, naturaltime
+from humanize import naturaldelta, naturalsize, naturaltime
 import pandas as pd
 import uniplot
 import vl_convert as vlc
@@ -27,8 +27,19 @@ from flexmeasures.data.models.time_series import Sensor, TimedBelief
 from flexmeasures.data.schemas.generic_assets import GenericAssetIdField
 from flexmeasures.data.schemas.sensors import SensorIdField
 from flexmeasures.data.schemas.account import AccountIdField
+from flexmeasures.data.schemas.networks import NetworkIdField
 from flexmeasures.data.schemas.sources import DataSourceIdField
 from flexmeasures.data.schemas.times import AwareDateTimeField, DurationField
+from flexmeasures.data.services.network_files import (
+    get_network_file_format,
+    to_pandapower,
+    write_network_file,
+)
+from flexmeasures.data.services.belief_files import (
+    BELIEF_FILE_FORMATS,
+    export_beliefs,
+)
+from flexmeasures.data.services.network_snapshots import freeze_network
 from flexmeasures.data.services.time_series import simplify_index
 from flexmeasures.utils.time_utils import determine_minimum_resampling_resolution
 from flexmeasures.cli.utils import MsgStyle, validate_unique
@@ -256,6 +267,43 @@ def show_generic_asset(asset):
     )
 
 
+@fm_show_data.command("network")
+@with_appcontext
+@click.option("--id", "network", type=NetworkIdField(), required=True)
+@click.option(
+    "--to-file",
+    "to_file",
+    required=False,
+    type=click.Path(dir_okay=False, writable=True),
+    help="Also export the network, with its assets, to a pandapower JSON (.json) or MATPOWER (.m) file.",
+)
+def show_network(network, to_file: str | None = None):
+    """
+    Show network info, count its resources and assets per kind, and optionally export it to a file.
+    """
+    click.echo(f"========{len(network.name) * '='}========")
+    click.echo(f"Network {network.name} (ID: {network.id})")
+    click.echo(f"========{len(network.name) * '='}========\n")
+
+    frozen = freeze_network(network)
+    network_data = [(kind, len(table)) for kind, table in frozen.tables.items()]
+    network_data += [
+        (kind, len(frozen.get_asset_ids(kind)))
+        for kind in ("load", "pv", "battery", "external_grid")
+    ]
+    click.echo(tabulate(network_data, headers=["Kind", "Count"]))
+
+    if to_file is not None:
+        try:
+            get_network_file_format(to_file)
+        except ValueError as ve:
+            click.secho(str(ve), **MsgStyle.ERROR)
+            raise click.Abort()
+        write_network_file(to_pandapower(frozen), to_file)
+        click.echo()
+        click.secho(f"Exported network to {to_file}.", **MsgStyle.SUCCESS)
+
+
 @fm_show_data.command("data-sources")
 @with_appcontext
 @click.option(
@@ -548,6 +596,13 @@ def chart(
     type=str,
     help="Set a filepath to store the beliefs as a CSV file.",
 )
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["csv", *BELIEF_FILE_FORMATS]),
+    default="csv",
+    help="Format of the file set with --to-file. In Parquet or Arrow format, all beliefs about the sensors are streamed to the file, instead of plotted (without resampling, and in chunks, for large datasets). Requires pyarrow.",
+)
 @click.option(
     "--include-ids/--exclude-ids",
     "include_ids",
@@ -577,11 +632,41 @@ def plot_beliefs(
     source_types: list[str] = None,
     include_ids: bool = False,
     reduce_paths: bool = True,
+    file_format: str = "csv",
 ):
     """
     Show a simple plot of belief data directly in the terminal, and optionally, save the data to a CSV file.
+
+    Alternatively, export all beliefs to a Parquet or Arrow file (see --format).
     """
     sensors = list(sensors)
+    if file_format != "csv":
+        if filepath is None:
+            click.secho(
+                f"Set a filepath with --to-file to export beliefs in {BELIEF_FILE_FORMATS[file_format]} format.",
+                **MsgStyle.ERROR,
+            )
+            raise click.Abort()
+        if belief_time_before is not None or resolution is not None:
+            click.secho(
+                "Exporting all beliefs, ignoring --belief-time-before and --resolution.",
+                **MsgStyle.WARN,
+            )
+        try:
+            n_beliefs = export_beliefs(
+                filepath,
+                sensors,
+                file_format=file_format,
+                event_starts_after=start,
+                event_ends_before=start + duration,
+                source_ids=[source.id] if source is not None else None,
+                source_types=[source_types] if source_types else None,
+            )
+        except ImportError as e:
+            click.secho(str(e), **MsgStyle.ERROR)
+            raise click.Abort()
+        click.secho(f"Exported {n_beliefs} beliefs to {filepath}.", **MsgStyle.SUCCESS)
+        return
     if resolution is None:
         resolution = determine_minimum_resampling_resolution(
             [sensor.event_resolution for sensor in sensors]
@@ -712,6 +797,35 @@ def list_items(item_type):
     )
 
 
+@fm_show_data.command("belief-cache")
+@with_appcontext
+def show_belief_cache():
+    """
+    Show how often belief searches were served from the cache, and how much is cached.
+    """
+    if not app.belief_cache.enabled:
+        click.secho(
+            "The belief cache is disabled (see FLEXMEASURES_BELIEF_CACHE_TTL).",
+            **MsgStyle.WARN,
+        )
+    stats = app.belief_cache.get_stats()
+    searches = stats["hits"] + stats["misses"]
+    click.echo(
+        tabulate(
+            [
+                ["Hits", stats["hits"]],
+                ["Misses", stats["misses"]],
+                [
+                    "Hit ratio",
+                    f"{stats['hits'] / searches:.1%}" if searches else "-",
+                ],
+                ["Cached results", stats["entries"]],
+                ["Size", naturalsize(stats["size"], binary=True)],
+            ]
+        )
+    )
+
+
 @fm_show_data.command("reporters")
 @with_appcontext
 def list_reporters():
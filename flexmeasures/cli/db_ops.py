@@ -7,6 +7,7 @@ from flask import current_app as app
 from flask.cli import with_appcontext
 import flask_migrate as migrate
 import click
+import pandas as pd
 
 from flexmeasures.cli.utils import MsgStyle
 
@@ -136,4 +137,42 @@ def restore(file: str):
         click.secho("db restore unsuccessful", **MsgStyle.ERROR)
 
 
+@fm_db_ops.command("create-partitions")
+@with_appcontext
+@click.option(
+    "--months-ahead",
+    type=int,
+    default=3,
+    help="Create partitions up to this many months ahead (from the current month).",
+)
+def create_belief_partitions(months_ahead: int = 3):
+    """Create monthly partitions of the timed_belief table ahead of time.
+
+    Meant to run periodically (e.g. daily, as a cron job), so that beliefs about upcoming months
+    do not end up in the default partition.
+    """
+    from flexmeasures.data.services.partitions import (
+        create_partitions,
+        get_month_start,
+        is_partitioned,
+    )
+    from flexmeasures.utils.time_utils import server_now
+
+    if not is_partitioned():
+        click.secho(
+            "The timed_belief table is not partitioned (run `flexmeasures db upgrade`).",
+            **MsgStyle.WARN,
+        )
+        return
+    until = get_month_start(server_now()) + pd.DateOffset(months=months_ahead + 1)
+    new_partitions = create_partitions(until=until)
+    app.db.session.commit()
+    if new_partitions:
+        click.secho(
+            f"Created partitions {', '.join(new_partitions)}.", **MsgStyle.SUCCESS
+        )
+    else:
+        click.secho("All partitions existed already.", **MsgStyle.SUCCESS)
+
+
 app.cli.add_command(fm_db_ops)
@@ -14,7 +14,7 @@ from flexmeasures.data.models.annotations import (
 )
 from flexmeasures.data.models.user import Account
 from flexmeasures.data.models.data_sources import DataSource
-from flexmeasures.data.models.time_series import Sensor
+from flexmeasures.data.models.time_series import Sensor, TimedBelief
 
 from flexmeasures.cli.tests.utils import get_click_commands
 from flexmeasures.utils.time_utils import server_now
@@ -540,3 +540,66 @@ def test_add_storage_schedule(
 
     assert result.exit_code == 0
     assert len(power_sensor.search_beliefs()) == 48
+
+
+def test_iter_lines_in_chunks(tmp_path):
+    from flexmeasures.cli.data_add import iter_lines_in_chunks
+
+    file = tmp_path / "lines.csv"
+    file.write_text("header\n" + "".join(f"{i}\n" for i in range(10)))
+
+    chunks = list(iter_lines_in_chunks(str(file), 4, skip_lines=1))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert chunks[0][0] == "0\n" and chunks[-1][-1] == "9\n"
+
+    # Resuming from row 3 of the first 8 rows
+    chunks = list(iter_lines_in_chunks(str(file), 4, skip_lines=1 + 3, max_lines=5))
+    assert [line for chunk in chunks for line in chunk] == [
+        f"{i}\n" for i in range(3, 8)
+    ]
+
+
+def test_add_beliefs_in_chunks(app, fresh_db, setup_dummy_data, tmp_path):
+    """Check loading a CSV file in chunks, resuming from a given row, and the reported row to resume from after a failure."""
+    from flexmeasures.cli.data_add import add_beliefs
+
+    sensor_id, _, _, _ = setup_dummy_data
+    file = tmp_path / "beliefs.csv"
+    file.write_text(
+        "datetime,value\n"
+        + "".join(f"2023-06-01T{i:02d}:00:00+00:00,{i}\n" for i in range(10))
+    )
+    cli_input = {
+        "sensor": sensor_id,
+        "source": "chunk test",
+        "horizon": 0,
+        "chunk-size": 4,
+        "nrows": 8,
+    }
+    runner = app.test_cli_runner()
+
+    def count_beliefs() -> int:
+        return fresh_db.session.scalar(
+            select(func.count())
+            .select_from(TimedBelief)
+            .filter(
+                TimedBelief.sensor_id == sensor_id,
+                TimedBelief.event_start >= datetime(2023, 6, 1, tzinfo=pytz.utc),
+            )
+        )
+
+    # Resuming from row 5 still stops after the first 8 rows
+    result = runner.invoke(
+        add_beliefs, [str(file)] + to_flags({**cli_input, "start-row": 5})
+    )
+    assert result.exit_code == 0, result.output
+    assert "from rows 5 to 7" in result.output
+    assert count_beliefs() == 3
+
+    # Starting over fails in the second chunk (rows 4 to 7), as rows 5 to 7 were saved already
+    result = runner.invoke(add_beliefs, [str(file)] + to_flags(cli_input))
+    assert result.exit_code != 0
+    assert "Added rows 0 to 3" in result.output
+    assert "Failed to add rows 4 to 7" in result.output
+    assert "--start-row 4" in result.output
+    assert count_beliefs() == 3 + 4
@@ -1,9 +1,12 @@
+import pandas as pd
 from sqlalchemy import select, func
 
 from flexmeasures.cli.tests.utils import to_flags
 from flexmeasures.data.models.audit_log import AuditLog
+from flexmeasures.data.models.time_series import TimedBelief
 from flexmeasures.data.models.user import Account, User
 from flexmeasures.data.services.users import find_user_by_email
+from flexmeasures.data.tests.utils import partition_timed_belief_table
 
 
 def test_delete_account(
@@ -47,3 +50,30 @@ def test_delete_account(
         .one_or_none()
     )
     assert user_creation_audit_log.affected_account_id is None
+
+
+def test_delete_old_beliefs_from_partitioned_table(fresh_db, setup_dummy_data, app):
+    """Check that old beliefs not covered by droppable partitions are deleted row by row."""
+    from flexmeasures.cli.data_delete import delete_old_beliefs
+
+    # All 2 x 200 hourly beliefs (from 2023-04-10) lie in the legacy partition, which also covers later events
+    partition_timed_belief_table(fresh_db, pd.Timestamp("2023-05-01T00:00+00:00"))
+    before = pd.Timestamp("2023-04-12T00:00+00:00")
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(
+        delete_old_beliefs, to_flags({"before": before.isoformat()}), input="y\n"
+    )
+    assert result.exit_code == 0, result.exception
+    assert "Delete 96 beliefs" in result.output
+    assert (
+        fresh_db.session.scalar(
+            select(func.count())
+            .select_from(TimedBelief)
+            .filter(TimedBelief.event_start < before)
+        )
+        == 0
+    )
+    assert fresh_db.session.scalar(
+        select(func.count()).select_from(TimedBelief)
+    ) == 2 * (200 - 48)
@@ -0,0 +1,187 @@
+"""Normalize network membership and electrical parameters of network resources
+
+Replaces the network.network_resources array with an indexed association table,
+and copies the electrical parameters of buses, lines, transformers and shunts
+from their JSON attributes to typed tables.
+
+The network tables were created outside of these migrations, so this migration does nothing if they do not exist
+(in which case the new tables are created along with them).
+
+Revision ID: 4a1d6e7c2b90
+Revises: 81cbbf42357b
+Create Date: 2024-05-06 10:12:43.118249
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "4a1d6e7c2b90"
+down_revision = "81cbbf42357b"
+branch_labels = None
+depends_on = None
+
+# Network resource type ids and their typed parameters (references to buses are integers, the rest are floats)
+PARAMETER_TABLES = {
+    "bus_parameters": (1, [], ["vn_kv", "max_vm_pu", "min_vm_pu"]),
+    "line_parameters": (
+        0,
+        ["from_bus", "to_bus"],
+        ["length_km", "r_ohm_per_km", "x_ohm_per_km", "c_nf_per_km", "max_i_ka"],
+    ),
+    "transformer_parameters": (
+        2,
+        ["hv_bus", "lv_bus"],
+        [
+            "sn_mva",
+            "vn_hv_kv",
+            "vn_lv_kv",
+            "vk_percent",
+            "vkr_percent",
+            "pfe_kw",
+            "i0_percent",
+        ],
+    ),
+    "shunt_parameters": (4, ["bus"], ["q_mvar", "p_mw", "vn_kv"]),
+}
+
+
+def network_tables_exist() -> bool:
+    table_names = sa.inspect(op.get_bind()).get_table_names()
+    return "network" in table_names and "network_resource" in table_names
+
+
+def upgrade():
+    if not network_tables_exist():
+        return
+    op.create_table(
+        "network_membership",
+        sa.Column("network_id", sa.Integer(), nullable=False),
+        sa.Column("network_resource_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["network_id"],
+            ["network.id"],
+            name=op.f("network_membership_network_id_network_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["network_resource_id"],
+            ["network_resource.id"],
+            name=op.f("network_membership_network_resource_id_network_resource_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "network_id", "network_resource_id", name=op.f("network_membership_pkey")
+        ),
+    )
+    op.create_index(
+        op.f("network_membership_network_resource_id_idx"),
+        "network_membership",
+        ["network_resource_id"],
+        unique=False,
+    )
+    for table_name, (_, bus_columns, float_columns) in PARAMETER_TABLES.items():
+        op.create_table(
+            table_name,
+            sa.Column("network_resource_id", sa.Integer(), nullable=False),
+            *[sa.Column(c, sa.Integer(), nullable=True) for c in bus_columns],
+            *[sa.Column(c, sa.Float(), nullable=True) for c in float_columns],
+            sa.ForeignKeyConstraint(
+                ["network_resource_id"],
+                ["network_resource.id"],
+                name=op.f(f"{table_name}_network_resource_id_network_resource_fkey"),
+                ondelete="CASCADE",
+            ),
+            *[
+                sa.ForeignKeyConstraint(
+                    [c],
+                    ["network_resource.id"],
+                    name=op.f(f"{table_name}_{c}_network_resource_fkey"),
+                    ondelete="CASCADE",
+                )
+                for c in bus_columns
+            ],
+            sa.PrimaryKeyConstraint(
+                "network_resource_id", name=op.f(f"{table_name}_pkey")
+            ),
+        )
+        for c in bus_columns:
+            op.create_index(
+                op.f(f"{table_name}_{c}_idx"), table_name, [c], unique=False
+            )
+
+    # Move the memberships out of the array column, skipping ids of resources that no longer exist
+    op.execute(
+        """
+        INSERT INTO network_membership (network_id, network_resource_id)
+        SELECT DISTINCT network.id, member.id
+        FROM network, unnest(network.network_resources) AS member(id)
+        JOIN network_resource ON network_resource.id = member.id
+        """
+    )
+    op.drop_column("network", "network_resources")
+
+    # Copy the electrical parameters from the JSON attributes
+    connection = op.get_bind()
+    resources = connection.execute(
+        sa.text("SELECT id, network_resource_type_id, attributes FROM network_resource")
+    ).fetchall()
+    for table_name, (type_id, bus_columns, float_columns) in PARAMETER_TABLES.items():
+        rows = []
+        for resource_id, resource_type_id, attributes in resources:
+            if resource_type_id != type_id:
+                continue
+            if isinstance(attributes, str):
+                attributes = json.loads(attributes)
+            attributes = attributes or {}
+            row = dict(network_resource_id=resource_id)
+            for c in bus_columns:
+                row[c] = int(attributes[c]) if attributes.get(c) is not None else None
+            for c in float_columns:
+                row[c] = float(attributes[c]) if attributes.get(c) is not None else None
+            rows.append(row)
+        if rows:
+            columns = ["network_resource_id"] + bus_columns + float_columns
+            connection.execute(
+                sa.text(
+                    f"INSERT INTO {table_name} ({', '.join(columns)})"
+                    f" VALUES ({', '.join(':' + c for c in columns)})"
+                ),
+                rows,
+            )
+
+
+def downgrade():
+    if not network_tables_exist():
+        return
+    op.add_column(
+        "network",
+        sa.Column(
+            "network_resources",
+            postgresql.ARRAY(sa.Integer()),
+            autoincrement=False,
+            nullable=True,
+        ),
+    )
+    op.execute(
+        """
+        UPDATE network SET network_resources = members.ids
+        FROM (
+            SELECT network_id, array_agg(network_resource_id ORDER BY network_resource_id) AS ids
+            FROM network_membership GROUP BY network_id
+        ) AS members
+        WHERE network.id = members.network_id
+        """
+    )
+    for table_name, (_, bus_columns, _) in PARAMETER_TABLES.items():
+        for c in bus_columns:
+            op.drop_index(op.f(f"{table_name}_{c}_idx"), table_name=table_name)
+        op.drop_table(table_name)
+    op.drop_index(
+        op.f("network_membership_network_resource_id_idx"),
+        table_name="network_membership",
+    )
+    op.drop_table("network_membership")
@@ -0,0 +1,51 @@
+"""Add timed_belief_rollup_coverage table
+
+Rollups are only read for periods in which they are known to be complete.
+Coverage of existing rollups is not recorded here, so searches fall back to the underlying beliefs
+until the rollups are recomputed with `flexmeasures add rollups` (or beliefs are saved).
+
+Revision ID: a3e8d1c6b047
+Revises: f1a7c3d9b528
+Create Date: 2024-05-29 14:12:51.220417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a3e8d1c6b047"
+down_revision = "f1a7c3d9b528"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "timed_belief_rollup_coverage",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("sensor_id", sa.Integer(), nullable=False),
+        sa.Column("resolution", sa.Interval(), nullable=False),
+        sa.Column("covered_since", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("covered_until", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["sensor_id"],
+            ["sensor.id"],
+            name=op.f("timed_belief_rollup_coverage_sensor_id_sensor_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("timed_belief_rollup_coverage_pkey")),
+    )
+    op.create_index(
+        op.f("timed_belief_rollup_coverage_sensor_id_idx"),
+        "timed_belief_rollup_coverage",
+        ["sensor_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("timed_belief_rollup_coverage_sensor_id_idx"),
+        table_name="timed_belief_rollup_coverage",
+    )
+    op.drop_table("timed_belief_rollup_coverage")
@@ -0,0 +1,56 @@
+"""Add network_snapshot table
+
+Like the previous migration, this does nothing if the network tables do not exist
+(in which case the new table is created along with them).
+
+Revision ID: b3e9c0f1d2a4
+Revises: 4a1d6e7c2b90
+Create Date: 2024-05-08 14:31:05.228715
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b3e9c0f1d2a4"
+down_revision = "4a1d6e7c2b90"
+branch_labels = None
+depends_on = None
+
+
+def network_table_exists() -> bool:
+    return "network" in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    if not network_table_exists():
+        return
+    op.create_table(
+        "network_snapshot",
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("network_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["network_id"],
+            ["network.id"],
+            name=op.f("network_snapshot_network_id_network_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("hash", name=op.f("network_snapshot_pkey")),
+    )
+    op.create_index(
+        op.f("network_snapshot_network_id_idx"),
+        "network_snapshot",
+        ["network_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    if not network_table_exists():
+        return
+    op.drop_index(
+        op.f("network_snapshot_network_id_idx"), table_name="network_snapshot"
+    )
+    op.drop_table("network_snapshot")
@@ -0,0 +1,75 @@
+"""Add spatial indexes on asset and network resource locations, and locations to network resources
+
+GiST indexes on ll_to_earth(latitude, longitude) serve k-nearest and radius queries,
+and B-tree indexes on (latitude, longitude) serve bounding box queries.
+The GiST indexes require the earthdistance and cube extensions; they are skipped if the extensions are missing.
+Network resources get latitude and longitude columns, if the network tables exist.
+
+Revision ID: c7d2e5a8f3b1
+Revises: b3e9c0f1d2a4
+Create Date: 2024-05-13 10:12:44.512094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c7d2e5a8f3b1"
+down_revision = "b3e9c0f1d2a4"
+branch_labels = None
+depends_on = None
+
+
+def earthdistance_exists() -> bool:
+    return (
+        op.get_bind()
+        .execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'earthdistance'"))
+        .first()
+        is not None
+    )
+
+
+def tables_with_locations() -> list[str]:
+    tables = ["generic_asset"]
+    if "network_resource" in sa.inspect(op.get_bind()).get_table_names():
+        tables.append("network_resource")
+    return tables
+
+
+def upgrade():
+    tables = tables_with_locations()
+    if "network_resource" in tables:
+        with op.batch_alter_table("network_resource", schema=None) as batch_op:
+            batch_op.add_column(sa.Column("latitude", sa.Float(), nullable=True))
+            batch_op.add_column(sa.Column("longitude", sa.Float(), nullable=True))
+    with_gist = earthdistance_exists()
+    if not with_gist:
+        print(
+            "The earthdistance extension is missing, so only bounding box queries on locations will be indexed."
+        )
+    for table in tables:
+        op.create_index(
+            op.f(f"{table}_latitude_longitude_idx"),
+            table,
+            ["latitude", "longitude"],
+            unique=False,
+        )
+        if with_gist:
+            op.create_index(
+                op.f(f"{table}_location_idx"),
+                table,
+                [sa.text("ll_to_earth(latitude, longitude)")],
+                unique=False,
+                postgresql_using="gist",
+            )
+
+
+def downgrade():
+    tables = tables_with_locations()
+    for table in tables:
+        op.execute(f"DROP INDEX IF EXISTS {table}_location_idx")
+        op.drop_index(op.f(f"{table}_latitude_longitude_idx"), table_name=table)
+    if "network_resource" in tables:
+        with op.batch_alter_table("network_resource", schema=None) as batch_op:
+            batch_op.drop_column("longitude")
+            batch_op.drop_column("latitude")
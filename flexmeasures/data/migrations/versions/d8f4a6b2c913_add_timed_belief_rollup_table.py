@@ -0,0 +1,55 @@
+"""Add timed_belief_rollup table
+
+Rollups of existing beliefs are not computed here, as that may take long for large databases.
+Use `flexmeasures add rollups` to compute them.
+
+Revision ID: d8f4a6b2c913
+Revises: c7d2e5a8f3b1
+Create Date: 2024-05-21 09:47:18.306152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "d8f4a6b2c913"
+down_revision = "c7d2e5a8f3b1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "timed_belief_rollup",
+        sa.Column("sensor_id", sa.Integer(), nullable=False),
+        sa.Column("resolution", sa.Interval(), nullable=False),
+        sa.Column("event_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("source_id", sa.Integer(), nullable=False),
+        sa.Column("event_value_sum", sa.Float(), nullable=False),
+        sa.Column("event_count", sa.Integer(), nullable=False),
+        sa.Column("belief_horizon", sa.Interval(), nullable=False),
+        sa.Column("probabilistic", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["sensor_id"],
+            ["sensor.id"],
+            name=op.f("timed_belief_rollup_sensor_id_sensor_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["source_id"],
+            ["data_source.id"],
+            name=op.f("timed_belief_rollup_source_id_data_source_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "sensor_id",
+            "resolution",
+            "event_start",
+            "source_id",
+            name=op.f("timed_belief_rollup_pkey"),
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("timed_belief_rollup")
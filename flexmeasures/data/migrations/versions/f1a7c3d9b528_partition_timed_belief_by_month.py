@@ -0,0 +1,125 @@
+"""Partition the timed_belief table by month of event_start
+
+The existing table becomes the partition timed_belief_legacy, covering all events up to the end of the month of the latest event,
+which avoids copying existing beliefs (attaching it does require Postgres to scan it once).
+Beliefs about later months go into monthly partitions, of which we create some ahead of time here
+(use `flexmeasures db-ops create-partitions` to keep doing so), or else into the default partition.
+
+Revision ID: f1a7c3d9b528
+Revises: d8f4a6b2c913
+Create Date: 2024-05-27 11:05:39.642871
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "f1a7c3d9b528"
+down_revision = "d8f4a6b2c913"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def month_start(year: int, month: int) -> datetime:
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def rename_indexes(table: str, old_prefix: str, new_prefix: str):
+    """Rename the indexes (including that of the primary key) of a table, to free up their names."""
+    for (name,) in op.get_bind().execute(
+        sa.text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+        dict(table=table),
+    ):
+        if name.startswith(old_prefix):
+            op.execute(
+                f"ALTER INDEX {name} RENAME TO {new_prefix}{name[len(old_prefix):]}"
+            )
+
+
+def create_timed_belief_table(name: str, **kwargs):
+    op.create_table(
+        name,
+        sa.Column("event_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("belief_horizon", sa.Interval(), nullable=False),
+        sa.Column("cumulative_probability", sa.Float(), nullable=False),
+        sa.Column("event_value", sa.Float(), nullable=False),
+        sa.Column("sensor_id", sa.Integer(), nullable=False),
+        sa.Column("source_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["sensor_id"],
+            ["sensor.id"],
+            name="timed_belief_sensor_id_sensor_fkey",
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["source_id"],
+            ["data_source.id"],
+            name="timed_belief_source_id_data_source_fkey",
+        ),
+        sa.PrimaryKeyConstraint(
+            "event_start",
+            "belief_horizon",
+            "cumulative_probability",
+            "sensor_id",
+            "source_id",
+            name="timed_belief_pkey",
+        ),
+        **kwargs,
+    )
+    op.create_index("timed_belief_event_start_idx", name, ["event_start"])
+    op.create_index("timed_belief_sensor_id_idx", name, ["sensor_id"])
+    op.create_index(
+        "timed_belief_search_session_idx",
+        name,
+        ["event_start", "sensor_id", "source_id"],
+        postgresql_include=["belief_horizon"],
+    )
+
+
+def upgrade():
+    latest_event_start = (
+        op.get_bind().execute(sa.text("SELECT max(event_start) FROM timed_belief"))
+    ).scalar()
+
+    op.rename_table("timed_belief", "timed_belief_legacy")
+    rename_indexes("timed_belief_legacy", "timed_belief_", "timed_belief_legacy_")
+    create_timed_belief_table(
+        "timed_belief", postgresql_partition_by="RANGE (event_start)"
+    )
+
+    now = datetime.now(timezone.utc)
+    first_month = month_start(now.year, now.month)
+    if latest_event_start is None:
+        op.drop_table("timed_belief_legacy")
+    else:
+        latest_event_start = latest_event_start.astimezone(timezone.utc)
+        boundary = month_start(latest_event_start.year, latest_event_start.month + 1)
+        # Partition bounds contain colons, which op.execute would mistake for query parameters
+        op.get_bind().exec_driver_sql(
+            f"ALTER TABLE timed_belief ATTACH PARTITION timed_belief_legacy FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+        )
+        first_month = max(first_month, boundary)
+    op.execute("CREATE TABLE timed_belief_default PARTITION OF timed_belief DEFAULT")
+
+    for i in range(MONTHS_AHEAD):
+        start = month_start(first_month.year, first_month.month + i)
+        end = month_start(first_month.year, first_month.month + i + 1)
+        op.get_bind().exec_driver_sql(
+            f"CREATE TABLE timed_belief_y{start.year}m{start.month:02d} PARTITION OF timed_belief "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+
+def downgrade():
+    op.rename_table("timed_belief", "timed_belief_partitioned")
+    rename_indexes(
+        "timed_belief_partitioned", "timed_belief_", "timed_belief_partitioned_"
+    )
+    create_timed_belief_table("timed_belief")
+    op.execute("INSERT INTO timed_belief SELECT * FROM timed_belief_partitioned")
+    op.execute("DROP TABLE timed_belief_partitioned CASCADE")
@@ -21,10 +21,12 @@ from flexmeasures.data.models.data_sources import DataSource
 from flexmeasures.data.models.parsing_utils import parse_source_arg
 from flexmeasures.data.models.user import User
 from flexmeasures.data.queries.annotations import query_asset_annotations
+from flexmeasures.data.queries.locations import add_location_indexes
 from flexmeasures.data.services.timerange import get_timerange
 from flexmeasures.auth.policy import AuthModelMixin, EVERY_LOGGED_IN_USER
 from flexmeasures.utils import geo_utils
 from flexmeasures.utils.coding_utils import flatten_unique
+from flexmeasures.utils.downsampling import DEFAULT_CHART_WIDTH
 from flexmeasures.utils.time_utils import determine_minimum_resampling_resolution
 
 
@@ -409,6 +411,9 @@ class GenericAsset(db.Model, AuthModelMixin):
         most_recent_beliefs_only: bool = True,
         most_recent_events_only: bool = False,
         as_json: bool = False,
+        compact: bool = False,
+        downsampling: str | None = None,
+        width: int = DEFAULT_CHART_WIDTH,
     ) -> BeliefsDataFrame | str:
         """Search all beliefs about events for all sensors of this asset
 
@@ -424,6 +429,9 @@ class GenericAsset(db.Model, AuthModelMixin):
         :param source: search only beliefs by this source (pass the DataSource, or its name or id) or list of sources
         :param most_recent_events_only: only return (post knowledge time) beliefs for the most recent event (maximum event start)
         :param as_json: return beliefs in JSON format (e.g. for use in charts) rather than as BeliefsDataFrame
+        :param compact: if as_json, list sensors and sources only once, and the beliefs by column (see beliefs_to_chart_json)
+        :param downsampling: if as_json, downsample the (resampled) beliefs of each sensor and source to fit a chart, with "lttb" or "minmax" (see downsample_chart_data)
+        :param width: if downsampling, the chart width in pixels
         :returns: dictionary of BeliefsDataFrames or JSON string (if as_json is True)
         """
         bdf_dict = {}
@@ -443,7 +451,11 @@ class GenericAsset(db.Model, AuthModelMixin):
                 one_deterministic_belief_per_event_per_source=True,
             )
         if as_json:
-            from flexmeasures.data.services.time_series import simplify_index
+            from flexmeasures.data.services.time_series import (
+                beliefs_to_chart_json,
+                downsample_chart_data,
+                simplify_index,
+            )
 
             if sensors:
                 minimum_resampling_resolution = determine_minimum_resampling_resolution(
@@ -483,9 +495,9 @@ class GenericAsset(db.Model, AuthModelMixin):
                 )
                 df["sensor"] = {}  # ensure the same columns as a non-empty frame
             df = df.reset_index()
-            df["source"] = df["source"].apply(lambda x: x.to_dict())
-            df["sensor"] = df["sensor"].apply(lambda x: x.to_dict())
-            return df.to_json(orient="records")
+            if downsampling is not None:
+                df = downsample_chart_data(df, width, downsampling)
+            return beliefs_to_chart_json(df, compact=compact)
         return bdf_dict
 
     @property
@@ -624,6 +636,41 @@ class GenericAsset(db.Model, AuthModelMixin):
         start, end = get_timerange(sensor_ids)
         return dict(start=start, end=end)
 
+    @classmethod
+    def find_closest(
+        cls, n: int = 1, generic_asset_type_name: str | None = None, **kwargs
+    ) -> GenericAsset | list[GenericAsset] | None:
+        """Returns the closest n assets, optionally of a given asset type (as a list if n > 1).
+        Parses latitude and longitude values stated in kwargs.
+
+        Can be called with an object that has latitude and longitude properties, for example:
+
+            asset = GenericAsset.find_closest(object=other_asset)
+
+        Can also be called with latitude and longitude parameters, for example:
+
+            assets = GenericAsset.find_closest(5, "battery", latitude=32, longitude=54)
+            assets = GenericAsset.find_closest(5, "battery", lat=32, lng=54)
+
+        Finally, pass in an account_id parameter if you want to query an account other than your own. This only works for admins. Public assets are always queried.
+        """
+        from flexmeasures.data.queries.generic_assets import query_assets_by_proximity
+
+        latitude, longitude = geo_utils.parse_lat_lng(kwargs)
+        query = query_assets_by_proximity(
+            latitude=latitude,
+            longitude=longitude,
+            generic_asset_type_name=generic_asset_type_name,
+            account_id=kwargs.get("account_id"),
+        )
+        if n == 1:
+            return db.session.scalars(query.limit(1)).first()
+        else:
+            return db.session.scalars(query.limit(n)).all()
+
+
+add_location_indexes(GenericAsset)
+
 
 def create_generic_asset(generic_asset_type: str, **kwargs) -> GenericAsset:
     """Create a GenericAsset and assigns it an id.
@@ -9,6 +9,7 @@ from flask_security import current_user
 import pandas as pd
 from sqlalchemy import select
 from sqlalchemy.engine import Row
+from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.hybrid import hybrid_method
 from sqlalchemy.sql.expression import func, text
 from sqlalchemy.ext.mutable import MutableDict
@@ -21,6 +22,7 @@ from flexmeasures.data.models.data_sources import DataSource
 from flexmeasures.data.models.parsing_utils import parse_source_arg
 from flexmeasures.data.models.user import User
 from flexmeasures.data.queries.annotations import query_network_resource_annotations
+from flexmeasures.data.queries.locations import add_location_indexes
 from flexmeasures.data.services.timerange import get_timerange
 from flexmeasures.auth.policy import AuthModelMixin, EVERY_LOGGED_IN_USER
 from flexmeasures.utils import geo_utils
@@ -28,6 +30,10 @@ from flexmeasures.utils.coding_utils import flatten_unique
 from flexmeasures.utils.time_utils import determine_minimum_resampling_resolution
 
 
+# Network resource types, by the ids used throughout the eflex services
+NETWORK_RESOURCE_TYPE_IDS = dict(line=0, bus=1, transformer=2, shunt=4)
+
+
 class NetworkResourceType(db.Model):
     """A Network type defines what type a network belongs to.
 
@@ -63,6 +69,8 @@ class NetworkResource(db.Model, AuthModelMixin):
     # No relationship
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), default="")
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     attributes = db.Column(MutableDict.as_mutable(db.JSON), nullable=False, default={})
 
     # One-to-many (or many-to-one?) relationships PAREI AQUI
@@ -203,6 +211,37 @@ class NetworkResource(db.Model, AuthModelMixin):
     def set_attribute(self, attribute: str, value):
         if self.has_attribute(attribute):
             self.attributes[attribute] = value
+            self.update_parameters()
+
+    @property
+    def kind(self) -> str | None:
+        """For example, "bus" or "line" (None for types without electrical parameters)."""
+        for kind, type_id in NETWORK_RESOURCE_TYPE_IDS.items():
+            if type_id == self.network_resource_type_id:
+                return kind
+        return None
+
+    @property
+    def parameters(self) -> NetworkResourceParameters | None:
+        """The typed electrical parameters of this resource, if its kind has any."""
+        if self.kind not in PARAMETER_MODELS:
+            return None
+        return getattr(self, PARAMETER_MODELS[self.kind].__tablename__)
+
+    def update_parameters(self):
+        """Copy the electrical parameters from the attributes to the typed parameter table of this resource's kind.
+
+        Call this after setting the attributes of a new or edited resource, so that the typed tables stay in sync.
+        """
+        if self.kind not in PARAMETER_MODELS:
+            return
+        model = PARAMETER_MODELS[self.kind]
+        parameters = self.parameters
+        if parameters is None:
+            parameters = model()
+            setattr(self, model.__tablename__, parameters)
+        for name in model.parameter_names():
+            setattr(parameters, name, self.attributes.get(name))
 
     @property
     def has_power_sensors(self) -> bool:
@@ -398,6 +437,7 @@ class NetworkResource(db.Model, AuthModelMixin):
         most_recent_beliefs_only: bool = True,
         most_recent_events_only: bool = False,
         as_json: bool = False,
+        compact: bool = False,
     ) -> BeliefsDataFrame | str:
         """Search all beliefs about events for all sensors of this network resource
 
@@ -413,6 +453,7 @@ class NetworkResource(db.Model, AuthModelMixin):
         :param source: search only beliefs by this source (pass the DataSource, or its name or id) or list of sources
         :param most_recent_events_only: only return (post knowledge time) beliefs for the most recent event (maximum event start)
         :param as_json: return beliefs in JSON format (e.g. for use in charts) rather than as BeliefsDataFrame
+        :param compact: if as_json, list sensors and sources only once, and the beliefs by column (see beliefs_to_chart_json)
         :returns: dictionary of BeliefsDataFrames or JSON string (if as_json is True)
         """
         bdf_dict = {}
@@ -432,7 +473,10 @@ class NetworkResource(db.Model, AuthModelMixin):
                 one_deterministic_belief_per_event_per_source=True,
             )
         if as_json:
-            from flexmeasures.data.services.time_series import simplify_index
+            from flexmeasures.data.services.time_series import (
+                beliefs_to_chart_json,
+                simplify_index,
+            )
 
             if sensors:
                 minimum_resampling_resolution = determine_minimum_resampling_resolution(
@@ -472,9 +516,7 @@ class NetworkResource(db.Model, AuthModelMixin):
                 )
                 df["sensor"] = {}  # ensure the same columns as a non-empty frame
             df = df.reset_index()
-            df["source"] = df["source"].apply(lambda x: x.to_dict())
-            df["sensor"] = df["sensor"].apply(lambda x: x.to_dict())
-            return df.to_json(orient="records")
+            return beliefs_to_chart_json(df, compact=compact)
         return bdf_dict
 
     @property
@@ -613,6 +655,138 @@ class NetworkResource(db.Model, AuthModelMixin):
         start, end = get_timerange(sensor_ids)
         return dict(start=start, end=end)
 
+    @classmethod
+    def find_closest(
+        cls, n: int = 1, kind: str | None = None, **kwargs
+    ) -> NetworkResource | list[NetworkResource] | None:
+        """Returns the closest n network resources, optionally of a given kind, e.g. "bus" (as a list if n > 1).
+        Parses latitude and longitude values stated in kwargs (see GenericAsset.find_closest).
+        """
+        from flexmeasures.data.queries.network_resources import (
+            query_network_resources_by_proximity,
+        )
+
+        latitude, longitude = geo_utils.parse_lat_lng(kwargs)
+        query = query_network_resources_by_proximity(
+            latitude=latitude,
+            longitude=longitude,
+            kind=kind,
+            account_id=kwargs.get("account_id"),
+        )
+        if n == 1:
+            return db.session.scalars(query.limit(1)).first()
+        else:
+            return db.session.scalars(query.limit(n)).all()
+
+
+add_location_indexes(NetworkResource)
+
+
+class NetworkResourceParameters(db.Model):
+    """Base class for the typed electrical parameters of one kind of network resource.
+
+    These mirror the parameters in the (untyped) attributes of the resource,
+    such that a whole network can be loaded in one query (see get_network_tables).
+    """
+
+    __abstract__ = True
+
+    @declared_attr
+    def network_resource_id(cls):
+        return db.Column(
+            db.Integer,
+            db.ForeignKey("network_resource.id", ondelete="CASCADE"),
+            primary_key=True,
+        )
+
+    @declared_attr
+    def network_resource(cls):
+        return db.relationship(
+            "NetworkResource",
+            foreign_keys=f"{cls.__name__}.network_resource_id",
+            backref=db.backref(
+                cls.__tablename__,
+                uselist=False,
+                cascade="all, delete-orphan",
+                passive_deletes=True,
+            ),
+        )
+
+    @classmethod
+    def parameter_names(cls) -> list[str]:
+        return [
+            column.name
+            for column in cls.__table__.columns
+            if column.name != "network_resource_id"
+        ]
+
+    def __repr__(self):
+        return "<%s of NetworkResource %s>" % (
+            self.__class__.__name__,
+            self.network_resource_id,
+        )
+
+
+def _bus_reference():
+    return db.Column(
+        db.Integer,
+        db.ForeignKey("network_resource.id", ondelete="CASCADE"),
+        nullable=True,
+        index=True,
+    )
+
+
+class BusParameters(NetworkResourceParameters):
+    __tablename__ = "bus_parameters"
+
+    vn_kv = db.Column(db.Float, nullable=True)
+    max_vm_pu = db.Column(db.Float, nullable=True)
+    min_vm_pu = db.Column(db.Float, nullable=True)
+
+
+class LineParameters(NetworkResourceParameters):
+    __tablename__ = "line_parameters"
+
+    from_bus = _bus_reference()
+    to_bus = _bus_reference()
+    length_km = db.Column(db.Float, nullable=True)
+    r_ohm_per_km = db.Column(db.Float, nullable=True)
+    x_ohm_per_km = db.Column(db.Float, nullable=True)
+    c_nf_per_km = db.Column(db.Float, nullable=True)
+    max_i_ka = db.Column(db.Float, nullable=True)
+
+
+class TransformerParameters(NetworkResourceParameters):
+    __tablename__ = "transformer_parameters"
+
+    hv_bus = _bus_reference()
+    lv_bus = _bus_reference()
+    sn_mva = db.Column(db.Float, nullable=True)
+    vn_hv_kv = db.Column(db.Float, nullable=True)
+    vn_lv_kv = db.Column(db.Float, nullable=True)
+    vk_percent = db.Column(db.Float, nullable=True)
+    vkr_percent = db.Column(db.Float, nullable=True)
+    pfe_kw = db.Column(db.Float, nullable=True)
+    i0_percent = db.Column(db.Float, nullable=True)
+
+
+class ShuntParameters(NetworkResourceParameters):
+    __tablename__ = "shunt_parameters"
+
+    bus = _bus_reference()
+    q_mvar = db.Column(db.Float, nullable=True)
+    p_mw = db.Column(db.Float, nullable=True)
+    vn_kv = db.Column(db.Float, nullable=True)
+
+
+# Typed parameter tables, by kind of network resource
+PARAMETER_MODELS: dict[str, type[NetworkResourceParameters]] = dict(
+    bus=BusParameters,
+    line=LineParameters,
+    transformer=TransformerParameters,
+    shunt=ShuntParameters,
+)
+
 
 def create_network_resource(network_resource_type: str, **kwargs) -> NetworkResource:
     """Create a NetworkResource and assigns it an id.
@@ -645,6 +819,7 @@ def create_network_resource(network_resource_type: str, **kwargs) -> NetworkReso
     for arg in ("latitude", "longitude", "account_id"):
         if arg in kwargs:
             setattr(new_network_resource, arg, kwargs[arg])
+    new_network_resource.update_parameters()
     db.session.add(new_network_resource)
     db.session.flush()  # generates the pkey for new_network_resource
 
@@ -668,11 +843,11 @@ def get_center_location_of_network_resources(user: User | None) -> tuple[float,
     query = (
         "Select (min(latitude) + max(latitude)) / 2 as latitude,"
         " (min(longitude) + max(longitude)) / 2 as longitude"
-        " from network_resources"
+        " from network_resource"
     )
     if user is None:
         user = current_user
-    query += f" where network_resources.account_id = {user.account_id}"
+    query += f" where network_resource.account_id = {user.account_id}"
     locations: list[Row] = db.session.execute(text(query + ";")).fetchall()
     if (
         len(locations) == 0
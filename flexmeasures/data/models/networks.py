@@ -11,7 +11,6 @@ from sqlalchemy import select
 from sqlalchemy.engine import Row
 from sqlalchemy.ext.hybrid import hybrid_method
 from sqlalchemy.sql.expression import func, text
-from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.mutable import MutableDict
 from timely_beliefs import BeliefsDataFrame, utils as tb_utils
 
@@ -19,6 +18,7 @@ from flexmeasures.data import db
 from flexmeasures.data.models.annotations import Annotation, to_annotation_frame
 from flexmeasures.data.models.charts import chart_type_to_chart_specs
 from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.data.models.network_resources import NetworkResource
 from flexmeasures.data.models.parsing_utils import parse_source_arg
 from flexmeasures.data.models.user import User
 from flexmeasures.data.queries.annotations import query_network_resource_annotations
@@ -50,7 +50,6 @@ class Network(db.Model, AuthModelMixin):
     # No relationship
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), default="")
-    network_resources = db.Column(ARRAY(db.Integer), default="")
     account_id = db.Column(
         db.Integer, db.ForeignKey("account.id", ondelete="CASCADE"), nullable=True
     )  # if null, asset is public
@@ -67,6 +66,12 @@ class Network(db.Model, AuthModelMixin):
     # )
 
     # Many-to-many relationships
+    resources = db.relationship(
+        "NetworkResource",
+        secondary="network_membership",
+        order_by="NetworkResource.id",
+        backref=db.backref("networks", lazy="dynamic"),
+    )
     # annotations = db.relationship(
     #     "Annotation",
     #     secondary="annotations_networks",
@@ -96,6 +101,23 @@ class Network(db.Model, AuthModelMixin):
             self.network_resources,
         )
 
+    @property
+    def network_resources(self) -> list[int]:
+        """Ids of the network resources in this network."""
+        return [resource.id for resource in self.resources]
+
+    @network_resources.setter
+    def network_resources(self, network_resource_ids: list[int]):
+        resources = db.session.scalars(
+            select(NetworkResource).filter(
+                NetworkResource.id.in_(network_resource_ids)
+            )
+        ).all()
+        unknown_ids = set(network_resource_ids) - {r.id for r in resources}
+        if unknown_ids:
+            raise ValueError(f"Unknown network resources: {sorted(unknown_ids)}.")
+        self.resources = resources
+
     # # @property
     # # def network_resource_type(self) -> NetworkResourceType:
     # #     """This property prepares for dropping the "generic" prefix later"""
@@ -600,6 +622,51 @@ class Network(db.Model, AuthModelMixin):
     #     return dict(start=start, end=end)
 
 
+class NetworkMembership(db.Model):
+    """Links networks to the network resources that make them up."""
+
+    __tablename__ = "network_membership"
+
+    network_id = db.Column(
+        db.Integer, db.ForeignKey("network.id", ondelete="CASCADE"), primary_key=True
+    )
+    network_resource_id = db.Column(
+        db.Integer,
+        db.ForeignKey("network_resource.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+
+
+class NetworkSnapshot(db.Model):
+    """A frozen copy of a network, with the parameters of all its resources and assets, identified by its content hash.
+
+    Snapshots are immutable. See the network_snapshots service for how they are made and read.
+    """
+
+    __tablename__ = "network_snapshot"
+
+    hash = db.Column(db.String(64), primary_key=True)
+    network_id = db.Column(
+        db.Integer,
+        db.ForeignKey("network.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    network = db.relationship(
+        "Network",
+        backref=db.backref(
+            "snapshots", lazy="dynamic", cascade="all, delete-orphan", passive_deletes=True
+        ),
+    )
+
+    def __repr__(self):
+        return "<NetworkSnapshot %s of Network %s>" % (self.hash[:12], self.network_id)
+
+
 # def create_network_resource(network_resource_type: str, **kwargs) -> NetworkResource:
 #     """Create a NetworkResource and assigns it an id.
 
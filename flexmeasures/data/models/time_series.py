@@ -6,7 +6,7 @@ import json
 from flask import current_app
 
 import pandas as pd
-from sqlalchemy import select
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.schema import UniqueConstraint
@@ -19,9 +19,15 @@ from flexmeasures.auth.policy import AuthModelMixin
 from flexmeasures.data import db
 from flexmeasures.data.models.parsing_utils import parse_source_arg
 from flexmeasures.data.services.annotations import prepare_annotations_for_chart
+from flexmeasures.data.services.belief_cache import get_belief_cache_key
 from flexmeasures.data.services.timerange import get_timerange
 from flexmeasures.data.queries.utils import get_source_criteria
-from flexmeasures.data.services.time_series import aggregate_values
+from flexmeasures.data.services.time_series import (
+    aggregate_values,
+    beliefs_to_chart_json,
+    downsample_chart_data,
+)
+from flexmeasures.utils.downsampling import DEFAULT_CHART_WIDTH
 from flexmeasures.utils.entity_address_utils import (
     EntityAddressException,
     build_entity_address,
@@ -321,6 +327,9 @@ class Sensor(db.Model, tb.SensorDBMixin, AuthModelMixin):
         one_deterministic_belief_per_event_per_source: bool = False,
         resolution: str | timedelta = None,
         as_json: bool = False,
+        compact: bool = False,
+        downsampling: str | None = None,
+        width: int = DEFAULT_CHART_WIDTH,
     ) -> tb.BeliefsDataFrame | str:
         """Search all beliefs about events for this sensor.
 
@@ -338,6 +347,9 @@ class Sensor(db.Model, tb.SensorDBMixin, AuthModelMixin):
         :param one_deterministic_belief_per_event: only return a single value per event (no probabilistic distribution and only 1 source)
         :param one_deterministic_belief_per_event_per_source: only return a single value per event per source (no probabilistic distribution)
         :param as_json: return beliefs in JSON format (e.g. for use in charts) rather than as BeliefsDataFrame
+        :param compact: if as_json, list the sensor and sources only once, and the beliefs by column (see beliefs_to_chart_json)
+        :param downsampling: if as_json, downsample the beliefs of each source to fit a chart, with "lttb" or "minmax" (see downsample_chart_data)
+        :param width: if downsampling, the chart width in pixels
         :returns: BeliefsDataFrame or JSON string (if as_json is True)
         """
         # todo: deprecate the 'most_recent_only' argument in favor of 'most_recent_beliefs_only' (announced v0.8.0)
@@ -366,9 +378,9 @@ class Sensor(db.Model, tb.SensorDBMixin, AuthModelMixin):
         if as_json:
             df = bdf.reset_index()
             df["sensor"] = self
-            df["sensor"] = df["sensor"].apply(lambda x: x.to_dict())
-            df["source"] = df["source"].apply(lambda x: x.to_dict())
-            return df.to_json(orient="records")
+            if downsampling is not None:
+                df = downsample_chart_data(df, width, downsampling)
+            return beliefs_to_chart_json(df, compact=compact)
         return bdf
 
     def chart(
@@ -579,6 +591,9 @@ class TimedBelief(db.Model, tb.TimedBeliefDBMixin):
     """A timed belief holds a precisely timed record of a belief about an event.
 
     It also records the source of the belief, and the sensor that the event pertains to.
+
+    In migrated databases, the timed_belief table is partitioned by month of event_start
+    (see flexmeasures.data.services.partitions), which is transparent to this model.
     """
 
     @declared_attr
@@ -652,6 +667,7 @@ class TimedBelief(db.Model, tb.TimedBeliefDBMixin):
         """Search all beliefs about events for the given sensors.
 
         If you don't set any filters, you get the most recent beliefs about all events.
+        Search results are cached (see flexmeasures.data.services.belief_cache).
 
         :param sensors: search only these sensors, identified by their instance or id (both unique) or name (non-unique)
         :param event_starts_after: only return beliefs about events that start after this datetime (inclusive)
@@ -677,6 +693,7 @@ class TimedBelief(db.Model, tb.TimedBeliefDBMixin):
            - timely-beliefs converts string resolutions to datetime.timedelta objects (see https://github.com/SeitaBV/timely-beliefs/issues/13).
            - for sensors recording non-instantaneous data: updates both the event frequency and the event resolution
            - for sensors recording instantaneous data: updates only the event frequency (and event resolution remains 0)
+           - the most recent beliefs are read from rollups where possible (see flexmeasures.data.services.rollups)
         """
         # todo: deprecate the 'sensor' argument in favor of 'sensors' (announced v0.8.0)
         sensors = tb_utils.replace_deprecated_argument(
@@ -707,29 +724,119 @@ class TimedBelief(db.Model, tb.TimedBeliefDBMixin):
             sensors.extend(sensors_from_names)
 
         parsed_sources = parse_source_arg(source)
+
+        # Read through the belief cache
+        belief_cache = getattr(current_app, "belief_cache", None)
+        cache_key = None
+        if (
+            belief_cache is not None
+            and belief_cache.enabled
+            and all(isinstance(s, Sensor) for s in sensors)
+        ):
+            cache_key = get_belief_cache_key(
+                sensors=sensors,
+                event_starts_after=event_starts_after,
+                event_ends_before=event_ends_before,
+                beliefs_after=beliefs_after,
+                beliefs_before=beliefs_before,
+                horizons_at_least=horizons_at_least,
+                horizons_at_most=horizons_at_most,
+                sources=parsed_sources,
+                user_source_ids=user_source_ids,
+                source_types=source_types,
+                exclude_source_types=exclude_source_types,
+                most_recent_beliefs_only=most_recent_beliefs_only,
+                most_recent_events_only=most_recent_events_only,
+                one_deterministic_belief_per_event=one_deterministic_belief_per_event,
+                one_deterministic_belief_per_event_per_source=one_deterministic_belief_per_event_per_source,
+                resolution=resolution,
+                sum_multiple=sum_multiple,
+            )
+            cached_result = belief_cache.get(cache_key, sensors)
+            if cached_result is not None:
+                return cached_result
+
         source_criteria = get_source_criteria(
             cls, user_source_ids, source_types, exclude_source_types
         )
         custom_join_targets = [] if parsed_sources else [DataSource]
 
-        bdf_dict = {}
-        for sensor in sensors:
-            bdf = cls.search_session(
-                session=db.session,
-                sensor=sensor,
+        # Fast track, read beliefs at coarse resolutions from rollups
+        rollup_bdfs = {}
+        if (
+            resolution is not None
+            and most_recent_beliefs_only
+            and not most_recent_events_only
+            and beliefs_after is None
+            and beliefs_before is None
+            and horizons_at_least is None
+            and horizons_at_most is None
+        ):
+            from flexmeasures.data.services.rollups import search_rollups
+
+            for sensor in sensors:
+                if not isinstance(sensor, Sensor):
+                    continue
+                bdf = search_rollups(
+                    sensor=sensor,
+                    resolution=resolution,
+                    event_starts_after=event_starts_after,
+                    event_ends_before=event_ends_before,
+                    sources=parsed_sources,
+                    user_source_ids=user_source_ids,
+                    source_types=source_types,
+                    exclude_source_types=exclude_source_types,
+                )
+                if bdf is not None:
+                    rollup_bdfs[sensor] = bdf
+        remaining_sensors = [s for s in sensors if s not in rollup_bdfs]
+
+        if (
+            len(remaining_sensors) > 1
+            and not most_recent_events_only
+            and beliefs_after is None
+            and beliefs_before is None
+        ):
+            # Fast track, one query for all sensors
+            bdfs = cls.search_sensors_in_one_query(
+                sensors=remaining_sensors,
                 # Workaround (1st half) for https://github.com/FlexMeasures/flexmeasures/issues/484
                 event_ends_after=event_starts_after,
                 event_starts_before=event_ends_before,
-                beliefs_after=beliefs_after,
-                beliefs_before=beliefs_before,
                 horizons_at_least=horizons_at_least,
                 horizons_at_most=horizons_at_most,
-                source=parsed_sources,
+                sources=parsed_sources,
                 most_recent_beliefs_only=most_recent_beliefs_only,
-                most_recent_events_only=most_recent_events_only,
                 custom_filter_criteria=source_criteria,
-                custom_join_targets=custom_join_targets,
             )
+        else:
+            bdfs = [
+                cls.search_session(
+                    session=db.session,
+                    sensor=sensor,
+                    # Workaround (1st half) for https://github.com/FlexMeasures/flexmeasures/issues/484
+                    event_ends_after=event_starts_after,
+                    event_starts_before=event_ends_before,
+                    beliefs_after=beliefs_after,
+                    beliefs_before=beliefs_before,
+                    horizons_at_least=horizons_at_least,
+                    horizons_at_most=horizons_at_most,
+                    source=parsed_sources,
+                    most_recent_beliefs_only=most_recent_beliefs_only,
+                    most_recent_events_only=most_recent_events_only,
+                    custom_filter_criteria=source_criteria,
+                    custom_join_targets=custom_join_targets,
+                )
+                for sensor in remaining_sensors
+            ]
+        remaining_bdfs = iter(bdfs)
+        bdfs = [
+            rollup_bdfs[s] if s in rollup_bdfs else next(remaining_bdfs)
+            for s in sensors
+        ]
+
+        bdf_dict = {}
+        for bdf in bdfs:
             if one_deterministic_belief_per_event:
                 # todo: compute median of collective belief instead of median of first belief (update expected test results accordingly)
                 # todo: move to timely-beliefs: select mean/median belief
@@ -761,10 +868,155 @@ class TimedBelief(db.Model, tb.TimedBeliefDBMixin):
                 bdf = bdf[bdf.event_ends <= event_ends_before]
             bdf_dict[bdf.sensor] = bdf
 
-        if sum_multiple:
-            return aggregate_values(bdf_dict)
-        else:
-            return bdf_dict
+        result = aggregate_values(bdf_dict) if sum_multiple else bdf_dict
+        if cache_key is not None:
+            belief_cache.set(
+                cache_key,
+                result,
+                sensors=sensors,
+                # Beliefs about any event may affect which events are the most recent
+                start=event_starts_after if not most_recent_events_only else None,
+                end=event_ends_before if not most_recent_events_only else None,
+            )
+        return result
+
+    @classmethod
+    def search_sensors_in_one_query(
+        cls,
+        sensors: list[Sensor | int],
+        event_ends_after: datetime_type | None = None,
+        event_starts_before: datetime_type | None = None,
+        horizons_at_least: timedelta | None = None,
+        horizons_at_most: timedelta | None = None,
+        sources: list[DataSource] | None = None,
+        most_recent_beliefs_only: bool = True,
+        custom_filter_criteria: list | None = None,
+    ) -> list[tb.BeliefsDataFrame]:
+        """Search beliefs about the events of several sensors in one query, returning one BeliefsDataFrame per sensor.
+
+        Like search_session, but selecting the most recent beliefs (per sensor, event and source) with a window function,
+        rather than in a subquery per sensor. Filters on belief time are not supported,
+        as they depend on the knowledge horizon function of each sensor.
+
+        :param event_ends_after: only return beliefs about events that end after this datetime (exclusive for non-instantaneous events, inclusive for instantaneous events)
+        :param event_starts_before: only return beliefs about events that start before this datetime (exclusive for non-instantaneous events, inclusive for instantaneous events)
+        :param sources: only return beliefs formed by one of these sources
+        :param custom_filter_criteria: additional filters, which may refer to the DataSource (such as those made by get_source_criteria)
+        """
+        sensor_ids = [s for s in sensors if isinstance(s, int)]
+        if sensor_ids:
+            sensors_by_id = {
+                sensor.id: sensor
+                for sensor in db.session.scalars(
+                    select(Sensor).filter(Sensor.id.in_(sensor_ids))
+                ).all()
+            }
+            missing_ids = set(sensor_ids) - set(sensors_by_id)
+            if missing_ids:
+                raise ValueError(f"No such sensor(s): {sorted(missing_ids)}")
+            sensors = [sensors_by_id[s] if isinstance(s, int) else s for s in sensors]
+        if sources == []:
+            return [tb.BeliefsDataFrame(sensor=sensor) for sensor in sensors]
+
+        # Event timing filters depend on the event resolution, so we group sensors by resolution
+        sensors_by_resolution: dict[timedelta, list[int]] = {}
+        for sensor in sensors:
+            sensors_by_resolution.setdefault(sensor.event_resolution, []).append(
+                sensor.id
+            )
+        event_criteria = []
+        for resolution, ids in sensors_by_resolution.items():
+            criteria = [cls.sensor_id.in_(ids)]
+            if event_ends_after is not None:
+                criteria.append(
+                    cls.event_start >= event_ends_after
+                    if resolution == timedelta(0)
+                    else cls.event_start > event_ends_after - resolution
+                )
+            if event_starts_before is not None:
+                criteria.append(
+                    cls.event_start <= event_starts_before
+                    if resolution == timedelta(0)
+                    else cls.event_start < event_starts_before
+                )
+            event_criteria.append(and_(*criteria))
+
+        q = (
+            select(
+                cls.sensor_id,
+                cls.event_start,
+                cls.belief_horizon,
+                cls.source_id,
+                cls.cumulative_probability,
+                cls.event_value,
+            )
+            .join(DataSource, DataSource.id == cls.source_id)
+            .filter(or_(*event_criteria))
+        )
+        if horizons_at_least is not None:
+            q = q.filter(cls.belief_horizon >= horizons_at_least)
+        if horizons_at_most is not None:
+            q = q.filter(cls.belief_horizon <= horizons_at_most)
+        if sources:
+            q = q.filter(cls.source_id.in_([source.id for source in sources]))
+        if custom_filter_criteria:
+            q = q.filter(*custom_filter_criteria)
+        if most_recent_beliefs_only:
+            # Rank (rather than number) the beliefs, to keep all probabilistic values of the most recent belief
+            ranked = q.add_columns(
+                func.rank()
+                .over(
+                    partition_by=(cls.sensor_id, cls.event_start, cls.source_id),
+                    order_by=cls.belief_horizon,
+                )
+                .label("horizon_rank")
+            ).subquery()
+            q = select(
+                ranked.c.sensor_id,
+                ranked.c.event_start,
+                ranked.c.belief_horizon,
+                ranked.c.source_id,
+                ranked.c.cumulative_probability,
+                ranked.c.event_value,
+            ).filter(ranked.c.horizon_rank == 1)
+        df = pd.DataFrame(
+            db.session.execute(q).all(),
+            columns=[
+                "sensor_id",
+                "event_start",
+                "belief_horizon",
+                "source",
+                "cumulative_probability",
+                "event_value",
+            ],
+        )
+
+        source_map = {
+            source.id: source
+            for source in db.session.scalars(
+                select(DataSource).filter(
+                    DataSource.id.in_(df["source"].unique().tolist())
+                )
+            ).all()
+        }
+        df["source"] = df["source"].map(source_map)
+        df["event_start"] = pd.to_datetime(df["event_start"], utc=True)
+        df["belief_horizon"] = pd.to_timedelta(df["belief_horizon"])
+
+        bdfs = []
+        for sensor in sensors:
+            sensor_df = df[df["sensor_id"] == sensor.id].drop(columns="sensor_id")
+            if sensor_df.empty:
+                bdfs.append(tb.BeliefsDataFrame(sensor=sensor))
+                continue
+            bdf = (
+                tb.BeliefsDataFrame(sensor_df, sensor=sensor)
+                .convert_index_from_belief_horizon_to_time()
+                .sort_index()
+            )
+            bdf = bdf.convert_timezone_of_belief_timing_index(sensor.timezone)
+            bdfs.append(bdf.convert_timezone_of_event_timing_index(sensor.timezone))
+        return bdfs
 
     @classmethod
     def add(
@@ -804,3 +1056,63 @@ class TimedBelief(db.Model, tb.TimedBeliefDBMixin):
     def __repr__(self) -> str:
         """timely-beliefs representation of timed beliefs."""
         return tb.TimedBelief.__repr__(self)
+
+
+class TimedBeliefRollup(db.Model):
+    """A rollup aggregates the most recent beliefs of a sensor, from one source, about the events within a time bucket.
+
+    Rollups are maintained for a few coarse resolutions (see FLEXMEASURES_ROLLUP_RESOLUTIONS),
+    so that searching beliefs at such resolutions can skip loading and resampling the underlying beliefs.
+    See flexmeasures.data.services.rollups for how they are maintained and read.
+    """
+
+    __tablename__ = "timed_belief_rollup"
+
+    sensor_id = db.Column(
+        db.Integer, db.ForeignKey("sensor.id", ondelete="CASCADE"), primary_key=True
+    )
+    resolution = db.Column(db.Interval(), primary_key=True)
+    # Start of the time bucket
+    event_start = db.Column(db.DateTime(timezone=True), primary_key=True)
+    source_id = db.Column(
+        db.Integer,
+        db.ForeignKey("data_source.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # Sum and number of the event values within the time bucket, so rollups can be combined into coarser buckets
+    event_value_sum = db.Column(db.Float, nullable=False)
+    event_count = db.Column(db.Integer, nullable=False)
+    # Shortest belief horizon of the beliefs within the time bucket
+    belief_horizon = db.Column(db.Interval(), nullable=False)
+    # Whether any of the beliefs was probabilistic, in which case the rollup cannot stand in for them
+    probabilistic = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __repr__(self) -> str:
+        return f"<TimedBeliefRollup sensor_id={self.sensor_id} source_id={self.source_id} resolution={self.resolution} event_start={self.event_start}>"
+
+
+class TimedBeliefRollupCoverage(db.Model):
+    """A period in which the rollups of a sensor, at some resolution, are known to be complete (for all sources).
+
+    Rollups are only read for searches within such a period, as beliefs may have been saved
+    before rollups were introduced (or by other means), without having been rolled up.
+    Unbounded periods are recorded with a missing start or end.
+    See flexmeasures.data.services.rollups for how coverage is recorded and checked.
+    """
+
+    __tablename__ = "timed_belief_rollup_coverage"
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(
+        db.Integer,
+        db.ForeignKey("sensor.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    resolution = db.Column(db.Interval(), nullable=False)
+    # Start of the first and end of the last time bucket covered
+    covered_since = db.Column(db.DateTime(timezone=True), nullable=True)
+    covered_until = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<TimedBeliefRollupCoverage sensor_id={self.sensor_id} resolution={self.resolution} covered_since={self.covered_since} covered_until={self.covered_until}>"
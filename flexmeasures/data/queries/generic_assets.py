@@ -9,6 +9,10 @@ from flexmeasures.auth.policy import user_has_admin_access
 
 from flexmeasures.data.models.generic_assets import GenericAsset, GenericAssetType
 from flexmeasures.data.models.user import Account
+from flexmeasures.data.queries.locations import (
+    filter_by_bounding_box,
+    order_by_proximity,
+)
 from flexmeasures.data.queries.utils import potentially_limit_assets_query_to_account
 from flexmeasures.utils.flexmeasures_inflection import pluralize
 
@@ -38,6 +42,44 @@ def query_assets_by_type(
     return query
 
 
+def query_assets_by_proximity(
+    latitude: float,
+    longitude: float,
+    generic_asset_type_name: str | None = None,
+    account_id: int | None = None,
+) -> Select:
+    """Order assets by proximity to the target (closest first), using the spatial index on their location.
+
+    Assets without a location are left out. Add a limit to get the k nearest assets.
+
+    :param account_id: Pass in an account ID if you want to query an account other than your own. This only works for admins. Public assets are always queried.
+    """
+    query = select(GenericAsset)
+    if generic_asset_type_name is not None:
+        query = query.join(GenericAssetType).filter(
+            GenericAssetType.name == generic_asset_type_name
+        )
+    query = order_by_proximity(query, GenericAsset, latitude, longitude)
+    return potentially_limit_assets_query_to_account(query, account_id)
+
+
+def query_assets_in_bounding_box(
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    account_id: int | None = None,
+) -> Select:
+    """Look up assets located within a bounding box (e.g. the visible part of a map), using the index on their location.
+
+    :param account_id: Pass in an account ID if you want to query an account other than your own. This only works for admins. Public assets are always queried.
+    """
+    query = filter_by_bounding_box(
+        select(GenericAsset), GenericAsset, south, west, north, east
+    )
+    return potentially_limit_assets_query_to_account(query, account_id)
+
+
 def get_location_queries(
     account_id: int | None = None,
 ) -> dict[str, Select[tuple[GenericAsset]]]:
@@ -0,0 +1,92 @@
+"""
+Spatial queries on models with a location (latitude and longitude columns), such as assets and network resources.
+
+These use the indexes on such models (see add_location_indexes):
+- a GiST index on ll_to_earth(latitude, longitude), for k-nearest and radius queries
+- a B-tree index on (latitude, longitude), for bounding box queries
+
+Requires the following Postgres extensions: earthdistance and cube.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import Select, and_, func, or_
+
+from flexmeasures.data import db
+
+
+def add_location_indexes(model: type[db.Model]):
+    """Index the location of a model, to be called right after defining the model."""
+    table_name = model.__tablename__
+    db.Index(
+        f"{table_name}_location_idx",
+        location_expression(model),
+        postgresql_using="gist",
+    )
+    db.Index(
+        f"{table_name}_latitude_longitude_idx",
+        model.latitude,
+        model.longitude,
+    )
+
+
+def location_expression(model: type[db.Model]):
+    """The (indexed) location of a model as a point on Earth, in the cube-based earth type."""
+    return func.ll_to_earth(model.latitude, model.longitude)
+
+
+def order_by_proximity(
+    query: Select, model: type[db.Model], latitude: float, longitude: float
+) -> Select:
+    """Order by proximity to the target (closest first), leaving out rows without a location.
+
+    Ordering by the (straight-line) distance between points in the earth type gives the same order as ordering by
+    great circle distance, and lets Postgres walk the GiST index, so k-nearest queries (with a limit) stay fast for many rows.
+    """
+    target = func.ll_to_earth(latitude, longitude)
+    return query.filter(
+        model.latitude.isnot(None), model.longitude.isnot(None)
+    ).order_by(location_expression(model).op("<->")(target))
+
+
+def filter_by_radius(
+    query: Select,
+    model: type[db.Model],
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+) -> Select:
+    """Keep rows within a great circle distance of the target."""
+    target = func.ll_to_earth(latitude, longitude)
+    radius_m = radius_km * 1000
+    return query.filter(
+        # The earth box lets Postgres use the GiST index, but also contains some points that lie just outside the radius
+        func.earth_box(target, radius_m).op("@>")(location_expression(model)),
+        func.earth_distance(target, location_expression(model)) <= radius_m,
+    )
+
+
+def filter_by_bounding_box(
+    query: Select,
+    model: type[db.Model],
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+) -> Select:
+    """Keep rows within a bounding box (e.g. the visible part of a map).
+
+    If west > east, the box crosses the antimeridian.
+    """
+    if south > north:
+        raise ValueError(
+            f"Invalid bounding box: south ({south}) lies north of north ({north})."
+        )
+    within_longitudes = (
+        and_(model.longitude >= west, model.longitude <= east)
+        if west <= east
+        else or_(model.longitude >= west, model.longitude <= east)
+    )
+    return query.filter(
+        model.latitude >= south, model.latitude <= north, within_longitudes
+    )
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from sqlalchemy import select, Select
+
+from flexmeasures.data.models.network_resources import (
+    NETWORK_RESOURCE_TYPE_IDS,
+    NetworkResource,
+)
+from flexmeasures.data.queries.locations import (
+    filter_by_bounding_box,
+    order_by_proximity,
+)
+
+
+def query_network_resources_by_proximity(
+    latitude: float,
+    longitude: float,
+    kind: str | None = None,
+    account_id: int | None = None,
+) -> Select:
+    """Order network resources by proximity to the target (closest first), using the spatial index on their location.
+
+    Resources without a location are left out. Add a limit to get the k nearest resources.
+
+    :param kind:        only look up resources of this kind (e.g. "bus")
+    :param account_id:  only look up resources of this account
+    """
+    query = _filter_network_resources(select(NetworkResource), kind, account_id)
+    return order_by_proximity(query, NetworkResource, latitude, longitude)
+
+
+def query_network_resources_in_bounding_box(
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    kind: str | None = None,
+    account_id: int | None = None,
+) -> Select:
+    """Look up network resources located within a bounding box, using the index on their location."""
+    query = _filter_network_resources(select(NetworkResource), kind, account_id)
+    return filter_by_bounding_box(query, NetworkResource, south, west, north, east)
+
+
+def _filter_network_resources(
+    query: Select, kind: str | None, account_id: int | None
+) -> Select:
+    if kind is not None:
+        query = query.filter(
+            NetworkResource.network_resource_type_id == NETWORK_RESOURCE_TYPE_IDS[kind]
+        )
+    if account_id is not None:
+        query = query.filter(NetworkResource.account_id == account_id)
+    return query
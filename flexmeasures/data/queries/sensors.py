@@ -3,6 +3,10 @@ from __future__ import annotations
 from sqlalchemy.sql import Select, select
 
 from flexmeasures.data.models.generic_assets import GenericAsset, GenericAssetType
+from flexmeasures.data.queries.locations import (
+    filter_by_bounding_box,
+    order_by_proximity,
+)
 from flexmeasures.data.queries.utils import potentially_limit_assets_query_to_account
 
 
@@ -41,7 +45,10 @@ def query_sensors_by_proximity(
     sensor_name: str | None,
     account_id: int | None = None,
 ) -> Select:
-    """Order them by proximity of their asset's location to the target."""
+    """Order them by proximity of their asset's location to the target (using the spatial index on asset locations).
+
+    Sensors of assets without a location are left out.
+    """
     from flexmeasures.data.models.time_series import Sensor
 
     closest_sensor_query = (
@@ -58,10 +65,28 @@ def query_sensors_by_proximity(
         )
     if sensor_name is not None:
         closest_sensor_query = closest_sensor_query.filter(Sensor.name == sensor_name)
-    closest_sensor_query = closest_sensor_query.order_by(
-        GenericAsset.great_circle_distance(lat=latitude, lng=longitude).asc()
+    closest_sensor_query = order_by_proximity(
+        closest_sensor_query, GenericAsset, latitude, longitude
     )
     closest_sensor_query = potentially_limit_assets_query_to_account(
         closest_sensor_query, account_id
     )
     return closest_sensor_query
+
+
+def query_sensors_in_bounding_box(
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    sensor_name: str | None = None,
+    account_id: int | None = None,
+) -> Select:
+    """Look up sensors whose asset lies within a bounding box (using the index on asset locations)."""
+    from flexmeasures.data.models.time_series import Sensor
+
+    query = select(Sensor).join(GenericAsset)
+    if sensor_name is not None:
+        query = query.filter(Sensor.name == sensor_name)
+    query = filter_by_bounding_box(query, GenericAsset, south, west, north, east)
+    return potentially_limit_assets_query_to_account(query, account_id)
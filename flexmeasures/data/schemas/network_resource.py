@@ -9,6 +9,7 @@ from sqlalchemy import select
 from flexmeasures.data import ma, db
 from flexmeasures.data.models.user import Account
 from flexmeasures.data.models.network_resources import NetworkResource, NetworkResourceType
+from flexmeasures.data.schemas.locations import LatitudeField, LongitudeField
 from flexmeasures.data.schemas.utils import (
     FMValidationError,
     MarshmallowClickMixin,
@@ -37,6 +38,8 @@ class NetworkResourceSchema(ma.SQLAlchemySchema):
 
     id = ma.auto_field(dump_only=True)
     name = fields.Str(required=True)
+    latitude = LatitudeField(allow_none=True)
+    longitude = LongitudeField(allow_none=True)
     account_id = ma.auto_field()
     network_resource_type_id = fields.Integer(required=True)
     attributes = JSON(required=False)
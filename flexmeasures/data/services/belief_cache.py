@@ -0,0 +1,388 @@
+"""
+Logic around caching the results of belief searches in Redis.
+
+Identical searches (e.g. by the dashboard, the chart data endpoints and services re-querying the same sensor windows)
+are served from the cache, until either:
+- beliefs are saved (with save_to_db) or deleted (with the CLI) about events within the searched window of one of the searched sensors, or
+- the cached result expires (see FLEXMEASURES_BELIEF_CACHE_TTL).
+
+Cached results are invalidated as soon as beliefs are saved, and once more when the transaction ends,
+so that results cached while the transaction was still open (and possibly rolled back) do not linger.
+
+The following Redis keys are used:
+- belief-cache:entry:<hash>: a cached search result
+- belief-cache:sensor:<id>: the keys of cached results about a sensor, mapped to their searched window (for invalidation)
+- belief-cache:entries: the keys of cached results, scored by the time of caching (for evicting the oldest results)
+- belief-cache:sizes and belief-cache:size: the size of each cached result, and their total size (for capping memory use)
+- belief-cache:hits and belief-cache:misses: counters
+
+Saving or deleting beliefs also bumps the version of the beliefs of each affected sensor (whether or not caching is enabled),
+which, together with its modification time, identifies the state of its beliefs (see get_belief_versions):
+- belief-version:sensor:<id>: the version of the beliefs of a sensor, and the time they were last modified
+- belief-version:all: the same, for modifications affecting all sensors
+- belief-version:epoch: a random token, which changes if Redis loses the versions, so versions are never reused
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+import hashlib
+import json
+import math
+import time
+import uuid
+
+from flask import current_app, has_app_context
+import msgpack
+import pandas as pd
+import redis
+from redis.exceptions import RedisError
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+import timely_beliefs as tb
+
+from flexmeasures.data import db
+from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.utils.msgpack_utils import pack_frame, unpack_frame
+
+
+PREFIX = "belief-cache"
+VERSION_PREFIX = "belief-version"
+
+
+def get_belief_cache_key(**search_parameters) -> str:
+    """Key of a cached search result, given the parameters of the search.
+
+    Sensors and sources are identified by their ID, datetimes and timedeltas by their ISO format.
+    """
+
+    def to_json(obj):
+        if isinstance(obj, (list, tuple)):
+            return [to_json(o) for o in obj]
+        if hasattr(obj, "id"):
+            return obj.id
+        if isinstance(obj, datetime):
+            return pd.Timestamp(obj).tz_convert("UTC").isoformat()
+        if isinstance(obj, timedelta):
+            return pd.Timedelta(obj).isoformat()
+        return obj
+
+    content = json.dumps(
+        {k: to_json(v) for k, v in sorted(search_parameters.items())}, default=str
+    )
+    return f"{PREFIX}:entry:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+class BeliefCache:
+    """
+    Class is used for caching the results of belief searches in Redis, and invalidating them.
+    Results are cached as DataFrames packed with MessagePack (see serialize_search_result), with sources referenced by their ID.
+    Any Redis errors are logged, and treated as cache misses, as are cached results that cannot be read.
+    """
+
+    def __init__(self, connection: redis.Redis):
+        self.connection = connection
+
+    @property
+    def ttl(self) -> int:
+        return current_app.config.get("FLEXMEASURES_BELIEF_CACHE_TTL", 0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(
+        self, key: str, sensors: list
+    ) -> tb.BeliefsDataFrame | dict[object, tb.BeliefsDataFrame] | None:
+        """Get a cached search result, or None in case of a cache miss.
+
+        :param sensors: the searched sensors, to which the cached beliefs are assigned
+        """
+        if not self.enabled:
+            return None
+        try:
+            data = self.connection.get(key)
+            self.connection.incr(f"{PREFIX}:{'misses' if data is None else 'hits'}")
+        except RedisError as e:
+            current_app.logger.warning(f"Could not read from the belief cache: {e}")
+            return None
+        if data is None:
+            return None
+        try:
+            return deserialize_search_result(data, sensors)
+        except (ValueError, KeyError, TypeError) as e:
+            current_app.logger.warning(f"Could not read from the belief cache: {e}")
+            return None
+
+    def set(
+        self,
+        key: str,
+        result: tb.BeliefsDataFrame | dict[object, tb.BeliefsDataFrame],
+        sensors: list,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ):
+        """Cache a search result about the given sensors and window (None meaning unbounded)."""
+        if not self.enabled:
+            return
+        try:
+            data = serialize_search_result(result)
+        except TypeError:
+            # Holds values that cannot be packed
+            return
+        if len(data) > current_app.config.get(
+            "FLEXMEASURES_BELIEF_CACHE_MAX_ENTRY_SIZE", 0
+        ):
+            return
+        window = f"{_to_epoch(start, -math.inf)},{_to_epoch(end, math.inf)}"
+        try:
+            pipeline = self.connection.pipeline()
+            pipeline.set(key, data, ex=self.ttl)
+            for sensor in sensors:
+                pipeline.hset(f"{PREFIX}:sensor:{sensor.id}", key, window)
+                pipeline.expire(f"{PREFIX}:sensor:{sensor.id}", self.ttl)
+            pipeline.zadd(f"{PREFIX}:entries", {key: time.time()})
+            pipeline.hset(f"{PREFIX}:sizes", key, len(data))
+            pipeline.incrby(f"{PREFIX}:size", len(data))
+            pipeline.execute()
+            self._evict()
+        except RedisError as e:
+            current_app.logger.warning(f"Could not write to the belief cache: {e}")
+
+    def invalidate(
+        self,
+        sensor_ids: list[int] | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ):
+        """Remove cached results about the given sensors, whose window overlaps with the given period.
+
+        :param sensor_ids:  IDs of the sensors with new or deleted beliefs, or None to remove all cached results
+        :param start:       start of the period with new or deleted beliefs (None meaning unbounded)
+        :param end:         end of the period with new or deleted beliefs (None meaning unbounded)
+        """
+        try:
+            if sensor_ids is None:
+                self._remove(
+                    [
+                        key.decode()
+                        for key in self.connection.zrange(f"{PREFIX}:entries", 0, -1)
+                    ]
+                )
+                return
+            start = _to_epoch(start, -math.inf)
+            end = _to_epoch(end, math.inf)
+            for sensor_id in sensor_ids:
+                keys = []
+                for key, window in self.connection.hgetall(
+                    f"{PREFIX}:sensor:{sensor_id}"
+                ).items():
+                    cached_start, cached_end = map(float, window.decode().split(","))
+                    if start <= cached_end and end >= cached_start:
+                        keys.append(key.decode())
+                if keys:
+                    self.connection.hdel(f"{PREFIX}:sensor:{sensor_id}", *keys)
+                    self._remove(keys)
+        except RedisError as e:
+            current_app.logger.warning(f"Could not invalidate the belief cache: {e}")
+
+    def get_stats(self) -> dict[str, int]:
+        """Hit and miss counts, and the number and total size (in bytes) of cached results."""
+        hits, misses, size = self.connection.mget(
+            f"{PREFIX}:hits", f"{PREFIX}:misses", f"{PREFIX}:size"
+        )
+        return dict(
+            hits=int(hits or 0),
+            misses=int(misses or 0),
+            entries=self.connection.zcard(f"{PREFIX}:entries"),
+            size=int(size or 0),
+        )
+
+    def _remove(self, keys: list[str]):
+        """Remove cached results, and update the bookkeeping of their sizes."""
+        if not keys:
+            return
+        sizes = self.connection.hmget(f"{PREFIX}:sizes", keys)
+        pipeline = self.connection.pipeline()
+        pipeline.delete(*keys)
+        pipeline.zrem(f"{PREFIX}:entries", *keys)
+        pipeline.hdel(f"{PREFIX}:sizes", *keys)
+        pipeline.decrby(f"{PREFIX}:size", sum(int(size or 0) for size in sizes))
+        pipeline.execute()
+
+    def _evict(self):
+        """Remove the oldest cached results while their total size exceeds FLEXMEASURES_BELIEF_CACHE_MAX_SIZE.
+
+        Expired results are evicted first, as they are the oldest.
+        """
+        max_size = current_app.config.get("FLEXMEASURES_BELIEF_CACHE_MAX_SIZE", 0)
+        while int(self.connection.get(f"{PREFIX}:size") or 0) > max_size:
+            oldest = self.connection.zrange(f"{PREFIX}:entries", 0, 0)
+            if not oldest:
+                # Nothing left to evict, so the bookkeeping was off
+                self.connection.set(f"{PREFIX}:size", 0)
+                break
+            self._remove([oldest[0].decode()])
+
+
+def invalidate_cached_beliefs(
+    sensor_ids: list[int] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """Invalidate cached search results about new or deleted beliefs, now and again when the transaction ends.
+
+    The versions of the beliefs of the given sensors are bumped, too (see bump_belief_versions).
+    See BeliefCache.invalidate for the parameters.
+    """
+    belief_cache: BeliefCache | None = getattr(current_app, "belief_cache", None)
+    if belief_cache is None:
+        return
+    bump_belief_versions(belief_cache.connection, sensor_ids)
+    if belief_cache.enabled:
+        belief_cache.invalidate(sensor_ids, start, end)
+    db.session.info.setdefault("belief_cache_invalidations", []).append(
+        (sensor_ids, start, end)
+    )
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_at_end_of_transaction(session: Session):
+    invalidations = session.info.pop("belief_cache_invalidations", [])
+    if not invalidations or not has_app_context():
+        return
+    belief_cache: BeliefCache | None = getattr(current_app, "belief_cache", None)
+    if belief_cache is None:
+        return
+    for sensor_ids, start, end in invalidations:
+        bump_belief_versions(belief_cache.connection, sensor_ids)
+        if belief_cache.enabled:
+            belief_cache.invalidate(sensor_ids, start, end)
+
+
+def bump_belief_versions(connection: redis.Redis, sensor_ids: list[int] | None = None):
+    """Bump the versions of the beliefs of the given sensors (or of all sensors), and record the time of modification.
+
+    Like cached results, versions are bumped when beliefs are saved or deleted, and once more when the transaction ends,
+    so that versions handed out while the transaction was still open do not linger.
+    """
+    keys = (
+        [f"{VERSION_PREFIX}:all"]
+        if sensor_ids is None
+        else [f"{VERSION_PREFIX}:sensor:{sensor_id}" for sensor_id in sensor_ids]
+    )
+    try:
+        pipeline = connection.pipeline()
+        for key in keys:
+            pipeline.hincrby(key, "version", 1)
+            pipeline.hset(key, "modified", time.time())
+        pipeline.execute()
+    except RedisError as e:
+        current_app.logger.warning(f"Could not bump belief versions: {e}")
+
+
+def get_belief_versions(
+    connection: redis.Redis, sensor_ids: list[int]
+) -> tuple[list, float] | None:
+    """Versions of the beliefs of the given sensors, and the time (as a Unix timestamp) they were last modified.
+
+    Sensors whose beliefs were not modified since versions were kept are considered modified as of now.
+
+    :returns: the versions (including the epoch and the version of all sensors) and the modification time,
+              or None if the versions could not be read
+    """
+    keys = [f"{VERSION_PREFIX}:all"] + [
+        f"{VERSION_PREFIX}:sensor:{sensor_id}" for sensor_id in sensor_ids
+    ]
+    try:
+        now = time.time()
+        pipeline = connection.pipeline()
+        pipeline.setnx(f"{VERSION_PREFIX}:epoch", uuid.uuid4().hex)
+        pipeline.get(f"{VERSION_PREFIX}:epoch")
+        for key in keys:
+            pipeline.hsetnx(key, "modified", now)
+            pipeline.hmget(key, "version", "modified")
+        results = pipeline.execute()
+    except RedisError as e:
+        current_app.logger.warning(f"Could not read belief versions: {e}")
+        return None
+    epoch = results[1].decode()
+    versions = [int(version or 0) for version, _ in results[3::2]]
+    last_modified = max(float(modified) for _, modified in results[3::2])
+    return [epoch] + versions, last_modified
+
+
+def serialize_search_result(
+    result: tb.BeliefsDataFrame | dict[object, tb.BeliefsDataFrame]
+) -> bytes:
+    """Serialize the BeliefsDataFrame(s) found by a search, referencing sensors and sources by their ID.
+
+    Frames are packed column by column with MessagePack (see pack_frame), so reading them cannot execute code.
+
+    :raises TypeError: if the beliefs hold values that cannot be packed
+    """
+    bdfs = list(result.values()) if isinstance(result, dict) else [result]
+    frames = []
+    for bdf in bdfs:
+        df = pd.DataFrame(bdf.reset_index())
+        df["source"] = df["source"].map(lambda source: source.id).astype(int)
+        frames.append(
+            dict(
+                sensor_id=bdf.sensor.id if bdf.sensor is not None else None,
+                event_resolution=pd.Timedelta(bdf.event_resolution).value
+                if bdf.event_resolution is not None
+                else None,
+                columns=pack_frame(df),
+            )
+        )
+    return msgpack.packb(dict(is_dict=isinstance(result, dict), frames=frames))
+
+
+def deserialize_search_result(
+    data: bytes, sensors: list
+) -> tb.BeliefsDataFrame | dict[object, tb.BeliefsDataFrame]:
+    """Deserialize the BeliefsDataFrame(s) found by a search, assigning the given sensors and loading sources.
+
+    :raises ValueError: if the data is not a packed search result
+    """
+    content = msgpack.unpackb(data)
+    sensors_by_id = {sensor.id: sensor for sensor in sensors}
+    frames = [
+        (
+            frame["sensor_id"],
+            pd.Timedelta(frame["event_resolution"]).to_pytimedelta()
+            if frame["event_resolution"] is not None
+            else None,
+            unpack_frame(frame["columns"]),
+        )
+        for frame in content["frames"]
+    ]
+    source_ids = set()
+    for _, _, df in frames:
+        source_ids.update(df["source"].unique().tolist())
+    sources_by_id = {
+        source.id: source
+        for source in db.session.scalars(
+            select(DataSource).filter(DataSource.id.in_(source_ids))
+        ).all()
+    }
+    bdfs = []
+    for sensor_id, event_resolution, df in frames:
+        sensor = sensors_by_id.get(sensor_id)
+        if df.empty:
+            bdfs.append(
+                tb.BeliefsDataFrame(sensor=sensor, event_resolution=event_resolution)
+            )
+            continue
+        df["source"] = df["source"].map(sources_by_id)
+        bdfs.append(
+            tb.BeliefsDataFrame(df, sensor=sensor, event_resolution=event_resolution)
+        )
+    if content["is_dict"]:
+        return {bdf.sensor: bdf for bdf in bdfs}
+    return bdfs[0]
+
+
+def _to_epoch(moment: datetime | None, default: float) -> float:
+    return pd.Timestamp(moment).timestamp() if moment is not None else default
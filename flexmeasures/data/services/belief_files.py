@@ -0,0 +1,311 @@
+"""
+Logic around exporting beliefs to, and importing them from, columnar files in Parquet or Arrow IPC format.
+
+Both directions stream beliefs in chunks of bounded size, so moving years of data between environments
+takes no more memory than one chunk: exports read with a server-side cursor, and imports save each chunk with COPY.
+Imports do not commit, so the caller decides on the transaction (e.g. one per chunk).
+
+Files hold one row per belief, with columns sensor_id, event_start, belief_horizon, cumulative_probability,
+event_value and source_id. The schema metadata describes the exported sensors and sources,
+such that sources can be matched (or created) by name, type, model and version in another database.
+
+Requires pyarrow, which is an optional dependency.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+import json
+import os
+from typing import Iterator
+
+import pandas as pd
+from sqlalchemy import select
+import timely_beliefs as tb
+
+from flexmeasures.data import db
+from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.data.models.time_series import Sensor, TimedBelief
+from flexmeasures.data.utils import get_data_source, save_to_db
+
+
+BELIEF_FILE_FORMATS = dict(parquet="Parquet", arrow="Arrow IPC")
+BELIEF_FILE_COLUMNS = [
+    "sensor_id",
+    "event_start",
+    "belief_horizon",
+    "cumulative_probability",
+    "event_value",
+    "source_id",
+]
+METADATA_KEY = b"flexmeasures"
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def import_pyarrow():
+    """Import pyarrow, which is only needed for reading and writing belief files.
+
+    :raises ImportError: if pyarrow is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa F401
+    except ImportError as e:
+        raise ImportError(
+            "Reading and writing Parquet or Arrow files requires pyarrow (pip install pyarrow)."
+        ) from e
+    return pyarrow
+
+
+def get_belief_file_format(path: str, file_format: str | None = None) -> str:
+    """For example, "parquet" for "beliefs.parquet".
+
+    :raises ValueError: for unsupported formats or file extensions
+    """
+    if file_format is None:
+        file_format = os.path.splitext(path)[1].lstrip(".").lower()
+        file_format = dict(feather="arrow", ipc="arrow").get(file_format, file_format)
+    if file_format not in BELIEF_FILE_FORMATS:
+        raise ValueError(
+            f"Unsupported belief file {path}. Supported formats: {', '.join(BELIEF_FILE_FORMATS)}."
+        )
+    return file_format
+
+
+def export_beliefs(
+    path: str,
+    sensors: list[Sensor],
+    file_format: str | None = None,
+    event_starts_after: datetime | None = None,
+    event_ends_before: datetime | None = None,
+    source_ids: list[int] | None = None,
+    source_types: list[str] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """Export all beliefs about the given sensors (optionally, within a time window and from given sources) to a file.
+
+    :returns: the number of exported beliefs
+    """
+    pa = import_pyarrow()
+    file_format = get_belief_file_format(path, file_format)
+
+    query = (
+        select(*(getattr(TimedBelief, column) for column in BELIEF_FILE_COLUMNS))
+        .join(Sensor, Sensor.id == TimedBelief.sensor_id)
+        .join(DataSource, DataSource.id == TimedBelief.source_id)
+        .filter(TimedBelief.sensor_id.in_([sensor.id for sensor in sensors]))
+    )
+    if event_starts_after is not None:
+        query = query.filter(TimedBelief.event_start >= event_starts_after)
+    if event_ends_before is not None:
+        query = query.filter(
+            TimedBelief.event_start + Sensor.event_resolution <= event_ends_before
+        )
+    if source_ids:
+        query = query.filter(TimedBelief.source_id.in_(source_ids))
+    if source_types:
+        query = query.filter(DataSource.type.in_(source_types))
+
+    sources = db.session.scalars(
+        select(DataSource).filter(
+            DataSource.id.in_(
+                query.with_only_columns(TimedBelief.source_id).distinct().subquery()
+            )
+        )
+    ).all()
+    schema = pa.schema(
+        [
+            ("sensor_id", pa.int64()),
+            ("event_start", pa.timestamp("us", tz="UTC")),
+            ("belief_horizon", pa.duration("us")),
+            ("cumulative_probability", pa.float64()),
+            ("event_value", pa.float64()),
+            ("source_id", pa.int64()),
+        ],
+        metadata={
+            METADATA_KEY: json.dumps(
+                dict(
+                    sensors={
+                        sensor.id: dict(
+                            name=sensor.name,
+                            unit=sensor.unit,
+                            event_resolution=pd.Timedelta(
+                                sensor.event_resolution
+                            ).isoformat(),
+                            timezone=sensor.timezone,
+                        )
+                        for sensor in sensors
+                    },
+                    sources={
+                        source.id: dict(
+                            name=source.name,
+                            type=source.type,
+                            model=source.model,
+                            version=source.version,
+                        )
+                        for source in sources
+                    },
+                )
+            ).encode()
+        },
+    )
+
+    if file_format == "parquet":
+        writer = pa.parquet.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+
+    # Stream rows with a server-side cursor, rather than loading them all at once
+    result = db.session.execute(
+        query.order_by(TimedBelief.sensor_id, TimedBelief.event_start),
+        execution_options=dict(yield_per=chunk_size),
+    )
+    n_beliefs = 0
+    with writer:
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            batch = pa.RecordBatch.from_arrays(
+                [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(columns, schema)
+                ],
+                schema=schema,
+            )
+            if file_format == "parquet":
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            n_beliefs += len(rows)
+    return n_beliefs
+
+
+def import_beliefs(
+    path: str,
+    file_format: str | None = None,
+    sensor: Sensor | None = None,
+    source: DataSource | None = None,
+    allow_overwrite: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[int]:
+    """Import beliefs from a file, one chunk at a time.
+
+    By default, beliefs are recorded under the sensors with the same IDs as in the file,
+    and under sources that match those described in the file (which are created if needed).
+
+    Sensors are checked against their description in the file, so that beliefs from another environment
+    do not silently end up under an unrelated sensor that happens to have the same ID:
+    the name, unit and resolution should match (the name is not checked for a given sensor).
+
+    :param sensor:  record all beliefs under this sensor instead (the file should then contain beliefs about one sensor only)
+    :param source:  record all beliefs under this source instead
+    :returns:       an iterator yielding the number of beliefs saved in each chunk (the caller can commit in between)
+    :raises ValueError: in case the file refers to unknown or undescribed sensors, to sensors that do not match their description,
+                        or to multiple sensors while a sensor was given
+    """
+    pa = import_pyarrow()
+    file_format = get_belief_file_format(path, file_format)
+
+    if file_format == "parquet":
+        parquet_file = pa.parquet.ParquetFile(path)
+        schema = parquet_file.schema_arrow
+        batches = parquet_file.iter_batches(
+            batch_size=chunk_size, columns=BELIEF_FILE_COLUMNS
+        )
+    else:
+        # Memory-map the file, so only the batch being read is loaded
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        schema = reader.schema
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    metadata = json.loads((schema.metadata or {}).get(METADATA_KEY, b"{}"))
+    sensor_descriptions = metadata.get("sensors", {})
+    source_descriptions = metadata.get("sources", {})
+
+    sensors_by_id: dict[int, Sensor] = {}
+    sources_by_id: dict[int, DataSource] = {}
+    for batch in batches:
+        df = batch.to_pandas()
+        for sensor_id in df["sensor_id"].unique():
+            if sensor_id in sensors_by_id:
+                continue
+            if sensor is not None:
+                if sensors_by_id:
+                    raise ValueError(
+                        f"File {path} contains beliefs about multiple sensors, so they cannot all be recorded under sensor {sensor.id}."
+                    )
+                check_sensor_description(
+                    path, sensor, sensor_descriptions.get(str(sensor_id)), sensor_id
+                )
+                sensors_by_id[sensor_id] = sensor
+                continue
+            sensors_by_id[sensor_id] = db.session.get(Sensor, int(sensor_id))
+            if sensors_by_id[sensor_id] is None:
+                raise ValueError(
+                    f"File {path} contains beliefs about unknown sensor {sensor_id}."
+                )
+            description = sensor_descriptions.get(str(sensor_id))
+            if description is None:
+                raise ValueError(f"File {path} does not describe sensor {sensor_id}.")
+            check_sensor_description(
+                path, sensors_by_id[sensor_id], description, sensor_id, check_name=True
+            )
+        for source_id in df["source_id"].unique():
+            if source_id in sources_by_id:
+                continue
+            if source is not None:
+                sources_by_id[source_id] = source
+                continue
+            description = source_descriptions.get(str(source_id))
+            if description is None:
+                raise ValueError(f"File {path} does not describe source {source_id}.")
+            sources_by_id[source_id] = get_data_source(
+                description["name"],
+                data_source_model=description["model"],
+                data_source_version=description["version"],
+                data_source_type=description["type"],
+            )
+
+        df["source"] = df["source_id"].map(sources_by_id)
+        n_beliefs = 0
+        for sensor_id, sensor_df in df.groupby("sensor_id"):
+            bdf = tb.BeliefsDataFrame(
+                sensor_df.drop(columns=["sensor_id", "source_id"]),
+                sensor=sensors_by_id[sensor_id],
+            )
+            save_to_db(
+                bdf,
+                save_changed_beliefs_only=False,
+                use_copy=True,
+                allow_overwrite=allow_overwrite,
+            )
+            n_beliefs += len(bdf)
+        yield n_beliefs
+
+
+def check_sensor_description(
+    path: str,
+    sensor: Sensor,
+    description: dict | None,
+    sensor_id: int,
+    check_name: bool = False,
+):
+    """Check whether a sensor matches the description of a sensor in a belief file (if the file describes it).
+
+    :raises ValueError: if the unit, resolution or (optionally) name differ
+    """
+    if description is None:
+        return
+    mismatches = []
+    if check_name and description.get("name") != sensor.name:
+        mismatches.append(f"name '{description.get('name')}' vs. '{sensor.name}'")
+    if description.get("unit") != sensor.unit:
+        mismatches.append(f"unit '{description.get('unit')}' vs. '{sensor.unit}'")
+    if "event_resolution" in description and pd.Timedelta(
+        description["event_resolution"]
+    ) != pd.Timedelta(sensor.event_resolution):
+        mismatches.append(
+            f"resolution {description['event_resolution']} vs. {pd.Timedelta(sensor.event_resolution).isoformat()}"
+        )
+    if mismatches:
+        raise ValueError(
+            f"File {path} describes sensor {sensor_id} differently from sensor {sensor.id} ({', '.join(mismatches)})."
+        )
@@ -1,12 +1,14 @@
+from __future__ import annotations
+
 from ast import List
 from datetime import datetime, timedelta
 from json import load
 
 import click
 import numpy as np
+import pandas as pd
 import cvxpy as cp
 from numpy import single, source
-from flexmeasures.data.models.network_resources import NetworkResource
 from rq import get_current_job
 import pandapower as pp
 import timely_beliefs as tb
@@ -14,8 +16,22 @@ import timely_beliefs as tb
 from flexmeasures.data import db
 from flexmeasures.data.models.planning.storage import StorageScheduler
 from flexmeasures.data.models.generic_assets import GenericAsset
+from flexmeasures.data.models.networks import Network
 from flexmeasures.data.models.time_series import Sensor, TimedBelief
 from flexmeasures.data.models.planning.utils import initialize_series
+from flexmeasures.data.services.job_progress import report_progress
+from flexmeasures.data.services.networks import get_network_tables
+from flexmeasures.data.services.network_topology import (
+    NetworkTopology,
+    validate_topology,
+)
+from flexmeasures.data.services.nodal_prices import (
+    get_prices_at_elements,
+    get_stored_nodal_prices,
+    read_nodal_prices,
+    save_nodal_prices,
+    stack_nodal_prices,
+)
 from flexmeasures.data.utils import get_data_source, save_to_db
 from flexmeasures.utils.time_utils import server_now
 from pandas.tseries.frequencies import to_offset
@@ -33,12 +49,28 @@ def eflex_flexibility(
     resolution: timedelta,
     belief_time: datetime,
     flex_config_has_been_deserialized: bool = False,
+    horizon: int | None = None,
+    horizon_step: int = 1,
+    network_id: int | None = None,
+    use_stored_prices: bool = False,
 ) -> bool:
     """
     This function computes a load scheduling. It returns True if it ran successfully.
 
+    By default, each step is optimised on its own (myopically), carrying only the state of charge forward.
+    Pass a horizon to switch to a receding-horizon (MPC) mode instead: each window of `horizon` steps is optimised
+    with coupled states of charge, and only its first `horizon_step` steps are committed before the window moves on.
+
     This is what this function does:
     - Turn results values into beliefs and save them to db
+
+    The nodal prices come from one OPF per step. If a network_id is given, they are stored as price sensors per bus,
+    and with use_stored_prices they are looked up from there instead, which skips the OPF runs altogether.
+
+    :param horizon:             number of steps in each optimisation window (None for the myopic step-by-step mode)
+    :param horizon_step:        number of steps committed from each window before it recedes
+    :param network_id:          network whose nodal prices to store (or look up)
+    :param use_stored_prices:   if True, use the stored nodal prices of the network rather than running an OPF per step
     """
 
     
@@ -77,48 +109,53 @@ def eflex_flexibility(
                 gen_data[asset_name] = {"Active Power": active_power}
                 
 
-    h, sc, hoc, oc, tc, flexibility_results, p_bat, bat_socs, dump = [], [], [], [], [], [], [], [], []
-    for K in range(len(next(iter(load_data.values()))["Active Power"])):
-        print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! DEBUGGING SESSION !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-        # h.append(K), sc.append(solar_curve[K]), hoc.append(house_curve[K]), oc.append(office_curve[K]), tc.append(total_curve[K])
-        
-        # Getting the load at hour h
-        L_max = []
-        for index, bus in network.load.iterrows():
-            L_max.append(load_data[list(load_data.keys())[index]]['Active Power'][K])
-            network.load.loc[network.load['bus'] == network.load['bus'][index], 'p_mw'] =   load_data[list(load_data.keys())[index]]['Active Power'][K]
-
-        gen = []
-        for index, bus in network.gen.iterrows():
-            gen.append(gen_data[list(gen_data.keys())[index]]['Active Power'][K])
-            network.gen.loc[network.gen['bus'] == network.gen['bus'][index], 'p_mw'] =       gen_data[list(gen_data.keys())[index]]['Active Power'][K]
-            network.gen.loc[network.gen['bus'] == network.gen['bus'][index], 'min_p_mw'] =   gen_data[list(gen_data.keys())[index]]['Active Power'][K]
-            network.gen.loc[network.gen['bus'] == network.gen['bus'][index], 'max_p_mw'] =   gen_data[list(gen_data.keys())[index]]['Active Power'][K]
-
-        pp.runopp(network, verbose=False)
-
-        prices_load, prices_battery = [], []
-        batteries = {}
-        for load in network.load.index:
-            prices_load.append(network.res_bus.at[network.load.at[load, 'bus'], 'lam_p'])
-        for bt in network.storage.index:
-            prices_battery.append(network.res_bus.at[network.storage.at[bt, 'bus'], 'lam_p'])
-            batteries[f'Battery {bt}'] = {'bf_min': network.storage.at[bt, 'min_p_mw'], 
-                                        'bf_max': network.storage.at[bt, 'max_p_mw'],
-                                        'soc_min': network.storage.at[bt, 'min_e_mwh'] * 100 / network.storage.at[bt, 'max_e_mwh'], 
-                                        'soc_max': network.storage.at[bt, 'max_e_mwh'] * 100 * 0.9 / network.storage.at[bt, 'max_e_mwh'],
-                                        'soc_now': network.storage.at[bt, 'soc_percent'], 
-                                        'e_nom': network.storage.at[bt, 'max_e_mwh']}
-        dt = 1
-        l_flex, batc_flex, batd_flex, soc_flex, dump_flex = flexibility(L_max, np.array(prices_load), gen, np.array(prices_battery), batteries, dt)
-        
-        for i, bt in enumerate(network.storage.index):
-            network.storage.at[bt, 'soc_percent'] = soc_flex[i]
-        
-        p_bat.append(batc_flex - batd_flex)
-        bat_socs.append(soc_flex)
-        dump.append(dump_flex)
-        flexibility_results.append(l_flex)
+    if use_stored_prices and network_id is None:
+        raise ValueError("Using stored nodal prices requires a network_id.")
+    network_record = db.session.get(Network, network_id) if network_id is not None else None
+    if use_stored_prices:
+        nodal_prices = get_stored_nodal_prices(network_record, list(buses), start, end, resolution)
+    else:
+        nodal_prices = discover_nodal_prices(network, load_data, gen_data, start, resolution)
+        if network_record is not None:
+            save_nodal_prices(network_record, nodal_prices, belief_time)
+
+    if horizon is not None:
+        p_bat, bat_socs, dump, flexibility_results = rolling_horizon_flexibility(
+            network,
+            load_data,
+            gen_data,
+            nodal_prices["lam_p"],
+            horizon=horizon,
+            horizon_step=horizon_step,
+            delta_t=resolution / timedelta(hours=1),
+        )
+    else:
+        p_bat, bat_socs, dump, flexibility_results = [], [], [], []
+        n_steps = len(next(iter(load_data.values()))["Active Power"])
+        dt = resolution / timedelta(hours=1)
+        for K in range(n_steps):
+            # Getting the load and generation at hour h
+            L_max, gen = set_network_state_at(network, load_data, gen_data, K)
+
+            prices_load, prices_battery = get_nodal_prices(network, nodal_prices["lam_p"].iloc[K])
+            batteries = get_battery_parameters(network)
+            l_flex, batc_flex, batd_flex, soc_flex, dump_flex = flexibility(L_max, prices_load, gen, prices_battery, batteries, dt)
+
+            for i, bt in enumerate(network.storage.index):
+                network.storage.at[bt, 'soc_percent'] = soc_flex[i]
+
+            p_bat.append(batc_flex - batd_flex)
+            bat_socs.append(soc_flex)
+            dump.append(dump_flex)
+            flexibility_results.append(l_flex)
+            report_progress(
+                K + 1,
+                n_steps,
+                f"Step {K + 1} of {n_steps}",
+                partial_result=dict(
+                    step=K, battery_power=p_bat[-1], soc=soc_flex, flexibility=l_flex
+                ),
+            )
 
     # Transform p_bat into a list of lists
     p_bat = [list(v) for v in zip(*p_bat)]
@@ -212,25 +249,29 @@ def eflex_flexibility(
 
 
 def build_network(network, buses, lines, external_grid, battery, transformers, shunts, pvs):
+    # Load all network resources with their parameters in one query
+    tables = get_network_tables(
+        resource_ids=list(buses) + list(lines) + list(transformers) + list(shunts)
+    )
+
+    # Fail fast on networks the OPF cannot solve
+    validate_topology(
+        NetworkTopology.from_tables(tables),
+        slack_buses=[
+            GenericAsset.query.get(a).get_attribute("bus")
+            for a in list(external_grid) + list(pvs)
+        ],
+    )
+
     # Create buses in the network
-    for bus in buses:
-        vn = NetworkResource.query.get(bus).get_attribute("vn_kv")
-        vmin = NetworkResource.query.get(bus).get_attribute("min_vm_pu")
-        vmax = NetworkResource.query.get(bus).get_attribute("max_vm_pu")
-        pp.create_bus(network, index=bus, vn_kv=vn, max_vm_pu=vmax, min_vm_pu=vmin, zone=1)
+    for bus in tables["bus"].loc[list(buses)].itertuples():
+        pp.create_bus(network, index=bus.Index, vn_kv=bus.vn_kv, max_vm_pu=bus.max_vm_pu, min_vm_pu=bus.min_vm_pu, zone=1)
 
 
     # Create lines in the network
-    for line in lines:
-        fbus = NetworkResource.query.get(line).get_attribute("from_bus")
-        tbus = NetworkResource.query.get(line).get_attribute("to_bus")
-        length = NetworkResource.query.get(line).get_attribute("length_km")
-        r = NetworkResource.query.get(line).get_attribute("r_ohm_per_km")
-        x = NetworkResource.query.get(line).get_attribute("x_ohm_per_km")
-        c = NetworkResource.query.get(line).get_attribute("c_nf_per_km")
-        max_i = NetworkResource.query.get(line).get_attribute("max_i_ka")
-        pp.create_line_from_parameters(network, from_bus=fbus, to_bus=tbus, length_km=length, r_ohm_per_km=r, 
-                                       x_ohm_per_km=x, c_nf_per_km=c, max_i_ka=max_i, type="None")
+    for line in tables["line"].loc[list(lines)].itertuples():
+        pp.create_line_from_parameters(network, from_bus=int(line.from_bus), to_bus=int(line.to_bus), length_km=line.length_km, r_ohm_per_km=line.r_ohm_per_km, 
+                                       x_ohm_per_km=line.x_ohm_per_km, c_nf_per_km=line.c_nf_per_km, max_i_ka=line.max_i_ka, type="None")
 
 
     # Create loads in the network
@@ -283,28 +324,15 @@ def build_network(network, buses, lines, external_grid, battery, transformers, s
 
 
     # Create transformers in the network
-    for transformer in transformers:
-        hv_bus = NetworkResource.query.get(transformer).get_attribute("hv_bus")
-        lv_bus = NetworkResource.query.get(transformer).get_attribute("lv_bus")
-        sn = NetworkResource.query.get(transformer).get_attribute("sn_mva")
-        vn_hv = NetworkResource.query.get(transformer).get_attribute("vn_hv_kv")
-        vn_lv = NetworkResource.query.get(transformer).get_attribute("vn_lv_kv")
-        vk_percent = NetworkResource.query.get(transformer).get_attribute("vk_percent")
-        vkr_percent = NetworkResource.query.get(transformer).get_attribute("vkr_percent")
-        pfe_kw = NetworkResource.query.get(transformer).get_attribute("pfe_kw")
-        i0_percent = NetworkResource.query.get(transformer).get_attribute("i0_percent")
-        pp.create_transformer_from_parameters(network, hv_bus=hv_bus, lv_bus=lv_bus, sn_mva=sn, vn_hv_kv=vn_hv, 
-                                              vn_lv_kv=vn_lv, vk_percent=vk_percent, vkr_percent=vkr_percent, 
-                                              pfe_kw=pfe_kw, i0_percent=i0_percent)
+    for trafo in tables["transformer"].loc[list(transformers)].itertuples():
+        pp.create_transformer_from_parameters(network, hv_bus=int(trafo.hv_bus), lv_bus=int(trafo.lv_bus), sn_mva=trafo.sn_mva, vn_hv_kv=trafo.vn_hv_kv, 
+                                              vn_lv_kv=trafo.vn_lv_kv, vk_percent=trafo.vk_percent, vkr_percent=trafo.vkr_percent, 
+                                              pfe_kw=trafo.pfe_kw, i0_percent=trafo.i0_percent)
 
 
     # Create shunts in the network
-    for shunt in shunts:
-        bus = NetworkResource.query.get(shunt).get_attribute("bus")
-        q = NetworkResource.query.get(shunt).get_attribute("q_mvar")
-        p = NetworkResource.query.get(shunt).get_attribute("p_mw")
-        vn = NetworkResource.query.get(shunt).get_attribute("vn_kv")
-        pp.create_shunt(network, bus=bus, q_mvar=q, p_mw=p, vn_kv=vn)
+    for shunt in tables["shunt"].loc[list(shunts)].itertuples():
+        pp.create_shunt(network, bus=int(shunt.bus), q_mvar=shunt.q_mvar, p_mw=shunt.p_mw, vn_kv=shunt.vn_kv)
 
 
     for pv in pvs:
@@ -313,6 +341,198 @@ def build_network(network, buses, lines, external_grid, battery, transformers, s
 
     return network
 
+def set_network_state_at(network, load_data, gen_data, K):
+    """Set the load and (fixed) generation of the network to their values at step K.
+
+    Returns the maximum load and the generation at step K, ordered like the network's load and gen tables.
+    """
+    L_max = []
+    for index, bus in network.load.iterrows():
+        L_max.append(load_data[list(load_data.keys())[index]]['Active Power'][K])
+        network.load.loc[network.load['bus'] == network.load['bus'][index], 'p_mw'] =   load_data[list(load_data.keys())[index]]['Active Power'][K]
+
+    gen = []
+    for index, bus in network.gen.iterrows():
+        gen.append(gen_data[list(gen_data.keys())[index]]['Active Power'][K])
+        network.gen.loc[network.gen['bus'] == network.gen['bus'][index], 'p_mw'] =       gen_data[list(gen_data.keys())[index]]['Active Power'][K]
+        network.gen.loc[network.gen['bus'] == network.gen['bus'][index], 'min_p_mw'] =   gen_data[list(gen_data.keys())[index]]['Active Power'][K]
+        network.gen.loc[network.gen['bus'] == network.gen['bus'][index], 'max_p_mw'] =   gen_data[list(gen_data.keys())[index]]['Active Power'][K]
+    return L_max, gen
+
+
+def discover_nodal_prices(network, load_data, gen_data, start: datetime, resolution: timedelta) -> dict[str, pd.DataFrame]:
+    """Run one OPF per step to find the nodal prices (they do not depend on the batteries' state of charge)."""
+    steps = []
+    for K in range(len(next(iter(load_data.values()))["Active Power"])):
+        set_network_state_at(network, load_data, gen_data, K)
+        pp.runopp(network, verbose=False)
+        steps.append(read_nodal_prices(network))
+    return stack_nodal_prices(steps, start, resolution)
+
+
+def get_nodal_prices(network, bus_prices: pd.Series):
+    """Nodal active power prices at the buses of the loads and of the batteries, given the prices per bus."""
+    prices_load = get_prices_at_elements(bus_prices, network.load['bus'])
+    prices_battery = get_prices_at_elements(bus_prices, network.storage['bus'])
+    return prices_load, prices_battery
+
+
+def get_battery_parameters(network) -> dict:
+    """Battery limits and current state of charge, as used by the flexibility LPs."""
+    batteries = {}
+    for bt in network.storage.index:
+        batteries[f'Battery {bt}'] = {'bf_min': network.storage.at[bt, 'min_p_mw'],
+                                    'bf_max': network.storage.at[bt, 'max_p_mw'],
+                                    'soc_min': network.storage.at[bt, 'min_e_mwh'] * 100 / network.storage.at[bt, 'max_e_mwh'],
+                                    'soc_max': network.storage.at[bt, 'max_e_mwh'] * 100 * 0.9 / network.storage.at[bt, 'max_e_mwh'],
+                                    'soc_now': network.storage.at[bt, 'soc_percent'],
+                                    'e_nom': network.storage.at[bt, 'max_e_mwh']}
+    return batteries
+
+
+def rolling_horizon_flexibility(network, load_data, gen_data, bus_prices: pd.DataFrame, horizon: int, horizon_step: int = 1, delta_t: float = 1):
+    """Receding-horizon (MPC) variant of the step-by-step flexibility loop.
+
+    Given the nodal prices per step and bus (see discover_nodal_prices),
+    one LP per window optimises `horizon` steps at once, coupled through the batteries' state of charge.
+    Only the first `horizon_step` steps of each window are committed, and their final state of charge seeds the next window.
+    Windows that reach beyond the last step hold the last known loads, generation and prices.
+
+    Returns per-step lists of battery power, battery SoC (in %), dumped energy and flexible load,
+    in the same layout as the myopic loop in eflex_flexibility.
+    """
+    if horizon < 1 or not 1 <= horizon_step <= horizon:
+        raise ValueError(f"Expected 1 <= horizon_step <= horizon, got horizon={horizon} and horizon_step={horizon_step}.")
+    T = len(next(iter(load_data.values()))["Active Power"])
+
+    L_max, gen, prices_load, prices_battery = [], [], [], []
+    for K in range(T):
+        l_max_K, gen_K = set_network_state_at(network, load_data, gen_data, K)
+        pl_K, pb_K = get_nodal_prices(network, bus_prices.iloc[K])
+        L_max.append(l_max_K), gen.append(gen_K), prices_load.append(pl_K), prices_battery.append(pb_K)
+    L_max, prices_load, prices_battery = np.array(L_max), np.array(prices_load), np.array(prices_battery)
+    gen_total = np.array([np.sum(g) for g in gen])
+
+    batteries = get_battery_parameters(network)
+    window = FlexibilityWindow(horizon, L_max.shape[1], batteries, delta_t)
+    soc_now = np.array([battery['soc_now'] for battery in batteries.values()], dtype=float)
+
+    p_bat, bat_socs, dump, flexibility_results = [], [], [], []
+    for k in range(0, T, horizon_step):
+        steps = np.minimum(np.arange(k, k + horizon), T - 1)
+        ell, bf_cha, bf_dis, soc, dumped = window.solve(
+            L_max[steps], prices_load[steps], gen_total[steps], prices_battery[steps], soc_now
+        )
+        n_commit = min(horizon_step, T - k)
+        for j in range(n_commit):
+            p_bat.append(bf_cha[j] - bf_dis[j])
+            bat_socs.append(soc[j])
+            dump.append(dumped[j])
+            flexibility_results.append(ell[j])
+        soc_now = soc[n_commit - 1]
+        report_progress(
+            k + n_commit,
+            T,
+            f"Step {k + n_commit} of {T}",
+            partial_result=dict(
+                step=k,
+                battery_power=p_bat[-n_commit:],
+                soc=bat_socs[-n_commit:],
+                flexibility=flexibility_results[-n_commit:],
+            ),
+        )
+
+    for i, bt in enumerate(network.storage.index):
+        network.storage.at[bt, 'soc_percent'] = soc_now[i]
+    return p_bat, bat_socs, dump, flexibility_results
+
+
+class FlexibilityWindow:
+    """Multi-step version of the flexibility LP, built once and re-solved for every window.
+
+    All time-varying data enter as cvxpy Parameters, so consecutive windows only update parameter values
+    and the solver is warm-started from the previous window's solution.
+    """
+
+    def __init__(self, horizon: int, n_loads: int, batteries: dict, delta_t: float = 1):
+        H, n, m = horizon, n_loads, len(batteries)
+        e_nom = np.array([battery['e_nom'] for battery in batteries.values()], dtype=float)
+        self.e_nom = e_nom
+
+        # Parameters (time-varying inputs, updated for each window)
+        self.ell_max = cp.Parameter((H, n), nonneg=True)
+        self.load_cost = cp.Parameter((H, n))
+        self.g = cp.Parameter(H)
+        self.charge_cost = cp.Parameter((H, m))
+        self.discharge_cost = cp.Parameter((H, m))
+        self.dump_cost = cp.Parameter((H, m))
+        self.e_start = cp.Parameter((H, m))
+
+        # Decision variables
+        self.ell = cp.Variable((H, n))
+        self.bf_cha = cp.Variable((H, m))
+        self.bf_dis = cp.Variable((H, m))
+        self.ebat = cp.Variable((H, m))
+        self.dumped = cp.Variable((H, m))
+
+        # Same objective as the single-step LP, summed over the window (load shedding enters through load_cost)
+        objective = cp.Minimize(
+            cp.sum(cp.multiply(self.load_cost, self.ell))
+            + cp.sum(cp.multiply(self.charge_cost, self.bf_cha))
+            + cp.sum(cp.multiply(self.discharge_cost, self.bf_dis))
+            + cp.sum(cp.multiply(self.dump_cost, self.dumped))
+        )
+
+        bf_max = np.array([battery['bf_max'] for battery in batteries.values()], dtype=float)
+        bf_min = np.array([battery['bf_min'] for battery in batteries.values()], dtype=float)
+        e_min = np.array([battery['e_nom'] * battery['soc_min'] / 100 for battery in batteries.values()], dtype=float)
+        e_max = np.array([battery['e_nom'] * battery['soc_max'] / 100 for battery in batteries.values()], dtype=float)
+        constraints = [
+            # Power balance at every step
+            self.g + cp.sum(self.bf_dis, axis=1) == cp.sum(self.ell, axis=1) + cp.sum(self.bf_cha, axis=1) + cp.sum(self.dumped, axis=1),
+            self.ell >= 0,
+            self.ell <= self.ell_max,
+            self.bf_cha >= 0,
+            self.bf_cha <= np.tile(bf_max, (H, 1)),
+            self.bf_dis >= 0,
+            self.bf_dis <= np.tile(-bf_min, (H, 1)),
+            # State of charge coupling over the window
+            self.ebat == self.e_start + cp.cumsum((self.bf_cha - self.bf_dis) * delta_t, axis=0),
+            self.ebat >= np.tile(e_min, (H, 1)),
+            self.ebat <= np.tile(e_max, (H, 1)),
+            self.dumped >= 0,
+        ]
+        self.problem = cp.Problem(objective, constraints)
+
+    def solve(self, ell_max, prices_load, g_total, prices_battery, soc_now):
+        """Solve the window for the given (H, ...) inputs and the current state of charge (in %).
+
+        Returns the flexible load, charging power, discharging power, state of charge (in %) and dumped energy per step.
+        """
+        price_scale = max(np.max(prices_load), np.max(prices_battery))
+        a1, a2, a3 = 50 * price_scale, 40 * price_scale, 1 * price_scale
+        H = ell_max.shape[0]
+
+        self.ell_max.value = np.asarray(ell_max, dtype=float)
+        self.load_cost.value = np.asarray(prices_load, dtype=float) - a1
+        self.g.value = np.asarray(g_total, dtype=float)
+        self.charge_cost.value = a3 * np.asarray(prices_battery, dtype=float)
+        self.discharge_cost.value = np.asarray(prices_battery, dtype=float)
+        self.dump_cost.value = a2 * np.asarray(prices_battery, dtype=float)
+        self.e_start.value = np.tile(self.e_nom * np.asarray(soc_now, dtype=float) / 100, (H, 1))
+
+        self.problem.solve(warm_start=True)
+        if self.problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+            raise ValueError(f"Flexibility window could not be solved: {self.problem.status}")
+        return (
+            self.ell.value,
+            self.bf_cha.value,
+            self.bf_dis.value,
+            self.ebat.value / self.e_nom * 100,
+            self.dumped.value,
+        )
+
+
 # import cvxpy as cp
 # import numpy as np
 # import matplotlib.pyplot as plt
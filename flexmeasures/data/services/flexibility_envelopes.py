@@ -0,0 +1,286 @@
+"""
+Logic around computing and storing flexibility envelopes: how much the power at each bus
+(and in the network as a whole) can still be moved up or down, given the stored schedules.
+
+An upward envelope is the room to increase net injection (shedding load, charging less or discharging more),
+a downward envelope is the room to decrease it (restoring load, charging more or discharging less).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import timely_beliefs as tb
+
+from flexmeasures.data import db
+from flexmeasures.data.models.generic_assets import GenericAsset
+from flexmeasures.data.models.networks import Network
+from flexmeasures.data.models.time_series import Sensor, TimedBelief
+from flexmeasures.data.services.networks import (
+    find_network_asset,
+    get_assets_on_buses,
+    get_network_resource_ids,
+    get_or_create_network_asset,
+    get_sensor_with_unit,
+    search_values,
+)
+from flexmeasures.data.services.utils import get_or_create_model
+from flexmeasures.data.utils import get_data_source, save_to_db
+from flexmeasures.utils.time_utils import server_now
+
+
+ENVELOPE_ASSET_KIND = "flexibility envelope"
+ENVELOPE_DIRECTIONS = ("upward", "downward")
+ENVELOPE_UNIT = "MW"
+
+# Source of the measured (inflexible) load, and of the schedules computed by eflex_flexibility
+BASELINE_SOURCE = "thesis"
+SCHEDULE_SOURCE = "scheduler"
+
+
+def compute_flexibility_envelopes(
+    network: Network,
+    start: datetime,
+    end: datetime,
+    resolution: timedelta,
+) -> dict[str, pd.DataFrame]:
+    """Compute the upward and downward flexibility envelopes of each bus in the network.
+
+    This uses the stored baseline loads and the stored schedules (from eflex_flexibility) only,
+    so no optimisation is run. Assets without a stored schedule count as unscheduled,
+    i.e. loads at their baseline and batteries idling at their configured state of charge.
+
+    :returns: dict with one frame per direction, indexed by event start, with a column per bus id
+    """
+    index = pd.date_range(
+        start, end, freq=resolution, inclusive="left", name="event_start"
+    )
+    bus_ids = get_network_resource_ids(network)["bus"]
+    assets = get_assets_on_buses(bus_ids)
+    loads, batteries = assets["load"], assets["battery"]
+    dt = resolution / timedelta(hours=1)
+
+    load_sensors = [get_sensor_with_unit(load, "W") for load in loads]
+    ell_max = search_values(load_sensors, index, BASELINE_SOURCE, fill_value=0)
+    ell = search_values(load_sensors, index, SCHEDULE_SOURCE)
+    load_up, load_down = load_envelope(np.where(np.isnan(ell), ell_max, ell), ell_max)
+
+    p_bat = search_values(
+        [get_sensor_with_unit(bat, "W") for bat in batteries],
+        index,
+        SCHEDULE_SOURCE,
+        fill_value=0,
+    )
+    soc_after = search_values(
+        [get_sensor_with_unit(bat, "%") for bat in batteries], index, SCHEDULE_SOURCE
+    )
+    soc_now = np.array(
+        [bat.get_attribute("soc_percent", 0) for bat in batteries], dtype=float
+    )
+    e_nom = np.array([bat.get_attribute("max_e_mwh") for bat in batteries], dtype=float)
+    bat_up, bat_down = battery_envelope(
+        p_bat,
+        soc_start=soc_at_step_start(soc_after, soc_now),
+        e_nom=e_nom,
+        e_min=np.array(
+            [bat.get_attribute("min_e_mwh") for bat in batteries], dtype=float
+        ),
+        e_max=0.9 * e_nom,
+        p_min=np.array(
+            [bat.get_attribute("min_p_mw") for bat in batteries], dtype=float
+        ),
+        p_max=np.array(
+            [bat.get_attribute("max_p_mw") for bat in batteries], dtype=float
+        ),
+        delta_t=dt,
+    )
+
+    asset_buses = [asset.get_attribute("bus") for asset in loads + batteries]
+    return {
+        direction: pd.DataFrame(
+            aggregate_per_bus(np.hstack(values), asset_buses, bus_ids),
+            index=index,
+            columns=bus_ids,
+        )
+        for direction, values in zip(
+            ENVELOPE_DIRECTIONS, ((load_up, bat_up), (load_down, bat_down))
+        )
+    }
+
+
+def load_envelope(
+    ell: np.ndarray, ell_max: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Envelopes of loads that can be shed between zero and their baseline (as in the flexibility LP).
+
+    :param ell:     scheduled loads, with shape (steps, loads)
+    :param ell_max: baseline loads, with shape (steps, loads)
+    """
+    return np.clip(ell, 0, None), np.clip(ell_max - ell, 0, None)
+
+
+def battery_envelope(
+    p: np.ndarray,
+    soc_start: np.ndarray,
+    e_nom: np.ndarray,
+    e_min: np.ndarray,
+    e_max: np.ndarray,
+    p_min: np.ndarray,
+    p_max: np.ndarray,
+    delta_t: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Envelopes of batteries, limited both by their power rating and by the energy left in each step.
+
+    :param p:           scheduled battery power (positive for charging), with shape (steps, batteries)
+    :param soc_start:   state of charge (in %) at the start of each step, with shape (steps, batteries)
+    :param e_nom:       nominal energy content (in MWh), per battery
+    :param e_min:       minimum energy content (in MWh), per battery
+    :param e_max:       maximum energy content (in MWh), per battery
+    :param p_min:       maximum discharging power (negative, in MW), per battery
+    :param p_max:       maximum charging power (in MW), per battery
+    :param delta_t:     step length in hours
+    """
+    e = soc_start / 100 * e_nom
+    max_discharge = np.minimum(-p_min, (e - e_min) / delta_t)
+    max_charge = np.minimum(p_max, (e_max - e) / delta_t)
+    return np.clip(p + max_discharge, 0, None), np.clip(max_charge - p, 0, None)
+
+
+def soc_at_step_start(soc_after: np.ndarray, soc_now: np.ndarray) -> np.ndarray:
+    """Shift stored states of charge (recorded at the end of each step) to the start of each step.
+
+    Steps without a stored state of charge hold the last known one, starting from soc_now.
+    """
+    soc = pd.DataFrame(np.vstack([soc_now[np.newaxis, :], soc_after[:-1]]))
+    return soc.ffill().to_numpy()
+
+
+def aggregate_per_bus(
+    values: np.ndarray, asset_buses: list[int], bus_ids: list[int]
+) -> np.ndarray:
+    """Sum asset values (with shape (steps, assets)) per bus, to an array with shape (steps, buses)."""
+    incidence = np.zeros((len(asset_buses), len(bus_ids)))
+    column = {bus_id: j for j, bus_id in enumerate(bus_ids)}
+    for i, bus in enumerate(asset_buses):
+        incidence[i, column[bus]] = 1
+    return values @ incidence
+
+
+def get_envelope_asset(network: Network) -> GenericAsset:
+    """Get (or create) the asset holding the flexibility envelope sensors of a network."""
+    return get_or_create_network_asset(
+        network,
+        ENVELOPE_ASSET_KIND,
+        description="Holds the upward and downward flexibility envelopes of a network.",
+    )
+
+
+def get_envelope_sensor_name(direction: str, bus_id: int | None = None) -> str:
+    """For example, "bus 3 upward flexibility", or "upward flexibility" for the network as a whole."""
+    if bus_id is None:
+        return f"{direction} flexibility"
+    return f"bus {bus_id} {direction} flexibility"
+
+
+def get_envelope_sensors(
+    network: Network, resolution: timedelta
+) -> dict[tuple[str, int | None], Sensor]:
+    """Get (or create) the envelope sensors of a network, keyed by (direction, bus id or None for the network)."""
+    asset = get_envelope_asset(network)
+    bus_ids = get_network_resource_ids(network)["bus"]
+    sensors = {}
+    for direction in ENVELOPE_DIRECTIONS:
+        for bus_id in [None] + bus_ids:
+            sensors[(direction, bus_id)] = get_or_create_model(
+                Sensor,
+                name=get_envelope_sensor_name(direction, bus_id),
+                generic_asset=asset,
+                unit=ENVELOPE_UNIT,
+                event_resolution=resolution,
+            )
+    db.session.flush()
+    return sensors
+
+
+def save_flexibility_envelopes(
+    network: Network,
+    envelopes: dict[str, pd.DataFrame],
+    resolution: timedelta,
+    belief_time: datetime | None = None,
+) -> str:
+    """Save the envelopes per bus, and their sum for the network, in one bulk write.
+
+    Does not commit, like save_to_db.
+    """
+    sensors = get_envelope_sensors(network, resolution)
+    data_source = get_data_source(
+        data_source_name="flexibility envelopes", data_source_type="reporter"
+    )
+    belief_time = belief_time or server_now()
+    bdfs = []
+    for direction, df in envelopes.items():
+        columns = [(None, df.sum(axis=1))] + [
+            (bus_id, df[bus_id]) for bus_id in df.columns
+        ]
+        for bus_id, s in columns:
+            bdfs.append(
+                tb.BeliefsDataFrame(
+                    s.rename("event_value"),
+                    sensor=sensors[(direction, bus_id)],
+                    source=data_source,
+                    belief_time=belief_time,
+                )
+            )
+    return save_to_db(bdfs, bulk_save_objects=True)
+
+
+def eflex_flexibility_envelopes(
+    network: Network,
+    start: datetime,
+    end: datetime,
+    resolution: timedelta,
+    belief_time: datetime | None = None,
+) -> dict[str, pd.DataFrame]:
+    """Compute and store the flexibility envelopes of a network. Returns the envelopes per bus."""
+    envelopes = compute_flexibility_envelopes(network, start, end, resolution)
+    save_flexibility_envelopes(network, envelopes, resolution, belief_time)
+    db.session.commit()
+    return envelopes
+
+
+def get_stored_flexibility_envelopes(
+    network: Network, start: datetime, end: datetime
+) -> dict[str, dict[int | None, pd.Series]] | None:
+    """Read back stored envelopes, keyed by direction and then by bus id (None for the network as a whole).
+
+    Returns None if no envelopes were ever computed for this network.
+    """
+    asset = find_network_asset(network, ENVELOPE_ASSET_KIND)
+    if asset is None:
+        return None
+    sensors_by_name = {sensor.name: sensor for sensor in asset.sensors}
+    keys = {}
+    for direction in ENVELOPE_DIRECTIONS:
+        for bus_id in [None] + get_network_resource_ids(network)["bus"]:
+            name = get_envelope_sensor_name(direction, bus_id)
+            if name in sensors_by_name:
+                keys[sensors_by_name[name]] = (direction, bus_id)
+    bdf_dict = TimedBelief.search(
+        list(keys),
+        event_starts_after=start,
+        event_ends_before=end,
+        most_recent_beliefs_only=True,
+        one_deterministic_belief_per_event=True,
+        sum_multiple=False,
+    )
+    envelopes: dict[str, dict[int | None, pd.Series]] = {
+        direction: {} for direction in ENVELOPE_DIRECTIONS
+    }
+    for sensor, bdf in bdf_dict.items():
+        direction, bus_id = keys[sensor]
+        envelopes[direction][bus_id] = bdf.reset_index().set_index("event_start")[
+            "event_value"
+        ]
+    return envelopes
@@ -0,0 +1,163 @@
+"""
+Logic around reporting the progress of running jobs, and following it live.
+
+Long-running network jobs (load scheduling, OPF/PF and flexibility) report their progress per time step or per iteration,
+optionally with partial results, using report_progress. Each update is published on a Redis channel of its own job,
+and the latest update is also kept under a key (with a TTL), so clients subscribing late still start from the current state.
+Clients follow the updates as Server-Sent Events (see iter_progress_events), rather than polling the job status.
+
+Outside of a job (e.g. when a service is called from the CLI), reporting progress does nothing.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import json
+import time
+from typing import Any, Callable, Iterator
+
+from flask import current_app
+from redis import Redis
+from rq import get_current_job
+from rq.job import Job, JobStatus
+
+from flexmeasures.utils.time_utils import server_now
+
+
+PROGRESS_KEY_PREFIX = "job-progress"
+PROGRESS_TTL = timedelta(days=1)
+END_STATUSES = (
+    JobStatus.FINISHED,
+    JobStatus.FAILED,
+    JobStatus.STOPPED,
+    JobStatus.CANCELED,
+)
+
+
+def get_progress_key(job_id: str) -> str:
+    """Name of both the channel and the key holding the latest update, e.g. "job-progress:<job_id>"."""
+    return f"{PROGRESS_KEY_PREFIX}:{job_id}"
+
+
+def enqueue_network_job(
+    func: Callable, network_id: int, kwargs: dict, queue: str = "scheduling"
+) -> Job:
+    """Enqueue a job calling a network service (like eflex_load_scheduling) with the given kwargs,
+    whose progress clients can follow.
+
+    The network is noted in the job meta data, so that only users who can read the network can follow the job.
+    """
+    return current_app.queues[queue].enqueue(
+        func,
+        kwargs=kwargs,
+        ttl=int(
+            current_app.config.get(
+                "FLEXMEASURES_JOB_TTL", timedelta(-1)
+            ).total_seconds()
+        ),
+        job_timeout=-1,  # no timeout, as network services can take hours
+        meta=dict(network_id=network_id),
+    )
+
+
+def _to_json(obj: Any):
+    """Serialize numpy arrays and scalars (which partial results often consist of), and anything else as a string."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def report_progress(
+    step: int,
+    total: int | None = None,
+    message: str | None = None,
+    partial_result: Any = None,
+    job: Job | None = None,
+) -> dict | None:
+    """Report the progress of the current job, e.g. after each time step or iteration.
+
+    :param step:            number of steps (or iterations) done so far
+    :param total:           total number of steps, if known (e.g. not for iterations that may converge early)
+    :param message:         human-readable description of the step
+    :param partial_result:  result of the step, which clients can show while the job continues (should be serializable to JSON)
+    :param job:             the job to report on, by default the current job
+    :returns:               the reported update, or None outside of a job
+    """
+    job = job or get_current_job()
+    if job is None:
+        return None
+    update = dict(
+        job_id=job.id,
+        step=step,
+        total=total,
+        message=message,
+        partial_result=partial_result,
+        reported_at=server_now().isoformat(),
+    )
+    data = json.dumps(update, default=_to_json)
+    key = get_progress_key(job.id)
+    pipeline = job.connection.pipeline()
+    pipeline.set(key, data, ex=PROGRESS_TTL)
+    pipeline.publish(key, data)
+    pipeline.execute()
+    return update
+
+
+def get_latest_progress(job_id: str, connection: Redis) -> dict | None:
+    """The latest update reported by the job, if any (and not expired)."""
+    data = connection.get(get_progress_key(job_id))
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+def format_event(event: str, data: str | bytes) -> str:
+    """Format a Server-Sent Event (the data should not span multiple lines, which holds for compact JSON)."""
+    if isinstance(data, bytes):
+        data = data.decode()
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def iter_progress_events(
+    job: Job,
+    poll_interval: float = 1,
+    heartbeat_interval: float = 15,
+) -> Iterator[str]:
+    """Follow the progress of a job as Server-Sent Events, until the job ends.
+
+    Yields a "progress" event for the latest update so far and for every update after that,
+    and a final "end" event stating the job status (e.g. "finished" or "failed", or "unknown" if the job expired).
+    In between, comments are sent as heartbeats, so proxies do not close the connection.
+
+    :param poll_interval:       seconds to wait for an update before checking whether the job has ended
+    :param heartbeat_interval:  seconds without events after which to send a heartbeat
+    """
+    connection = job.connection
+    key = get_progress_key(job.id)
+    pubsub = connection.pubsub(ignore_subscribe_messages=True)
+    # Subscribe before looking up the latest update, so no update goes missing in between
+    pubsub.subscribe(key)
+    try:
+        latest = connection.get(key)
+        if latest is not None:
+            yield format_event("progress", latest)
+        last_sent = time.monotonic()
+        while True:
+            message = pubsub.get_message(timeout=poll_interval)
+            if message is not None:
+                yield format_event("progress", message["data"])
+                last_sent = time.monotonic()
+                continue
+            # A job without a status has expired (or was deleted), so it has ended as well
+            status = job.get_status(refresh=True)
+            if status is None or status in END_STATUSES:
+                status = status.value if status is not None else "unknown"
+                yield format_event(
+                    "end", json.dumps(dict(job_id=job.id, status=status))
+                )
+                return
+            if time.monotonic() - last_sent >= heartbeat_interval:
+                yield ": heartbeat\n\n"
+                last_sent = time.monotonic()
+    finally:
+        pubsub.close()
@@ -1,12 +1,14 @@
+from __future__ import annotations
+
 from ast import List
 from datetime import datetime, timedelta
 from json import load
 
 import click
 import numpy as np
+import pandas as pd
 import cvxpy as cp
 from numpy import single, source
-from flexmeasures.data.models.network_resources import NetworkResource
 from rq import get_current_job
 import pandapower as pp
 import timely_beliefs as tb
@@ -14,8 +16,31 @@ import timely_beliefs as tb
 from flexmeasures.data import db
 from flexmeasures.data.models.planning.storage import StorageScheduler
 from flexmeasures.data.models.generic_assets import GenericAsset
+from flexmeasures.data.models.networks import Network
 from flexmeasures.data.models.time_series import Sensor, TimedBelief
 from flexmeasures.data.models.planning.utils import initialize_series
+from flexmeasures.data.services.job_progress import report_progress
+from flexmeasures.data.services.load_scheduling_admm import admm_load_scheduling
+from flexmeasures.data.services.networks import get_network_tables
+from flexmeasures.data.services.network_cache import (
+    get_compiled_network,
+    get_compiled_network_key,
+)
+from flexmeasures.data.services.network_snapshots import (
+    FrozenNetwork,
+    get_asset_attribute_getter,
+    load_network_snapshot,
+    take_network_snapshot,
+)
+from flexmeasures.data.services.network_topology import (
+    NetworkTopology,
+    validate_topology,
+)
+from flexmeasures.data.services.nodal_prices import (
+    get_stored_nodal_prices,
+    save_nodal_prices,
+    stack_nodal_prices,
+)
 from flexmeasures.data.utils import get_data_source, save_to_db
 from flexmeasures.utils.time_utils import server_now
 from pandas.tseries.frequencies import to_offset
@@ -32,18 +57,67 @@ def eflex_load_scheduling(
     resolution: timedelta,
     belief_time: datetime,
     flex_config_has_been_deserialized: bool = False,
+    network_id: int | None = None,
+    use_stored_prices: bool = False,
+    method: str = "central",
+    rho: float = 1.0,
+    max_iterations: int = 20,
+    tolerance: float = 1e-3,
+    n_workers: int | None = None,
+    snapshot_hash: str | None = None,
 ) -> bool:
     """
     This function computes a load scheduling. It returns True if it ran successfully.
 
+    By default ("central" method), loads are rescheduled one by one against the nodal prices of one OPF per step,
+    as the loads change. The "admm" method instead lets all loads solve their local subproblem in parallel worker processes,
+    and coordinates them through a proximal OPF per step (see admm_load_scheduling). Its convergence metrics are saved on the RQ job, if any.
+    If a network_id is given, the nodal prices of the last iteration are stored as price sensors per bus.
+    With use_stored_prices, the loads are scheduled once against the stored nodal prices instead, without running any OPF.
+
     This is what this function does:
     - Turn results values into beliefs and save them to db
+
+    :param network_id:          network whose nodal prices to store (or look up)
+    :param use_stored_prices:   if True, use the stored nodal prices of the network rather than running OPFs
+    :param method:              "central" or "admm"
+    :param rho:                 ADMM penalty parameter (only used by the "admm" method)
+    :param max_iterations:      maximum number of iterations
+    :param tolerance:           ADMM stopping tolerance on the primal and dual residuals (only used by the "admm" method)
+    :param n_workers:           number of ADMM worker processes, defaults to the number of cores (only used by the "admm" method)
+    :param snapshot_hash:       read network and asset parameters from this network snapshot
+                                (by default, a snapshot of the network is taken if a network_id is given)
     """
+    if method not in ("central", "admm"):
+        raise ValueError(f"Unknown load scheduling method '{method}', expected 'central' or 'admm'.")
+    if method == "admm" and use_stored_prices:
+        raise ValueError("The ADMM method discovers nodal prices itself, so it cannot use stored nodal prices.")
 
     
-    # Initialize an empty network using pandapower
-    network = pp.create_empty_network()
-    network = build_network(network, buses, lines, external_grid, battery, transformers, shunts)
+    if snapshot_hash is None and network_id is not None:
+        snapshot_hash = take_network_snapshot(
+            db.session.get(Network, network_id),
+            asset_ids=list(external_grid) + list(battery),
+        ).hash
+    frozen = load_network_snapshot(snapshot_hash) if snapshot_hash is not None else None
+    rq_job = get_current_job()
+    if rq_job and snapshot_hash is not None:
+        rq_job.meta["network_snapshot"] = snapshot_hash
+        rq_job.save_meta()
+
+    # Initialize an empty network using pandapower (with a snapshot, a copy of the network compiled earlier)
+    if frozen is not None:
+        network = get_compiled_network(
+            get_compiled_network_key(
+                frozen.hash, "load scheduling", buses, lines, external_grid, battery, transformers, shunts
+            ),
+            lambda: build_network(
+                pp.create_empty_network(), buses, lines, external_grid, battery, transformers, shunts, frozen
+            ),
+        )
+    else:
+        network = pp.create_empty_network()
+        network = build_network(network, buses, lines, external_grid, battery, transformers, shunts, frozen)
     # Print all network tables for debugging purposes
     # print("Buses:")
     # print(network.bus)
@@ -76,16 +150,52 @@ def eflex_load_scheduling(
                 load_data[asset_name] = {"Active Power": active_power, "Reactive Power": reactive_power, "Type": load_asset.get_attribute("type")}
                 
     # print(load_data)
-    tc = []
-    tc.append(get_first_cost(network, load_data, None))
-    for iterator in range(1, 21):
-        nlc, nnw, ntc, npr = schedule_N(network, load_data, None)
-        load_data = nlc
-        network = nnw
-        tc.append(ntc)
-        print(iterator, ntc)    
-        # if (iterator % 1 == 0):
-        #     print(iterator, npr, nlc, nnw)
+    if use_stored_prices and network_id is None:
+        raise ValueError("Using stored nodal prices requires a network_id.")
+    network_record = db.session.get(Network, network_id) if network_id is not None else None
+    if use_stored_prices:
+        # Prices do not respond to the loads, so one pass suffices
+        stored_prices = get_stored_nodal_prices(network_record, list(buses), start, end, resolution)
+        load_data, network, _, _ = schedule_N(network, load_data, None, stored_prices=stored_prices)
+    elif method == "admm":
+        load_data, admm_prices, metrics = admm_load_scheduling(
+            network,
+            load_data,
+            rho=rho,
+            max_iterations=max_iterations,
+            tolerance=tolerance,
+            n_workers=n_workers,
+        )
+        if rq_job:
+            rq_job.meta["admm_convergence"] = [m.to_dict() for m in metrics]
+            rq_job.save_meta()
+        if network_record is not None:
+            steps = [
+                {kind: pd.Series(admm_prices[kind][t], index=network.bus.index) for kind in admm_prices}
+                for t in range(len(admm_prices["lam_p"]))
+            ]
+            save_nodal_prices(network_record, stack_nodal_prices(steps, start, resolution), belief_time)
+    else:
+        tc = []
+        tc.append(get_first_cost(network, load_data, None))
+        for iterator in range(1, max_iterations + 1):
+            nlc, nnw, ntc, npr = schedule_N(network, load_data, None)
+            load_data = nlc
+            network = nnw
+            tc.append(ntc)
+            print(iterator, ntc)    
+            report_progress(
+                iterator,
+                max_iterations,
+                f"Iteration {iterator}: total cost {ntc}",
+                partial_result=dict(total_cost=tc),
+            )
+            # if (iterator % 1 == 0):
+            #     print(iterator, npr, nlc, nnw)
+        if network_record is not None:
+            save_nodal_prices(
+                network_record, nodal_prices_from_curves(network, npr, start, resolution), belief_time
+            )
 
     # Save the information from nlc to the sensors without overwriting current curves
     belief_time = belief_time or server_now()
@@ -276,39 +386,50 @@ def eflex_load_scheduling(
 #     return True
 
 
-def schedule_N(nw, loads, solars):
+def schedule_N(nw, loads, solars, stored_prices: dict[str, pd.DataFrame] | None = None):
+    """Reschedule each flexible load once, against the nodal prices at that moment.
+
+    With stored_prices (see get_stored_nodal_prices), no OPF is run and the returned total cost is None.
+    """
     new_loads = loads
     loads = list(loads.keys())
+    if stored_prices is not None:
+        total_cost = None
+        prices = price_curves_from_nodal_prices(nw, stored_prices)
+    else:
+        total_cost = 0.0
+        prices = create_empty_price_curves(nw)
     for ld in loads:
         if new_loads[ld]['Type'] == 'Inflexible': continue
         
-        total_cost = 0.0
-        prices = create_empty_price_curves(nw)
-
         # Get the bus in the network to which the load is connected
         # bus_ld = int(nw.load.loc[nw.load['bus'] == GenericAsset.query.filter_by(name=ld).first().get_attribute("bus"), 'bus'].values[0])
         bus_ld = int(nw.load.loc[nw.load['bus'] == GenericAsset.query.filter_by(name=ld).first().get_attribute("bus"), 'bus'].index[0])
-        
-        # Run OPF for every hour to get prices and check the power flow    
-        for hour in range(len(new_loads[ld]['Active Power'])):
 
-            # Getting the load at hour h 
-            for index, bus in nw.load.iterrows():
-                nw.load.loc[nw.load['bus'] == nw.load['bus'][index], 'p_mw'] =   new_loads[loads[index]]["Active Power"][hour]
-                nw.load.loc[nw.load['bus'] == nw.load['bus'][index], 'q_mvar'] = new_loads[loads[index]]["Reactive Power"][hour] 
+        if stored_prices is None:
+            total_cost = 0.0
+            prices = create_empty_price_curves(nw)
+
+            # Run OPF for every hour to get prices and check the power flow    
+            for hour in range(len(new_loads[ld]['Active Power'])):
+
+                # Getting the load at hour h 
+                for index, bus in nw.load.iterrows():
+                    nw.load.loc[nw.load['bus'] == nw.load['bus'][index], 'p_mw'] =   new_loads[loads[index]]["Active Power"][hour]
+                    nw.load.loc[nw.load['bus'] == nw.load['bus'][index], 'q_mvar'] = new_loads[loads[index]]["Reactive Power"][hour] 
             
-            # Getting the pv curve at hour h
-            if solars is not None:
-                for index, s in enumerate(solars):
-                    nw.sgen.loc[nw.sgen['bus'] == nw.sgen['bus'][index], 'p_mw'] =   solars[index][hour]
-                    nw.sgen.loc[nw.sgen['bus'] == nw.sgen['bus'][index], 'q_mvar'] = 0.0
-
-            pp.runopp(nw, verbose=False, tolerance_mva=1e-6)
-            total_cost += nw.res_cost
-            # print(nw.res_bus['lam_p'])
-            for i in range(len(nw.res_bus['lam_p'])):
-                prices[i][0].append(nw.res_bus['lam_p'][nw.bus.index[i]])
-                prices[i][1].append(nw.res_bus['lam_q'][nw.bus.index[i]])
+                # Getting the pv curve at hour h
+                if solars is not None:
+                    for index, s in enumerate(solars):
+                        nw.sgen.loc[nw.sgen['bus'] == nw.sgen['bus'][index], 'p_mw'] =   solars[index][hour]
+                        nw.sgen.loc[nw.sgen['bus'] == nw.sgen['bus'][index], 'q_mvar'] = 0.0
+
+                pp.runopp(nw, verbose=False, tolerance_mva=1e-6)
+                total_cost += nw.res_cost
+                # print(nw.res_bus['lam_p'])
+                for i in range(len(nw.res_bus['lam_p'])):
+                    prices[i][0].append(nw.res_bus['lam_p'][nw.bus.index[i]])
+                    prices[i][1].append(nw.res_bus['lam_q'][nw.bus.index[i]])
         
         # Load Scheduling Part
         T = len(new_loads[ld]["Active Power"])
@@ -338,33 +459,45 @@ def schedule_N(nw, loads, solars):
     return new_loads, nw, total_cost, prices
 
 
-def build_network(network, buses, lines, external_grid, battery, transformers, shunts):
+def build_network(network, buses, lines, external_grid, battery, transformers, shunts, frozen: FrozenNetwork | None = None):
+    """Add the given network elements to a pandapower network, reading their parameters from a snapshot if given."""
+    # Load all network resources with their parameters in one query
+    resource_ids = list(buses) + list(lines) + list(transformers) + list(shunts)
+    if frozen is not None:
+        tables = frozen.get_tables(resource_ids)
+    else:
+        tables = get_network_tables(resource_ids=resource_ids)
+    get_asset_attribute = get_asset_attribute_getter(frozen)
+
+    # Fail fast on networks the OPF cannot solve
+    validate_topology(
+        NetworkTopology.from_tables(tables),
+        slack_buses=[
+            get_asset_attribute(a, "bus")
+            for a in list(external_grid) + list(battery)
+            if a in external_grid or get_asset_attribute(a, "slack") == "True"
+        ],
+    )
+
     # Create buses in the network
-    for bus in buses:
-        vn = NetworkResource.query.get(bus).get_attribute("vn_kv")
-        vmin = NetworkResource.query.get(bus).get_attribute("min_vm_pu")
-        vmax = NetworkResource.query.get(bus).get_attribute("max_vm_pu")
-        pp.create_bus(network, index=bus, vn_kv=vn, max_vm_pu=vmax, min_vm_pu=vmin, zone=1)
+    for bus in tables["bus"].loc[list(buses)].itertuples():
+        pp.create_bus(network, index=bus.Index, vn_kv=bus.vn_kv, max_vm_pu=bus.max_vm_pu, min_vm_pu=bus.min_vm_pu, zone=1)
 
 
     # Create lines in the network
-    for line in lines:
-        fbus = NetworkResource.query.get(line).get_attribute("from_bus")
-        tbus = NetworkResource.query.get(line).get_attribute("to_bus")
-        length = NetworkResource.query.get(line).get_attribute("length_km")
-        r = NetworkResource.query.get(line).get_attribute("r_ohm_per_km")
-        x = NetworkResource.query.get(line).get_attribute("x_ohm_per_km")
-        c = NetworkResource.query.get(line).get_attribute("c_nf_per_km")
-        max_i = NetworkResource.query.get(line).get_attribute("max_i_ka")
-        pp.create_line_from_parameters(network, from_bus=fbus, to_bus=tbus, length_km=length, r_ohm_per_km=r, 
-                                       x_ohm_per_km=x, c_nf_per_km=c, max_i_ka=max_i, type="None")
+    for line in tables["line"].loc[list(lines)].itertuples():
+        pp.create_line_from_parameters(network, from_bus=int(line.from_bus), to_bus=int(line.to_bus), length_km=line.length_km, r_ohm_per_km=line.r_ohm_per_km, 
+                                       x_ohm_per_km=line.x_ohm_per_km, c_nf_per_km=line.c_nf_per_km, max_i_ka=line.max_i_ka, type="None")
 
 
     # Create loads in the network
     for bus in buses:
-        buildings = GenericAsset.query.filter_by(generic_asset_type_id = 6).all()
+        if frozen is not None:
+            buildings = frozen.get_asset_ids("load")
+        else:
+            buildings = [b.id for b in GenericAsset.query.filter_by(generic_asset_type_id = 6).all()]
         for building in buildings:
-            if building.get_attribute("bus") == bus:
+            if get_asset_attribute(building, "bus") == bus:
                 p = 30.0
                 q = 30.0
                 pp.create_load(network, bus=bus, p_mw=p, q_mvar=q, type=None, controllable=False)
@@ -372,70 +505,57 @@ def build_network(network, buses, lines, external_grid, battery, transformers, s
 
     # Create external grid in the network
     for eg in external_grid:
-        bus = GenericAsset.query.get(eg).get_attribute("bus")
-        vm = GenericAsset.query.get(eg).get_attribute("vm_pu")
-        qmax = GenericAsset.query.get(eg).get_attribute("max_q_mvar")
-        qmin = GenericAsset.query.get(eg).get_attribute("min_q_mvar")
-        pmax = GenericAsset.query.get(eg).get_attribute("max_p_mw")
-        pmin = GenericAsset.query.get(eg).get_attribute("min_p_mw")
+        bus = get_asset_attribute(eg, "bus")
+        vm = get_asset_attribute(eg, "vm_pu")
+        qmax = get_asset_attribute(eg, "max_q_mvar")
+        qmin = get_asset_attribute(eg, "min_q_mvar")
+        pmax = get_asset_attribute(eg, "max_p_mw")
+        pmin = get_asset_attribute(eg, "min_p_mw")
         pp.create_ext_grid(network, index=eg, bus=bus, vm_pu=vm, min_p_mw=pmin, max_p_mw=pmax,
                             max_q_mvar=qmax, min_q_mvar=qmin)
 
-        cp0 = GenericAsset.query.get(eg).get_attribute("cp0")
-        cp1 = GenericAsset.query.get(eg).get_attribute("cp1")
-        cp2 = GenericAsset.query.get(eg).get_attribute("cp2")
-        cq0 = GenericAsset.query.get(eg).get_attribute("cq0")
-        cq1 = GenericAsset.query.get(eg).get_attribute("cq1")
-        cq2 = GenericAsset.query.get(eg).get_attribute("cq2")
+        cp0 = get_asset_attribute(eg, "cp0")
+        cp1 = get_asset_attribute(eg, "cp1")
+        cp2 = get_asset_attribute(eg, "cp2")
+        cq0 = get_asset_attribute(eg, "cq0")
+        cq1 = get_asset_attribute(eg, "cq1")
+        cq2 = get_asset_attribute(eg, "cq2")
         pp.create_poly_cost(network, element=eg, et="ext_grid", cp0_eur=cp0, cp1_eur_per_mw=cp1, cp2_eur_per_mw2=cp2, 
                             cq0_eur=cq0, cq1_eur_per_mvar=cq1, cq2_eur_per_mvar2=cq2)
         
 
     # Create generators in the network
     for bt in battery:
-        bus = GenericAsset.query.get(bt).get_attribute("bus")
-        p = GenericAsset.query.get(bt).get_attribute("p_mw")
-        vm = GenericAsset.query.get(bt).get_attribute("vm_pu")
-        qmax = GenericAsset.query.get(bt).get_attribute("max_q_mvar")
-        qmin = GenericAsset.query.get(bt).get_attribute("min_q_mvar")
-        pmax = GenericAsset.query.get(bt).get_attribute("max_p_mw")
-        pmin = GenericAsset.query.get(bt).get_attribute("min_p_mw")
-        slack = GenericAsset.query.get(bt).get_attribute("slack") == 'True'
+        bus = get_asset_attribute(bt, "bus")
+        p = get_asset_attribute(bt, "p_mw")
+        vm = get_asset_attribute(bt, "vm_pu")
+        qmax = get_asset_attribute(bt, "max_q_mvar")
+        qmin = get_asset_attribute(bt, "min_q_mvar")
+        pmax = get_asset_attribute(bt, "max_p_mw")
+        pmin = get_asset_attribute(bt, "min_p_mw")
+        slack = get_asset_attribute(bt, "slack") == 'True'
         pp.create_gen(network, index=bt, bus=bus, vm_pu=vm, p_mw=p, min_p_mw=pmin, max_p_mw=pmax, slack=slack, 
                           max_q_mvar=qmax, min_q_mvar=qmin, controllable=True)
         
-        cp0 = GenericAsset.query.get(bt).get_attribute("cp0")
-        cp1 = GenericAsset.query.get(bt).get_attribute("cp1")
-        cp2 = GenericAsset.query.get(bt).get_attribute("cp2")
-        cq0 = GenericAsset.query.get(bt).get_attribute("cq0")
-        cq1 = GenericAsset.query.get(bt).get_attribute("cq1")
-        cq2 = GenericAsset.query.get(bt).get_attribute("cq2")
+        cp0 = get_asset_attribute(bt, "cp0")
+        cp1 = get_asset_attribute(bt, "cp1")
+        cp2 = get_asset_attribute(bt, "cp2")
+        cq0 = get_asset_attribute(bt, "cq0")
+        cq1 = get_asset_attribute(bt, "cq1")
+        cq2 = get_asset_attribute(bt, "cq2")
         pp.create_poly_cost(network, element=bt, et="gen", cp0_eur=cp0, cp1_eur_per_mw=cp1, cp2_eur_per_mw2=cp2, 
                             cq0_eur=cq0, cq1_eur_per_mvar=cq1, cq2_eur_per_mvar2=cq2)
 
 
     # Create transformers in the network
-    for transformer in transformers:
-        hv_bus = NetworkResource.query.get(transformer).get_attribute("hv_bus")
-        lv_bus = NetworkResource.query.get(transformer).get_attribute("lv_bus")
-        sn = NetworkResource.query.get(transformer).get_attribute("sn_mva")
-        vn_hv = NetworkResource.query.get(transformer).get_attribute("vn_hv_kv")
-        vn_lv = NetworkResource.query.get(transformer).get_attribute("vn_lv_kv")
-        vk_percent = NetworkResource.query.get(transformer).get_attribute("vk_percent")
-        vkr_percent = NetworkResource.query.get(transformer).get_attribute("vkr_percent")
-        pfe_kw = NetworkResource.query.get(transformer).get_attribute("pfe_kw")
-        i0_percent = NetworkResource.query.get(transformer).get_attribute("i0_percent")
-        pp.create_transformer_from_parameters(network, hv_bus=hv_bus, lv_bus=lv_bus, sn_mva=sn, vn_hv_kv=vn_hv, 
-                                              vn_lv_kv=vn_lv, vk_percent=vk_percent, vkr_percent=vkr_percent, 
-                                              pfe_kw=pfe_kw, i0_percent=i0_percent)
+    for trafo in tables["transformer"].loc[list(transformers)].itertuples():
+        pp.create_transformer_from_parameters(network, hv_bus=int(trafo.hv_bus), lv_bus=int(trafo.lv_bus), sn_mva=trafo.sn_mva, vn_hv_kv=trafo.vn_hv_kv, 
+                                              vn_lv_kv=trafo.vn_lv_kv, vk_percent=trafo.vk_percent, vkr_percent=trafo.vkr_percent, 
+                                              pfe_kw=trafo.pfe_kw, i0_percent=trafo.i0_percent)
 
     # Create shunts in the network
-    for shunt in shunts:
-        bus = NetworkResource.query.get(shunt).get_attribute("bus")
-        q = NetworkResource.query.get(shunt).get_attribute("q_mvar")
-        p = NetworkResource.query.get(shunt).get_attribute("p_mw")
-        vn = NetworkResource.query.get(shunt).get_attribute("vn_kv")
-        pp.create_shunt(network, bus=bus, q_mvar=q, p_mw=p, vn_kv=vn)
+    for shunt in tables["shunt"].loc[list(shunts)].itertuples():
+        pp.create_shunt(network, bus=int(shunt.bus), q_mvar=shunt.q_mvar, p_mw=shunt.p_mw, vn_kv=shunt.vn_kv)
 
     return network
 
@@ -612,4 +732,24 @@ def create_empty_price_curves(nw):
     prices = []
     for _ in range(len(nw.bus)):
         prices.append([[], []])
-    return prices
\ No newline at end of file
+    return prices
+
+
+def price_curves_from_nodal_prices(nw, nodal_prices: dict[str, pd.DataFrame]):
+    """Turn nodal prices (see get_stored_nodal_prices) into price curves, in the layout of create_empty_price_curves."""
+    return [
+        [list(nodal_prices["lam_p"][bus]), list(nodal_prices["lam_q"][bus])]
+        for bus in nw.bus.index
+    ]
+
+
+def nodal_prices_from_curves(nw, prices, start: datetime, resolution: timedelta) -> dict[str, pd.DataFrame]:
+    """Turn price curves (in the layout of create_empty_price_curves) into nodal prices, as stored by save_nodal_prices."""
+    steps = [
+        {
+            kind: pd.Series([prices[i][k][hour] for i in range(len(nw.bus))], index=nw.bus.index)
+            for k, kind in enumerate(("lam_p", "lam_q"))
+        }
+        for hour in range(len(prices[0][0]) if prices else 0)
+    ]
+    return stack_nodal_prices(steps, start, resolution)
\ No newline at end of file
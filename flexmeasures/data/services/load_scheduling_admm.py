@@ -0,0 +1,326 @@
+"""
+Distributed (ADMM) load scheduling.
+
+Rather than rescheduling the loads one by one, with an OPF per load and per step (see schedule_N),
+each iteration lets all flexible loads solve their local subproblem at once, in worker processes,
+after which a coordinator runs one proximal OPF per step (also in parallel) to update the loads' copies on the network side.
+
+This is consensus ADMM, with scaled dual variables u, between the curves x that the loads can follow
+and their copies z on the network side:
+
+    minimise  sum_i I_X_i(x_i)  +  g(z)  subject to  x = z
+
+where X_i holds the curves that load i may follow given its type (shiftable, breakable or modulatable),
+and g is the network cost (the OPF objective). Each iteration performs:
+
+    x_i = argmin_{x in X_i}  || x - z_i + u_i ||^2                    (local, per load)
+    z   = argmin_z  g(z) + rho / 2 * || x - z + u ||^2                 (coordinator)
+    u   = u + x - z                                                    (dual update)
+
+Each load's curve x_i holds its active and reactive power, so a shiftable or breakable load
+moves both by the same shift or ordering.
+In the coordinator's OPF, each load is replaced by a controllable static generator (with opposite sign) at its bus,
+with the proximal term as its quadratic cost, so the OPF finds z within the network's limits.
+Iterations stop once both the primal residual || x - z || and the dual residual rho * || z - z_previous ||
+(as root mean square per element) fall below the tolerance.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+import copy
+from dataclasses import dataclass, asdict
+import multiprocessing
+import os
+
+import cvxpy as cp
+import numpy as np
+import pandapower as pp
+from scipy.optimize import linear_sum_assignment
+
+from flexmeasures.data.services.job_progress import report_progress
+
+
+# Limits of modulatable loads, as in schedule_N
+MODULATION_LIMITS = dict(min_power=0.0, max_power=48.0, max_change=1.0)
+
+# The proximal network each worker process runs its OPFs on, and its rho (see _init_worker)
+_worker_network = None
+_worker_rho = None
+
+
+@dataclass
+class ADMMIteration:
+    """Convergence metrics of one ADMM iteration."""
+
+    iteration: int
+    primal_residual: float
+    dual_residual: float
+    total_cost: float
+    converged: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def admm_load_scheduling(
+    nw,
+    load_data: dict,
+    rho: float = 1.0,
+    max_iterations: int = 20,
+    tolerance: float = 1e-3,
+    n_workers: int | None = None,
+) -> tuple[dict, dict[str, np.ndarray], list[ADMMIteration]]:
+    """Schedule all flexible loads with ADMM.
+
+    :param nw:              pandapower network, with one load row per entry in load_data (in the same order)
+    :param load_data:       active and reactive power curves (and type) per load, as collected by eflex_load_scheduling
+    :param rho:             ADMM penalty parameter
+    :param max_iterations:  stop after this many iterations, even if not converged
+    :param tolerance:       stop once both residuals (root mean square per element) drop below this value
+    :param n_workers:       number of worker processes (defaults to the number of cores, use 1 to run in-process)
+    :returns:   the rescheduled load data, the final nodal prices (lam_p and lam_q, with shape (steps, buses)),
+                and the convergence metrics per iteration
+    """
+    names = list(load_data.keys())
+    types = [load_data[name]["Type"] for name in names]
+    # Curves per load, with shape (loads, 2, steps), holding active and reactive power
+    baseline = np.array(
+        [
+            [load_data[name]["Active Power"], load_data[name]["Reactive Power"]]
+            for name in names
+        ],
+        dtype=float,
+    )
+    n_steps = baseline.shape[2]
+    n_workers = n_workers or os.cpu_count() or 1
+    proximal_nw = make_proximal_network(
+        nw, [get_load_bounds(t, b) for t, b in zip(types, baseline)]
+    )
+
+    executor = None
+    if n_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            # Spawn rather than fork, so workers do not share the parent's database connections
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(proximal_nw, rho),
+        )
+    else:
+        _init_worker(proximal_nw, rho)
+    try:
+        x = baseline.copy()
+        z = baseline.copy()
+        u = np.zeros_like(baseline)
+        prices = None
+        metrics: list[ADMMIteration] = []
+        for k in range(1, max_iterations + 1):
+            # Local step: each load follows the feasible curve closest to its network-side copy (minus its dual)
+            x = np.array(
+                _map(
+                    executor,
+                    n_workers,
+                    _solve_local_subproblem_star,
+                    [(types[i], baseline[i], z[i] - u[i]) for i in range(len(names))],
+                )
+            ).reshape(baseline.shape)
+
+            # Coordinator step: a proximal OPF per step moves the network-side copies towards x + u
+            z_previous = z
+            z, prices, total_cost = _coordinate(executor, n_workers, x + u, n_steps)
+
+            # Dual step
+            u = u + x - z
+
+            primal_residual = _rms(x - z)
+            dual_residual = rho * _rms(z - z_previous)
+            converged = primal_residual < tolerance and dual_residual < tolerance
+            metrics.append(
+                ADMMIteration(k, primal_residual, dual_residual, total_cost, converged)
+            )
+            report_progress(
+                k,
+                max_iterations,
+                f"ADMM iteration {k}: primal residual {primal_residual:.3g},"
+                f" dual residual {dual_residual:.3g}, total cost {total_cost:.6g}",
+                partial_result=[m.to_dict() for m in metrics],
+            )
+            if converged:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    new_load_data = {
+        name: {
+            **load_data[name],
+            "Active Power": list(x[i, 0]),
+            "Reactive Power": list(x[i, 1]),
+        }
+        for i, name in enumerate(names)
+    }
+    return new_load_data, prices, metrics
+
+
+def solve_local_subproblem(
+    load_type: str,
+    baseline: np.ndarray,
+    target: np.ndarray,
+) -> np.ndarray:
+    """Local ADMM step of one load: find the feasible curve closest to the target curve (in the least-squares sense).
+
+    Curves have shape (2, steps), holding active and reactive power.
+    The feasible curves follow from the baseline curve:
+    - Shiftable loads follow a cyclic shift of their baseline.
+    - Breakable loads reorder the non-zero steps of their baseline.
+    - Modulatable loads deviate from their baseline within MODULATION_LIMITS, keeping their total energy.
+    - Other loads (e.g. inflexible ones) follow their baseline.
+    Shifts and orderings apply to active and reactive power alike.
+    """
+    n_steps = baseline.shape[1]
+    if load_type == "Shiftable":
+        candidates = np.array([np.roll(baseline, j, axis=1) for j in range(n_steps)])
+        return candidates[np.argmin(np.sum((candidates - target) ** 2, axis=(1, 2)))]
+    elif load_type == "Breakable":
+        values = baseline[:, np.any(baseline != 0, axis=0)]
+        # Cost of putting value j in step t, relative to leaving step t empty
+        costs = np.sum(
+            (values[:, np.newaxis, :] - target[:, :, np.newaxis]) ** 2
+            - target[:, :, np.newaxis] ** 2,
+            axis=0,
+        )
+        steps, value_indices = linear_sum_assignment(costs)
+        curve = np.zeros_like(baseline)
+        curve[:, steps] = values[:, value_indices]
+        return curve
+    elif load_type == "Modulatable":
+        delta = cp.Variable(baseline.shape)
+        curve = baseline + delta
+        constraints = [
+            cp.sum(delta, axis=1) == 0,
+            cp.abs(delta) <= MODULATION_LIMITS["max_change"],
+            curve >= max(MODULATION_LIMITS["min_power"], 0),
+            curve <= MODULATION_LIMITS["max_power"],
+        ]
+        problem = cp.Problem(cp.Minimize(cp.sum_squares(curve - target)), constraints)
+        problem.solve()
+        if delta.value is None:
+            return baseline
+        return baseline + delta.value
+    return baseline
+
+
+def get_load_bounds(load_type: str, baseline: np.ndarray) -> np.ndarray:
+    """Lower and upper bounds on the curves a load may follow, with shape (2, 2): (active, reactive) x (lower, upper)."""
+    lower = np.minimum(baseline.min(axis=1), 0)
+    upper = np.maximum(baseline.max(axis=1), 0)
+    if load_type == "Modulatable":
+        lower = np.minimum(lower, MODULATION_LIMITS["min_power"])
+        upper = np.maximum(upper, MODULATION_LIMITS["max_power"])
+    return np.stack([lower, upper], axis=1)
+
+
+def make_proximal_network(nw, bounds: list[np.ndarray]):
+    """Copy of the network in which each load is replaced by a controllable static generator at its bus.
+
+    Each generator injects minus the load's network-side copy z, within the load's bounds (see get_load_bounds).
+    Its cost holds the proximal term, whose coefficients are set per step (see _run_opf_step).
+    """
+    nw = copy.deepcopy(nw)
+    nw.load["p_mw"] = 0.0
+    nw.load["q_mvar"] = 0.0
+    nw.load["controllable"] = False
+    proximal_sgens = []
+    for (_, load), ((p_min, p_max), (q_min, q_max)) in zip(nw.load.iterrows(), bounds):
+        sgen = pp.create_sgen(
+            nw,
+            bus=load["bus"],
+            p_mw=0.0,
+            q_mvar=0.0,
+            controllable=True,
+            min_p_mw=-p_max,
+            max_p_mw=-p_min,
+            min_q_mvar=-q_max,
+            max_q_mvar=-q_min,
+        )
+        pp.create_poly_cost(nw, element=sgen, et="sgen", cp1_eur_per_mw=0.0)
+        proximal_sgens.append(sgen)
+    nw["proximal_sgens"] = proximal_sgens
+    return nw
+
+
+def _solve_local_subproblem_star(args) -> np.ndarray:
+    return solve_local_subproblem(*args)
+
+
+def _init_worker(nw, rho: float):
+    """Keep a private copy of the network in each worker process, so it is only sent once."""
+    global _worker_network, _worker_rho
+    _worker_network = copy.deepcopy(nw)
+    _worker_rho = rho
+
+
+def _run_opf_step(v: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """Coordinator step for one time step: run the proximal OPF around v, with shape (loads, 2).
+
+    Minimises the network cost plus rho / 2 * || z - v ||^2, by giving each proximal generator (which injects s = -z)
+    the cost rho / 2 * s^2 + rho * v * s (dropping the constant term).
+
+    :returns: z, with shape (loads, 2), the nodal prices of active and reactive power, and the network cost
+    """
+    nw, rho = _worker_network, _worker_rho
+    sgens = nw["proximal_sgens"]
+    costs = nw.poly_cost.index[
+        (nw.poly_cost["et"] == "sgen") & nw.poly_cost["element"].isin(sgens)
+    ]
+    nw.poly_cost.loc[costs, "cp2_eur_per_mw2"] = rho / 2
+    nw.poly_cost.loc[costs, "cp1_eur_per_mw"] = rho * v[:, 0]
+    nw.poly_cost.loc[costs, "cq2_eur_per_mvar2"] = rho / 2
+    nw.poly_cost.loc[costs, "cq1_eur_per_mvar"] = rho * v[:, 1]
+    pp.runopp(nw, verbose=False, tolerance_mva=1e-6)
+    z = -nw.res_sgen.loc[sgens, ["p_mw", "q_mvar"]].to_numpy()
+    proximal_cost = np.sum(rho / 2 * z**2 - rho * v * z)
+    return (
+        z,
+        nw.res_bus["lam_p"].to_numpy(),
+        nw.res_bus["lam_q"].to_numpy(),
+        nw.res_cost - proximal_cost,
+    )
+
+
+def _run_opf_step_star(args):
+    return _run_opf_step(*args)
+
+
+def _coordinate(
+    executor, n_workers: int, v: np.ndarray, n_steps: int
+) -> tuple[np.ndarray, dict[str, np.ndarray], float]:
+    """Run one proximal OPF per step (in parallel) around v, with shape (loads, 2, steps).
+
+    :returns: z (with the shape of v), the nodal prices (with shape (steps, buses)) and the total network cost
+    """
+    results = _map(
+        executor,
+        n_workers,
+        _run_opf_step_star,
+        [(v[:, :, t],) for t in range(n_steps)],
+    )
+    z, lam_p, lam_q, costs = zip(*results)
+    return (
+        np.stack(z, axis=2),
+        dict(lam_p=np.array(lam_p), lam_q=np.array(lam_q)),
+        float(sum(costs)),
+    )
+
+
+def _map(executor, n_workers: int, fn, tasks: list) -> list:
+    if executor is None:
+        return [fn(task) for task in tasks]
+    # A few chunks per worker balances the load while keeping the number of round trips low
+    chunksize = max(1, len(tasks) // (4 * n_workers))
+    return list(executor.map(fn, tasks, chunksize=chunksize))
+
+
+def _rms(a: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(np.square(a)))) if a.size else 0.0
@@ -0,0 +1,97 @@
+"""
+Logic around caching compiled networks: pandapower networks built from a network snapshot, ready to be solved.
+
+Building the pandapower network of a snapshot gives the same result in every job using that snapshot,
+so workers build it once, memoize it in-process and pickle it to the local cache (next to the snapshots).
+Pickles are signed with the app's secret key, and only unpickled if their signature checks out.
+Each job gets its own deep copy, to which it can add step-specific elements (like loads) before solving.
+
+As snapshots are identified by a hash of their content (including the topology),
+a changed network gets a new snapshot hash, and thereby a new compiled network.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import hmac
+import json
+import os
+import pickle
+from typing import Callable
+
+from flask import current_app
+import pandapower as pp
+
+from flexmeasures.data.services.network_snapshots import (
+    get_local_cache_path,
+    write_to_local_cache,
+)
+
+
+# Number of compiled networks memoized per process (the oldest is dropped first)
+COMPILED_NETWORK_CACHE_SIZE = 32
+
+# In-process cache, keyed by compiled network key
+_compiled_networks: dict[str, pp.pandapowerNet] = {}
+
+
+def get_compiled_network_key(snapshot_hash: str, purpose: str, *element_ids) -> str:
+    """Key of the network built from a snapshot for a given purpose (e.g. "opf"), from the given elements.
+
+    :param element_ids: lists of ids, such as the buses and lines included in the network
+    """
+    content = [
+        pp.__version__,  # pickles need not be compatible across pandapower versions
+        snapshot_hash,
+        purpose,
+        [sorted(int(i) for i in ids) for ids in element_ids],
+    ]
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def get_compiled_network(
+    key: str, build: Callable[[], pp.pandapowerNet]
+) -> pp.pandapowerNet:
+    """Get a copy of a compiled network, from the in-process cache, from the local cache or else by building it.
+
+    :param key:     see get_compiled_network_key
+    :param build:   builds the network, in case it is not cached yet
+    """
+    net = _compiled_networks.get(key)
+    if net is None:
+        path = get_local_cache_path(f"{key}.net.pickle")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                net = _load_signed_pickle(f.read())
+        if net is None:
+            net = build()
+            write_to_local_cache(path, _dump_signed_pickle(net))
+        while len(_compiled_networks) >= COMPILED_NETWORK_CACHE_SIZE:
+            del _compiled_networks[next(iter(_compiled_networks))]
+        _compiled_networks[key] = net
+    return copy.deepcopy(net)
+
+
+def _sign(data: bytes) -> bytes:
+    key = current_app.config["SECRET_KEY"]
+    if isinstance(key, str):
+        key = key.encode()
+    return hmac.new(key, data, hashlib.sha256).digest()
+
+
+def _dump_signed_pickle(net: pp.pandapowerNet) -> bytes:
+    data = pickle.dumps(net)
+    return _sign(data) + data
+
+
+def _load_signed_pickle(signed_data: bytes) -> pp.pandapowerNet | None:
+    """Unpickle a compiled network, or return None if it is unsigned, tampered with, corrupted or incompatible."""
+    signature_size = hashlib.sha256().digest_size
+    signature, data = signed_data[:signature_size], signed_data[signature_size:]
+    if not hmac.compare_digest(signature, _sign(data)):
+        return None
+    try:
+        return pickle.loads(data)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
@@ -0,0 +1,387 @@
+"""
+Logic around importing networks from, and exporting them to, files in pandapower JSON or MATPOWER (.m) format.
+
+Imports create all network resources (with their typed parameters), assets and sensors with batched inserts,
+such that a case with thousands of buses takes seconds. They do not commit, so the caller decides on the transaction.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import os
+import re
+
+from flask import current_app
+import numpy as np
+import pandapower as pp
+import pandapower.converter as pc
+import pandas as pd
+from sqlalchemy import insert
+
+from flexmeasures.data import db
+from flexmeasures.data.models.generic_assets import GenericAsset
+from flexmeasures.data.models.network_resources import (
+    NETWORK_RESOURCE_TYPE_IDS,
+    PARAMETER_MODELS,
+    NetworkResource,
+)
+from flexmeasures.data.models.networks import Network, NetworkMembership
+from flexmeasures.data.models.time_series import Sensor
+from flexmeasures.data.services.network_snapshots import FrozenNetwork
+from flexmeasures.data.services.networks import ASSET_TYPE_IDS
+
+
+NETWORK_FILE_FORMATS = dict(json="pandapower JSON", m="MATPOWER")
+
+# pandapower element tables holding each kind of network resource
+PANDAPOWER_TABLES = dict(bus="bus", line="line", transformer="trafo", shunt="shunt")
+
+# Parameters that refer to buses, for each kind of network resource
+BUS_REFERENCES = dict(
+    bus=[], line=["from_bus", "to_bus"], transformer=["hv_bus", "lv_bus"], shunt=["bus"]
+)
+
+# Asset attributes read by the OPF and load scheduling, for each pandapower element table holding assets
+ASSET_ATTRIBUTES = dict(
+    load=["p_mw", "q_mvar"],
+    sgen=["p_mw", "q_mvar"],
+    gen=["p_mw", "vm_pu", "max_p_mw", "min_p_mw", "max_q_mvar", "min_q_mvar"],
+    ext_grid=["vm_pu", "max_p_mw", "min_p_mw", "max_q_mvar", "min_q_mvar"],
+)
+COST_ATTRIBUTES = dict(
+    cp0="cp0_eur",
+    cp1="cp1_eur_per_mw",
+    cp2="cp2_eur_per_mw2",
+    cq0="cq0_eur",
+    cq1="cq1_eur_per_mvar",
+    cq2="cq2_eur_per_mvar2",
+)
+
+# MATPOWER case columns (without the columns holding OPF results)
+MATPOWER_COLUMNS = dict(bus=13, gen=21, branch=13)
+
+
+def get_network_file_format(path: str) -> str:
+    """For example, "m" for "case118.m".
+
+    :raises ValueError: for unsupported file extensions
+    """
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension not in NETWORK_FILE_FORMATS:
+        raise ValueError(
+            f"Unsupported network file {path}. Supported extensions: {', '.join(f'.{e}' for e in NETWORK_FILE_FORMATS)}."
+        )
+    return extension
+
+
+def read_network_file(path: str) -> pp.pandapowerNet:
+    """Read a pandapower network from a pandapower JSON file or a MATPOWER case file."""
+    if get_network_file_format(path) == "json":
+        return pp.from_json(path)
+    with open(path) as f:
+        ppc = parse_matpower_case(f.read())
+    return pc.from_ppc(ppc, f_hz=50, validate_conversion=False)
+
+
+def write_network_file(net: pp.pandapowerNet, path: str):
+    """Write a pandapower network to a pandapower JSON file or a MATPOWER case file."""
+    if get_network_file_format(path) == "json":
+        pp.to_json(net, path)
+        return
+    ppc = pc.to_ppc(net, init="flat", calculate_voltage_angles=False)
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "w") as f:
+        f.write(format_matpower_case(ppc, name=name))
+
+
+def parse_matpower_case(text: str) -> dict:
+    """Parse the text of a MATPOWER case file (version 2) into a PYPOWER case dict.
+
+    Only the baseMVA and the bus, gen, branch and gencost matrices are read.
+    """
+    text = re.sub(r"%.*", "", text)  # strip comments
+    base_mva = re.search(r"mpc\.baseMVA\s*=\s*([^;]+);", text)
+    if base_mva is None:
+        raise ValueError("Not a MATPOWER case: no mpc.baseMVA found.")
+    ppc = dict(version="2", baseMVA=float(base_mva.group(1)))
+    for name, values in re.findall(r"mpc\.(\w+)\s*=\s*\[(.*?)\]\s*;", text, re.DOTALL):
+        rows = [
+            [float(v) for v in re.split(r"[\s,]+", row.strip())]
+            for row in re.split(r"[;\n]", values)
+            if row.strip()
+        ]
+        ppc[name] = np.array(rows, dtype=float)
+    for name in ("bus", "gen", "branch"):
+        if name not in ppc:
+            raise ValueError(f"Not a MATPOWER case: no mpc.{name} found.")
+    return ppc
+
+
+def format_matpower_case(ppc: dict, name: str = "case") -> str:
+    """Format a PYPOWER case dict (as made by pandapower.converter.to_ppc) as a MATPOWER case file (version 2).
+
+    Buses are numbered from 1, as MATPOWER expects.
+    """
+    bus = ppc["bus"][:, : MATPOWER_COLUMNS["bus"]].copy()
+    gen = ppc["gen"][:, : MATPOWER_COLUMNS["gen"]].copy()
+    branch = ppc["branch"][:, : MATPOWER_COLUMNS["branch"]].real.copy()
+    bus[:, 0] += 1
+    gen[:, 0] += 1
+    branch[:, :2] += 1
+    lines = [
+        f"function mpc = {name}",
+        "mpc.version = '2';",
+        f"mpc.baseMVA = {float(ppc['baseMVA']):g};",
+    ]
+    matrices = dict(bus=bus, gen=gen, branch=branch)
+    if "gencost" in ppc and len(ppc["gencost"]):
+        matrices["gencost"] = ppc["gencost"]
+    for matrix_name, matrix in matrices.items():
+        lines.append(f"mpc.{matrix_name} = [")
+        lines.extend(
+            "\t" + "\t".join(f"{v:.10g}" for v in row) + ";" for row in np.real(matrix)
+        )
+        lines.append("];")
+    return "\n".join(lines) + "\n"
+
+
+def import_network(
+    net: pp.pandapowerNet,
+    name: str,
+    account_id: int | None = None,
+    sensor_resolution: timedelta = timedelta(hours=1),
+) -> Network:
+    """Create a network from a pandapower network, with batched inserts (one per table), without committing.
+
+    Buses, lines, transformers and shunts become network resources.
+    Loads, static generators (as PV), generators (as batteries) and external grids (as slack batteries)
+    become assets connected to their bus, each with power sensors (W, and VAr except for PV).
+    Generator costs are copied from the polynomial costs.
+    """
+    network = Network(name=name, account_id=account_id)
+    db.session.add(network)
+    db.session.flush()
+
+    # Resources, buses first, as the other kinds refer to them
+    resource_ids: dict[str, dict[int, int]] = {}
+    for kind, table_name in PANDAPOWER_TABLES.items():
+        table = net[table_name]
+        model = PARAMETER_MODELS[kind]
+        parameters = [
+            {
+                parameter: _to_python(row.get(parameter))
+                for parameter in model.parameter_names()
+            }
+            for _, row in table.iterrows()
+        ]
+        for row_parameters in parameters:
+            for parameter in BUS_REFERENCES[kind]:
+                row_parameters[parameter] = resource_ids["bus"][
+                    row_parameters[parameter]
+                ]
+        if not parameters:
+            resource_ids[kind] = {}
+            continue
+        ids = db.session.scalars(
+            insert(NetworkResource).returning(
+                NetworkResource.id, sort_by_parameter_order=True
+            ),
+            [
+                dict(
+                    name=_element_name(table, index, kind),
+                    network_resource_type_id=NETWORK_RESOURCE_TYPE_IDS[kind],
+                    account_id=account_id,
+                    attributes=row_parameters,
+                )
+                for index, row_parameters in zip(table.index, parameters)
+            ],
+        ).all()
+        resource_ids[kind] = dict(zip(table.index, ids))
+        db.session.execute(
+            insert(model),
+            [
+                dict(network_resource_id=resource_id, **row_parameters)
+                for resource_id, row_parameters in zip(ids, parameters)
+            ],
+        )
+    db.session.execute(
+        insert(NetworkMembership),
+        [
+            dict(network_id=network.id, network_resource_id=resource_id)
+            for ids in resource_ids.values()
+            for resource_id in ids.values()
+        ],
+    )
+
+    # Assets and their sensors
+    costs = {
+        (row["et"], row["element"]): row
+        for _, row in net.get("poly_cost", pd.DataFrame()).iterrows()
+    }
+    timezone = current_app.config.get("FLEXMEASURES_TIMEZONE", "UTC")
+    asset_kinds = dict(load="load", sgen="pv", gen="battery", ext_grid="battery")
+    for table_name, kind in asset_kinds.items():
+        table = net[table_name]
+        for index, row in table.iterrows():
+            attributes = {
+                attribute: _to_python(row.get(attribute))
+                for attribute in ASSET_ATTRIBUTES[table_name]
+            }
+            attributes["bus"] = resource_ids["bus"][row["bus"]]
+            if table_name in ("gen", "ext_grid"):
+                attributes["slack"] = str(
+                    table_name == "ext_grid" or bool(row.get("slack", False))
+                )
+                cost = costs.get((table_name, index))
+                for attribute, column in COST_ATTRIBUTES.items():
+                    attributes[attribute] = (
+                        _to_python(cost.get(column, 0.0)) if cost is not None else 0.0
+                    )
+            element_name = _element_name(table, index, table_name)
+            if table_name == "ext_grid" and "external grid" not in element_name.lower():
+                element_name = f"External grid {element_name}"
+            asset = GenericAsset(
+                name=f"{name}: {element_name}",
+                generic_asset_type_id=ASSET_TYPE_IDS[kind],
+                account_id=account_id,
+                attributes=attributes,
+            )
+            db.session.add(asset)
+            for sensor_name, unit in [("active power", "W"), ("reactive power", "VAr")]:
+                if kind == "pv" and unit == "VAr":
+                    continue
+                db.session.add(
+                    Sensor(
+                        name=sensor_name,
+                        generic_asset=asset,
+                        unit=unit,
+                        event_resolution=sensor_resolution,
+                        timezone=timezone,
+                    )
+                )
+    # Assets and sensors are inserted in batches, too, when flushing
+    db.session.flush()
+    return network
+
+
+def to_pandapower(frozen: FrozenNetwork) -> pp.pandapowerNet:
+    """Build a pandapower network from a network snapshot, indexing buses, lines, transformers and shunts by their resource id.
+
+    Assets become loads, static generators, generators and external grids (see import_network).
+    """
+    net = pp.create_empty_network()
+    tables = frozen.tables
+    for bus in tables["bus"].itertuples():
+        pp.create_bus(
+            net,
+            index=bus.Index,
+            vn_kv=bus.vn_kv,
+            max_vm_pu=bus.max_vm_pu,
+            min_vm_pu=bus.min_vm_pu,
+        )
+    for line in tables["line"].itertuples():
+        pp.create_line_from_parameters(
+            net,
+            index=line.Index,
+            from_bus=int(line.from_bus),
+            to_bus=int(line.to_bus),
+            length_km=line.length_km,
+            r_ohm_per_km=line.r_ohm_per_km,
+            x_ohm_per_km=line.x_ohm_per_km,
+            c_nf_per_km=line.c_nf_per_km,
+            max_i_ka=line.max_i_ka,
+        )
+    for trafo in tables["transformer"].itertuples():
+        pp.create_transformer_from_parameters(
+            net,
+            index=trafo.Index,
+            hv_bus=int(trafo.hv_bus),
+            lv_bus=int(trafo.lv_bus),
+            sn_mva=trafo.sn_mva,
+            vn_hv_kv=trafo.vn_hv_kv,
+            vn_lv_kv=trafo.vn_lv_kv,
+            vk_percent=trafo.vk_percent,
+            vkr_percent=trafo.vkr_percent,
+            pfe_kw=trafo.pfe_kw,
+            i0_percent=trafo.i0_percent,
+        )
+    for shunt in tables["shunt"].itertuples():
+        pp.create_shunt(
+            net,
+            index=shunt.Index,
+            bus=int(shunt.bus),
+            q_mvar=shunt.q_mvar,
+            p_mw=shunt.p_mw,
+            vn_kv=shunt.vn_kv,
+        )
+
+    for asset_id, asset in sorted(frozen.assets.items()):
+        attributes = asset["attributes"]
+        bus = attributes["bus"]
+        if asset["kind"] == "load":
+            pp.create_load(
+                net,
+                index=asset_id,
+                bus=bus,
+                p_mw=attributes.get("p_mw") or 0.0,
+                q_mvar=attributes.get("q_mvar") or 0.0,
+                name=asset["name"],
+            )
+        elif asset["kind"] == "pv":
+            pp.create_sgen(
+                net,
+                index=asset_id,
+                bus=bus,
+                p_mw=attributes.get("p_mw") or 0.0,
+                q_mvar=attributes.get("q_mvar") or 0.0,
+                name=asset["name"],
+            )
+        else:
+            limits = {
+                attribute: attributes[attribute]
+                for attribute in ASSET_ATTRIBUTES["ext_grid"]
+                if attributes.get(attribute) is not None
+            }
+            limits.setdefault("vm_pu", 1.0)
+            if asset["kind"] == "external_grid":
+                et = "ext_grid"
+                pp.create_ext_grid(
+                    net, index=asset_id, bus=bus, name=asset["name"], **limits
+                )
+            else:
+                et = "gen"
+                pp.create_gen(
+                    net,
+                    index=asset_id,
+                    bus=bus,
+                    p_mw=attributes.get("p_mw") or 0.0,
+                    controllable=True,
+                    name=asset["name"],
+                    **limits,
+                )
+            pp.create_poly_cost(
+                net,
+                element=asset_id,
+                et=et,
+                **{
+                    column: attributes.get(attribute) or 0.0
+                    for attribute, column in COST_ATTRIBUTES.items()
+                },
+            )
+    return net
+
+
+def _element_name(table: pd.DataFrame, index: int, kind: str) -> str:
+    name = table.at[index, "name"] if "name" in table.columns else None
+    if name is None or (isinstance(name, float) and np.isnan(name)) or name == "":
+        return f"{kind} {index}"
+    return str(name)
+
+
+def _to_python(value):
+    """Plain Python version of a pandapower table value, for inserting into the database (missing values become None)."""
+    if value is None or pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
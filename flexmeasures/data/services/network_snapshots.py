@@ -0,0 +1,273 @@
+"""
+Logic around network snapshots: immutable copies of a network, with the parameters of all its resources and assets,
+identified by a hash of their content.
+
+Runs record the snapshot they used (so two runs with the same hash used the same network),
+and workers read snapshots from a local cache rather than from the live (mutable) rows in the database.
+
+A snapshot is serialized with MessagePack (as are sensor data messages), with sorted keys and columnar tables,
+so that the same content always gives the same bytes, and thereby the same hash.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import hashlib
+import json
+import math
+import os
+
+from flask import current_app
+import isodate
+import msgpack
+import pandas as pd
+
+from flexmeasures.data import db
+from flexmeasures.data.models.generic_assets import GenericAsset
+from flexmeasures.data.models.network_resources import PARAMETER_MODELS
+from flexmeasures.data.models.networks import Network, NetworkSnapshot
+from flexmeasures.data.services.networks import (
+    get_asset_kind,
+    get_assets_on_buses,
+    get_network_tables,
+    set_parameter_dtypes,
+)
+from flexmeasures.utils.time_utils import server_now
+
+
+# Snapshots already read by this process, by hash
+_snapshots: dict[str, "FrozenNetwork"] = {}
+
+
+@dataclass
+class FrozenNetwork:
+    """The content of a network snapshot.
+
+    Resource tables are laid out like those of get_network_tables.
+    Assets are keyed by id, each with their kind (e.g. "load"), name, attributes and sensors.
+    """
+
+    network_id: int
+    tables: dict[str, pd.DataFrame]
+    assets: dict[int, dict]
+    hash: str = field(init=False)
+
+    def __post_init__(self):
+        self.hash = hashlib.sha256(self.to_bytes()).hexdigest()
+
+    def _content(self) -> dict:
+        return dict(
+            network_id=self.network_id,
+            resources={
+                kind: dict(
+                    id=[int(i) for i in table.index],
+                    **{
+                        column: [_plain(v) for v in table[column]]
+                        for column in table.columns
+                    },
+                )
+                for kind, table in self.tables.items()
+            },
+            assets={str(asset_id): asset for asset_id, asset in self.assets.items()},
+        )
+
+    def to_bytes(self) -> bytes:
+        return msgpack.packb(_sort_keys(self._content()))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> FrozenNetwork:
+        content = msgpack.unpackb(data)
+        tables = {}
+        for kind, model in PARAMETER_MODELS.items():
+            columns = content["resources"][kind]
+            table = pd.DataFrame(
+                {name: columns[name] for name in model.parameter_names()},
+                index=pd.Index(columns["id"], name="id", dtype=int),
+            )
+            tables[kind] = set_parameter_dtypes(table, model)
+        return cls(
+            network_id=content["network_id"],
+            tables=tables,
+            assets={
+                int(asset_id): asset for asset_id, asset in content["assets"].items()
+            },
+        )
+
+    def get_tables(
+        self, resource_ids: list[int] | None = None
+    ) -> dict[str, pd.DataFrame]:
+        """Like get_network_tables, optionally restricted to the given resources."""
+        if resource_ids is None:
+            return self.tables
+        return {
+            kind: table[table.index.isin(list(resource_ids))]
+            for kind, table in self.tables.items()
+        }
+
+    def get_asset_ids(self, kind: str) -> list[int]:
+        """Ids of the assets of a kind (pv, battery, load or external_grid), in ascending order."""
+        return sorted(
+            asset_id for asset_id, asset in self.assets.items() if asset["kind"] == kind
+        )
+
+    def get_asset_attribute(self, asset_id: int, attribute: str, default=None):
+        """Like GenericAsset.get_attribute, for the frozen attributes of an asset.
+
+        :raises KeyError: if the asset is not in the snapshot (rather than reading its live attributes,
+                          which would make runs on the same snapshot differ)
+        """
+        if asset_id not in self.assets:
+            raise KeyError(
+                f"Asset {asset_id} is not part of network snapshot {self.hash}."
+            )
+        return self.assets[asset_id]["attributes"].get(attribute, default)
+
+
+def freeze_network(network: Network, asset_ids: list[int] = ()) -> FrozenNetwork:
+    """Read the current state of a network, and of its assets, into a FrozenNetwork.
+
+    Frozen assets are those connected to the network's buses, plus the given assets
+    (such as the external grid and batteries passed to a job), so that all assets a network is built from are frozen.
+
+    :raises ValueError: if a given asset does not exist
+    """
+    tables = get_network_tables(network)
+    assets = {}
+    for kind, assets_of_kind in get_assets_on_buses(list(tables["bus"].index)).items():
+        for asset in assets_of_kind:
+            assets[asset.id] = _freeze_asset(asset, kind)
+    for asset_id in asset_ids:
+        if int(asset_id) in assets:
+            continue
+        asset = db.session.get(GenericAsset, asset_id)
+        if asset is None:
+            raise ValueError(f"No asset with ID {asset_id}.")
+        assets[asset.id] = _freeze_asset(asset, get_asset_kind(asset) or "other")
+    return FrozenNetwork(network_id=network.id, tables=tables, assets=assets)
+
+
+def take_network_snapshot(network: Network, asset_ids: list[int] = ()) -> FrozenNetwork:
+    """Freeze a network (and the given assets, see freeze_network) and store the snapshot,
+    unless an identical snapshot exists already.
+
+    Does not commit.
+    """
+    frozen = freeze_network(network, asset_ids)
+    if db.session.get(NetworkSnapshot, frozen.hash) is None:
+        data = frozen.to_bytes()
+        db.session.add(
+            NetworkSnapshot(
+                hash=frozen.hash,
+                network_id=network.id,
+                created_at=server_now(),
+                data=data,
+            )
+        )
+        db.session.flush()
+        write_to_local_cache(_local_cache_path(frozen.hash), data)
+    _snapshots[frozen.hash] = frozen
+    return frozen
+
+
+def load_network_snapshot(snapshot_hash: str) -> FrozenNetwork:
+    """Read a snapshot from this process, from the local cache or else from the database (and then cache it locally).
+
+    :raises ValueError: if no snapshot with this hash exists
+    """
+    if snapshot_hash in _snapshots:
+        return _snapshots[snapshot_hash]
+    frozen = None
+    path = _local_cache_path(snapshot_hash)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            frozen = FrozenNetwork.from_bytes(f.read())
+        if frozen.hash != snapshot_hash:
+            # Corrupted or tampered with, so fall back to the database
+            frozen = None
+    if frozen is None:
+        snapshot = db.session.get(NetworkSnapshot, snapshot_hash)
+        if snapshot is None:
+            raise ValueError(f"No network snapshot with hash {snapshot_hash}.")
+        frozen = FrozenNetwork.from_bytes(snapshot.data)
+        write_to_local_cache(_local_cache_path(snapshot_hash), snapshot.data)
+    _snapshots[snapshot_hash] = frozen
+    return frozen
+
+
+def get_asset_attribute_getter(frozen: FrozenNetwork | None):
+    """Look up asset attributes in a snapshot if given, or else in the database."""
+    if frozen is not None:
+        return frozen.get_asset_attribute
+    return _get_asset_attribute_from_db
+
+
+def get_local_cache_path(filename: str) -> str:
+    """Path of a file in the local cache of network snapshots (and artefacts derived from them).
+
+    By default, the cache lives in the app's instance folder, rather than in a folder shared with other users.
+    """
+    folder = current_app.config.get(
+        "FLEXMEASURES_NETWORK_SNAPSHOT_PATH"
+    ) or os.path.join(current_app.instance_path, "network-snapshots")
+    return os.path.join(folder, filename)
+
+
+def write_to_local_cache(path: str, data: bytes):
+    """Write a file to the local cache, readable and writable by the owner only."""
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    # Write to a temporary file first, so concurrent readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with os.fdopen(
+        os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb"
+    ) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _get_asset_attribute_from_db(asset_id: int, attribute: str, default=None):
+    asset = db.session.get(GenericAsset, asset_id)
+    if asset is None:
+        return default
+    return asset.get_attribute(attribute, default)
+
+
+def _freeze_asset(asset: GenericAsset, kind: str) -> dict:
+    return dict(
+        kind=kind,
+        name=asset.name,
+        attributes=json.loads(json.dumps(asset.attributes or {}, default=str)),
+        sensors=[
+            dict(
+                id=sensor.id,
+                unit=sensor.unit,
+                event_resolution=isodate.duration_isoformat(sensor.event_resolution),
+            )
+            for sensor in sorted(asset.sensors, key=lambda s: s.id)
+        ],
+    )
+
+
+def _local_cache_path(snapshot_hash: str) -> str:
+    return get_local_cache_path(f"{snapshot_hash}.msgpack")
+
+
+def _sort_keys(content):
+    """Nested content with its dicts sorted by key, as MessagePack keeps the insertion order."""
+    if isinstance(content, dict):
+        return {key: _sort_keys(content[key]) for key in sorted(content)}
+    if isinstance(content, list):
+        return [_sort_keys(item) for item in content]
+    return content
+
+
+def _plain(value):
+    """Plain Python version of a table value (missing values become None)."""
+    if value is None or value is pd.NA:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+    return value
@@ -0,0 +1,334 @@
+"""
+Logic around the topology of a network: which buses are connected through lines and transformers.
+
+The topology is kept as a sparse adjacency matrix over the buses, so that queries like finding islands,
+feeders or the buses downstream of a bus run in O(V+E), using scipy.sparse.csgraph.
+
+Topologies are cached per network, in-process and in Redis (if available), packed with MessagePack.
+The cache is invalidated once a transaction that changed networks, their memberships, network resources
+or their parameters is committed (see _invalidate_after_commit), whether through the ORM or through
+insert, update or delete statements. Until then, the session that made the changes builds topologies without caching them.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import chain
+
+from flask import current_app, has_app_context
+import msgpack
+import numpy as np
+import pandas as pd
+from redis.exceptions import ConnectionError
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, connected_components
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from flexmeasures.data import db
+from flexmeasures.data.models.network_resources import (
+    PARAMETER_MODELS,
+    NetworkResource,
+)
+from flexmeasures.data.models.networks import Network, NetworkMembership
+from flexmeasures.data.services.networks import get_network_tables
+from flexmeasures.utils.msgpack_utils import (
+    pack_array,
+    pack_frame,
+    unpack_array,
+    unpack_frame,
+)
+
+
+# Endpoints of each kind of branch, as named in their parameter tables
+BRANCH_ENDPOINTS = dict(line=("from_bus", "to_bus"), transformer=("hv_bus", "lv_bus"))
+
+TOPOLOGY_VERSION_KEY = "network-topology:version"
+TOPOLOGY_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Models whose changes affect topologies
+TOPOLOGY_MODELS = (
+    Network,
+    NetworkMembership,
+    NetworkResource,
+    *PARAMETER_MODELS.values(),
+)
+# Session info key, marking uncommitted changes to topologies
+CHANGED_KEY = "network_topology_changed"
+
+# In-process cache, keyed by (network id, topology version)
+_topologies: dict[tuple[int, int], "NetworkTopology"] = {}
+_local_version = 0
+
+
+class InvalidNetworkTopology(ValueError):
+    pass
+
+
+@dataclass
+class NetworkTopology:
+    """Sparse graph of the buses in a network (nodes) and the lines and transformers connecting them (edges).
+
+    Buses are referred to by their resource id, and internally by their position in bus_ids.
+    """
+
+    bus_ids: np.ndarray
+    adjacency: csr_matrix
+    branches: pd.DataFrame  # kind, from_bus and to_bus, indexed by resource id
+    dangling_branches: list[int]  # branches with an endpoint outside the network
+
+    @classmethod
+    def from_tables(cls, tables: dict[str, pd.DataFrame]) -> NetworkTopology:
+        """Build the topology from the tables returned by get_network_tables."""
+        bus_ids = np.sort(tables["bus"].index.to_numpy(dtype=int))
+        branches = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "kind": kind,
+                        "from_bus": tables[kind][from_column],
+                        "to_bus": tables[kind][to_column],
+                    },
+                    index=tables[kind].index,
+                )
+                for kind, (from_column, to_column) in BRANCH_ENDPOINTS.items()
+            ]
+        )
+        known = branches["from_bus"].isin(bus_ids) & branches["to_bus"].isin(bus_ids)
+        connected = branches[known]
+        rows = np.searchsorted(bus_ids, connected["from_bus"].to_numpy(dtype=int))
+        cols = np.searchsorted(bus_ids, connected["to_bus"].to_numpy(dtype=int))
+        adjacency = csr_matrix(
+            (
+                np.ones(2 * len(rows)),
+                (np.hstack([rows, cols]), np.hstack([cols, rows])),
+            ),
+            shape=(len(bus_ids), len(bus_ids)),
+        )
+        return cls(
+            bus_ids=bus_ids,
+            adjacency=adjacency,
+            branches=branches,
+            dangling_branches=branches.index[~known].tolist(),
+        )
+
+    def to_bytes(self) -> bytes:
+        return msgpack.packb(
+            dict(
+                bus_ids=pack_array(self.bus_ids),
+                data=pack_array(self.adjacency.data),
+                indices=pack_array(self.adjacency.indices),
+                indptr=pack_array(self.adjacency.indptr),
+                branches=pack_frame(self.branches.reset_index(names="id")),
+                branches_index_name=self.branches.index.name,
+                dangling_branches=[int(i) for i in self.dangling_branches],
+            )
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> NetworkTopology:
+        """Inverse of to_bytes.
+
+        :raises ValueError: if the data is not a packed topology
+        """
+        content = msgpack.unpackb(data)
+        bus_ids = unpack_array(content["bus_ids"])
+        return cls(
+            bus_ids=bus_ids,
+            adjacency=csr_matrix(
+                (
+                    unpack_array(content["data"]),
+                    unpack_array(content["indices"]),
+                    unpack_array(content["indptr"]),
+                ),
+                shape=(len(bus_ids), len(bus_ids)),
+            ),
+            branches=unpack_frame(content["branches"])
+            .set_index("id")
+            .rename_axis(content["branches_index_name"]),
+            dangling_branches=content["dangling_branches"],
+        )
+
+    def _position(self, bus_id: int) -> int:
+        position = np.searchsorted(self.bus_ids, bus_id)
+        if position == len(self.bus_ids) or self.bus_ids[position] != bus_id:
+            raise KeyError(f"Bus {bus_id} is not part of this network.")
+        return int(position)
+
+    def islands(self) -> list[list[int]]:
+        """Groups of buses that are connected to each other, but not to other groups."""
+        n_islands, labels = connected_components(self.adjacency, directed=False)
+        return [self.bus_ids[labels == label].tolist() for label in range(n_islands)]
+
+    def is_radial(self) -> bool:
+        """True if the network has no loops (including parallel branches), i.e. each island is a tree."""
+        n_islands, _ = connected_components(self.adjacency, directed=False)
+        n_branches = len(self.branches) - len(self.dangling_branches)
+        return n_branches == len(self.bus_ids) - n_islands
+
+    def _bfs(self, root: int) -> tuple[np.ndarray, np.ndarray]:
+        return breadth_first_order(
+            self.adjacency,
+            self._position(root),
+            directed=False,
+            return_predecessors=True,
+        )
+
+    def downstream_buses(self, bus_id: int, root: int) -> list[int]:
+        """Buses fed through the given bus, when the network is fed from root (e.g. the slack bus).
+
+        In meshed networks, each bus counts as downstream of the bus through which breadth-first search first reaches it.
+        """
+        order, predecessors = self._bfs(root)
+        start = self._position(bus_id)
+        downstream = np.zeros(len(self.bus_ids), dtype=bool)
+        for node in order:
+            # Breadth-first order visits parents before their children
+            if node == start or (
+                predecessors[node] >= 0 and downstream[predecessors[node]]
+            ):
+                downstream[node] = True
+        return self.bus_ids[downstream].tolist()
+
+    def feeders(self, root: int) -> dict[int, list[int]]:
+        """The buses fed through each neighbour of root, keyed by that neighbour."""
+        order, predecessors = self._bfs(root)
+        root_position = self._position(root)
+        feeder = np.full(len(self.bus_ids), -1)
+        for node in order:
+            if node == root_position:
+                continue
+            parent = predecessors[node]
+            feeder[node] = node if parent == root_position else feeder[parent]
+        return {
+            int(self.bus_ids[head]): self.bus_ids[feeder == head].tolist()
+            for head in np.unique(feeder[feeder >= 0])
+        }
+
+    def path(self, root: int, bus_id: int) -> list[int]:
+        """Buses on a shortest path (in number of branches) from root to the given bus, or [] if unreachable."""
+        _, predecessors = self._bfs(root)
+        node = self._position(bus_id)
+        root_position = self._position(root)
+        path = [node]
+        while node != root_position:
+            node = predecessors[node]
+            if node < 0:
+                return []
+            path.append(node)
+        return self.bus_ids[path[::-1]].tolist()
+
+
+def validate_topology(topology: NetworkTopology, slack_buses: list[int]):
+    """Check that a network can be solved, before spending time in a (optimal) power flow.
+
+    :param slack_buses: buses with an external grid or slack generator
+    :raises InvalidNetworkTopology: if any branch connects to buses outside the network,
+                                    or any island lacks a slack bus
+    """
+    problems = []
+    if topology.dangling_branches:
+        problems.append(
+            f"branches {topology.dangling_branches} connect to buses outside the network"
+        )
+    slack_buses = set(slack_buses)
+    unsupplied = [
+        island for island in topology.islands() if not slack_buses & set(island)
+    ]
+    if unsupplied:
+        problems.append(
+            f"islands {unsupplied} have no external grid or slack generator"
+        )
+    if problems:
+        raise InvalidNetworkTopology(f"Invalid network: {'; '.join(problems)}.")
+
+
+def get_network_topology(network: Network) -> NetworkTopology:
+    """Get the topology of a network, from the in-process cache, from Redis or else by building it.
+
+    While the session holds uncommitted changes to topologies, the topology is built, and not cached.
+    """
+    if db.session.info.get(CHANGED_KEY):
+        return NetworkTopology.from_tables(get_network_tables(network))
+    version = get_topology_version()
+    key = (network.id, version)
+    if key in _topologies:
+        return _topologies[key]
+    # Topologies of older versions are outdated
+    for outdated_key in [k for k in _topologies if k[1] != version]:
+        del _topologies[outdated_key]
+    redis_key = f"network-topology:{network.id}:{version}"
+    topology = None
+    try:
+        cached = current_app.redis_connection.get(redis_key)
+        if cached is not None:
+            topology = NetworkTopology.from_bytes(cached)
+    except (ConnectionError, ConnectionRefusedError):
+        pass
+    except (ValueError, KeyError, TypeError):
+        # Not a packed topology, so rebuild it
+        topology = None
+    if topology is None:
+        topology = NetworkTopology.from_tables(get_network_tables(network))
+        try:
+            current_app.redis_connection.set(
+                redis_key, topology.to_bytes(), ex=TOPOLOGY_CACHE_TTL
+            )
+        except (ConnectionError, ConnectionRefusedError):
+            pass
+    _topologies[key] = topology
+    return topology
+
+
+def get_topology_version() -> int:
+    """Shared version (in Redis) of all network topologies, or the version known to this process if Redis is unavailable."""
+    try:
+        return int(current_app.redis_connection.get(TOPOLOGY_VERSION_KEY) or 0)
+    except (ConnectionError, ConnectionRefusedError):
+        return _local_version
+
+
+def invalidate_network_topologies():
+    """Drop all cached topologies, in this process and (by bumping the shared version) in other processes."""
+    global _local_version
+    _local_version += 1
+    _topologies.clear()
+    try:
+        current_app.redis_connection.incr(TOPOLOGY_VERSION_KEY)
+    except (ConnectionError, ConnectionRefusedError):
+        pass
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed_changes(session: Session, flush_context):
+    if any(
+        isinstance(obj, TOPOLOGY_MODELS)
+        for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info[CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_executed_changes(orm_execute_state):
+    """Catch insert, update and delete statements, which bypass the flush (e.g. db.session.execute(delete(Network)))."""
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, TOPOLOGY_MODELS):
+        orm_execute_state.session.info[CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    """Invalidate topologies only once changes are committed, so other processes do not rebuild them from older data."""
+    if session.info.pop(CHANGED_KEY, False) and has_app_context():
+        invalidate_network_topologies()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_changes(session: Session):
+    session.info.pop(CHANGED_KEY, None)
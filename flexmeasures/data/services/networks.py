@@ -0,0 +1,217 @@
+"""
+Logic around looking up the elements (network resources and assets) that make up a network, and their sensors
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from flexmeasures.data import db
+from flexmeasures.data.models.generic_assets import GenericAsset, GenericAssetType
+from flexmeasures.data.models.network_resources import (
+    NETWORK_RESOURCE_TYPE_IDS,
+    PARAMETER_MODELS,
+    NetworkResource,
+    NetworkResourceParameters,
+)
+from flexmeasures.data.models.networks import Network, NetworkMembership
+from flexmeasures.data.models.time_series import Sensor, TimedBelief
+from flexmeasures.data.services.utils import get_or_create_model
+
+
+# Asset types of the assets that connect to buses
+ASSET_TYPE_IDS = dict(pv=1, battery=5, load=6)
+
+
+def get_network_resources(network: Network) -> dict[str, list[NetworkResource]]:
+    """Look up the network resources of a network in one query, grouped by kind (e.g. "bus" or "line").
+
+    Resources of an unknown type are grouped under their type id.
+    """
+    kind_by_type_id = {v: k for k, v in NETWORK_RESOURCE_TYPE_IDS.items()}
+    resources = db.session.scalars(
+        select(NetworkResource)
+        .join(NetworkMembership)
+        .filter(NetworkMembership.network_id == network.id)
+        .order_by(NetworkResource.id)
+    ).all()
+    grouped: dict[str, list[NetworkResource]] = {
+        kind: [] for kind in NETWORK_RESOURCE_TYPE_IDS
+    }
+    for resource in resources:
+        kind = kind_by_type_id.get(
+            resource.network_resource_type_id, resource.network_resource_type_id
+        )
+        grouped.setdefault(kind, []).append(resource)
+    return grouped
+
+
+def get_network_resource_ids(network: Network) -> dict[str, list[int]]:
+    """Like get_network_resources, but returns ids, e.g. {"bus": [1, 2], "line": [3], ...}."""
+    return {
+        kind: list(table.index) for kind, table in get_network_tables(network).items()
+    }
+
+
+def get_network_tables(
+    network: Network | None = None, resource_ids: list[int] | None = None
+) -> dict[str, pd.DataFrame]:
+    """Load the resources of a network, with their typed electrical parameters, in one query.
+
+    Returns one table per kind (bus, line, transformer and shunt), indexed by resource id (in ascending order),
+    with a column per parameter (see PARAMETER_MODELS), such that parameters can be read out as arrays,
+    e.g. tables["line"]["r_ohm_per_km"].to_numpy().
+    References to buses (like a line's from_bus) are nullable integers.
+
+    :param network:         load the resources of this network
+    :param resource_ids:    alternatively (or additionally), load only these resources
+    """
+    columns = [
+        getattr(model, name).label(f"{kind}.{name}")
+        for kind, model in PARAMETER_MODELS.items()
+        for name in model.parameter_names()
+    ]
+    query = select(
+        NetworkResource.id, NetworkResource.network_resource_type_id, *columns
+    )
+    for model in PARAMETER_MODELS.values():
+        query = query.outerjoin(model, model.network_resource_id == NetworkResource.id)
+    if network is not None:
+        query = query.join(
+            NetworkMembership,
+            NetworkMembership.network_resource_id == NetworkResource.id,
+        ).filter(NetworkMembership.network_id == network.id)
+    if resource_ids is not None:
+        query = query.filter(NetworkResource.id.in_(resource_ids))
+    rows = db.session.execute(query.order_by(NetworkResource.id)).all()
+    df = pd.DataFrame(
+        rows, columns=["id", "network_resource_type_id"] + [c.name for c in columns]
+    ).set_index("id")
+
+    tables = {}
+    for kind, model in PARAMETER_MODELS.items():
+        table = df.loc[
+            df["network_resource_type_id"] == NETWORK_RESOURCE_TYPE_IDS[kind],
+            [f"{kind}.{name}" for name in model.parameter_names()],
+        ].copy()
+        table.columns = model.parameter_names()
+        tables[kind] = set_parameter_dtypes(table, model)
+    return tables
+
+
+def set_parameter_dtypes(
+    table: pd.DataFrame, model: type[NetworkResourceParameters]
+) -> pd.DataFrame:
+    """Make references to buses nullable integers, and all other parameters floats."""
+    for column in model.__table__.columns:
+        if column.name in table.columns:
+            table[column.name] = table[column.name].astype(
+                "Int64" if isinstance(column.type, db.Integer) else float
+            )
+    return table
+
+
+def get_assets_on_buses(bus_ids: list[int]) -> dict[str, list[GenericAsset]]:
+    """Look up the assets connected to the given buses (through their "bus" attribute), grouped by kind.
+
+    Batteries that act as the external grid (by name or by their "slack" attribute) are grouped as "external_grid".
+    """
+    bus_ids = set(bus_ids)
+    assets = db.session.scalars(
+        select(GenericAsset)
+        .filter(GenericAsset.generic_asset_type_id.in_(ASSET_TYPE_IDS.values()))
+        .order_by(GenericAsset.id)
+    ).all()
+    grouped: dict[str, list[GenericAsset]] = defaultdict(list)
+    for asset in assets:
+        if asset.get_attribute("bus") not in bus_ids:
+            continue
+        grouped[get_asset_kind(asset)].append(asset)
+    return {
+        kind: grouped.get(kind, []) for kind in list(ASSET_TYPE_IDS) + ["external_grid"]
+    }
+
+
+def get_asset_kind(asset: GenericAsset) -> str | None:
+    """Kind of a network asset (pv, battery, load or external_grid), or None for other assets."""
+    kind = {v: k for k, v in ASSET_TYPE_IDS.items()}.get(asset.generic_asset_type_id)
+    if kind == "battery" and (
+        "external grid" in asset.name.lower() or asset.get_attribute("slack") == "True"
+    ):
+        kind = "external_grid"
+    return kind
+
+
+def get_network_asset_name(network: Network, kind: str) -> str:
+    """For example, "nodal prices of network 1"."""
+    return f"{kind} of network {network.id}"
+
+
+def get_or_create_network_asset(
+    network: Network, kind: str, description: str
+) -> GenericAsset:
+    """Get (or create) the asset holding the sensors of a given kind for a network, such as its nodal prices.
+
+    Network resources (like buses) have no sensors of their own, so such sensors are grouped under one asset per network and kind.
+    """
+    asset_type = get_or_create_model(
+        GenericAssetType, name=kind, description=description
+    )
+    return get_or_create_model(
+        GenericAsset,
+        name=get_network_asset_name(network, kind),
+        generic_asset_type=asset_type,
+        account_id=network.account_id,
+    )
+
+
+def find_network_asset(network: Network, kind: str) -> GenericAsset | None:
+    """Like get_or_create_network_asset, but returns None instead of creating the asset."""
+    return db.session.execute(
+        select(GenericAsset).filter_by(name=get_network_asset_name(network, kind))
+    ).scalar_one_or_none()
+
+
+def get_sensor_with_unit(asset: GenericAsset, unit: str) -> Sensor | None:
+    for sensor in asset.sensors:
+        if sensor.unit == unit:
+            return sensor
+    return None
+
+
+def search_values(
+    sensors: list[Sensor | None],
+    index: pd.DatetimeIndex,
+    source: str | None = None,
+    fill_value: float = np.nan,
+) -> np.ndarray:
+    """Search the most recent beliefs of several sensors in one go, as an array with shape (steps, sensors).
+
+    The index should be regular (i.e. have a freq).
+
+    Missing sensors and missing events are filled with fill_value.
+    """
+    values = np.full((len(index), len(sensors)), fill_value, dtype=float)
+    existing_sensors = [sensor for sensor in sensors if sensor is not None]
+    if len(index) == 0 or not existing_sensors:
+        return values
+    bdf_dict = TimedBelief.search(
+        existing_sensors,
+        event_starts_after=index[0],
+        event_ends_before=index[-1] + index.freq,
+        source=source,
+        most_recent_beliefs_only=True,
+        one_deterministic_belief_per_event=True,
+        sum_multiple=False,
+    )
+    for j, sensor in enumerate(sensors):
+        if sensor is None or bdf_dict[sensor].empty:
+            continue
+        s = bdf_dict[sensor].reset_index().set_index("event_start")["event_value"]
+        s = s.reindex(index)
+        values[:, j] = np.where(s.isna(), fill_value, s.to_numpy(dtype=float))
+    return values
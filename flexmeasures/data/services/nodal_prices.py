@@ -0,0 +1,160 @@
+"""
+Logic around storing and reusing nodal prices (locational marginal prices, or LMPs) found by an optimal power flow.
+
+Each OPF run yields an active (lam_p) and a reactive (lam_q) power price per bus, which we store as price sensors per bus,
+so services can look them up later instead of running the OPF again.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import timely_beliefs as tb
+
+from flexmeasures.data import db
+from flexmeasures.data.models.networks import Network
+from flexmeasures.data.models.time_series import Sensor
+from flexmeasures.data.services.networks import (
+    find_network_asset,
+    get_or_create_network_asset,
+    search_values,
+)
+from flexmeasures.data.services.utils import get_or_create_model
+from flexmeasures.data.utils import get_data_source, save_to_db
+from flexmeasures.utils.time_utils import server_now
+
+
+NODAL_PRICE_ASSET_KIND = "nodal prices"
+
+# Price kinds (as named in pandapower's res_bus table) and their units
+NODAL_PRICE_UNITS = dict(lam_p="EUR/MWh", lam_q="EUR/MVArh")
+
+
+def get_nodal_price_sensor_name(kind: str, bus_id: int) -> str:
+    """For example, "bus 3 lam_p"."""
+    return f"bus {bus_id} {kind}"
+
+
+def get_nodal_price_sensors(
+    network: Network, bus_ids: list[int], resolution: timedelta
+) -> dict[tuple[str, int], Sensor]:
+    """Get (or create) the nodal price sensors of the given buses, keyed by (price kind, bus id)."""
+    asset = get_or_create_network_asset(
+        network,
+        NODAL_PRICE_ASSET_KIND,
+        description="Holds the nodal prices (LMPs) at the buses of a network.",
+    )
+    sensors = {}
+    for kind, unit in NODAL_PRICE_UNITS.items():
+        for bus_id in bus_ids:
+            sensors[(kind, bus_id)] = get_or_create_model(
+                Sensor,
+                name=get_nodal_price_sensor_name(kind, bus_id),
+                generic_asset=asset,
+                unit=unit,
+                event_resolution=resolution,
+            )
+    db.session.flush()
+    return sensors
+
+
+def read_nodal_prices(net) -> dict[str, pd.Series]:
+    """Nodal prices from the last OPF run on a pandapower network, per price kind, indexed by bus id."""
+    return {kind: net.res_bus[kind].copy() for kind in NODAL_PRICE_UNITS}
+
+
+def stack_nodal_prices(
+    steps: list[dict[str, pd.Series]], start: datetime, resolution: timedelta
+) -> dict[str, pd.DataFrame]:
+    """Stack the nodal prices of consecutive OPF runs (see read_nodal_prices) into one frame per price kind,
+    indexed by event start, with a column per bus id."""
+    index = pd.date_range(
+        start, periods=len(steps), freq=resolution, name="event_start"
+    )
+    return {
+        kind: pd.DataFrame([step[kind] for step in steps], index=index)
+        for kind in NODAL_PRICE_UNITS
+    }
+
+
+def save_nodal_prices(
+    network: Network,
+    prices: dict[str, pd.DataFrame],
+    belief_time: datetime | None = None,
+) -> str:
+    """Save nodal prices (see stack_nodal_prices) as price sensors per bus, in one bulk write.
+
+    Does not commit, like save_to_db.
+    """
+    first = next(iter(prices.values()))
+    if first.empty:
+        return "success_but_nothing_new"
+    sensors = get_nodal_price_sensors(
+        network, bus_ids=list(first.columns), resolution=first.index.freq
+    )
+    data_source = get_data_source(
+        data_source_name="nodal prices", data_source_type="scheduler"
+    )
+    belief_time = belief_time or server_now()
+    bdfs = [
+        tb.BeliefsDataFrame(
+            df[bus_id].rename("event_value"),
+            sensor=sensors[(kind, bus_id)],
+            source=data_source,
+            belief_time=belief_time,
+        )
+        for kind, df in prices.items()
+        for bus_id in df.columns
+    ]
+    return save_to_db(bdfs, bulk_save_objects=True)
+
+
+def get_stored_nodal_prices(
+    network: Network,
+    bus_ids: list[int],
+    start: datetime,
+    end: datetime,
+    resolution: timedelta,
+) -> dict[str, pd.DataFrame]:
+    """Look up stored nodal prices (most recent beliefs) in one go, in the same layout as stack_nodal_prices.
+
+    :raises ValueError: if prices are missing for any of the buses or steps
+    """
+    index = pd.date_range(
+        start, end, freq=resolution, inclusive="left", name="event_start"
+    )
+    asset = find_network_asset(network, NODAL_PRICE_ASSET_KIND)
+    sensors_by_name = (
+        {sensor.name: sensor for sensor in asset.sensors} if asset is not None else {}
+    )
+    keys = [(kind, bus_id) for kind in NODAL_PRICE_UNITS for bus_id in bus_ids]
+    values = search_values(
+        [
+            sensors_by_name.get(get_nodal_price_sensor_name(kind, bus_id))
+            for kind, bus_id in keys
+        ],
+        index,
+    )
+    if np.isnan(values).any():
+        missing_buses = sorted(
+            {
+                bus_id
+                for j, (_, bus_id) in enumerate(keys)
+                if np.isnan(values[:, j]).any()
+            }
+        )
+        raise ValueError(
+            f"No stored nodal prices for buses {missing_buses} of network {network.id} between {start} and {end}."
+            " Run an OPF-based service (e.g. `flexmeasures add opf`) first."
+        )
+    frame = pd.DataFrame(values, index=index, columns=pd.MultiIndex.from_tuples(keys))
+    return {kind: frame[kind] for kind in NODAL_PRICE_UNITS}
+
+
+def get_prices_at_elements(
+    bus_prices: pd.Series, element_buses: pd.Series | list[int]
+) -> np.ndarray:
+    """Look up the nodal prices at the buses of some network elements (e.g. net.load["bus"])."""
+    return bus_prices.reindex(list(element_buses)).to_numpy(dtype=float)
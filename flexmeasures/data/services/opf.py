@@ -1,9 +1,10 @@
+from __future__ import annotations
+
 from ast import List
 from datetime import datetime, timedelta
 
 import click
 from numpy import single
-from flexmeasures.data.models.network_resources import NetworkResource
 from rq import get_current_job
 import pandapower as pp
 import timely_beliefs as tb
@@ -11,8 +12,29 @@ import timely_beliefs as tb
 from flexmeasures.data import db
 from flexmeasures.data.models.planning.storage import StorageScheduler
 from flexmeasures.data.models.generic_assets import GenericAsset
+from flexmeasures.data.models.networks import Network
 from flexmeasures.data.models.time_series import Sensor, TimedBelief
 from flexmeasures.data.models.planning.utils import initialize_series
+from flexmeasures.data.services.job_progress import report_progress
+from flexmeasures.data.services.networks import get_network_tables
+from flexmeasures.data.services.network_cache import (
+    get_compiled_network,
+    get_compiled_network_key,
+)
+from flexmeasures.data.services.network_snapshots import (
+    get_asset_attribute_getter,
+    load_network_snapshot,
+    take_network_snapshot,
+)
+from flexmeasures.data.services.network_topology import (
+    NetworkTopology,
+    validate_topology,
+)
+from flexmeasures.data.services.nodal_prices import (
+    read_nodal_prices,
+    save_nodal_prices,
+    stack_nodal_prices,
+)
 from flexmeasures.data.utils import get_data_source, save_to_db
 from flexmeasures.utils.time_utils import server_now
 from pandas.tseries.frequencies import to_offset
@@ -30,18 +52,48 @@ def eflex_opf(
     resolution: timedelta,
     belief_time: datetime,
     flex_config_has_been_deserialized: bool = False,
+    network_id: int | None = None,
+    snapshot_hash: str | None = None,
 ) -> bool:
     """
     This function computes an opf. It returns True if it ran successfully.
 
     This is what this function does:
     - Turn results values into beliefs and save them to db
+    - If a network_id is given, also save the nodal prices (LMPs) of each OPF run as price sensors per bus,
+      so that load scheduling and flexibility can reuse them (see their use_stored_prices option)
+
+    Network and asset parameters are read from a network snapshot, if a snapshot_hash is given.
+    Otherwise, if a network_id is given, a snapshot is taken first. The hash is recorded on the RQ job, if any.
     """
+    # Load all network resources with their parameters at once, rather than per element and per step
+    if snapshot_hash is None and network_id is not None:
+        snapshot_hash = take_network_snapshot(
+            db.session.get(Network, network_id),
+            asset_ids=list(battery) + list(external_grd) + list(load),
+        ).hash
+    frozen = load_network_snapshot(snapshot_hash) if snapshot_hash is not None else None
+    resource_ids = list(buses) + list(lines) + list(transformers) + list(shunts)
+    if frozen is not None:
+        tables = frozen.get_tables(resource_ids)
+    else:
+        tables = get_network_tables(resource_ids=resource_ids)
+    get_asset_attribute = get_asset_attribute_getter(frozen)
+
     # https://docs.sqlalchemy.org/en/13/faq/connections.html#how-do-i-use-engines-connections-sessions-with-python-multiprocessing-or-os-fork
     battery_sensors_w = []
     battery_sensors_var = []
     for eg in external_grd:
         battery.append(eg)
+    # Fail fast on networks the OPF cannot solve
+    validate_topology(
+        NetworkTopology.from_tables(tables),
+        slack_buses=[
+            get_asset_attribute(bt, "bus")
+            for bt in battery
+            if get_asset_attribute(bt, "slack") == "True"
+        ],
+    )
     for bt in battery:
         for sens in GenericAsset.query.get(bt).sensors:
             if sens.unit == "W":
@@ -59,6 +111,10 @@ def eflex_opf(
             "Running Scheduling Job %s: %s, from %s to %s"
             % (rq_job.id, battery_sensors_w[0], start, end)
         )
+        if snapshot_hash is not None:
+            click.echo("Using network snapshot %s" % snapshot_hash)
+            rq_job.meta["network_snapshot"] = snapshot_hash
+            rq_job.save_meta()
     
     data_source_info = StorageScheduler.get_data_source_info()
 
@@ -91,52 +147,34 @@ def eflex_opf(
     for _ in range(nbr_bt):
         p_w_results.append([])
         p_var_results.append([])
+    nodal_price_steps = []
 
     ####################################################################################################################
     # Here the optimization begins
-    for j in range(int(nbr_blfs)):
-        # Creating the network
+    def build_static_network():
+        """Create the network elements that are the same in each step (all but the loads)."""
         net = pp.create_empty_network()
 
         # Creating the network buses 
-        for bus in buses:
-            vn = NetworkResource.query.get(bus).get_attribute("vn_kv")
-            vmax = NetworkResource.query.get(bus).get_attribute("max_vm_pu")
-            vmin = NetworkResource.query.get(bus).get_attribute("min_vm_pu")
-            print("bus", bus, vn, vmax, vmin)
-            pp.create_bus(net, index=bus, vn_kv=vn, max_vm_pu=vmax, min_vm_pu=vmin, zone=1)
+        for bus in tables["bus"].loc[list(buses)].itertuples():
+            print("bus", bus.Index, bus.vn_kv, bus.max_vm_pu, bus.min_vm_pu)
+            pp.create_bus(net, index=bus.Index, vn_kv=bus.vn_kv, max_vm_pu=bus.max_vm_pu, min_vm_pu=bus.min_vm_pu, zone=1)
 
         # Creating network lines
-        for line in lines:
-            fbus = NetworkResource.query.get(line).get_attribute("from_bus")
-            tbus = NetworkResource.query.get(line).get_attribute("to_bus")
-            l = NetworkResource.query.get(line).get_attribute("length_km")
-            r = NetworkResource.query.get(line).get_attribute("r_ohm_per_km")
-            x = NetworkResource.query.get(line).get_attribute("x_ohm_per_km")
-            c = NetworkResource.query.get(line).get_attribute("c_nf_per_km")
-            i = NetworkResource.query.get(line).get_attribute("max_i_ka")
-            print("line", line, fbus, tbus, l, r, x, c, i)
-            pp.create_line_from_parameters(net, from_bus=fbus, to_bus=tbus, length_km=l, r_ohm_per_km=r, x_ohm_per_km=x, c_nf_per_km=c, max_i_ka=i,type="ol", max_loading_percent=100.0)
+        for line in tables["line"].loc[list(lines)].itertuples():
+            print("line", line.Index, line.from_bus, line.to_bus, line.length_km, line.r_ohm_per_km, line.x_ohm_per_km, line.c_nf_per_km, line.max_i_ka)
+            pp.create_line_from_parameters(net, from_bus=int(line.from_bus), to_bus=int(line.to_bus), length_km=line.length_km, r_ohm_per_km=line.r_ohm_per_km, x_ohm_per_km=line.x_ohm_per_km, c_nf_per_km=line.c_nf_per_km, max_i_ka=line.max_i_ka, type="ol", max_loading_percent=100.0)
         
-        # Creating network loads
-        if nbr_ld > 0:
-            for i, ld in enumerate(load):
-                b = GenericAsset.query.get(ld).get_attribute("bus")
-                p = load_data.get("Active")[i][j]
-                q = load_data.get("Reactive")[i][j]
-                print("load", ld, b, p, q)
-                pp.create_load(net, bus=b, p_mw=p, q_mvar=q, type=None)
-
         # Creating the batteries (generators)
         for bt in battery:
-            b = GenericAsset.query.get(bt).get_attribute("bus")
-            p = GenericAsset.query.get(bt).get_attribute("p_mw")
-            vm = GenericAsset.query.get(bt).get_attribute("vm_pu")
-            qmax = GenericAsset.query.get(bt).get_attribute("max_q_mvar")
-            qmin = GenericAsset.query.get(bt).get_attribute("min_q_mvar")
-            pmax = GenericAsset.query.get(bt).get_attribute("max_p_mw")
-            pmin = GenericAsset.query.get(bt).get_attribute("min_p_mw")
-            s = GenericAsset.query.get(bt).get_attribute("slack")
+            b = get_asset_attribute(bt, "bus")
+            p = get_asset_attribute(bt, "p_mw")
+            vm = get_asset_attribute(bt, "vm_pu")
+            qmax = get_asset_attribute(bt, "max_q_mvar")
+            qmin = get_asset_attribute(bt, "min_q_mvar")
+            pmax = get_asset_attribute(bt, "max_p_mw")
+            pmin = get_asset_attribute(bt, "min_p_mw")
+            s = get_asset_attribute(bt, "slack")
             s = s == 'True'
             print("battery", bt, b, p, vm, qmax, qmin, pmax, pmin, s)
             if s:
@@ -146,13 +184,13 @@ def eflex_opf(
 
         # Creating the polynomial costs
         for bt in battery:
-            cp0 = GenericAsset.query.get(bt).get_attribute("cp0")
-            cp1 = GenericAsset.query.get(bt).get_attribute("cp1")
-            cp2 = GenericAsset.query.get(bt).get_attribute("cp2")
-            cq0 = GenericAsset.query.get(bt).get_attribute("cq0")
-            cq1 = GenericAsset.query.get(bt).get_attribute("cq1")
-            cq2 = GenericAsset.query.get(bt).get_attribute("cq2")
-            s = GenericAsset.query.get(bt).get_attribute("slack")
+            cp0 = get_asset_attribute(bt, "cp0")
+            cp1 = get_asset_attribute(bt, "cp1")
+            cp2 = get_asset_attribute(bt, "cp2")
+            cq0 = get_asset_attribute(bt, "cq0")
+            cq1 = get_asset_attribute(bt, "cq1")
+            cq2 = get_asset_attribute(bt, "cq2")
+            s = get_asset_attribute(bt, "slack")
             s = s == 'True'
             if s:
                 et_ = 'ext_grid'
@@ -162,30 +200,39 @@ def eflex_opf(
             pp.create_poly_cost(net, element=bt, et=et_, cp0_eur=cp0, cp1_eur_per_mw=cp1, cp2_eur_per_mw2=cp2, cq0_eur=cq0, cq1_eur_per_mw=cq1, cq2_eur_per_mw2=cq2)
 
         # Creating the transformers
-        for transformer in transformers:
-            hvb = NetworkResource.query.get(transformer).get_attribute("hv_bus")
-            lvb = NetworkResource.query.get(transformer).get_attribute("lv_bus")
-            sn = NetworkResource.query.get(transformer).get_attribute("sn_mva")
-            vnhv = NetworkResource.query.get(transformer).get_attribute("vn_hv_kv")
-            vnlv = NetworkResource.query.get(transformer).get_attribute("vn_lv_kv")
-            vkp = NetworkResource.query.get(transformer).get_attribute("vk_percent")
-            vkr = NetworkResource.query.get(transformer).get_attribute("vkr_percent")
-            pfe = NetworkResource.query.get(transformer).get_attribute("pfe_kw")
-            i0 = NetworkResource.query.get(transformer).get_attribute("i0_percent")           
-
-            print("transformer", transformer, hvb, lvb, sn, vnhv, vnlv, vkp, vkr, pfe, i0)
-            pp.create_transformer_from_parameters(net, hv_bus=hvb, lv_bus=lvb, sn_mva=sn, vn_hv_kv=vnhv, vn_lv_kv=vnlv, 
-                                                  vk_percent=vkp, vkr_percent=vkr, pfe_kw=pfe, i0_percent=i0)
+        for trafo in tables["transformer"].loc[list(transformers)].itertuples():
+            print("transformer", trafo.Index, trafo.hv_bus, trafo.lv_bus, trafo.sn_mva, trafo.vn_hv_kv, trafo.vn_lv_kv, trafo.vk_percent, trafo.vkr_percent, trafo.pfe_kw, trafo.i0_percent)
+            pp.create_transformer_from_parameters(net, hv_bus=int(trafo.hv_bus), lv_bus=int(trafo.lv_bus), sn_mva=trafo.sn_mva, vn_hv_kv=trafo.vn_hv_kv, vn_lv_kv=trafo.vn_lv_kv,
+                                                  vk_percent=trafo.vk_percent, vkr_percent=trafo.vkr_percent, pfe_kw=trafo.pfe_kw, i0_percent=trafo.i0_percent)
 
         # Creating the shunts
-        for shunt in shunts:
-            b = NetworkResource.query.get(shunt).get_attribute("bus")
-            q = NetworkResource.query.get(shunt).get_attribute("q_mvar")
-            p = NetworkResource.query.get(shunt).get_attribute("p_mw")
-            v = NetworkResource.query.get(shunt).get_attribute("vn_kv")
-            print("shunt", shunt, b, q, p, v)
-            pp.create_shunt(net, bus=b, q_mvar=q, p_mw=p, vn_kv=v)
-        
+        for shunt in tables["shunt"].loc[list(shunts)].itertuples():
+            print("shunt", shunt.Index, shunt.bus, shunt.q_mvar, shunt.p_mw, shunt.vn_kv)
+            pp.create_shunt(net, bus=int(shunt.bus), q_mvar=shunt.q_mvar, p_mw=shunt.p_mw, vn_kv=shunt.vn_kv)
+
+        return net
+
+    # With a snapshot, the static network is built once per snapshot (see get_compiled_network)
+    if frozen is not None:
+        compiled_network_key = get_compiled_network_key(
+            frozen.hash, "opf", buses, lines, battery, transformers, shunts
+        )
+    for j in range(int(nbr_blfs)):
+        # Creating the network
+        if frozen is not None:
+            net = get_compiled_network(compiled_network_key, build_static_network)
+        else:
+            net = build_static_network()
+
+        # Creating network loads
+        if nbr_ld > 0:
+            for i, ld in enumerate(load):
+                b = get_asset_attribute(ld, "bus")
+                p = load_data.get("Active")[i][j]
+                q = load_data.get("Reactive")[i][j]
+                print("load", ld, b, p, q)
+                pp.create_load(net, bus=b, p_mw=p, q_mvar=q, type=None)
+
         print("\nNet:")
         print(net)
 
@@ -215,6 +262,7 @@ def eflex_opf(
 
         # Run the optimal power flow
         pp.runopp(net, numba=False)
+        nodal_price_steps.append(read_nodal_prices(net))
 
         print("\nBus voltages after OPF:")
         print(net.res_bus.vm_pu)
@@ -240,6 +288,16 @@ def eflex_opf(
             else:
                 p_w_results[k].append(net.res_ext_grid.get("p_mw").values[k-len(net.gen)])
                 p_var_results[k].append(net.res_ext_grid.get("q_mvar").values[k-len(net.gen)])
+        report_progress(
+            j + 1,
+            int(nbr_blfs),
+            f"OPF step {j + 1} of {int(nbr_blfs)}",
+            partial_result=dict(
+                step=j,
+                p_mw=[r[-1] if r else None for r in p_w_results],
+                q_mvar=[r[-1] if r else None for r in p_var_results],
+            ),
+        )
                 
     ####################################################################################################################
 
@@ -300,6 +358,13 @@ def eflex_opf(
         ]
         bdf = tb.BeliefsDataFrame(ts_value_schedule)
         save_to_db(bdf, bulk_save_objects=True)
+
+    if network_id is not None:
+        save_nodal_prices(
+            db.session.get(Network, network_id),
+            stack_nodal_prices(nodal_price_steps, start, resolution),
+            belief_time,
+        )
     
     # Commit the current transaction to the database
     db.session.commit()
@@ -330,6 +395,16 @@ def eflex_pf(
     # for ld in load:
     #     print("teste paizinhuuuuuuu", GenericAsset.query.get(ld).sensors)
     
+    tables = get_network_tables(resource_ids=list(buses) + list(lines))
+    validate_topology(
+        NetworkTopology.from_tables(tables),
+        slack_buses=[
+            GenericAsset.query.get(bt).get_attribute("bus")
+            for bt in battery
+            if GenericAsset.query.get(bt).get_attribute("slack") == "True"
+        ],
+    )
+
     battery_sensors_w = []
     battery_sensors_var = []
     for bt in battery:
@@ -389,19 +464,12 @@ def eflex_pf(
         net = pp.create_empty_network()
         
         # Creating the network buses 
-        for bus in buses:
-            pp.create_bus(net, index=bus, vn_kv=NetworkResource.query.get(bus).get_attribute("vn_kv"))
+        for bus in tables["bus"].loc[list(buses)].itertuples():
+            pp.create_bus(net, index=bus.Index, vn_kv=bus.vn_kv)
         
         # Creating network lines
-        for line in lines:
-            fbus = NetworkResource.query.get(line).get_attribute("from_bus")
-            tbus = NetworkResource.query.get(line).get_attribute("to_bus")
-            l = NetworkResource.query.get(line).get_attribute("length_km")
-            r = NetworkResource.query.get(line).get_attribute("r_ohm_per_km")
-            x = NetworkResource.query.get(line).get_attribute("x_ohm_per_km")
-            c = NetworkResource.query.get(line).get_attribute("c_nf_per_km")
-            i = NetworkResource.query.get(line).get_attribute("max_i_ka")
-            pp.create_line_from_parameters(net, from_bus=fbus, to_bus=tbus, length_km=l, r_ohm_per_km=r, x_ohm_per_km=x, c_nf_per_km=c, max_i_ka=i)
+        for line in tables["line"].loc[list(lines)].itertuples():
+            pp.create_line_from_parameters(net, from_bus=int(line.from_bus), to_bus=int(line.to_bus), length_km=line.length_km, r_ohm_per_km=line.r_ohm_per_km, x_ohm_per_km=line.x_ohm_per_km, c_nf_per_km=line.c_nf_per_km, max_i_ka=line.max_i_ka)
 
         # Creating network loads
         if nbr_ld > 0:
@@ -427,6 +495,16 @@ def eflex_pf(
         for k in range(nbr_bt):
             p_w_results[k].append(net.res_gen.get("p_mw").values[k])
             p_var_results[k].append(net.res_gen.get("q_mvar").values[k])
+        report_progress(
+            j + 1,
+            int(nbr_blfs),
+            f"PF step {j + 1} of {int(nbr_blfs)}",
+            partial_result=dict(
+                step=j,
+                p_mw=[r[-1] if r else None for r in p_w_results],
+                q_mvar=[r[-1] if r else None for r in p_var_results],
+            ),
+        )
     ####################################################################################################################
     
     # Adding a the data into a data series
@@ -0,0 +1,181 @@
+"""
+Logic around the monthly partitions of the timed_belief table.
+
+The timed_belief table is range-partitioned by event_start, with one partition per month (in UTC), such that:
+- queries filtering on event_start (like belief searches and schedule replacements) only scan the relevant partitions, and
+- old beliefs can be removed by dropping whole partitions, rather than by deleting rows.
+
+Beliefs stored before the table was partitioned live in a single partition covering all months up to the partitioning,
+and beliefs about months without a partition of their own end up in the default partition.
+Partitions for upcoming months should be created ahead of time (see `flexmeasures db-ops create-partitions`),
+which also moves any beliefs about these months out of the default partition.
+
+Databases whose timed_belief table is not partitioned (such as those created from the data model directly) are left alone.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+import re
+
+import pandas as pd
+from sqlalchemy import text
+
+from flexmeasures.data import db
+from flexmeasures.utils.time_utils import server_now
+
+
+PARTITIONED_TABLE = "timed_belief"
+
+
+@dataclass
+class Partition:
+    """A partition, covering events starting from start (inclusive) until end (exclusive), with None meaning unbounded."""
+
+    name: str
+    start: pd.Timestamp | None
+    end: pd.Timestamp | None
+    is_default: bool = False
+
+
+def is_partitioned(table: str = PARTITIONED_TABLE) -> bool:
+    return (
+        db.session.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+            ),
+            dict(table=table),
+        ).first()
+        is not None
+    )
+
+
+def get_partitions(table: str = PARTITIONED_TABLE) -> list[Partition]:
+    """List the partitions of a table, in order of the events they cover (with the default partition last)."""
+    rows = db.session.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table"
+        ),
+        dict(table=table),
+    ).all()
+    partitions = [parse_partition_bound(name, bound) for name, bound in rows]
+    return sorted(
+        partitions,
+        key=lambda p: (
+            p.is_default,
+            p.start if p.start is not None else pd.Timestamp.min.tz_localize("UTC"),
+        ),
+    )
+
+
+def parse_partition_bound(name: str, bound: str) -> Partition:
+    """Parse a partition bound as reported by Postgres, e.g. "FOR VALUES FROM ('2024-05-01 00:00:00+00') TO (MAXVALUE)"."""
+    if bound == "DEFAULT":
+        return Partition(name=name, start=None, end=None, is_default=True)
+    match = re.fullmatch(r"FOR VALUES FROM \((.+)\) TO \((.+)\)", bound)
+    if match is None:
+        raise ValueError(f"Cannot parse the bound of partition {name}: {bound}")
+
+    def parse_value(value: str) -> pd.Timestamp | None:
+        if value in ("MINVALUE", "MAXVALUE"):
+            return None
+        return pd.Timestamp(value.strip("'")).tz_convert("UTC")
+
+    return Partition(
+        name=name, start=parse_value(match.group(1)), end=parse_value(match.group(2))
+    )
+
+
+def get_partition_name(month_start: datetime, table: str = PARTITIONED_TABLE) -> str:
+    return f"{table}_y{month_start.year}m{month_start.month:02d}"
+
+
+def get_month_start(moment: datetime) -> pd.Timestamp:
+    """Start of the month (in UTC) containing the given moment."""
+    moment = pd.Timestamp(moment)
+    moment = (
+        moment.tz_localize("UTC") if moment.tzinfo is None else moment.tz_convert("UTC")
+    )
+    return moment.normalize().replace(day=1)
+
+
+def create_partitions(
+    until: datetime, start: datetime | None = None, table: str = PARTITIONED_TABLE
+) -> list[str]:
+    """Create monthly partitions for all months from start (by default, the current month) until the given moment.
+
+    Months that are already covered by a partition are skipped.
+    Beliefs about the new partitions' months are moved out of the default partition.
+
+    Note: This function does not commit.
+
+    :returns: the names of the new partitions
+    """
+    if not is_partitioned(table):
+        return []
+    partitions = get_partitions(table)
+    default_partition = next((p for p in partitions if p.is_default), None)
+    month_start = get_month_start(start if start is not None else server_now())
+    new_partitions = []
+    while month_start < pd.Timestamp(until):
+        month_end = month_start + pd.DateOffset(months=1)
+        if not any(
+            not p.is_default
+            and (p.start is None or p.start < month_end)
+            and (p.end is None or p.end > month_start)
+            for p in partitions
+        ):
+            name = get_partition_name(month_start, table)
+            db.session.execute(
+                text(
+                    f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                )
+            )
+            if default_partition is not None:
+                # Otherwise, attaching the new partition fails due to rows in the default partition that belong to it
+                db.session.execute(
+                    text(
+                        f"WITH moved AS (DELETE FROM {default_partition.name} WHERE event_start >= :start AND event_start < :end RETURNING *) "
+                        f"INSERT INTO {name} SELECT * FROM moved"
+                    ),
+                    dict(
+                        start=month_start.to_pydatetime(),
+                        end=month_end.to_pydatetime(),
+                    ),
+                )
+            # Partition bounds cannot be passed as query parameters (and their colons would be mistaken for them)
+            db.session.connection().exec_driver_sql(
+                f"ALTER TABLE {table} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{month_end.isoformat()}')"
+            )
+            new_partitions.append(name)
+        month_start = month_end
+    return new_partitions
+
+
+def drop_partitions(
+    before: datetime, dry_run: bool = False, table: str = PARTITIONED_TABLE
+) -> list[Partition]:
+    """Drop the partitions covering only events starting before the given moment.
+
+    Beliefs in partitions that also cover later events are kept.
+
+    Note: This function does not commit.
+
+    :returns: the dropped partitions
+    """
+    if not is_partitioned(table):
+        return []
+    old_partitions = [
+        p
+        for p in get_partitions(table)
+        if not p.is_default and p.end is not None and p.end <= pd.Timestamp(before)
+    ]
+    if not dry_run:
+        for partition in old_partitions:
+            db.session.execute(text(f"DROP TABLE {partition.name}"))
+    return old_partitions
@@ -0,0 +1,488 @@
+"""
+Logic around rollups: aggregates of the most recent beliefs of a sensor, per source and per time bucket.
+
+Searching beliefs over a long period at a coarse resolution (e.g. a year of 1-minute meter data, shown per day)
+would otherwise load and resample every underlying belief. Instead, rollups are maintained for the resolutions in
+FLEXMEASURES_ROLLUP_RESOLUTIONS, and searches at a resolution that is a multiple of one of these read from the coarsest
+such rollup, so their cost scales with the number of time buckets rather than with the number of beliefs.
+
+- Rollups are updated by save_to_db, for the time buckets touched by the saved beliefs.
+- Rollups of data that was saved before rollups were introduced (or by other means) can be (re)computed
+  with `flexmeasures add rollups`.
+- Rollups are only read for periods in which they are known to be complete, i.e. periods for which
+  they were computed for all sources. These periods are recorded as rollup coverage.
+- Rollups are updated after deleting beliefs, for the time buckets of the deleted beliefs.
+- Rollups only stand in for deterministic beliefs. Searches about time buckets with probabilistic beliefs
+  (and searches that filter on belief timing) still go through the underlying beliefs.
+
+Sub-daily time buckets are aligned with UTC, while daily time buckets follow the calendar days of the sensor's timezone.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+import pandas as pd
+from sqlalchemy import delete, func, insert, literal, select
+import timely_beliefs as tb
+import timely_beliefs.utils as tb_utils
+
+from flexmeasures.data import db
+from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.data.models.time_series import (
+    Sensor,
+    TimedBelief,
+    TimedBeliefRollup,
+    TimedBeliefRollupCoverage,
+)
+from flexmeasures.data.queries.utils import get_source_criteria
+
+
+def get_rollup_resolutions(sensor: Sensor) -> list[timedelta]:
+    """Resolutions of the rollups maintained for the given sensor, from fine to coarse.
+
+    Rollups apply to sensors recording non-instantaneous events,
+    at resolutions that are a multiple of the sensor resolution, and either divide a day or are exactly a day.
+    """
+    if sensor.event_resolution == timedelta(0):
+        return []
+    resolutions = []
+    for resolution in current_app.config.get("FLEXMEASURES_ROLLUP_RESOLUTIONS", []):
+        if (
+            resolution > sensor.event_resolution
+            and resolution % sensor.event_resolution == timedelta(0)
+            and timedelta(days=1) % resolution == timedelta(0)
+        ):
+            resolutions.append(resolution)
+    return sorted(resolutions)
+
+
+def select_rollup_resolution(
+    sensor: Sensor,
+    resolution: timedelta,
+    event_starts_after: datetime | None = None,
+    event_ends_before: datetime | None = None,
+) -> timedelta | None:
+    """Select the coarsest rollup resolution from which beliefs can be resampled to the given resolution.
+
+    Sub-daily rollups (aligned with UTC) are only selected if the UTC offsets of the sensor's timezone
+    at the start and end of the searched period are a multiple of the rollup resolution,
+    because resampling aligns with the sensor's timezone.
+    """
+    moments = [
+        pd.Timestamp(moment).tz_convert(sensor.timezone)
+        for moment in (event_starts_after, event_ends_before)
+        if moment is not None
+    ] or [pd.Timestamp.now(tz=sensor.timezone)]
+    for rollup_resolution in reversed(get_rollup_resolutions(sensor)):
+        if resolution % rollup_resolution != timedelta(0):
+            continue
+        if rollup_resolution < timedelta(days=1) and any(
+            moment.utcoffset() % rollup_resolution != timedelta(0) for moment in moments
+        ):
+            continue
+        return rollup_resolution
+    return None
+
+
+def floor_to_bucket(moment: datetime, resolution: timedelta, timezone: str) -> datetime:
+    """Start of the time bucket containing the given moment."""
+    moment = pd.Timestamp(moment).tz_convert("UTC")
+    if resolution == timedelta(days=1):
+        return moment.tz_convert(timezone).normalize()
+    return moment.floor(resolution)
+
+
+def ceil_to_bucket(moment: datetime, resolution: timedelta, timezone: str) -> datetime:
+    """End of the time bucket containing the given moment (or the moment itself if it lies on a bucket boundary)."""
+    bucket_start = floor_to_bucket(moment, resolution, timezone)
+    if bucket_start == moment:
+        return bucket_start
+    if resolution == timedelta(days=1):
+        return bucket_start + pd.DateOffset(days=1)
+    return bucket_start + resolution
+
+
+def bucket_expression(event_start, resolution: timedelta, timezone: str):
+    """SQL expression for the start of the time bucket containing an event start (see floor_to_bucket)."""
+    if resolution == timedelta(days=1):
+        return func.timezone(
+            timezone, func.date_trunc("day", func.timezone(timezone, event_start))
+        )
+    seconds = resolution.total_seconds()
+    return func.to_timestamp(
+        func.floor(func.extract("epoch", event_start) / seconds) * seconds
+    )
+
+
+def update_rollups(
+    sensor: Sensor,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    source_ids: list[int] | None = None,
+):
+    """(Re)compute the rollups of a sensor about time buckets overlapping the given period, from its beliefs.
+
+    Note: This function does not commit.
+
+    :param sensor:      the sensor whose beliefs are rolled up
+    :param start:       start of the period with new (or deleted) beliefs, or None to recompute from the first time bucket
+    :param end:         end of the period with new (or deleted) beliefs, or None to recompute up to the last time bucket
+    :param source_ids:  only recompute the rollups of these sources (by default, of all sources,
+                        in which case the period is recorded as covered by rollups)
+    """
+    for resolution in get_rollup_resolutions(sensor):
+        bucket_start = (
+            floor_to_bucket(start, resolution, sensor.timezone)
+            if start is not None
+            else None
+        )
+        bucket_end = (
+            ceil_to_bucket(end, resolution, sensor.timezone)
+            if end is not None
+            else None
+        )
+
+        # Rank beliefs by belief horizon, to aggregate the most recent belief about each event from each source
+        ranked = select(
+            TimedBelief.event_start,
+            TimedBelief.belief_horizon,
+            TimedBelief.source_id,
+            TimedBelief.cumulative_probability,
+            TimedBelief.event_value,
+            func.rank()
+            .over(
+                partition_by=(TimedBelief.event_start, TimedBelief.source_id),
+                order_by=TimedBelief.belief_horizon,
+            )
+            .label("horizon_rank"),
+        ).filter(TimedBelief.sensor_id == sensor.id)
+        rollups_to_delete = delete(TimedBeliefRollup).filter(
+            TimedBeliefRollup.sensor_id == sensor.id,
+            TimedBeliefRollup.resolution == resolution,
+        )
+        if bucket_start is not None:
+            ranked = ranked.filter(TimedBelief.event_start >= bucket_start)
+            rollups_to_delete = rollups_to_delete.filter(
+                TimedBeliefRollup.event_start >= bucket_start
+            )
+        if bucket_end is not None:
+            ranked = ranked.filter(TimedBelief.event_start < bucket_end)
+            rollups_to_delete = rollups_to_delete.filter(
+                TimedBeliefRollup.event_start < bucket_end
+            )
+        if source_ids is not None:
+            ranked = ranked.filter(TimedBelief.source_id.in_(source_ids))
+            rollups_to_delete = rollups_to_delete.filter(
+                TimedBeliefRollup.source_id.in_(source_ids)
+            )
+        ranked = ranked.subquery()
+
+        bucket = bucket_expression(ranked.c.event_start, resolution, sensor.timezone)
+        rollups = (
+            select(
+                literal(sensor.id),
+                ranked.c.source_id,
+                literal(resolution),
+                bucket,
+                func.sum(ranked.c.event_value),
+                func.count(),
+                func.min(ranked.c.belief_horizon),
+                func.bool_or(ranked.c.cumulative_probability != 0.5),
+            )
+            .filter(
+                ranked.c.horizon_rank == 1,
+                # Like resampling, leave out NaN values (NaN equals NaN in Postgres)
+                ranked.c.event_value != float("NaN"),
+            )
+            .group_by(ranked.c.source_id, bucket)
+        )
+        db.session.execute(rollups_to_delete)
+        db.session.execute(
+            insert(TimedBeliefRollup).from_select(
+                [
+                    "sensor_id",
+                    "source_id",
+                    "resolution",
+                    "event_start",
+                    "event_value_sum",
+                    "event_count",
+                    "belief_horizon",
+                    "probabilistic",
+                ],
+                rollups,
+            )
+        )
+        if source_ids is None:
+            record_rollup_coverage(sensor, resolution, bucket_start, bucket_end)
+
+
+def update_rollups_for_beliefs(bdf: tb.BeliefsDataFrame):
+    """Update the rollups about the time buckets of the events in a BeliefsDataFrame (see update_rollups).
+
+    The rollups of all sources are recomputed, so the time buckets become covered by rollups.
+    """
+    if bdf.empty or not get_rollup_resolutions(bdf.sensor):
+        return
+    update_rollups(
+        sensor=bdf.sensor,
+        start=bdf.event_starts.min(),
+        end=bdf.event_ends.max(),
+    )
+
+
+def update_rollups_for_windows(windows: dict[int, tuple[datetime, datetime]]):
+    """Update the rollups of sensors about the given periods, e.g. after deleting beliefs (see get_belief_windows).
+
+    Note: This function does not commit.
+
+    :param windows: per sensor ID, the start and end of the period with deleted beliefs
+    """
+    for sensor_id, (start, end) in windows.items():
+        sensor = db.session.get(Sensor, sensor_id)
+        if sensor is None or not get_rollup_resolutions(sensor):
+            continue
+        update_rollups(sensor, start=start, end=end)
+
+
+def get_belief_windows(q) -> dict[int, tuple[datetime, datetime]]:
+    """Per sensor, the start of the first and the end of the last event of the beliefs selected by a query.
+
+    Call this before deleting these beliefs, to update their rollups afterwards (see update_rollups_for_windows).
+
+    :param q: a query selecting TimedBelief objects (e.g. with filters applied)
+    """
+    beliefs = q.subquery()
+    windows = db.session.execute(
+        select(
+            beliefs.c.sensor_id,
+            func.min(beliefs.c.event_start),
+            func.max(beliefs.c.event_start + Sensor.event_resolution),
+        )
+        .join(Sensor, Sensor.id == beliefs.c.sensor_id)
+        .group_by(beliefs.c.sensor_id)
+    ).all()
+    return {sensor_id: (start, end) for sensor_id, start, end in windows}
+
+
+def record_rollup_coverage(
+    sensor: Sensor,
+    resolution: timedelta,
+    start: datetime | None,
+    end: datetime | None,
+):
+    """Record that the rollups of a sensor at the given resolution are complete from start until end.
+
+    Overlapping and adjacent periods are merged, so coverage stays a short list of disjoint periods.
+
+    Note: This function does not commit.
+
+    :param start:   start of the covered period, or None if the period is unbounded in the past
+    :param end:     end of the covered period, or None if the period is unbounded in the future
+    """
+    if start is not None and end is not None and start >= end:
+        return
+    coverage = db.session.scalars(
+        select(TimedBeliefRollupCoverage).filter(
+            TimedBeliefRollupCoverage.sensor_id == sensor.id,
+            TimedBeliefRollupCoverage.resolution == resolution,
+        )
+    ).all()
+    periods = [(c.covered_since, c.covered_until) for c in coverage]
+    merged = _merge_periods(periods + [(start, end)])
+    if sorted(periods, key=_period_sort_key) == merged:
+        return
+    for c in coverage:
+        db.session.delete(c)
+    db.session.add_all(
+        [
+            TimedBeliefRollupCoverage(
+                sensor_id=sensor.id,
+                resolution=resolution,
+                covered_since=since,
+                covered_until=until,
+            )
+            for since, until in merged
+        ]
+    )
+    db.session.flush()
+
+
+def _period_sort_key(period: tuple[datetime | None, datetime | None]):
+    since = period[0]
+    return (since is not None, pd.Timestamp(since) if since is not None else None)
+
+
+def _merge_periods(
+    periods: list[tuple[datetime | None, datetime | None]]
+) -> list[tuple[datetime | None, datetime | None]]:
+    """Merge overlapping and adjacent periods, where None stands for an unbounded start or end."""
+    merged: list[tuple[datetime | None, datetime | None]] = []
+    for since, until in sorted(periods, key=_period_sort_key):
+        if merged:
+            last_since, last_until = merged[-1]
+            if last_until is None:
+                break
+            if since is None or pd.Timestamp(since) <= pd.Timestamp(last_until):
+                if until is None or pd.Timestamp(until) > pd.Timestamp(last_until):
+                    merged[-1] = (last_since, until)
+                continue
+        merged.append((since, until))
+    return merged
+
+
+def is_rollup_covered(
+    sensor: Sensor,
+    resolution: timedelta,
+    event_starts_after: datetime | None = None,
+    event_ends_before: datetime | None = None,
+) -> bool:
+    """Whether the time buckets overlapping the given period are all covered by rollups at the given resolution."""
+    q = select(TimedBeliefRollupCoverage.id).filter(
+        TimedBeliefRollupCoverage.sensor_id == sensor.id,
+        TimedBeliefRollupCoverage.resolution == resolution,
+    )
+    if event_starts_after is None:
+        q = q.filter(TimedBeliefRollupCoverage.covered_since.is_(None))
+    else:
+        q = q.filter(
+            (TimedBeliefRollupCoverage.covered_since.is_(None))
+            | (
+                TimedBeliefRollupCoverage.covered_since
+                <= floor_to_bucket(event_starts_after, resolution, sensor.timezone)
+            )
+        )
+    if event_ends_before is None:
+        q = q.filter(TimedBeliefRollupCoverage.covered_until.is_(None))
+    else:
+        q = q.filter(
+            (TimedBeliefRollupCoverage.covered_until.is_(None))
+            | (
+                TimedBeliefRollupCoverage.covered_until
+                >= ceil_to_bucket(event_ends_before, resolution, sensor.timezone)
+            )
+        )
+    return db.session.execute(q.limit(1)).first() is not None
+
+
+def search_rollups(
+    sensor: Sensor,
+    resolution: str | timedelta,
+    event_starts_after: datetime | None = None,
+    event_ends_before: datetime | None = None,
+    sources: list[DataSource] | None = None,
+    user_source_ids: int | list[int] | None = None,
+    source_types: list[str] | None = None,
+    exclude_source_types: list[str] | None = None,
+) -> tb.BeliefsDataFrame | None:
+    """Search the most recent beliefs about events for the given sensor, at the given resolution, by reading rollups.
+
+    The result resembles that of TimedBelief.search with the same resolution, with the belief time of each
+    resampled event derived from the shortest belief horizon within its time bucket.
+
+    :returns: a BeliefsDataFrame, or None if no rollups can stand in for the beliefs
+              (including when the rollups are not known to be complete for the searched period,
+              as they may not have been computed yet)
+    """
+    resolution = tb_utils.parse_timedelta_like(resolution)
+    rollup_resolution = select_rollup_resolution(
+        sensor, resolution, event_starts_after, event_ends_before
+    )
+    if rollup_resolution is None:
+        return None
+    if sources == []:
+        return None
+    if not is_rollup_covered(
+        sensor, rollup_resolution, event_starts_after, event_ends_before
+    ):
+        return None
+
+    q = (
+        select(
+            TimedBeliefRollup.event_start,
+            TimedBeliefRollup.belief_horizon,
+            TimedBeliefRollup.source_id,
+            TimedBeliefRollup.event_value_sum,
+            TimedBeliefRollup.event_count,
+            TimedBeliefRollup.probabilistic,
+        )
+        .join(DataSource, DataSource.id == TimedBeliefRollup.source_id)
+        .filter(
+            TimedBeliefRollup.sensor_id == sensor.id,
+            TimedBeliefRollup.resolution == rollup_resolution,
+        )
+    )
+    if event_starts_after is not None:
+        q = q.filter(
+            TimedBeliefRollup.event_start
+            >= floor_to_bucket(event_starts_after, rollup_resolution, sensor.timezone)
+        )
+    if event_ends_before is not None:
+        q = q.filter(TimedBeliefRollup.event_start < event_ends_before)
+    if sources:
+        q = q.filter(TimedBeliefRollup.source_id.in_([s.id for s in sources]))
+    q = q.filter(
+        *get_source_criteria(
+            TimedBeliefRollup, user_source_ids, source_types, exclude_source_types
+        )
+    )
+    df = pd.DataFrame(
+        db.session.execute(q).all(),
+        columns=[
+            "event_start",
+            "belief_horizon",
+            "source",
+            "event_value_sum",
+            "event_count",
+            "probabilistic",
+        ],
+    )
+    if df.empty or df["probabilistic"].any():
+        return None
+
+    df["event_start"] = pd.to_datetime(df["event_start"], utc=True).dt.tz_convert(
+        sensor.timezone
+    )
+    df["belief_horizon"] = pd.to_timedelta(df["belief_horizon"])
+    if resolution != rollup_resolution:
+        # Combine rollups into coarser time buckets, aligned with the sensor's timezone (like resampling)
+        df = (
+            df.groupby(
+                [
+                    pd.Grouper(
+                        key="event_start",
+                        freq=pd.tseries.frequencies.to_offset(resolution),
+                    ),
+                    "source",
+                ]
+            )
+            .agg(
+                {
+                    "belief_horizon": "min",
+                    "event_value_sum": "sum",
+                    "event_count": "sum",
+                }
+            )
+            .reset_index()
+        )
+        df = df[df["event_count"] > 0]
+    df["event_value"] = df["event_value_sum"] / df["event_count"]
+    source_map = {
+        source.id: source
+        for source in db.session.scalars(
+            select(DataSource).filter(DataSource.id.in_(df["source"].unique().tolist()))
+        ).all()
+    }
+    df["source"] = df["source"].map(source_map)
+    bdf = (
+        tb.BeliefsDataFrame(
+            df[["event_start", "belief_horizon", "source", "event_value"]],
+            sensor=sensor,
+            event_resolution=resolution,
+        )
+        .convert_index_from_belief_horizon_to_time()
+        .sort_index()
+    )
+    bdf = bdf.convert_timezone_of_belief_timing_index(sensor.timezone)
+    return bdf.convert_timezone_of_event_timing_index(sensor.timezone)
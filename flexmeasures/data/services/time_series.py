@@ -1,15 +1,34 @@
 from __future__ import annotations
 
 from typing import Any
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import uuid
 
 import inflect
 from flask import current_app
 import pandas as pd
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Float,
+    Integer,
+    Interval,
+    and_,
+    cast,
+    column,
+    func,
+    or_,
+    select,
+    values,
+)
 import timely_beliefs as tb
-from timely_beliefs.beliefs import utils as belief_utils
 
+from flexmeasures.data import db
 from flexmeasures.data.queries.utils import simplify_index
+from flexmeasures.utils.downsampling import downsample_indices
+from flexmeasures.utils.time_utils import server_now
 
 
 p = inflect.engine()
@@ -88,11 +107,7 @@ def drop_unchanged_beliefs(bdf: tb.BeliefsDataFrame) -> tb.BeliefsDataFrame:
     )
 
     # Remove unchanged beliefs with respect to what is already stored in the database
-    return (
-        bdf.convert_index_from_belief_horizon_to_time()
-        .groupby(level=["belief_time", "source"], group_keys=False, as_index=False)
-        .apply(_drop_unchanged_beliefs_compared_to_db)
-    )
+    return _drop_unchanged_beliefs_compared_to_db(bdf)
 
 
 def _drop_unchanged_beliefs_compared_to_db(
@@ -100,45 +115,253 @@ def _drop_unchanged_beliefs_compared_to_db(
 ) -> tb.BeliefsDataFrame:
     """Drop beliefs that are already stored in the database with an earlier belief time.
 
-    Assumes a BeliefsDataFrame with a unique belief time and unique source,
-    and either all ex-ante beliefs or all ex-post beliefs.
+    Assumes a BeliefsDataFrame with either all ex-ante beliefs or all ex-post beliefs.
+
+    The comparison is done by the database, in a single query:
+    the new beliefs are passed along as a VALUES list, and each is compared to the most recent stored belief
+    about the same event, from the same source, and with an earlier (or equal) belief time.
+    For a given event, an earlier belief time means a longer belief horizon.
+    Only the row numbers of the beliefs to keep are returned, so nothing is read back otherwise.
+    Whole probabilistic beliefs are kept, not just the parts that changed.
 
     It is preferable to call the public function drop_unchanged_beliefs instead.
     """
-    if bdf.belief_horizons[0] > timedelta(0):
-        # Look up only ex-ante beliefs (horizon > 0)
-        kwargs = dict(horizons_at_least=timedelta(0))
-    else:
-        # Look up only ex-post beliefs (horizon <= 0)
-        kwargs = dict(horizons_at_most=timedelta(0))
-    previous_beliefs_in_db = bdf.sensor.search_beliefs(
-        event_starts_after=bdf.event_starts[0],
-        event_ends_before=bdf.event_ends[-1],
-        beliefs_before=bdf.lineage.belief_times[0],  # unique belief time
-        source=bdf.lineage.sources[0],  # unique source
-        most_recent_beliefs_only=False,
-        **kwargs,
+    from flexmeasures.data.models.time_series import TimedBelief
+
+    bdf = bdf.convert_index_from_belief_time_to_horizon()
+    df = bdf.reset_index()
+    df["source_id"] = df["source"].map(lambda source: source.id)
+    # Beliefs from new sources cannot have been stored before
+    rows = [
+        (
+            i,
+            event_start.to_pydatetime(),
+            belief_horizon.to_pytimedelta(),
+            int(source_id),
+            float(cp),
+            float(event_value),
+        )
+        for i, (event_start, belief_horizon, source_id, cp, event_value) in enumerate(
+            df[
+                [
+                    "event_start",
+                    "belief_horizon",
+                    "source_id",
+                    "cumulative_probability",
+                    "event_value",
+                ]
+            ].itertuples(index=False, name=None)
+        )
+        if not pd.isnull(source_id)
+    ]
+    if not rows:
+        return bdf.convert_index_from_belief_horizon_to_time()
+    incoming_values = values(
+        column("i", Integer),
+        column("event_start", DateTime(timezone=True)),
+        column("belief_horizon", Interval),
+        column("source_id", Integer),
+        column("cumulative_probability", Float),
+        column("event_value", Float),
+        name="incoming_values",
+    ).data(rows)
+    incoming = select(incoming_values).cte("incoming")
+
+    # Stored beliefs about the same events, ranked from most recent (rank 1) to oldest, per new belief
+    previous_beliefs = (
+        select(
+            incoming.c.i,
+            and_(
+                TimedBelief.cumulative_probability == incoming.c.cumulative_probability,
+                TimedBelief.event_value == incoming.c.event_value,
+            ).label("is_unchanged"),
+            func.rank()
+            .over(partition_by=incoming.c.i, order_by=TimedBelief.belief_horizon)
+            .label("rank"),
+        )
+        .join(
+            TimedBelief,
+            and_(
+                TimedBelief.sensor_id == bdf.sensor.id,
+                TimedBelief.event_start == incoming.c.event_start,
+                TimedBelief.source_id == incoming.c.source_id,
+                TimedBelief.belief_horizon >= incoming.c.belief_horizon,
+                # Compare ex-post beliefs only to ex-post beliefs
+                or_(
+                    incoming.c.belief_horizon > timedelta(0),
+                    TimedBelief.belief_horizon <= timedelta(0),
+                ),
+            ),
+        )
+        .subquery()
+    )
+    unchanged = select(previous_beliefs.c.i).filter(
+        previous_beliefs.c.rank == 1, previous_beliefs.c.is_unchanged
     )
-    # todo: delete next line and set most_recent_beliefs_only=True when this is resolved: https://github.com/SeitaBV/timely-beliefs/pull/117
-    previous_most_recent_beliefs_in_db = belief_utils.select_most_recent_belief(
-        previous_beliefs_in_db
+    changed_beliefs = (
+        select(incoming.c.event_start, incoming.c.belief_horizon, incoming.c.source_id)
+        .filter(incoming.c.i.not_in(unchanged))
+        .subquery()
     )
+    keep = db.session.scalars(
+        select(incoming.c.i).join(
+            changed_beliefs,
+            and_(
+                changed_beliefs.c.event_start == incoming.c.event_start,
+                changed_beliefs.c.belief_horizon == incoming.c.belief_horizon,
+                changed_beliefs.c.source_id == incoming.c.source_id,
+            ),
+        )
+    ).all()
+    keep = df.index.isin(keep) | df["source_id"].isnull()
+    return bdf[keep.to_numpy()].convert_index_from_belief_horizon_to_time()
+
+
+def get_belief_version(
+    sensors: list,
+    event_starts_after: datetime | None = None,
+    event_ends_before: datetime | None = None,
+) -> tuple[str, datetime | None]:
+    """Fingerprint the beliefs about the given sensors, about events within the given window (None meaning unbounded).
+
+    Saving or deleting beliefs changes the fingerprint, which makes it suitable as the basis of an ETag.
+    The fingerprint combines:
+    - the versions of the beliefs of the sensors, which are bumped whenever their beliefs are saved (including overwrites)
+      or deleted (see bump_belief_versions), and
+    - the number and belief times of the beliefs within the window, which also changes when beliefs are added by other means.
+      Only indexed columns (sensor_id, event_start and belief_horizon) are read for this,
+      so Postgres can answer from the timed_belief_search_session_idx index alone, without touching the belief rows.
 
-    compare_fields = ["event_start", "source", "cumulative_probability", "event_value"]
-    a = bdf.reset_index().set_index(compare_fields)
-    b = previous_most_recent_beliefs_in_db.reset_index().set_index(compare_fields)
-    bdf = a.drop(
-        b.index,
-        errors="ignore",
-        axis=0,
+    The last modification time is the last time beliefs of any of the sensors were saved or deleted (at most the current time).
+    If the versions cannot be read, the fingerprint is unique, so that conditional requests never wrongly match.
+
+    :returns: the fingerprint (a hex digest) and the last modification time (None if unknown)
+    """
+    from flexmeasures.data.models.time_series import TimedBelief
+    from flexmeasures.data.services.belief_cache import get_belief_versions
+
+    if not sensors:
+        return hashlib.sha1(b"").hexdigest(), None
+    sensors_by_id = {sensor.id: sensor for sensor in sensors}
+    belief_start = TimedBelief.event_start - TimedBelief.belief_horizon
+    query = (
+        select(
+            TimedBelief.sensor_id,
+            func.count(),
+            func.sum(cast(func.extract("epoch", belief_start), BigInteger)),
+        )
+        .filter(TimedBelief.sensor_id.in_(sensors_by_id))
+        .group_by(TimedBelief.sensor_id)
+        .order_by(TimedBelief.sensor_id)
     )
+    # Cover the events of all sensors, whatever their resolution (so possibly some more)
+    if event_starts_after is not None:
+        max_resolution = max(sensor.event_resolution for sensor in sensors)
+        query = query.filter(
+            TimedBelief.event_start >= event_starts_after - max_resolution
+        )
+    if event_ends_before is not None:
+        query = query.filter(TimedBelief.event_start <= event_ends_before)
+    rows = db.session.execute(query).all()
+    versions = get_belief_versions(current_app.redis_connection, sorted(sensors_by_id))
+    if versions is None:
+        return uuid.uuid4().hex, None
+    versions, last_modified = versions
+
+    fingerprint = hashlib.sha1(
+        json.dumps(
+            [sorted(sensors_by_id), versions]
+            + [[sensor_id, count, int(total)] for sensor_id, count, total in rows]
+        ).encode()
+    ).hexdigest()
+    last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+    return fingerprint, min(last_modified, server_now())
+
+
+def downsample_chart_data(
+    df: pd.DataFrame, width: int, method: str = "lttb"
+) -> pd.DataFrame:
+    """Downsample each series in a frame with one row per belief (as used for charts) to fit a chart of the given width.
+
+    Each combination of sensor and source (where present as columns) is downsampled separately (see downsample_indices),
+    after any resampling, and only if it has more points than the chart has pixels.
+    Downsampled series leave out their missing values.
+    Zooming in on a shorter time window thus brings back the original points.
+
+    :param width:   chart width in pixels
+    :param method:  "lttb" or "minmax"
+    """
+    group_columns = [column for column in ("sensor", "source") if column in df.columns]
+    groups = (
+        df.groupby(group_columns, sort=False, dropna=False)
+        if group_columns
+        else [(None, df)]
+    )
+    keep = []
+    for _, group in groups:
+        if len(group) <= width:
+            keep.append(group.index)
+            continue
+        group = group[group["event_value"].notna()].sort_values("event_start")
+        if group.empty:
+            continue
+        x = pd.DatetimeIndex(group["event_start"]).asi8
+        indices = downsample_indices(
+            x - x[0], group["event_value"].to_numpy(dtype=float), width, method
+        )
+        keep.append(group.index[indices])
+    if not keep:
+        return df
+    return df.loc[df.index.isin(keep[0].append(keep[1:]))]
+
+
+def beliefs_to_chart_json(df: pd.DataFrame, compact: bool = False) -> str:
+    """Serialize beliefs for use in charts, given a frame with one row per belief and sensors and sources in columns.
+
+    By default, beliefs are listed as records, in which each record repeats the full sensor and source.
+    The compact format lists each sensor and source only once, and serializes each column as a whole:
 
-    # Keep whole probabilistic beliefs, not just the parts that changed
-    c = bdf.reset_index().set_index(["event_start", "source"])
-    d = a.reset_index().set_index(["event_start", "source"])
-    bdf = d[d.index.isin(c.index)]
+        {
+            "sensors": {"1": {"id": 1, "name": ...}},
+            "sources": {"2": {"id": 2, "name": ...}},
+            "data": {"event_start": [...], "event_value": [...], "sensor": [1, ...], "source": [2, ...], ...}
+        }
 
-    bdf = bdf.reset_index().set_index(
-        ["event_start", "belief_time", "source", "cumulative_probability"]
+    In both formats, datetimes are given in milliseconds since the UNIX epoch, timedeltas in milliseconds,
+    and missing values as null.
+    """
+    lookups = {}
+    for col_name in ("sensor", "source"):
+        if col_name in df.columns:
+            # Map each unique object once, rather than each row
+            lookups[col_name] = {obj: obj.to_dict() for obj in df[col_name].unique()}
+    if not compact:
+        df = df.copy()
+        for col_name, lookup in lookups.items():
+            df[col_name] = df[col_name].map(lookup)
+        return df.to_json(orient="records")
+
+    data = {}
+    for col_name in df.columns:
+        series = df[col_name]
+        if col_name in lookups:
+            values = series.map({obj: d["id"] for obj, d in lookups[col_name].items()})
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            values = pd.Series(
+                pd.DatetimeIndex(series).asi8 // 10**6, index=series.index
+            )
+        elif pd.api.types.is_timedelta64_dtype(series):
+            values = pd.Series(
+                pd.TimedeltaIndex(series).asi8 // 10**6, index=series.index
+            )
+        else:
+            values = series
+        data[col_name] = values.astype(object).where(series.notna(), None).tolist()
+    return json.dumps(
+        dict(
+            sensors={d["id"]: d for d in lookups.get("sensor", {}).values()},
+            sources={d["id"]: d for d in lookups.get("source", {}).values()},
+            data=data,
+        ),
+        separators=(",", ":"),
     )
-    return bdf
@@ -0,0 +1,166 @@
+from datetime import timedelta
+import pickle
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+import timely_beliefs as tb
+
+from flexmeasures.cli.tests.utils import to_flags
+from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.data.models.time_series import TimedBelief
+from flexmeasures.data.utils import save_to_db
+
+
+@pytest.fixture(scope="function")
+def belief_cache(app, monkeypatch):
+    monkeypatch.setitem(app.config, "FLEXMEASURES_BELIEF_CACHE_TTL", 60)
+    app.belief_cache.invalidate()
+    return app.belief_cache
+
+
+def save_belief(db, sensor, event_start: str, event_value: float):
+    source = db.session.execute(
+        select(DataSource).filter_by(name="Seita")
+    ).scalar_one_or_none()
+    bdf = tb.BeliefsDataFrame(
+        pd.DataFrame(
+            {
+                "event_start": [pd.Timestamp(event_start)],
+                "belief_horizon": [timedelta(hours=-1)],
+                "event_value": [event_value],
+            }
+        ),
+        sensor=sensor,
+        source=source,
+    )
+    save_to_db(bdf)
+
+
+def test_belief_cache(db, setup_test_data, belief_cache):
+    """Check whether repeated searches are served from the cache, until beliefs about the searched window are saved."""
+    sensor = setup_test_data["solar-asset-1"].sensors[0]
+    search_kwargs = dict(
+        event_starts_after=pd.Timestamp("2015-01-01T00:00+00:00"),
+        event_ends_before=pd.Timestamp("2015-01-02T00:00+00:00"),
+    )
+    bdf = TimedBelief.search(sensor, **search_kwargs)
+    stats = belief_cache.get_stats()
+
+    # Repeated search is a hit
+    cached_bdf = TimedBelief.search(sensor, **search_kwargs)
+    pd.testing.assert_frame_equal(cached_bdf, bdf)
+    assert cached_bdf.sensor == sensor
+    assert belief_cache.get_stats()["hits"] == stats["hits"] + 1
+
+    # Beliefs outside the searched window leave the cached result alone
+    save_belief(db, sensor, "2015-01-03T00:00+00:00", 100)
+    TimedBelief.search(sensor, **search_kwargs)
+    assert belief_cache.get_stats()["hits"] == stats["hits"] + 2
+
+    # Beliefs within the searched window invalidate the cached result
+    save_belief(db, sensor, "2015-01-01T00:00+00:00", 100)
+    bdf = TimedBelief.search(sensor, **search_kwargs)
+    assert belief_cache.get_stats()["misses"] == stats["misses"] + 1
+    assert bdf["event_value"].iloc[0] == 100
+
+
+def test_belief_cache_of_multiple_sensors(db, setup_test_data, belief_cache):
+    sensors = [
+        setup_test_data["wind-asset-1"].sensors[0],
+        setup_test_data["wind-asset-2"].sensors[0],
+    ]
+    bdf_dict = TimedBelief.search(sensors, sum_multiple=False)
+    cached_bdf_dict = TimedBelief.search(sensors, sum_multiple=False)
+    assert list(cached_bdf_dict.keys()) == sensors
+    for sensor in sensors:
+        pd.testing.assert_frame_equal(cached_bdf_dict[sensor], bdf_dict[sensor])
+
+
+SEARCH_KWARGS = dict(
+    event_starts_after=pd.Timestamp("2015-01-01T00:00+00:00"),
+    event_ends_before=pd.Timestamp("2015-01-02T00:00+00:00"),
+)
+
+
+def test_belief_cache_after_rollback(fresh_db, setup_fresh_test_data, belief_cache):
+    """Check that results cached while saving beliefs do not outlive a rollback."""
+    fresh_db.session.commit()
+    sensor = setup_fresh_test_data["solar-asset-1"].sensors[0]
+    original_value = TimedBelief.search(sensor, **SEARCH_KWARGS)["event_value"].iloc[0]
+
+    # Searching within the transaction finds (and caches) the new belief
+    save_belief(fresh_db, sensor, "2015-01-01T00:00+00:00", 100)
+    bdf = TimedBelief.search(sensor, **SEARCH_KWARGS)
+    assert bdf["event_value"].iloc[0] == 100
+
+    fresh_db.session.rollback()
+    bdf = TimedBelief.search(sensor, **SEARCH_KWARGS)
+    assert bdf["event_value"].iloc[0] == original_value
+
+
+def test_belief_cache_after_deleting_beliefs(
+    app, fresh_db, setup_fresh_test_data, belief_cache
+):
+    """Check that deleting beliefs with the CLI invalidates cached results."""
+    from flexmeasures.cli.data_delete import delete_beliefs
+
+    fresh_db.session.commit()
+    sensor = setup_fresh_test_data["solar-asset-1"].sensors[0]
+    n_beliefs = len(TimedBelief.search(sensor, **SEARCH_KWARGS))
+    assert n_beliefs > 0
+    stats = belief_cache.get_stats()
+
+    result = app.test_cli_runner().invoke(
+        delete_beliefs,
+        to_flags(
+            {
+                "sensor": sensor.id,
+                "start": "2015-01-01T12:00:00+00:00",
+                "end": "2015-01-02T00:00:00+00:00",
+            }
+        ),
+        input="y\n",
+    )
+    assert result.exit_code == 0, result.exception
+    bdf = TimedBelief.search(sensor, **SEARCH_KWARGS)
+    assert belief_cache.get_stats()["misses"] == stats["misses"] + 1
+    assert len(bdf) == n_beliefs // 2
+
+
+def test_belief_cache_after_resampling_data(
+    app, fresh_db, setup_fresh_test_data, belief_cache
+):
+    """Check that resampling the data of a sensor with the CLI invalidates cached results."""
+    from flexmeasures.cli.data_edit import resample_sensor_data
+
+    fresh_db.session.commit()
+    sensor = setup_fresh_test_data["solar-asset-1"].sensors[0]
+    n_beliefs = len(TimedBelief.search(sensor, **SEARCH_KWARGS))
+    assert n_beliefs == 96
+
+    result = app.test_cli_runner().invoke(
+        resample_sensor_data,
+        to_flags({"sensor": sensor.id, "event-resolution": 60})
+        + ["--skip-integrity-check"],
+    )
+    assert result.exit_code == 0, result.exception
+    bdf = TimedBelief.search(sensor, **SEARCH_KWARGS)
+    assert len(bdf) == n_beliefs // 4
+
+
+class Payload:
+    """Fails the test when unpickled."""
+
+    def __reduce__(self):
+        return pytest.fail, ("A cached result was unpickled",)
+
+
+def test_belief_cache_does_not_unpickle(db, setup_test_data, belief_cache):
+    """Check that cached results which are not packed search results count as misses, rather than being unpickled."""
+    sensor = setup_test_data["solar-asset-1"].sensors[0]
+    bdf = TimedBelief.search(sensor, **SEARCH_KWARGS)
+    for key in belief_cache.connection.zrange("belief-cache:entries", 0, -1):
+        belief_cache.connection.set(key, pickle.dumps(Payload()))
+
+    pd.testing.assert_frame_equal(TimedBelief.search(sensor, **SEARCH_KWARGS), bdf)
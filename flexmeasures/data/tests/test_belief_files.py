@@ -0,0 +1,58 @@
+import pytest
+
+from flexmeasures.data.models.time_series import TimedBelief
+from flexmeasures.data.services.belief_files import export_beliefs, import_beliefs
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_export_and_import_beliefs(db, setup_test_data, tmp_path, file_format):
+    """Check whether exporting beliefs in small chunks, and importing them back, results in the same beliefs."""
+    sensor = setup_test_data["wind-asset-1"].sensors[0]
+    bdf = TimedBelief.search(sensor, most_recent_beliefs_only=False)
+    path = str(tmp_path / f"beliefs.{file_format}")
+
+    assert export_beliefs(path, [sensor], chunk_size=10) == len(bdf)
+
+    # Import the beliefs back, overwriting the existing ones
+    n_beliefs_per_chunk = list(
+        import_beliefs(path, allow_overwrite=True, chunk_size=10)
+    )
+    assert len(n_beliefs_per_chunk) == -(-len(bdf) // 10)
+    assert sum(n_beliefs_per_chunk) == len(bdf)
+    imported_bdf = TimedBelief.search(sensor, most_recent_beliefs_only=False)
+    assert len(imported_bdf) == len(bdf)
+    assert (imported_bdf["event_value"] == bdf["event_value"]).all()
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_import_beliefs_into_mismatching_sensor(
+    db, setup_test_data, tmp_path, file_format
+):
+    """Check that beliefs are not imported under a sensor that does not match its description in the file."""
+    sensor = setup_test_data["wind-asset-1"].sensors[0]
+    path = str(tmp_path / f"beliefs.{file_format}")
+    export_beliefs(path, [sensor])
+    n_beliefs = len(TimedBelief.search(sensor, most_recent_beliefs_only=False))
+
+    # Like a sensor with the same ID in another environment
+    unit = sensor.unit
+    sensor.unit = "kW"
+    with pytest.raises(ValueError, match="unit"):
+        list(import_beliefs(path, allow_overwrite=True))
+    sensor.unit = unit
+    name = sensor.name
+    sensor.name = "another sensor"
+    with pytest.raises(ValueError, match="name"):
+        list(import_beliefs(path, allow_overwrite=True))
+    sensor.name = name
+
+    # A given sensor should have the same resolution, but may have another name
+    other_sensor = setup_test_data["wind-asset-2"].sensors[0]
+    resolution = other_sensor.event_resolution
+    other_sensor.event_resolution = sensor.event_resolution * 2
+    with pytest.raises(ValueError, match="resolution"):
+        list(import_beliefs(path, sensor=other_sensor, allow_overwrite=True))
+    other_sensor.event_resolution = resolution
+    assert len(TimedBelief.search(sensor, most_recent_beliefs_only=False)) == n_beliefs
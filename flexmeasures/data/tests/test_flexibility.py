@@ -0,0 +1,37 @@
+import numpy as np
+
+from flexmeasures.data.services.flexibility import FlexibilityWindow
+
+
+def test_flexibility_window_couples_state_of_charge():
+    """With cheap power first and expensive power later, the battery should charge early and discharge later,
+    which the single-step LP cannot see."""
+    batteries = {
+        "Battery 0": {
+            "bf_min": -1.0,
+            "bf_max": 1.0,
+            "soc_min": 0.0,
+            "soc_max": 90.0,
+            "soc_now": 0.0,
+            "e_nom": 2.0,
+        }
+    }
+    window = FlexibilityWindow(horizon=4, n_loads=1, batteries=batteries, delta_t=1)
+    prices = np.array([[1.0], [1.0], [10.0], [10.0]])
+    ell, bf_cha, bf_dis, soc, dumped = window.solve(
+        ell_max=np.ones((4, 1)),
+        prices_load=prices,
+        g_total=np.array([2.0, 2.0, 0.0, 0.0]),
+        prices_battery=prices,
+        soc_now=[0.0],
+    )
+
+    # State of charge stays within bounds and follows the battery power
+    assert np.all(soc >= -1e-6) and np.all(soc <= 90 + 1e-6)
+    np.testing.assert_allclose(
+        soc[:, 0], np.cumsum(bf_cha[:, 0] - bf_dis[:, 0]) / 2.0 * 100, atol=1e-4
+    )
+
+    # Energy is stored while it is cheap and released while it is expensive
+    assert bf_cha[:2, 0].sum() > 0.5
+    assert bf_dis[2:, 0].sum() > 0.5
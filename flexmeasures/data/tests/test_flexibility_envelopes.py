@@ -0,0 +1,44 @@
+import numpy as np
+
+from flexmeasures.data.services.flexibility_envelopes import (
+    aggregate_per_bus,
+    battery_envelope,
+    load_envelope,
+    soc_at_step_start,
+)
+
+
+def test_battery_envelope_is_limited_by_power_and_energy():
+    """A 1 MW / 2 MWh battery, idling at 10% and at 80% state of charge (with at most 90% usable)."""
+    up, down = battery_envelope(
+        p=np.array([[0.0], [0.0], [0.5]]),
+        soc_start=np.array([[10.0], [80.0], [80.0]]),
+        e_nom=np.array([2.0]),
+        e_min=np.array([0.0]),
+        e_max=np.array([1.8]),
+        p_min=np.array([-1.0]),
+        p_max=np.array([1.0]),
+        delta_t=1,
+    )
+    # Upward: only 0.2 MWh left at 10%, full rating at 80%, plus stopping the scheduled charging
+    np.testing.assert_allclose(up[:, 0], [0.2, 1.0, 1.5])
+    # Downward: full rating at 10%, only 0.2 MWh of room at 80%, of which the scheduled charging already takes 0.5
+    np.testing.assert_allclose(down[:, 0], [1.0, 0.2, 0.0])
+
+
+def test_load_envelope():
+    up, down = load_envelope(ell=np.array([[1.0, 0.0]]), ell_max=np.array([[3.0, 2.0]]))
+    np.testing.assert_allclose(up, [[1.0, 0.0]])
+    np.testing.assert_allclose(down, [[2.0, 2.0]])
+
+
+def test_soc_at_step_start_holds_last_known_soc():
+    soc_after = np.array([[20.0], [np.nan], [40.0]])
+    soc = soc_at_step_start(soc_after, soc_now=np.array([10.0]))
+    np.testing.assert_allclose(soc[:, 0], [10.0, 20.0, 20.0])
+
+
+def test_aggregate_per_bus():
+    values = np.array([[1.0, 2.0, 4.0], [0.0, 1.0, 1.0]])
+    per_bus = aggregate_per_bus(values, asset_buses=[7, 3, 7], bus_ids=[3, 5, 7])
+    np.testing.assert_allclose(per_bus, [[2.0, 0.0, 5.0], [1.0, 0.0, 1.0]])
@@ -0,0 +1,40 @@
+import json
+
+from rq.job import Job
+
+from flexmeasures.data.services.job_progress import (
+    get_latest_progress,
+    iter_progress_events,
+    report_progress,
+)
+from flexmeasures.data.tests.utils import work_on_rq, exception_reporter
+
+
+def count_to(n: int) -> int:
+    for i in range(n):
+        report_progress(i + 1, n, f"Step {i + 1} of {n}", partial_result=[i])
+    return n
+
+
+def test_report_progress_outside_of_job():
+    assert report_progress(1, 2) is None
+
+
+def test_follow_job_progress(app):
+    """Check that the progress of a job can be followed, also after it ended."""
+    queue = app.queues["scheduling"]
+    job = queue.enqueue(count_to, 3)
+    assert get_latest_progress(job.id, queue.connection) is None
+
+    work_on_rq(queue, exc_handler=exception_reporter)
+    progress = get_latest_progress(job.id, queue.connection)
+    assert progress["step"] == progress["total"] == 3
+    assert progress["partial_result"] == [2]
+
+    # Late subscribers get the latest update, and learn that the job has ended
+    events = list(iter_progress_events(Job.fetch(job.id, connection=queue.connection)))
+    assert len(events) == 2
+    assert events[0].startswith("event: progress\n")
+    assert json.loads(events[0].split("data: ")[1]) == progress
+    assert events[1].startswith("event: end\n")
+    assert json.loads(events[1].split("data: ")[1])["status"] == "finished"
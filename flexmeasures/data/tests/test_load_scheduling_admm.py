@@ -0,0 +1,93 @@
+import numpy as np
+import pandapower as pp
+
+from flexmeasures.data.services.load_scheduling_admm import (
+    admm_load_scheduling,
+    solve_local_subproblem,
+)
+
+
+def test_shiftable_load_shifts_active_and_reactive_power_alike():
+    baseline = np.array([[2.0, 2.0, 0.0, 0.0], [0.4, 0.4, 0.0, 0.0]])
+    # The active power is pulled towards the last steps, more strongly than the reactive power to the first
+    target = np.array([[0.0, 0.0, 2.0, 2.0], [0.4, 0.0, 0.0, 0.0]])
+    curve = solve_local_subproblem("Shiftable", baseline, target)
+    np.testing.assert_allclose(curve, np.roll(baseline, 2, axis=1))
+
+
+def test_shiftable_load_follows_a_feasible_target():
+    baseline = np.array([[3.0, 0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]])
+    target = np.roll(baseline, 1, axis=1) + 0.1
+    curve = solve_local_subproblem("Shiftable", baseline, target)
+    np.testing.assert_allclose(curve, np.roll(baseline, 1, axis=1))
+
+
+def test_breakable_load_reorders_its_steps():
+    baseline = np.array([[1.0, 3.0, 0.0, 0.0], [0.1, 0.3, 0.0, 0.0]])
+    target = np.array([[0.0, 0.0, 2.5, 1.5], [0.0, 0.0, 0.0, 0.0]])
+    curve = solve_local_subproblem("Breakable", baseline, target)
+    # The largest step goes where the target is largest, and takes its reactive power along
+    np.testing.assert_allclose(curve, [[0.0, 0.0, 3.0, 1.0], [0.0, 0.0, 0.3, 0.1]])
+
+
+def test_modulatable_load_moves_towards_its_target_within_limits():
+    baseline = np.array([[2.0, 2.0, 2.0], [1.0, 1.0, 1.0]])
+    target = np.array([[5.0, 2.0, -1.0], [1.0, 1.0, 1.0]])
+    curve = solve_local_subproblem("Modulatable", baseline, target)
+    np.testing.assert_allclose(curve, [[3.0, 2.0, 1.0], [1.0, 1.0, 1.0]], atol=1e-4)
+    np.testing.assert_allclose(curve.sum(axis=1), baseline.sum(axis=1), atol=1e-6)
+
+
+def test_inflexible_load_follows_its_baseline():
+    baseline = np.array([[1.0, 2.0], [0.1, 0.2]])
+    curve = solve_local_subproblem("Inflexible", baseline, np.zeros_like(baseline))
+    np.testing.assert_allclose(curve, baseline)
+
+
+def test_admm_reaches_consensus_between_loads_and_network():
+    """The loads end up on feasible curves, which the network-side copies agree with."""
+    nw = pp.create_empty_network()
+    buses = [
+        pp.create_bus(nw, vn_kv=20.0, max_vm_pu=1.1, min_vm_pu=0.9) for _ in range(2)
+    ]
+    pp.create_line_from_parameters(
+        nw, buses[0], buses[1], 1.0, 0.5, 0.3, 10.0, 0.2, max_loading_percent=100
+    )
+    ext_grid = pp.create_ext_grid(
+        nw, buses[0], max_p_mw=100, min_p_mw=-100, max_q_mvar=100, min_q_mvar=-100
+    )
+    # Power gets more expensive as more is drawn at once, which rewards spreading out the loads
+    pp.create_poly_cost(
+        nw, ext_grid, "ext_grid", cp1_eur_per_mw=10.0, cp2_eur_per_mw2=2.0
+    )
+    load_data = {
+        "washing machine": {
+            "Active Power": [1.0, 1.0, 0.0, 0.0],
+            "Reactive Power": [0.2, 0.2, 0.0, 0.0],
+            "Type": "Shiftable",
+        },
+        "heat pump": {
+            "Active Power": [2.0, 2.0, 0.0, 0.0],
+            "Reactive Power": [0.0, 0.0, 0.0, 0.0],
+            "Type": "Breakable",
+        },
+    }
+    for _ in load_data:
+        pp.create_load(nw, buses[1], p_mw=0.0, q_mvar=0.0)
+
+    new_load_data, prices, metrics = admm_load_scheduling(
+        nw, load_data, rho=5.0, max_iterations=50, tolerance=1e-3, n_workers=1
+    )
+
+    assert metrics[-1].primal_residual < 1e-2
+    assert prices["lam_p"].shape == (4, 2)
+    washing_machine = new_load_data["washing machine"]
+    heat_pump = new_load_data["heat pump"]
+    assert sorted(heat_pump["Active Power"]) == [0.0, 0.0, 2.0, 2.0]
+    # The loads no longer coincide, and the washing machine still runs for two consecutive steps
+    total = np.add(washing_machine["Active Power"], heat_pump["Active Power"])
+    assert total.max() < 3.0
+    np.testing.assert_allclose(
+        np.array(washing_machine["Reactive Power"]) * 5,
+        washing_machine["Active Power"],
+    )
@@ -0,0 +1,57 @@
+import pickle
+
+import pandapower as pp
+
+from flexmeasures.data.services import network_cache
+from flexmeasures.data.services.network_cache import (
+    get_compiled_network,
+    get_compiled_network_key,
+)
+
+
+def test_compiled_network_is_built_once_and_copied(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "FLEXMEASURES_NETWORK_SNAPSHOT_PATH", str(tmp_path))
+    monkeypatch.setattr(network_cache, "_compiled_networks", {})
+    builds = []
+
+    def build():
+        builds.append(1)
+        net = pp.create_empty_network()
+        pp.create_bus(net, index=1, vn_kv=20.0)
+        return net
+
+    key = get_compiled_network_key("abc", "opf", [1], [])
+    assert key == get_compiled_network_key("abc", "opf", [1], [])
+    assert key != get_compiled_network_key("abc", "opf", [1, 2], [])
+
+    net = get_compiled_network(key, build)
+    pp.create_load(net, bus=1, p_mw=1.0)
+    assert len(get_compiled_network(key, build).load) == 0
+    assert len(builds) == 1
+
+    # Other processes read the compiled network from the local cache
+    monkeypatch.setattr(network_cache, "_compiled_networks", {})
+    assert list(get_compiled_network(key, build).bus.index) == [1]
+    assert len(builds) == 1
+
+
+def test_tampered_compiled_network_is_not_unpickled(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "FLEXMEASURES_NETWORK_SNAPSHOT_PATH", str(tmp_path))
+    monkeypatch.setattr(network_cache, "_compiled_networks", {})
+    builds = []
+
+    def build():
+        builds.append(1)
+        return pp.create_empty_network()
+
+    key = get_compiled_network_key("abc", "opf", [], [])
+    get_compiled_network(key, build)
+    path = tmp_path / f"{key}.net.pickle"
+    assert path.stat().st_mode & 0o077 == 0
+
+    # Replace the pickle, keeping the old signature, which no longer checks out
+    signed_data = path.read_bytes()
+    path.write_bytes(signed_data[:32] + pickle.dumps("not a network"))
+    monkeypatch.setattr(network_cache, "_compiled_networks", {})
+    assert isinstance(get_compiled_network(key, build), pp.pandapowerNet)
+    assert len(builds) == 2
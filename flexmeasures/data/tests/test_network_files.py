@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from flexmeasures.data.services.network_files import (
+    format_matpower_case,
+    get_network_file_format,
+    parse_matpower_case,
+)
+
+
+CASE = """function mpc = case2
+%% MATPOWER Case Format : Version 2
+mpc.version = '2';
+mpc.baseMVA = 100;
+
+%% bus data
+%	bus_i	type	Pd	Qd	Gs	Bs	area	Vm	Va	baseKV	zone	Vmax	Vmin
+mpc.bus = [
+	1	3	0	0	0	0	1	1	0	20	1	1.1	0.9;
+	2	1	10	5	0	0	1	1	0	20	1	1.1	0.9;
+];
+
+mpc.gen = [
+	1	0	0	300	-300	1	100	1	250	10	0	0	0	0	0	0	0	0	0	0	0;
+];
+
+mpc.branch = [
+	1	2	0.01	0.05	0.02	250	250	250	0	0	1	-360	360;
+];
+"""
+
+
+def test_matpower_case_round_trip():
+    ppc = parse_matpower_case(CASE)
+    assert ppc["baseMVA"] == 100
+    assert ppc["bus"].shape == (2, 13)
+    assert ppc["gen"].shape == (1, 21)
+    np.testing.assert_array_equal(ppc["branch"][0, :4], [1, 2, 0.01, 0.05])
+
+    # Formatting numbers buses from 1, so we pass them as pandapower does (from 0)
+    ppc_from_0 = dict(ppc)
+    for name, columns in dict(bus=[0], gen=[0], branch=[0, 1]).items():
+        ppc_from_0[name] = ppc[name].copy()
+        ppc_from_0[name][:, columns] -= 1
+    reparsed = parse_matpower_case(format_matpower_case(ppc_from_0, name="case2"))
+    for name in ("bus", "gen", "branch"):
+        np.testing.assert_allclose(reparsed[name], ppc[name])
+
+
+def test_unsupported_network_files():
+    assert get_network_file_format("case118.M") == "m"
+    with pytest.raises(ValueError, match="Unsupported network file"):
+        get_network_file_format("case118.mat")
+    with pytest.raises(ValueError, match="no mpc.baseMVA"):
+        parse_matpower_case("mpc.bus = [1 3 0;];")
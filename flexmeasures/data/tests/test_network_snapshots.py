@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flexmeasures.data.models.network_resources import (
+    NETWORK_RESOURCE_TYPE_IDS,
+    PARAMETER_MODELS,
+    NetworkResourceType,
+)
+from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.network_snapshots import FrozenNetwork, freeze_network
+from flexmeasures.data.services.networks import set_parameter_dtypes
+from flexmeasures.data.tests.test_networks import add_resource
+
+
+def make_frozen_network(line_length: float = 1.5) -> FrozenNetwork:
+    tables = {
+        kind: set_parameter_dtypes(
+            pd.DataFrame(
+                columns=model.parameter_names(),
+                index=pd.Index([], name="id", dtype=int),
+            ),
+            model,
+        )
+        for kind, model in PARAMETER_MODELS.items()
+    }
+    tables["bus"] = set_parameter_dtypes(
+        pd.DataFrame(
+            dict(vn_kv=[20.0, 0.4], max_vm_pu=[1.1, np.nan], min_vm_pu=[0.9, np.nan]),
+            index=pd.Index([1, 2], name="id"),
+        ),
+        PARAMETER_MODELS["bus"],
+    )
+    tables["line"] = set_parameter_dtypes(
+        pd.DataFrame(
+            dict(
+                from_bus=[1],
+                to_bus=[2],
+                length_km=[line_length],
+                r_ohm_per_km=[0.6],
+                x_ohm_per_km=[0.3],
+                c_nf_per_km=[10.0],
+                max_i_ka=[0.2],
+            ),
+            index=pd.Index([3], name="id"),
+        ),
+        PARAMETER_MODELS["line"],
+    )
+    assets = {
+        7: dict(
+            kind="load",
+            name="building",
+            attributes=dict(bus=2, type="Shiftable"),
+            sensors=[dict(id=11, unit="W", event_resolution="PT1H")],
+        )
+    }
+    return FrozenNetwork(network_id=1, tables=tables, assets=assets)
+
+
+def test_snapshot_round_trip_keeps_content_and_hash():
+    frozen = make_frozen_network()
+    restored = FrozenNetwork.from_bytes(frozen.to_bytes())
+
+    assert restored.hash == frozen.hash
+    assert restored.tables["line"].loc[3, "to_bus"] == 2
+    assert np.isnan(restored.tables["bus"].loc[2, "max_vm_pu"])
+    assert restored.get_asset_attribute(7, "type") == "Shiftable"
+    assert restored.get_asset_ids("load") == [7]
+    assert list(restored.get_tables([1])["bus"].index) == [1]
+
+
+def test_snapshot_hash_depends_on_content():
+    assert make_frozen_network().hash == make_frozen_network().hash
+    assert make_frozen_network().hash != make_frozen_network(line_length=2.0).hash
+
+
+def test_snapshot_hash_does_not_depend_on_key_order():
+    frozen = make_frozen_network()
+    frozen.assets[7]["attributes"] = dict(type="Shiftable", bus=2)
+    assert FrozenNetwork(frozen.network_id, frozen.tables, frozen.assets).hash == (
+        make_frozen_network().hash
+    )
+
+
+def test_asset_outside_snapshot_is_not_looked_up():
+    frozen = make_frozen_network()
+    with pytest.raises(KeyError):
+        frozen.get_asset_attribute(8, "bus", default=0)
+
+
+def test_freeze_network_with_given_assets(db, add_battery_assets):
+    """Assets that the network is built from are frozen, even if they are not connected to its buses."""
+    for kind, type_id in NETWORK_RESOURCE_TYPE_IDS.items():
+        if db.session.get(NetworkResourceType, type_id) is None:
+            db.session.add(NetworkResourceType(id=type_id, name=f"test {kind}"))
+    bus = add_resource(db, "bus", vn_kv=20.0)
+    network = Network(name="test network", network_resources=[bus.id])
+    db.session.add(network)
+    db.session.flush()
+    battery = add_battery_assets["Test battery"]
+    other_battery = add_battery_assets["Test small battery"]
+
+    frozen = freeze_network(network, asset_ids=[battery.id])
+
+    assert frozen.get_asset_attribute(battery.id, "capacity_in_mw") == 2
+    with pytest.raises(KeyError):
+        frozen.get_asset_attribute(other_battery.id, "capacity_in_mw")
+    with pytest.raises(ValueError):
+        freeze_network(network, asset_ids=[-1])
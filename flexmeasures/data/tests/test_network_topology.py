@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import delete
+
+from flexmeasures.data.models.network_resources import (
+    NETWORK_RESOURCE_TYPE_IDS,
+    NetworkResource,
+    NetworkResourceType,
+)
+from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.network_topology import (
+    InvalidNetworkTopology,
+    NetworkTopology,
+    get_network_topology,
+    get_topology_version,
+    validate_topology,
+)
+from flexmeasures.data.tests.test_networks import add_resource
+
+
+def make_topology(lines: dict, transformers: dict | None = None, buses=range(1, 8)):
+    """Topology from (from bus, to bus) pairs, keyed by resource id."""
+    transformers = transformers or {}
+    return NetworkTopology.from_tables(
+        dict(
+            bus=pd.DataFrame(index=pd.Index(list(buses), name="id")),
+            line=pd.DataFrame(
+                list(lines.values()), index=list(lines), columns=["from_bus", "to_bus"]
+            ),
+            transformer=pd.DataFrame(
+                list(transformers.values()),
+                index=list(transformers),
+                columns=["hv_bus", "lv_bus"],
+            ),
+        )
+    )
+
+
+def test_radial_network_queries():
+    """Bus 1 feeds bus 2 through a transformer, which feeds two branches (3-4 and 5), while 6 and 7 form a separate island."""
+    topology = make_topology(
+        lines={11: (2, 3), 12: (3, 4), 13: (2, 5), 14: (6, 7)},
+        transformers={21: (1, 2)},
+    )
+
+    assert topology.islands() == [[1, 2, 3, 4, 5], [6, 7]]
+    assert topology.is_radial()
+    assert topology.downstream_buses(3, root=1) == [3, 4]
+    assert topology.feeders(root=2) == {1: [1], 3: [3, 4], 5: [5]}
+    assert topology.path(1, 4) == [1, 2, 3, 4]
+    assert topology.path(1, 7) == []
+
+
+def test_loops_are_not_radial():
+    topology = make_topology(
+        lines={11: (1, 2), 12: (2, 3), 13: (3, 1)}, buses=[1, 2, 3]
+    )
+    assert not topology.is_radial()
+
+    # Parallel lines form a loop, too
+    topology = make_topology(lines={11: (1, 2), 12: (1, 2)}, buses=[1, 2])
+    assert not topology.is_radial()
+
+
+def test_validate_topology():
+    topology = make_topology(
+        lines={11: (1, 2), 12: (3, 4), 13: (4, 9)}, buses=[1, 2, 3, 4]
+    )
+    assert topology.dangling_branches == [13]
+
+    with pytest.raises(InvalidNetworkTopology, match=r"branches \[13\]") as exc_info:
+        validate_topology(topology, slack_buses=[1])
+    assert "islands [[3, 4]]" in str(exc_info.value)
+
+    validate_topology(make_topology(lines={11: (1, 2)}, buses=[1, 2]), slack_buses=[2])
+
+
+def test_topology_round_trip():
+    topology = make_topology(
+        lines={11: (1, 2), 12: (1, 2), 13: (4, 9)}, transformers={21: (2, 3)}
+    )
+    restored = NetworkTopology.from_bytes(topology.to_bytes())
+    np.testing.assert_array_equal(restored.bus_ids, topology.bus_ids)
+    np.testing.assert_array_equal(
+        restored.adjacency.toarray(), topology.adjacency.toarray()
+    )
+    pd.testing.assert_frame_equal(
+        restored.branches, topology.branches, check_index_type=False
+    )
+    assert restored.dangling_branches == [13]
+
+
+def test_topology_is_invalidated_after_deleting_a_line(fresh_db):
+    """Deleting a resource with a statement (as the API and CLI do) invalidates cached topologies, once committed."""
+    db = fresh_db
+    for kind, type_id in NETWORK_RESOURCE_TYPE_IDS.items():
+        db.session.add(NetworkResourceType(id=type_id, name=f"test {kind}"))
+    buses = [add_resource(db, "bus", vn_kv=20.0) for _ in range(2)]
+    line = add_resource(
+        db,
+        "line",
+        from_bus=buses[0].id,
+        to_bus=buses[1].id,
+        length_km=1.0,
+        r_ohm_per_km=0.6,
+        x_ohm_per_km=0.3,
+        c_nf_per_km=10.0,
+        max_i_ka=0.2,
+    )
+    network = Network(
+        name="test network", network_resources=[b.id for b in buses] + [line.id]
+    )
+    db.session.add(network)
+    db.session.commit()
+    assert len(get_network_topology(network).islands()) == 1
+    version = get_topology_version()
+
+    db.session.execute(delete(NetworkResource).filter_by(id=line.id))
+    # Until committed, the topology is built without caching it
+    assert len(get_network_topology(network).islands()) == 2
+    assert get_topology_version() == version
+
+    db.session.commit()
+    assert get_topology_version() > version
+    assert len(get_network_topology(network).islands()) == 2
@@ -0,0 +1,68 @@
+import numpy as np
+
+from flexmeasures.data.models.network_resources import (
+    NETWORK_RESOURCE_TYPE_IDS,
+    NetworkResource,
+    NetworkResourceType,
+)
+from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.networks import (
+    get_network_resource_ids,
+    get_network_tables,
+)
+
+
+def add_resource(db, kind: str, **attributes) -> NetworkResource:
+    resource = NetworkResource(
+        name=f"test {kind}",
+        network_resource_type_id=NETWORK_RESOURCE_TYPE_IDS[kind],
+        attributes=attributes,
+    )
+    resource.update_parameters()
+    db.session.add(resource)
+    db.session.flush()
+    return resource
+
+
+def test_network_tables_load_typed_parameters(db):
+    for kind, type_id in NETWORK_RESOURCE_TYPE_IDS.items():
+        if db.session.get(NetworkResourceType, type_id) is None:
+            db.session.add(NetworkResourceType(id=type_id, name=f"test {kind}"))
+    bus_1 = add_resource(db, "bus", vn_kv=20.0, max_vm_pu=1.1, min_vm_pu=0.9)
+    bus_2 = add_resource(db, "bus", vn_kv=0.4)
+    line = add_resource(
+        db,
+        "line",
+        from_bus=bus_1.id,
+        to_bus=bus_2.id,
+        length_km=1.5,
+        r_ohm_per_km=0.6,
+        x_ohm_per_km=0.3,
+        c_nf_per_km=10.0,
+        max_i_ka=0.2,
+    )
+    other_bus = add_resource(db, "bus", vn_kv=110.0)
+    network = Network(
+        name="test network", network_resources=[bus_1.id, bus_2.id, line.id]
+    )
+    db.session.add(network)
+    db.session.flush()
+
+    tables = get_network_tables(network)
+
+    assert list(tables["bus"].index) == [bus_1.id, bus_2.id]
+    assert other_bus.id not in tables["bus"].index
+    np.testing.assert_allclose(tables["bus"]["vn_kv"].to_numpy(), [20.0, 0.4])
+    assert np.isnan(tables["bus"].loc[bus_2.id, "max_vm_pu"])
+    assert tables["line"].loc[line.id, "to_bus"] == bus_2.id
+    assert tables["line"].loc[line.id, "r_ohm_per_km"] == 0.6
+    assert tables["transformer"].empty and tables["shunt"].empty
+    assert get_network_resource_ids(network)["line"] == [line.id]
+
+    # Editing an attribute keeps the typed parameters in sync
+    line.set_attribute("length_km", 2.0)
+    db.session.flush()
+    assert (
+        get_network_tables(resource_ids=[line.id])["line"].loc[line.id, "length_km"]
+        == 2.0
+    )
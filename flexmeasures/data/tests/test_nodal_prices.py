@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from flexmeasures.data.services.load_scheduling import (
+    nodal_prices_from_curves,
+    price_curves_from_nodal_prices,
+)
+from flexmeasures.data.services.nodal_prices import (
+    get_prices_at_elements,
+    stack_nodal_prices,
+)
+
+
+def test_stack_nodal_prices_and_look_up_prices_at_elements():
+    start = datetime(2024, 5, 1, tzinfo=pytz.utc)
+    steps = [
+        dict(
+            lam_p=pd.Series([10.0, 12.0], index=[3, 7]),
+            lam_q=pd.Series([1.0, 2.0], index=[3, 7]),
+        ),
+        dict(
+            lam_p=pd.Series([20.0, 25.0], index=[3, 7]),
+            lam_q=pd.Series([3.0, 4.0], index=[3, 7]),
+        ),
+    ]
+    prices = stack_nodal_prices(steps, start, timedelta(hours=1))
+
+    assert list(prices["lam_p"].columns) == [3, 7]
+    assert prices["lam_p"].index[1] == start + timedelta(hours=1)
+
+    # Two loads on bus 7 and one on bus 3
+    np.testing.assert_allclose(
+        get_prices_at_elements(prices["lam_p"].iloc[1], pd.Series([7, 3, 7])),
+        [25.0, 20.0, 25.0],
+    )
+
+
+def test_price_curves_round_trip():
+    """Load scheduling keeps its prices as curves per bus, which should convert to and from stored nodal prices."""
+    nw = SimpleNamespace(bus=pd.DataFrame(index=[3, 7]))
+    curves = [[[10.0, 20.0], [1.0, 3.0]], [[12.0, 25.0], [2.0, 4.0]]]
+    start = datetime(2024, 5, 1, tzinfo=pytz.utc)
+
+    nodal_prices = nodal_prices_from_curves(nw, curves, start, timedelta(hours=1))
+    assert nodal_prices["lam_q"].loc[start + timedelta(hours=1), 7] == 4.0
+    assert price_curves_from_nodal_prices(nw, nodal_prices) == curves
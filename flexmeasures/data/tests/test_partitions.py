@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select, text
+
+from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.data.models.time_series import Sensor, TimedBelief
+from flexmeasures.data.services.partitions import (
+    create_partitions,
+    drop_partitions,
+    get_month_start,
+    get_partition_name,
+    is_partitioned,
+    parse_partition_bound,
+)
+from flexmeasures.data.tests.utils import partition_timed_belief_table
+
+
+@pytest.mark.parametrize(
+    "bound, start, end, is_default",
+    [
+        (
+            "FOR VALUES FROM ('2024-05-01 00:00:00+00') TO ('2024-06-01 00:00:00+00')",
+            pd.Timestamp("2024-05-01T00:00+00:00"),
+            pd.Timestamp("2024-06-01T00:00+00:00"),
+            False,
+        ),
+        (
+            "FOR VALUES FROM (MINVALUE) TO ('2024-05-01 02:00:00+02')",
+            None,
+            pd.Timestamp("2024-05-01T00:00+00:00"),
+            False,
+        ),
+        ("DEFAULT", None, None, True),
+    ],
+)
+def test_parse_partition_bound(bound, start, end, is_default):
+    partition = parse_partition_bound("timed_belief_y2024m05", bound)
+    assert partition.start == start
+    assert partition.end == end
+    assert partition.is_default == is_default
+
+
+def test_month_start_and_partition_name():
+    month_start = get_month_start(pd.Timestamp("2024-06-01T01:00+02:00"))
+    assert month_start == pd.Timestamp("2024-05-01T00:00+00:00")
+    assert get_partition_name(month_start) == "timed_belief_y2024m05"
+
+
+def test_create_and_drop_partitions(fresh_db, setup_fresh_test_data):
+    """Check that partitions are created for months not covered yet, and that only old partitions are dropped."""
+    db = fresh_db
+    latest_event_start = db.session.scalar(select(func.max(TimedBelief.event_start)))
+    boundary = get_month_start(latest_event_start) + pd.DateOffset(months=1)
+    partition_timed_belief_table(db, boundary)
+    assert is_partitioned()
+    num_beliefs = db.session.scalar(select(func.count()).select_from(TimedBelief))
+
+    # A belief about a month without a partition of its own ends up in the default partition
+    next_month = boundary + pd.DateOffset(months=1)
+    db.session.add(
+        TimedBelief(
+            sensor=db.session.scalars(select(Sensor)).first(),
+            source=db.session.scalars(select(DataSource)).first(),
+            event_start=next_month + timedelta(days=1),
+            belief_horizon=timedelta(0),
+            event_value=1,
+        )
+    )
+    db.session.flush()
+    assert count_rows(db, "timed_belief_default") == 1
+
+    # The month of the legacy partition is skipped, and the belief moves to the partition of its month
+    new_partitions = create_partitions(
+        until=boundary + pd.DateOffset(months=3),
+        start=boundary - pd.DateOffset(months=1),
+    )
+    assert new_partitions == [
+        get_partition_name(boundary + pd.DateOffset(months=i)) for i in range(3)
+    ]
+    assert count_rows(db, "timed_belief_default") == 0
+    assert count_rows(db, get_partition_name(next_month)) == 1
+    assert (
+        create_partitions(
+            until=boundary + pd.DateOffset(months=3),
+            start=boundary - pd.DateOffset(months=1),
+        )
+        == []
+    )
+
+    # Partitions are only dropped if they cover no events after the cutoff
+    assert drop_partitions(boundary - timedelta(days=1)) == []
+    assert [p.name for p in drop_partitions(boundary, dry_run=True)] == [
+        "timed_belief_legacy"
+    ]
+    dropped_partitions = drop_partitions(next_month + timedelta(days=1))
+    assert [p.name for p in dropped_partitions] == [
+        "timed_belief_legacy",
+        get_partition_name(boundary),
+    ]
+    assert num_beliefs > 0
+    assert db.session.scalar(select(func.count()).select_from(TimedBelief)) == 1
+
+
+def count_rows(db, table: str) -> int:
+    return db.session.execute(text(f"SELECT count(*) FROM {table}")).scalar()
@@ -251,6 +251,29 @@ def test_query_beliefs(setup_beliefs, db):
         assert len(bdf) == setup_beliefs
 
 
+@pytest.mark.parametrize("most_recent_beliefs_only", [True, False])
+def test_query_beliefs_of_multiple_sensors(
+    setup_beliefs, setup_test_data, db, most_recent_beliefs_only
+):
+    """Check whether searching beliefs of several sensors at once (in one query) gives the same results
+    as searching them one sensor at a time."""
+    sensors = [
+        get_test_sensor(db),
+        setup_test_data["wind-asset-1"].sensors[0],
+        setup_test_data["solar-asset-1"].sensors[0],
+    ]
+    bdf_dict = TimedBelief.search(
+        sensors, most_recent_beliefs_only=most_recent_beliefs_only
+    )
+    assert list(bdf_dict.keys()) == sensors
+    for sensor in sensors:
+        bdf = TimedBelief.search(
+            sensor, most_recent_beliefs_only=most_recent_beliefs_only
+        )
+        assert bdf_dict[sensor].event_resolution == sensor.event_resolution
+        pd.testing.assert_frame_equal(bdf_dict[sensor], bdf)
+
+
 def test_persist_beliefs(setup_beliefs, setup_test_data, db):
     """Check whether persisting beliefs works.
 
@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import delete, select
+import timely_beliefs as tb
+
+from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.data.models.time_series import (
+    TimedBelief,
+    TimedBeliefRollup,
+    TimedBeliefRollupCoverage,
+)
+from flexmeasures.data.services.rollups import (
+    get_rollup_resolutions,
+    is_rollup_covered,
+    search_rollups,
+    update_rollups,
+)
+from flexmeasures.data.utils import save_to_db
+
+
+def test_rollup_resolutions(setup_test_data):
+    sensor = setup_test_data["wind-asset-1"].sensors[0]
+    assert get_rollup_resolutions(sensor) == [timedelta(hours=1), timedelta(days=1)]
+
+
+@pytest.mark.parametrize("resolution", ["PT1H", "PT3H", "P1D"])
+def test_search_rollups(db, setup_test_data, resolution):
+    """Check whether reading beliefs from rollups gives the same results as resampling the underlying beliefs."""
+    sensor = setup_test_data["wind-asset-1"].sensors[0]
+    start = pd.Timestamp("2015-01-01T00:00+00:00")
+    end = pd.Timestamp("2015-01-02T00:00+00:00")
+    delete_rollups(db, sensor)
+
+    # Without rollups, beliefs are resampled from the underlying beliefs
+    assert search_rollups(sensor, resolution, start, end) is None
+    expected_bdf = TimedBelief.search(
+        sensor, event_starts_after=start, event_ends_before=end, resolution=resolution
+    )
+
+    update_rollups(sensor)
+    bdf = search_rollups(sensor, resolution, start, end)
+    assert bdf is not None
+    assert bdf.event_resolution == expected_bdf.event_resolution
+    assert (bdf.event_starts == expected_bdf.event_starts).all()
+    np.testing.assert_allclose(bdf["event_value"], expected_bdf["event_value"])
+
+    # Searching beliefs now reads from the rollups
+    bdf = TimedBelief.search(
+        sensor, event_starts_after=start, event_ends_before=end, resolution=resolution
+    )
+    np.testing.assert_allclose(bdf["event_value"], expected_bdf["event_value"])
+
+
+def test_search_rollups_with_partial_coverage(db, setup_test_data):
+    """Check that rollups are only read for periods in which they are known to be complete."""
+    sensor = setup_test_data["wind-asset-1"].sensors[0]
+    start = pd.Timestamp("2015-01-01T00:00+00:00")
+    midday = pd.Timestamp("2015-01-01T12:00+00:00")
+    end = pd.Timestamp("2015-01-02T00:00+00:00")
+    delete_rollups(db, sensor)
+    expected_bdf = TimedBelief.search(
+        sensor, event_starts_after=start, event_ends_before=end, resolution="PT1H"
+    )
+
+    # Roll up the first half of the day only (like history saved before rollups were introduced)
+    update_rollups(sensor, start=start, end=midday)
+    assert is_rollup_covered(sensor, timedelta(hours=1), start, midday)
+    assert not is_rollup_covered(sensor, timedelta(hours=1), start, end)
+    assert not is_rollup_covered(sensor, timedelta(hours=1), start, None)
+    assert search_rollups(sensor, "PT1H", start, midday) is not None
+    assert search_rollups(sensor, "PT1H", start, end) is None
+
+    # Searching the whole day falls back to the underlying beliefs, rather than returning half a day
+    bdf = TimedBelief.search(
+        sensor, event_starts_after=start, event_ends_before=end, resolution="PT1H"
+    )
+    assert len(bdf) == len(expected_bdf)
+    np.testing.assert_allclose(bdf["event_value"], expected_bdf["event_value"])
+
+    # Rolling up the second half merges the covered periods
+    update_rollups(sensor, start=midday, end=end)
+    coverage = db.session.scalars(
+        select(TimedBeliefRollupCoverage).filter_by(
+            sensor_id=sensor.id, resolution=timedelta(hours=1)
+        )
+    ).all()
+    assert [(c.covered_since, c.covered_until) for c in coverage] == [(start, end)]
+    bdf = search_rollups(sensor, "PT1H", start, end)
+    assert bdf is not None
+    np.testing.assert_allclose(bdf["event_value"], expected_bdf["event_value"])
+
+
+def test_save_to_db_updates_rollups(db, setup_test_data):
+    sensor = setup_test_data["wind-asset-2"].sensors[0]
+    source = db.session.execute(
+        select(DataSource).filter_by(name="Seita")
+    ).scalar_one_or_none()
+    bdf = tb.BeliefsDataFrame(
+        pd.DataFrame(
+            {
+                "event_start": pd.date_range(
+                    "2015-01-02T00:00+00:00", periods=4, freq="15min"
+                ),
+                "belief_horizon": timedelta(0),
+                "event_value": [1.0, 2.0, 3.0, 4.0],
+            }
+        ),
+        sensor=sensor,
+        source=source,
+    )
+    save_to_db(bdf)
+    rollup = db.session.get(
+        TimedBeliefRollup,
+        (
+            sensor.id,
+            timedelta(hours=1),
+            pd.Timestamp("2015-01-02T00:00+00:00"),
+            source.id,
+        ),
+    )
+    assert rollup is not None
+    assert rollup.event_count == 4
+    assert rollup.event_value_sum == 10
+    assert not rollup.probabilistic
+
+
+def delete_rollups(db, sensor):
+    """Delete the rollups of a sensor, and forget they were ever complete."""
+    db.session.execute(
+        delete(TimedBeliefRollup).filter(TimedBeliefRollup.sensor_id == sensor.id)
+    )
+    db.session.execute(
+        delete(TimedBeliefRollupCoverage).filter(
+            TimedBeliefRollupCoverage.sensor_id == sensor.id
+        )
+    )
@@ -1,6 +1,9 @@
 import pytest
 
+from flexmeasures.data import db
+from flexmeasures.data.models.generic_assets import GenericAsset
 from flexmeasures.data.models.time_series import Sensor
+from flexmeasures.data.queries.sensors import query_sensors_in_bounding_box
 
 
 @pytest.mark.parametrize("n", [1, 3])
@@ -41,3 +44,30 @@ def test_closest_sensor(run_as_cli, add_nearby_weather_sensors, n):
                 sensor.generic_asset.generic_asset_type.name
                 == wind_sensor.generic_asset.generic_asset_type.name
             )
+
+
+def test_sensors_in_bounding_box(run_as_cli, add_nearby_weather_sensors):
+    """Check that a bounding box just east of the wind sensor includes the farther temperature sensor, but not the even farther one."""
+    wind_sensor = add_nearby_weather_sensors["wind"]
+    latitude, longitude = wind_sensor.generic_asset.location
+    sensors = db.session.scalars(
+        query_sensors_in_bounding_box(
+            south=latitude - 0.01,
+            west=longitude + 0.05,
+            north=latitude + 0.01,
+            east=longitude + 0.15,
+            sensor_name="temperature",
+        )
+    ).all()
+    assert sensors == [add_nearby_weather_sensors["farther_temperature"]]
+
+
+def test_closest_assets(run_as_cli, add_nearby_weather_sensors):
+    wind_sensor = add_nearby_weather_sensors["wind"]
+    closest_assets = GenericAsset.find_closest(
+        n=3,
+        generic_asset_type_name="weather station",
+        object=wind_sensor.generic_asset,
+    )
+    assert len(closest_assets) == 3
+    assert closest_assets[0].location == wind_sensor.generic_asset.location
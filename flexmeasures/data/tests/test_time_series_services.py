@@ -1,3 +1,6 @@
+import json
+
+import numpy as np
 import pandas as pd
 from timely_beliefs import utils as tb_utils
 
@@ -94,3 +97,61 @@ def test_do_not_drop_changed_probabilistic_belief(setup_beliefs, db):
     bdf = sensor.search_beliefs(source="ENTSO-E", most_recent_beliefs_only=False)
     num_beliefs_after = len(bdf)
     assert num_beliefs_after == num_beliefs_before + len(new_belief)
+
+
+def test_save_to_db_with_copy(setup_beliefs, db):
+    """Streaming beliefs with COPY should save new beliefs, and still skip unchanged beliefs."""
+
+    sensor = get_test_sensor(db)
+    bdf = sensor.search_beliefs(most_recent_beliefs_only=False)
+    num_beliefs_before = len(bdf)
+
+    # Save the same beliefs about events a year later
+    bdf = tb_utils.replace_multi_index_level(
+        bdf, "event_start", bdf.event_starts + pd.Timedelta(days=365)
+    )
+    assert save_to_db(bdf, use_copy=True) == "success"
+    bdf_after = sensor.search_beliefs(most_recent_beliefs_only=False)
+    assert len(bdf_after) == 2 * num_beliefs_before
+
+    # Saving them again adds nothing new
+    assert save_to_db(bdf, use_copy=True) == "success_but_nothing_new"
+    bdf_after = sensor.search_beliefs(most_recent_beliefs_only=False)
+    assert len(bdf_after) == 2 * num_beliefs_before
+
+
+def test_save_nan_to_db_with_copy(setup_beliefs, db):
+    """Streaming beliefs with COPY should store NaN values as NaN, like the ORM does, rather than as NULL."""
+
+    sensor = get_test_sensor(db)
+    bdf = sensor.search_beliefs(most_recent_beliefs_only=False)
+    bdf = tb_utils.replace_multi_index_level(
+        bdf, "event_start", bdf.event_starts + pd.Timedelta(days=730)
+    )
+    bdf["event_value"] = np.nan
+    assert save_to_db(bdf, use_copy=True) == "success"
+    bdf_after = sensor.search_beliefs(
+        event_starts_after=bdf.event_starts.min(), most_recent_beliefs_only=False
+    )
+    assert len(bdf_after) == len(bdf)
+    assert bdf_after["event_value"].isnull().all()
+
+
+def test_compact_chart_data(setup_beliefs, db):
+    """The compact chart data format should hold the same beliefs as the records format."""
+    sensor = get_test_sensor(db)
+    records = json.loads(sensor.search_beliefs(as_json=True))
+    compact = json.loads(sensor.search_beliefs(as_json=True, compact=True))
+    assert list(compact["sensors"].keys()) == [str(sensor.id)]
+    expanded_records = [
+        {
+            column: compact["sensors"][str(values[i])]
+            if column == "sensor"
+            else compact["sources"][str(values[i])]
+            if column == "source"
+            else values[i]
+            for column, values in compact["data"].items()
+        }
+        for i in range(len(records))
+    ]
+    assert expanded_records == records
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+import timely_beliefs as tb
+
+from flexmeasures.data.models.data_sources import DataSource
+from flexmeasures.data.services.time_series import (
+    _drop_unchanged_beliefs_compared_to_db,
+)
+from flexmeasures.tests.utils import get_test_sensor
+
+
+def make_beliefs(sensor, beliefs: list[tuple]) -> tb.BeliefsDataFrame:
+    """BeliefsDataFrame from (event start, belief horizon, source, cumulative probability, event value) tuples."""
+    return tb.BeliefsDataFrame(
+        pd.DataFrame(
+            [
+                (pd.Timestamp(event_start), horizon, source, cp, value)
+                for event_start, horizon, source, cp, value in beliefs
+            ],
+            columns=[
+                "event_start",
+                "belief_horizon",
+                "source",
+                "cumulative_probability",
+                "event_value",
+            ],
+        ),
+        sensor=sensor,
+    )
+
+
+@pytest.mark.parametrize(
+    "event_start, belief_horizon, new_beliefs, expected_values",
+    [
+        # An ex-post belief equal to the stored ex-post belief
+        ("2021-03-28 16:00+01", timedelta(hours=-1), [(0.5, 21)], []),
+        # A changed ex-post belief
+        ("2021-03-28 17:00+01", timedelta(hours=-1), [(0.5, 22)], [22]),
+        # An ex-post belief is not compared to the (earlier) ex-ante belief it equals
+        ("2021-03-28 17:00+01", timedelta(hours=-1), [(0.2, 20)], [20]),
+        # A probabilistic ex-ante belief equal to the stored ex-ante belief
+        ("2021-03-28 17:00+01", timedelta(hours=1), [(0.2, 20), (0.5, 21)], []),
+        # A probabilistic belief of which one part changed is kept whole
+        (
+            "2021-03-28 17:00+01",
+            timedelta(hours=1),
+            [(0.2, 20), (0.5, 22)],
+            [20, 22],
+        ),
+        # A probabilistic belief that gained a cumulative probability is kept whole
+        (
+            "2021-03-28 17:00+01",
+            timedelta(hours=1),
+            [(0.2, 20), (0.5, 21), (0.8, 23)],
+            [20, 21, 23],
+        ),
+        # An ex-ante belief with nothing stored before it (only a later ex-post belief)
+        ("2021-03-28 16:00+01", timedelta(hours=1), [(0.5, 21)], [21]),
+    ],
+)
+def test_drop_unchanged_beliefs_compared_to_db(
+    fresh_db,
+    setup_beliefs_fresh_db,
+    setup_sources_fresh_db,
+    event_start,
+    belief_horizon,
+    new_beliefs,
+    expected_values,
+):
+    """New beliefs equal to the most recent stored belief from the same source are dropped, others are kept."""
+    sensor = get_test_sensor(fresh_db)
+    bdf = make_beliefs(
+        sensor,
+        [
+            (event_start, belief_horizon, setup_sources_fresh_db["ENTSO-E"], cp, value)
+            for cp, value in new_beliefs
+        ],
+    )
+    kept_bdf = _drop_unchanged_beliefs_compared_to_db(bdf)
+    assert list(kept_bdf["event_value"]) == expected_values
+
+
+def test_do_not_drop_beliefs_from_new_sources(
+    fresh_db, setup_beliefs_fresh_db, setup_sources_fresh_db
+):
+    """Beliefs from a source without stored beliefs, or from a source that has no ID yet, are all kept."""
+    sensor = get_test_sensor(fresh_db)
+    new_source = DataSource(name="New source", type="demo script")
+    fresh_db.session.add(new_source)
+    fresh_db.session.flush()
+    unsaved_source = DataSource(name="Unsaved source", type="demo script")
+    bdf = make_beliefs(
+        sensor,
+        [
+            ("2021-03-28 16:00+01", timedelta(hours=-1), new_source, 0.5, 21),
+            ("2021-03-28 16:00+01", timedelta(hours=-1), unsaved_source, 0.5, 21),
+            # Dropped, as this belief is stored already
+            (
+                "2021-03-28 16:00+01",
+                timedelta(hours=-1),
+                setup_sources_fresh_db["ENTSO-E"],
+                0.5,
+                21,
+            ),
+        ],
+    )
+    assert unsaved_source.id is None
+
+    kept_bdf = _drop_unchanged_beliefs_compared_to_db(bdf)
+    kept_sources = kept_bdf.index.get_level_values("source")
+    assert sorted(kept_sources, key=lambda source: source.name) == [
+        new_source,
+        unsaved_source,
+    ]
+
+    # With only beliefs from sources without IDs, nothing is compared
+    bdf = make_beliefs(
+        sensor,
+        [("2021-03-28 16:00+01", timedelta(hours=-1), unsaved_source, 0.5, 21)],
+    )
+    assert len(_drop_unchanged_beliefs_compared_to_db(bdf)) == 1
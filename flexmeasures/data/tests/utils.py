@@ -1,3 +1,4 @@
+from datetime import datetime
 import os
 
 import click
@@ -25,3 +26,24 @@ def work_on_rq(redis_queue, exc_handler=None, max_jobs=None):
 
 def exception_reporter(job, exc_type, exc_value, traceback):
     click.echo("HANDLING RQ WORKER EXCEPTION: %s:%s\n" % (exc_type, exc_value))
+
+
+def partition_timed_belief_table(db, boundary: datetime):
+    """Partition the timed_belief table by range of event_start, like the migration to monthly partitions does.
+
+    The existing beliefs end up in a single (legacy) partition covering all events before the given boundary,
+    next to a default partition. Partitions for later months are left to create_partitions.
+    """
+    connection = db.session.connection()
+    connection.exec_driver_sql("ALTER TABLE timed_belief RENAME TO timed_belief_legacy")
+    connection.exec_driver_sql(
+        "CREATE TABLE timed_belief (LIKE timed_belief_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (event_start)"
+    )
+    connection.exec_driver_sql(
+        "ALTER TABLE timed_belief ATTACH PARTITION timed_belief_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+    )
+    connection.exec_driver_sql(
+        "CREATE TABLE timed_belief_default PARTITION OF timed_belief DEFAULT"
+    )
@@ -4,13 +4,19 @@ Utils around the data models and db sessions
 
 from __future__ import annotations
 
+import io
+import time
+
 from flask import current_app
+import pandas as pd
 from timely_beliefs import BeliefsDataFrame, BeliefsSeries
-from sqlalchemy import select
+from sqlalchemy import select, text
 
 from flexmeasures.data import db
 from flexmeasures.data.models.data_sources import DataSource
 from flexmeasures.data.models.time_series import TimedBelief
+from flexmeasures.data.services.belief_cache import invalidate_cached_beliefs
+from flexmeasures.data.services.rollups import update_rollups_for_beliefs
 from flexmeasures.data.services.time_series import drop_unchanged_beliefs
 
 
@@ -60,11 +66,16 @@ def save_to_db(
     data: BeliefsDataFrame | BeliefsSeries | list[BeliefsDataFrame | BeliefsSeries],
     bulk_save_objects: bool = False,
     save_changed_beliefs_only: bool = True,
+    use_copy: bool = False,
+    allow_overwrite: bool | None = None,
 ) -> str:
     """Save the timed beliefs to the database.
 
     Note: This function does not commit. It does, however, flush the session. Best to keep transactions short.
 
+    Rollups about the time buckets of saved beliefs are updated, too (see flexmeasures.data.services.rollups),
+    and cached search results about them are invalidated (see flexmeasures.data.services.belief_cache).
+
     We make the distinction between updating beliefs and replacing beliefs.
 
     # Updating beliefs
@@ -88,12 +99,21 @@ def save_to_db(
                               https://docs.sqlalchemy.org/orm/persistence_techniques.html#bulk-operations-caveats
     :param save_changed_beliefs_only: if True, unchanged beliefs are skipped (updated beliefs are only stored if they represent changed beliefs)
                                       if False, all updated beliefs are stored
+    :param use_copy: if True, beliefs are streamed to the database with COPY (see copy_beliefs_to_db),
+                     which is the fastest way to save large numbers of beliefs (e.g. from backfills)
+    :param allow_overwrite: if True, beliefs may replace beliefs with the same belief time,
+                            by default as set by FLEXMEASURES_ALLOW_DATA_OVERWRITE
     :returns: status string, one of the following:
               - 'success': all beliefs were saved
               - 'success_with_unchanged_beliefs_skipped': not all beliefs represented a state change
               - 'success_but_nothing_new': no beliefs represented a state change
     """
 
+    if allow_overwrite is None:
+        allow_overwrite = current_app.config.get(
+            "FLEXMEASURES_ALLOW_DATA_OVERWRITE", False
+        )
+
     # Convert to list
     if not isinstance(data, list):
         timed_values_list = [data]
@@ -102,6 +122,7 @@ def save_to_db(
 
     status = "success"
     values_saved = 0
+    saved_timed_values = []
     for timed_values in timed_values_list:
 
         if timed_values.empty:
@@ -130,18 +151,124 @@ def save_to_db(
                 continue
 
         current_app.logger.info("SAVING TO DB...")
-        TimedBelief.add_to_session(
-            session=db.session,
-            beliefs_data_frame=timed_values,
-            bulk_save_objects=bulk_save_objects,
-            allow_overwrite=current_app.config.get(
-                "FLEXMEASURES_ALLOW_DATA_OVERWRITE", False
-            ),
-        )
+        if use_copy and db.session.get_bind().dialect.name == "postgresql":
+            copy_beliefs_to_db(timed_values, allow_overwrite=allow_overwrite)
+        else:
+            TimedBelief.add_to_session(
+                session=db.session,
+                beliefs_data_frame=timed_values,
+                bulk_save_objects=bulk_save_objects,
+                allow_overwrite=allow_overwrite,
+            )
         values_saved += len(timed_values)
+        saved_timed_values.append(timed_values)
     # Flush to bring up potential unique violations (due to attempting to replace beliefs)
     db.session.flush()
 
+    # Update the rollups about the time buckets with new beliefs, and invalidate cached search results about them
+    for timed_values in saved_timed_values:
+        update_rollups_for_beliefs(timed_values)
+        invalidate_cached_beliefs(
+            [timed_values.sensor.id],
+            start=timed_values.event_starts.min(),
+            end=timed_values.event_ends.max(),
+        )
+
     if values_saved == 0:
         status = "success_but_nothing_new"
     return status
+
+
+COPY_COLUMNS = [
+    "event_start",
+    "belief_horizon",
+    "cumulative_probability",
+    "event_value",
+    "sensor_id",
+    "source_id",
+]
+COPY_CHUNK_SIZE = (
+    100_000  # beliefs per COPY statement, which caps the size of the CSV buffer
+)
+
+
+def copy_beliefs_to_db(
+    bdf: BeliefsDataFrame,
+    allow_overwrite: bool = False,
+    staging_table: str = "timed_belief_staging",
+) -> int:
+    """Stream beliefs into the timed_belief table with Postgres' COPY.
+
+    The beliefs are copied (in chunks, as CSV) into a temporary staging table,
+    and then merged into the timed_belief table with a single INSERT ... SELECT.
+    Like with TimedBelief.add_to_session, replacing beliefs (with the same belief time) raises an IntegrityError,
+    unless allow_overwrite is True, in which case their event values are updated.
+    Skipping unchanged beliefs is up to the caller (see save_to_db).
+
+    Note: This function does not commit.
+
+    :returns: the number of copied beliefs
+    """
+    if bdf.empty:
+        return 0
+    start_time = time.perf_counter()
+    df = bdf.convert_index_from_belief_time_to_horizon().reset_index()
+
+    # Make sure new sources get an ID
+    new_sources = [source for source in df["source"].unique() if source.id is None]
+    if new_sources:
+        db.session.add_all(new_sources)
+        db.session.flush()
+
+    df["sensor_id"] = bdf.sensor.id
+    df["source_id"] = df["source"].map(lambda source: source.id)
+    df["event_start"] = pd.DatetimeIndex(df["event_start"]).tz_convert("UTC")
+    df["belief_horizon"] = (
+        pd.to_timedelta(df["belief_horizon"])
+        .dt.total_seconds()
+        .map(lambda seconds: f"{seconds:.6f} seconds")
+    )
+    columns = ", ".join(COPY_COLUMNS)
+
+    connection = db.session.connection()
+    connection.execute(
+        text(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} "
+            f"(LIKE {TimedBelief.__tablename__} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+    )
+    # Go through the session's connection, so the COPY is part of the session's transaction
+    cursor = connection.connection.cursor()
+    try:
+        for i in range(0, len(df), COPY_CHUNK_SIZE):
+            buffer = io.StringIO()
+            df[COPY_COLUMNS].iloc[i : i + COPY_CHUNK_SIZE].to_csv(
+                buffer,
+                index=False,
+                header=False,
+                date_format="%Y-%m-%d %H:%M:%S.%f%z",
+                # Otherwise, NaN values become empty fields, which COPY reads as NULL
+                na_rep="NaN",
+            )
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {staging_table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+    finally:
+        cursor.close()
+
+    merge_statement = f"INSERT INTO {TimedBelief.__tablename__} ({columns}) SELECT {columns} FROM {staging_table}"
+    if allow_overwrite:
+        merge_statement += (
+            " ON CONFLICT (event_start, belief_horizon, cumulative_probability, sensor_id, source_id)"
+            " DO UPDATE SET event_value = EXCLUDED.event_value"
+        )
+    connection.execute(text(merge_statement))
+    # Empty the staging table for the next batch within the same transaction
+    connection.execute(text(f"TRUNCATE {staging_table}"))
+
+    duration = time.perf_counter() - start_time
+    current_app.logger.info(
+        f"Copied {len(df)} beliefs to the database in {duration:.2f} seconds ({len(df) / max(duration, 1e-9):.0f} beliefs per second)."
+    )
+    return len(df)
@@ -7,8 +7,8 @@ from flask import url_for, current_app, request
 from flask_classful import FlaskView, route
 from flask_wtf import FlaskForm
 from flask_security import login_required, current_user
-from flexmeasures.data.models.network_resources import NetworkResource
 from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.networks import get_network_resource_ids
 from webargs.flaskparser import use_kwargs
 from wtforms import StringField, DecimalField, SelectField
 from wtforms.validators import DataRequired, optional
@@ -35,6 +35,7 @@ from flexmeasures.data.services.sensors import (
 )
 from flexmeasures.data.services.load_scheduling import eflex_load_scheduling
 from flexmeasures.data.services.flexibility import eflex_flexibility
+from flexmeasures.data.services.job_progress import enqueue_network_job
 from datetime import datetime
 from flexmeasures.utils.time_utils import server_now
 from flexmeasures.ui.crud.networks import get_networks_by_account
@@ -43,6 +44,27 @@ from flexmeasures.ui.crud.networks import get_networks_by_account
 WRITE SOMETHING
 """
 
+
+def get_horizon_error(horizon: int | None, horizon_step: int) -> str | None:
+    """Describe what is wrong with the horizon settings of a flexibility run, if anything.
+
+    Values that are not whole numbers are dropped by request.args.get, so they are checked against the raw arguments.
+    """
+    for name in ("horizon", "horizon_step"):
+        value = request.args.get(name)
+        if value and not value.isdigit():
+            return f"The {name.replace('_', ' ')} should be a whole number of steps, but it is {value}."
+    if horizon is None:
+        # Myopic mode, which does not use the horizon step
+        return None
+    if not 0 < horizon_step <= horizon:
+        return (
+            f"The horizon step should be at least 1 and at most the horizon ({horizon} steps),"
+            f" but it is {horizon_step}."
+        )
+    return None
+
+
 class RunFlexibilityUI(FlaskView):
     """
     These views help us offer a Jinja2-based UI.
@@ -64,23 +86,30 @@ class RunFlexibilityUI(FlaskView):
         to_day = request.args.get('to_day')
         from_time = request.args.get('from_time')
         to_time = request.args.get('to_time')
-        
+        horizon = request.args.get('horizon', type=int)
+        horizon_step = request.args.get('horizon_step', default=1, type=int)
+        use_stored_prices = request.args.get('use_stored_prices', default=False, type=lambda v: v.lower() == 'true')
+
+        networks = get_networks_by_account(current_user.account_id)
+        horizon_error = get_horizon_error(horizon, horizon_step)
+        if horizon_error:
+            return render_flexmeasures_template(
+                "admin/flexibility.html",
+                logged_in_user=current_user,
+                networks=networks,
+                msg=horizon_error,
+            ), 400
+
         from_datetime = datetime.strptime(from_day + " " + from_time, "%Y-%m-%d %H:%M")
         to_datetime = datetime.strptime(to_day + " " + to_time, "%Y-%m-%d %H:%M")
 
-        networks = get_networks_by_account(current_user.account_id)
         the_network = Network.query.filter_by(name=network_name).first().id
         
-        lines_on_network, buses_on_network, shunts_on_network, transformers_on_network = [], [], [], []    
-        for resource in Network.query.get(the_network).network_resources:
-            if(NetworkResource.query.get(resource).network_resource_type_id == 1):
-                buses_on_network.append(NetworkResource.query.get(resource).id)
-            if(NetworkResource.query.get(resource).network_resource_type_id == 0):
-                lines_on_network.append(NetworkResource.query.get(resource).id)
-            if(NetworkResource.query.get(resource).network_resource_type_id == 4):
-                shunts_on_network.append(NetworkResource.query.get(resource).id)
-            if(NetworkResource.query.get(resource).network_resource_type_id == 2):
-                transformers_on_network.append(NetworkResource.query.get(resource).id)
+        resource_ids = get_network_resource_ids(Network.query.get(the_network))
+        lines_on_network = resource_ids["line"]
+        buses_on_network = resource_ids["bus"]
+        shunts_on_network = resource_ids["shunt"]
+        transformers_on_network = resource_ids["transformer"]
         
         battery = []
         for bat in GenericAsset.query.filter_by(generic_asset_type_id=5).all():
@@ -122,16 +151,22 @@ class RunFlexibilityUI(FlaskView):
             external_grid = ext_grid,
             resolution    = GenericAsset.query.get(battery[0]).sensors[0].event_resolution,
             belief_time   = server_now(),
+            horizon       = horizon,
+            horizon_step  = horizon_step,
+            network_id    = the_network,
+            use_stored_prices = use_stored_prices,
+        )
+
+        # Run as a job, whose progress (and partial results) the page follows live
+        job = enqueue_network_job(
+            eflex_flexibility, the_network, flexibility_scheduling_kwargs
         )
 
-        success = eflex_flexibility(**flexibility_scheduling_kwargs)
-        if success:
-            print("Flexibility done with success")
-        
         return render_flexmeasures_template(
             "admin/flexibility.html",
             logged_in_user=current_user,
             networks=networks,
+            job_id=job.id,
         )
 
     # @login_required
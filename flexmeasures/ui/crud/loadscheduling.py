@@ -7,8 +7,8 @@ from flask import url_for, current_app, request
 from flask_classful import FlaskView, route
 from flask_wtf import FlaskForm
 from flask_security import login_required, current_user
-from flexmeasures.data.models.network_resources import NetworkResource
 from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.networks import get_network_resource_ids
 from webargs.flaskparser import use_kwargs
 from wtforms import StringField, DecimalField, SelectField
 from wtforms.validators import DataRequired, optional
@@ -33,6 +33,7 @@ from flexmeasures.data.services.sensors import (
     build_sensor_status_data,
     build_asset_jobs_data,
 )
+from flexmeasures.data.services.job_progress import enqueue_network_job
 from flexmeasures.data.services.load_scheduling import eflex_load_scheduling
 from datetime import datetime
 from flexmeasures.utils.time_utils import server_now
@@ -64,6 +65,8 @@ class RunLoadSchedulingUI(FlaskView):
         to_day = request.args.get('to_day')
         from_time = request.args.get('from_time')
         to_time = request.args.get('to_time')
+        use_stored_prices = request.args.get('use_stored_prices', default=False, type=lambda v: v.lower() == 'true')
+        method = request.args.get('method', default='central')
         
         from_datetime = datetime.strptime(from_day + " " + from_time, "%Y-%m-%d %H:%M")
         to_datetime = datetime.strptime(to_day + " " + to_time, "%Y-%m-%d %H:%M")
@@ -71,16 +74,11 @@ class RunLoadSchedulingUI(FlaskView):
         networks = get_networks_by_account(current_user.account_id)
         the_network = Network.query.filter_by(name=network_name).first().id
         
-        lines_on_network, buses_on_network, shunts_on_network, transformers_on_network = [], [], [], []    
-        for resource in Network.query.get(the_network).network_resources:
-            if(NetworkResource.query.get(resource).network_resource_type_id == 1):
-                buses_on_network.append(NetworkResource.query.get(resource).id)
-            if(NetworkResource.query.get(resource).network_resource_type_id == 0):
-                lines_on_network.append(NetworkResource.query.get(resource).id)
-            if(NetworkResource.query.get(resource).network_resource_type_id == 4):
-                shunts_on_network.append(NetworkResource.query.get(resource).id)
-            if(NetworkResource.query.get(resource).network_resource_type_id == 2):
-                transformers_on_network.append(NetworkResource.query.get(resource).id)
+        resource_ids = get_network_resource_ids(Network.query.get(the_network))
+        lines_on_network = resource_ids["line"]
+        buses_on_network = resource_ids["bus"]
+        shunts_on_network = resource_ids["shunt"]
+        transformers_on_network = resource_ids["transformer"]
         
         battery = []
         for bat in GenericAsset.query.filter_by(generic_asset_type_id=5).all():
@@ -116,14 +114,19 @@ class RunLoadSchedulingUI(FlaskView):
             external_grid = ext_grid,
             resolution    = GenericAsset.query.get(ext_grid[0]).sensors[0].event_resolution,
             belief_time   = server_now(),
+            network_id    = the_network,
+            use_stored_prices = use_stored_prices,
+            method        = method,
+        )
+
+        # Run as a job, whose progress (and partial results) the page follows live
+        job = enqueue_network_job(
+            eflex_load_scheduling, the_network, load_scheduling_kwargs
         )
 
-        success = eflex_load_scheduling(**load_scheduling_kwargs)
-        if success:
-            print("Load Scheduling done with success")
-        
         return render_flexmeasures_template(
             "admin/loadscheduling.html",
             logged_in_user=current_user,
             networks=networks,
+            job_id=job.id,
         )
@@ -7,8 +7,8 @@ from flask import url_for, current_app, request
 from flask_classful import FlaskView, route
 from flask_wtf import FlaskForm
 from flask_security import login_required, current_user
-from flexmeasures.data.models.network_resources import NetworkResource
 from flexmeasures.data.models.networks import Network
+from flexmeasures.data.services.networks import get_network_resource_ids
 from webargs.flaskparser import use_kwargs
 from wtforms import StringField, DecimalField, SelectField
 from wtforms.validators import DataRequired, optional
@@ -33,6 +33,7 @@ from flexmeasures.data.services.sensors import (
     build_sensor_status_data,
     build_asset_jobs_data,
 )
+from flexmeasures.data.services.job_progress import enqueue_network_job
 from flexmeasures.data.services.opf import eflex_opf, eflex_pf
 from datetime import datetime
 from flexmeasures.utils.time_utils import server_now
@@ -72,19 +73,11 @@ class RunOPFUI(FlaskView):
         networks = get_networks_by_account(current_user.account_id)
         the_network = Network.query.filter_by(name=network_name).first()
 
-        shunt = []
-        trafo = []
-        buses = []
-        lines = []
-        for network_resource in the_network.network_resources:
-            if NetworkResource.query.get(network_resource).network_resource_type_id == 1:
-                buses.append(network_resource)
-            if NetworkResource.query.get(network_resource).network_resource_type_id == 0:
-                lines.append(network_resource)
-            if NetworkResource.query.get(network_resource).network_resource_type_id == 2:
-                trafo.append(network_resource)
-            if NetworkResource.query.get(network_resource).network_resource_type_id == 4:
-                shunt.append(network_resource)
+        resource_ids = get_network_resource_ids(the_network)
+        shunt = resource_ids["shunt"]
+        trafo = resource_ids["transformer"]
+        buses = resource_ids["bus"]
+        lines = resource_ids["line"]
 
         batteries = []
         loads = []
@@ -124,19 +117,20 @@ class RunOPFUI(FlaskView):
             belief_time  = now
         )
 
-        success = False
+        # Run as a job, whose progress (and partial results) the page follows live
+        job = None
         if OPForPF == 'OPF':
-            success = eflex_opf(**scheduling_kwargs)
+            job = enqueue_network_job(
+                eflex_opf,
+                the_network.id,
+                dict(**scheduling_kwargs, network_id=the_network.id),
+            )
         elif OPForPF == 'PF':
-            success = eflex_pf(**scheduling_kwargs)
-
-        if success:
-            print("PF done with success")
-        else:
-            print("ERROR!")
+            job = enqueue_network_job(eflex_pf, the_network.id, scheduling_kwargs)
 
         return render_flexmeasures_template(
             "admin/opf.html",
             logged_in_user=current_user,
             networks=networks,
+            job_id=job.id if job is not None else None,
         )
@@ -148,4 +148,38 @@ export function convertToCSV(data) {
 
     // Combine the header row and data rows
     return "data:text/csv;charset=utf-8," + headerRow + dataRows.join('\n');
-}
\ No newline at end of file
+}
+/**
+ * Expands chart data in the compact format (with sensors and sources listed once, and beliefs listed by column)
+ * into an array of records, in which the sensor and source properties reference the listed sensors and sources.
+ *
+ * @param {Object} data - Chart data in the compact format, or already an array of records (which is returned as is).
+ * @returns {Array} An array of records, one per belief.
+ *
+ * @example
+ * const data = {
+ *   "sensors": {"1": {"id": 1, "name": "power"}},
+ *   "sources": {"4": {"id": 4, "name": "foo"}},
+ *   "data": {"event_start": [1700000000000, 1700000900000], "event_value": [2.5, 3], "sensor": [1, 1], "source": [4, 4]}
+ * };
+ * const records = expandChartData(data);
+ * console.log(records[1]); // Output: {"event_start": 1700000900000, "event_value": 3, "sensor": {"id": 1, "name": "power"}, "source": {"id": 4, "name": "foo"}}
+ */
+export function expandChartData(data) {
+    if (Array.isArray(data)) {
+        return data;
+    }
+    const columns = Object.keys(data.data);
+    const numRecords = columns.length > 0 ? data.data[columns[0]].length : 0;
+    const lookups = {"sensor": data.sensors, "source": data.sources};
+    const records = new Array(numRecords);
+    for (let i = 0; i < numRecords; i++) {
+        const record = {};
+        for (const column of columns) {
+            const value = data.data[column][i];
+            record[column] = column in lookups ? lookups[column][value] : value;
+        }
+        records[i] = record;
+    }
+    return records;
+}
@@ -1,4 +1,5 @@
 from flask import url_for
+import pytest
 
 from flexmeasures.ui.tests.utils import logout
 
@@ -39,3 +40,22 @@ def test_control_responds(client, as_prosumer_user1):
 def test_logout(client, as_prosumer_user1):
     logout_response = logout(client)
     assert b"Please log in" in logout_response.data
+
+
+@pytest.mark.parametrize(
+    "horizon, horizon_step",
+    [(4, 0), (4, 5), ("four", 1), (4, "-1")],
+)
+def test_run_flexibility_with_invalid_horizon(
+    client, as_prosumer_user1, horizon, horizon_step
+):
+    response = client.get(
+        url_for(
+            "RunFlexibilityUI:run",
+            network_name="test network",
+            horizon=horizon,
+            horizon_step=horizon_step,
+        )
+    )
+    assert response.status_code == 400
+    assert b"The horizon" in response.data
@@ -110,6 +110,14 @@ class Config(object):
         "EVSE": ["one-way_evse", "two-way_evse"],
     }  # how to group assets by asset types
     FLEXMEASURES_LP_SOLVER: str = "appsi_highs"
+    FLEXMEASURES_NETWORK_SNAPSHOT_PATH: str | None = (
+        None  # None means a folder in the app's instance folder
+    )
+    FLEXMEASURES_ROLLUP_RESOLUTIONS: list[timedelta] = [
+        timedelta(minutes=15),
+        timedelta(hours=1),
+        timedelta(days=1),
+    ]  # Resolutions at which beliefs are rolled up, for fast searches at coarse resolutions
     FLEXMEASURES_JOB_TTL: timedelta = timedelta(days=1)
     FLEXMEASURES_PLANNING_HORIZON: timedelta = timedelta(days=2)
     FLEXMEASURES_MAX_PLANNING_HORIZON: timedelta | int | None = 2520  # smallest number divisible by 1-10, which yields pleasant-looking durations for common sensor resolutions
@@ -118,6 +126,13 @@ class Config(object):
     )  # Time to live for UDI event ids of successful scheduling jobs. Set a negative timedelta to persist forever.
     FLEXMEASURES_DEFAULT_DATASOURCE: str = "FlexMeasures"
     FLEXMEASURES_JOB_CACHE_TTL: int = 3600  # Time to live for the job caching keys in seconds. Set a negative timedelta to persist forever.
+    FLEXMEASURES_BELIEF_CACHE_TTL: int = 300  # Time to live for cached belief search results in seconds. Set to 0 to disable the belief cache.
+    FLEXMEASURES_BELIEF_CACHE_MAX_SIZE: int = (
+        256 * 1024**2
+    )  # Total size of cached belief search results in bytes, beyond which the oldest results are evicted
+    FLEXMEASURES_BELIEF_CACHE_MAX_ENTRY_SIZE: int = (
+        16 * 1024**2
+    )  # Larger belief search results are not cached
     FLEXMEASURES_TASK_CHECK_AUTH_TOKEN: str | None = None
     FLEXMEASURES_REDIS_URL: str = "localhost"
     FLEXMEASURES_REDIS_PORT: int = 6379
@@ -208,6 +223,7 @@ class TestingConfig(Config):
     FLEXMEASURES_PLANNING_HORIZON: timedelta = timedelta(
         hours=2 * 24
     )  # if more than 2 days, consider setting up more days of price data for tests
+    FLEXMEASURES_BELIEF_CACHE_TTL: int = 0  # test data is often set up without invalidating the belief cache, so it is enabled per test (see flexmeasures/data/tests/test_belief_cache.py)
 
 
 class DocumentationConfig(Config):
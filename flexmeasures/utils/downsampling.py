@@ -0,0 +1,107 @@
+"""
+Utils for downsampling time series while preserving their shape, e.g. to chart years of minute data.
+
+Both methods select a subset of the original points, rather than averaging them, so peaks and dips remain visible:
+- "lttb" (Largest-Triangle-Three-Buckets) selects one point per bucket of equal size (in number of points),
+  namely the one forming the largest triangle with the point selected in the previous bucket and the average of the next bucket.
+- "minmax" selects the minimum and maximum of each bucket of equal width (in time), such as one bucket per pixel of a chart.
+
+The first and last points are always kept.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+DEFAULT_CHART_WIDTH = 1000  # pixels
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Positions of the points selected by Largest-Triangle-Three-Buckets.
+
+    The buckets are processed in order, as each selection depends on the previous one,
+    but the areas within each bucket, and the averages of all buckets, are computed with vectorized operations.
+
+    :param x:       sorted positions (e.g. timestamps as numbers) of the points
+    :param y:       values of the points, without NaN values
+    :param n_out:   number of points to select (at least 3)
+    :returns:       sorted positions of the selected points
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("LTTB selects at least 3 points.")
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket edges for all points but the first and last, which are selected anyway
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    counts = np.diff(edges)
+    # Averages per bucket, with the last point standing in for the bucket after the last one
+    avg_x = np.append(np.add.reduceat(x[: n - 1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[: n - 1], edges[:-1]) / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Twice the area of the triangles spanned by point a, each point in the bucket, and the next bucket's average
+        areas = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Positions of the minimum and maximum of each bucket of equal width in x.
+
+    :param x:           sorted positions (e.g. timestamps as numbers) of the points
+    :param y:           values of the points, without NaN values
+    :param n_buckets:   number of buckets (at least 1), such that at most 2 * n_buckets + 2 points are selected
+    :returns:           sorted positions of the selected points
+    """
+    n = len(x)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    if n_buckets < 1:
+        raise ValueError("Min/max downsampling requires at least 1 bucket.")
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    span = x[-1] - x[0]
+    if span > 0:
+        buckets = np.minimum(((x - x[0]) / span * n_buckets).astype(int), n_buckets - 1)
+    else:
+        buckets = np.zeros(n, dtype=int)
+    # Sort by bucket, and within each bucket by value, so each bucket starts with its minimum and ends with its maximum
+    order = np.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    bucket_changes = sorted_buckets[1:] != sorted_buckets[:-1]
+    is_first = np.append(True, bucket_changes)
+    is_last = np.append(bucket_changes, True)
+    return np.union1d(np.concatenate([order[is_first], order[is_last]]), [0, n - 1])
+
+
+def downsample_indices(
+    x: np.ndarray, y: np.ndarray, width: int, method: str = "lttb"
+) -> np.ndarray:
+    """Positions of the points to keep to show a series on a chart of the given width (in pixels).
+
+    With "lttb", one point is kept per pixel; with "minmax", the minimum and maximum per pixel.
+
+    :raises ValueError: for unknown methods
+    """
+    if method == "lttb":
+        return lttb_indices(x, y, max(width, 3))
+    elif method == "minmax":
+        return minmax_indices(x, y, width)
+    raise ValueError(
+        f"Unknown downsampling method '{method}', expected one of {', '.join(DOWNSAMPLING_METHODS)}."
+    )
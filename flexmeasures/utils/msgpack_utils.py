@@ -0,0 +1,93 @@
+"""
+Utils for packing arrays and DataFrames with MessagePack, e.g. to cache them in Redis.
+
+Unlike pickles, packed data can only describe values (never code), so reading data written by someone else is safe.
+Numeric, datetime and timedelta columns are packed as raw buffers (datetimes in UTC, with their timezone alongside),
+and other columns as lists of plain values.
+The index is not packed, so reset it first if it holds data.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta, timezone
+
+import msgpack
+import numpy as np
+import pandas as pd
+
+
+def pack_array(array: np.ndarray) -> dict:
+    """Describe a numeric array in plain values, which msgpack can pack."""
+    array = np.ascontiguousarray(array)
+    return dict(dtype=array.dtype.str, shape=list(array.shape), data=array.tobytes())
+
+
+def unpack_array(packed: dict) -> np.ndarray:
+    """Inverse of pack_array."""
+    return (
+        np.frombuffer(packed["data"], dtype=np.dtype(packed["dtype"]))
+        .reshape(packed["shape"])
+        .copy()
+    )
+
+
+def pack_frame(df: pd.DataFrame) -> list[dict]:
+    """Describe the columns of a DataFrame in plain values, which msgpack can pack.
+
+    :raises TypeError: if an object column holds values msgpack cannot pack
+    """
+    columns = []
+    for name, series in df.items():
+        column = dict(name=name)
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            column.update(
+                kind="datetime",
+                tz=_pack_timezone(series.dt.tz),
+                **pack_array(series.dt.tz_convert("UTC").dt.tz_localize(None).values),
+            )
+        elif pd.api.types.is_datetime64_dtype(series):
+            column.update(kind="datetime", tz=None, **pack_array(series.values))
+        elif pd.api.types.is_timedelta64_dtype(series) or (
+            pd.api.types.is_numeric_dtype(series)
+            and not pd.api.types.is_extension_array_dtype(series)
+        ):
+            column.update(kind="array", **pack_array(series.values))
+        else:
+            values = series.tolist()
+            # Fail now, rather than when packing the whole message
+            msgpack.packb(values)
+            column.update(kind="list", data=values)
+        columns.append(column)
+    return columns
+
+
+def unpack_frame(columns: list[dict]) -> pd.DataFrame:
+    """Inverse of pack_frame, with a default index."""
+    data = {}
+    for column in columns:
+        if column["kind"] == "list":
+            data[column["name"]] = pd.Series(column["data"], dtype=object)
+            continue
+        series = pd.Series(unpack_array(column))
+        if column["kind"] == "datetime" and column["tz"] is not None:
+            series = series.dt.tz_localize("UTC").dt.tz_convert(
+                _unpack_timezone(column["tz"])
+            )
+        data[column["name"]] = series
+    return pd.DataFrame(data)
+
+
+def _pack_timezone(tz) -> str | int:
+    """Name of a timezone (from pytz or zoneinfo, or UTC), or else its fixed offset in seconds."""
+    name = getattr(tz, "zone", None) or getattr(tz, "key", None)
+    if name is None and str(tz) == "UTC":
+        name = "UTC"
+    if name is not None:
+        return name
+    return int(tz.utcoffset(None).total_seconds())
+
+
+def _unpack_timezone(tz: str | int):
+    if isinstance(tz, int):
+        return timezone(timedelta(seconds=tz))
+    return tz
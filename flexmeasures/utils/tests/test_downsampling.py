@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from flexmeasures.utils.downsampling import (
+    downsample_indices,
+    lttb_indices,
+    minmax_indices,
+)
+
+
+@pytest.fixture
+def series_with_peak():
+    x = np.arange(10_000)
+    y = np.sin(x / 300)
+    y[5_000] = 5  # a peak that should survive downsampling
+    y[7_000] = -5  # and a dip
+    return x, y
+
+
+def test_lttb(series_with_peak):
+    x, y = series_with_peak
+    indices = lttb_indices(x, y, 200)
+    assert len(indices) == 200
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert {5_000, 7_000} <= set(indices)
+
+
+def test_minmax(series_with_peak):
+    x, y = series_with_peak
+    indices = minmax_indices(x, y, 100)
+    assert len(indices) <= 2 * 100 + 2
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert {5_000, 7_000} <= set(indices)
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_are_left_alone(method):
+    x = np.arange(10)
+    y = np.random.random(10)
+    np.testing.assert_array_equal(downsample_indices(x, y, 100, method), x)
+
+
+def test_unknown_method(series_with_peak):
+    with pytest.raises(ValueError):
+        downsample_indices(*series_with_peak, 100, "average")
@@ -0,0 +1,39 @@
+from datetime import timedelta, timezone
+
+import msgpack
+import numpy as np
+import pandas as pd
+
+from flexmeasures.utils.msgpack_utils import (
+    pack_array,
+    pack_frame,
+    unpack_array,
+    unpack_frame,
+)
+
+
+def test_pack_and_unpack_frame():
+    df = pd.DataFrame(
+        {
+            "event_start": pd.date_range(
+                "2024-03-31", periods=3, freq="h", tz="Europe/Amsterdam"
+            ),
+            "belief_time": pd.to_datetime(
+                ["2024-03-30T00:00+01:00", None, "2024-03-30T00:00+01:00"]
+            ).tz_convert(timezone(timedelta(hours=1))),
+            "belief_horizon": pd.to_timedelta([1, -2, None], unit="h"),
+            "source": [1, 2, 3],
+            "event_value": [1.0, np.nan, 3.0],
+            "label": ["a", None, "c"],
+        }
+    )
+    packed = msgpack.packb(pack_frame(df))
+    pd.testing.assert_frame_equal(unpack_frame(msgpack.unpackb(packed)), df)
+
+
+def test_pack_and_unpack_array():
+    array = np.arange(6, dtype=np.int32).reshape(2, 3)
+    unpacked = unpack_array(msgpack.unpackb(msgpack.packb(pack_array(array))))
+    np.testing.assert_array_equal(unpacked, array)
+    assert unpacked.dtype == array.dtype
+    assert unpacked.flags.writeable